@@ -0,0 +1,124 @@
+"""
+Бенчмарк классификатора исторических сообщений ConversationService.
+
+Сравнивает предкомпилированный классификатор (_is_history_related,
+_normalize_russian_input) с прежней реализацией, которая на каждом
+вызове собирала множества ключевых слов и проходила по словарю опечаток.
+
+Запуск:
+    python benchmarks/bench_conversation_matcher.py [--corpus FILE] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import conversation_service
+from src.conversation_service import ConversationService
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), 'data', 'conversation_messages.txt')
+
+
+def legacy_is_history_related(user_message, user_data):
+    """Прежняя реализация: множества строятся заново на каждом вызове"""
+    history_keywords = set(conversation_service._HISTORY_KEYWORDS)
+    history_question_markers = set(conversation_service._HISTORY_QUESTION_MARKERS)
+    message_lower = user_message.lower()
+    words = set(message_lower.split())
+    is_history_related = bool(words.intersection(history_keywords))
+    if not is_history_related:
+        for marker in history_question_markers:
+            if marker in message_lower:
+                is_history_related = True
+                break
+    previous_messages = user_data.get('conversation_history', [])[:-1]
+    previous_context = " ".join(previous_messages[-2:]) if previous_messages else ""
+    return bool(
+        is_history_related
+        or ('?' in user_message and any(word in message_lower for word in ['кто', 'что', 'когда', 'где', 'почему', 'как']))
+        or (previous_context and any(kw in previous_context.lower() for kw in ['россия', 'история', 'царь', 'война']))
+    )
+
+
+def legacy_normalize(text):
+    """Прежняя реализация: вложенный цикл по опечаткам и девять проходов replace"""
+    text = text.lower()
+    typo_corrections = dict(conversation_service._TYPO_CORRECTIONS)
+    corrected_words = []
+    for word in text.split():
+        corrected = word
+        for typo, correction in typo_corrections.items():
+            if word.startswith(typo):
+                corrected = correction + word[len(typo):]
+                break
+        corrected_words.append(corrected)
+    normalized_text = ' '.join(corrected_words)
+    for lat, cyr in zip('aeopcxbhy', 'аеорсхвну'):
+        normalized_text = normalized_text.replace(lat, cyr)
+    return normalized_text
+
+
+def load_corpus(path):
+    """Загружает сообщения корпуса (по одному на строку)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def measure(func, messages, repeat):
+    """Возвращает среднее время обработки одного сообщения в микросекундах"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            func(message)
+    elapsed = time.perf_counter() - started
+    return elapsed / (repeat * len(messages)) * 1e6
+
+
+def run(corpus_path=DEFAULT_CORPUS, repeat=200):
+    """
+    Выполняет бенчмарк.
+
+    Returns:
+        dict: Время на сообщение (мкс) для старой и новой реализаций и доля совпадений
+    """
+    messages = load_corpus(corpus_path)
+    service = ConversationService(MagicMock(), MagicMock())
+    user_data = {'conversation_history': []}
+
+    results = {
+        "messages": len(messages),
+        "legacy_classify_us": measure(lambda m: legacy_is_history_related(m, user_data), messages, repeat),
+        "classify_us": measure(lambda m: service._is_history_related(m, user_data), messages, repeat),
+        "legacy_normalize_us": measure(legacy_normalize, messages, repeat),
+        "normalize_us": measure(service._normalize_russian_input, messages, repeat),
+    }
+
+    # Новая реализация находит словоформы, поэтому может отмечать больше сообщений
+    results["history_related_legacy"] = sum(legacy_is_history_related(m, user_data) for m in messages)
+    results["history_related"] = sum(service._is_history_related(m, user_data) for m in messages)
+    results["normalize_mismatches"] = sum(
+        legacy_normalize(m) != service._normalize_russian_input(m) for m in messages
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='Файл с сообщениями пользователей')
+    parser.add_argument('--repeat', type=int, default=200, help='Количество повторов корпуса')
+    args = parser.parse_args()
+
+    results = run(args.corpus, args.repeat)
+    print(f"Сообщений в корпусе: {results['messages']}")
+    print(f"_is_history_related:     {results['legacy_classify_us']:.2f} -> {results['classify_us']:.2f} мкс/сообщение")
+    print(f"_normalize_russian_input: {results['legacy_normalize_us']:.2f} -> {results['normalize_us']:.2f} мкс/сообщение")
+    print(f"Исторических сообщений: {results['history_related_legacy']} -> {results['history_related']}")
+    print(f"Расхождений нормализации: {results['normalize_mismatches']}")
+
+
+if __name__ == '__main__':
+    main()
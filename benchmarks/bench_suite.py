@@ -0,0 +1,453 @@
+"""
+Набор микробенчмарков кэшей, очередей и обработки текста с сохраненными
+базовыми замерами.
+
+Каждый бенчмарк - функция-контекст, которая готовит объект и возвращает
+функцию одного прогона (ops операций). Число прогонов подбирается так,
+чтобы замер длился не меньше --min-time секунд; замер повторяется
+--repeat раз, в отчет попадают медиана и минимум времени одной операции.
+
+Результаты можно сохранить как базовые (--save) и сравнить с ними после
+изменения (--compare). Замедлением считается рост и медианы, и минимума
+больше чем на --threshold, поэтому единичные выбросы его не дают.
+Базовые замеры зависят от машины: сравнивайте прогоны на одном окружении.
+
+Запуск:
+    python benchmarks/bench_suite.py [--filter СТРОКА] [--list]
+    python benchmarks/bench_suite.py --save [FILE]
+    python benchmarks/bench_suite.py --compare [FILE] [--threshold 0.2] [--fail-on-regression]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.load_test_handlers import DEFAULT_CORPUS, LoadTestLogger, load_corpus, scripted_response
+from src.api_cache import APICache
+from src.conversation_service import ConversationService
+from src.distributed_cache import DistributedCache
+from src.state_manager import StateManager
+from src.task_queue import TaskQueue
+from src.telegram_queue import TelegramRequestQueue
+from src.test_service import TestService
+from src.text_cache_service import TextCacheService
+from src.topic_service import TopicService
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'baseline.json')
+
+# Ответ API, который кэшируется в APICache и DistributedCache
+SAMPLE_RESULT = {"text": scripted_response("Контекст темы: Смутное время"), "status": "success"}
+
+BENCHMARKS = []
+
+
+class Benchmark:
+    """Описание бенчмарка: имя, параметры и функция подготовки"""
+
+    def __init__(self, name, setup, params=(None,), param_name=None, ops=1):
+        self.name = name
+        self.setup = setup
+        self.params = params
+        self.param_name = param_name
+        self.ops = ops
+
+    def cases(self):
+        """Имена и параметры отдельных замеров"""
+        for param in self.params:
+            if param is None:
+                yield self.name, param
+            else:
+                yield f"{self.name}[{self.param_name}={param}]", param
+
+
+def benchmark(name, params=(None,), param_name=None, ops=1):
+    """Регистрирует бенчмарк; функция принимает параметр и рабочий каталог"""
+    def decorator(func):
+        BENCHMARKS.append(Benchmark(name, contextmanager(func), params, param_name, ops))
+        return func
+    return decorator
+
+
+# --- Кэши ---
+
+def _filled_api_cache(size, workdir):
+    """APICache с size записями; заполняется без перезаписи файла на каждом set"""
+    cache = APICache(LoadTestLogger(), max_size=size, cache_file=os.path.join(workdir, f"api_cache_{size}.json"))
+    cache._save_cache = lambda: None
+    for number in range(size):
+        cache.set(f"prompt-{number}", SAMPLE_RESULT)
+    del cache._save_cache
+    cache._save_cache()
+    return cache
+
+
+@benchmark("api_cache.get", params=(100, 1000), param_name="size", ops=100)
+def bench_api_cache_get(size, workdir):
+    cache = _filled_api_cache(size, workdir)
+    keys = itertools.cycle([f"prompt-{number}" for number in range(size)])
+
+    def run():
+        for _ in range(100):
+            cache.get(next(keys))
+    yield run
+
+
+@benchmark("api_cache.set", params=(100, 1000), param_name="size")
+def bench_api_cache_set(size, workdir):
+    cache = _filled_api_cache(size, workdir)
+    keys = itertools.cycle([f"prompt-{number}" for number in range(size)])
+    yield lambda: cache.set(next(keys), SAMPLE_RESULT)
+
+
+def _local_distributed_cache(workdir, size=1000):
+    """DistributedCache без Redis (только локальный кэш)"""
+    cache = DistributedCache(LoadTestLogger(), redis_url=None, max_local_size=size,
+                             local_cache_file=os.path.join(workdir, "local_cache.json"))
+    cache.set_many({f"prompt-{number}": SAMPLE_RESULT for number in range(size)})
+    return cache
+
+
+@benchmark("distributed_cache.get_local", ops=100)
+def bench_distributed_cache_get(_, workdir):
+    cache = _local_distributed_cache(workdir)
+    keys = itertools.cycle([f"prompt-{number}" for number in range(1000)])
+
+    def run():
+        for _ in range(100):
+            cache.get(next(keys))
+    yield run
+
+
+@benchmark("distributed_cache.set_local")
+def bench_distributed_cache_set(_, workdir):
+    cache = _local_distributed_cache(workdir)
+    keys = itertools.cycle([f"prompt-{number}" for number in range(1000)])
+    yield lambda: cache.set(next(keys), SAMPLE_RESULT)
+
+
+def _text_cache(workdir):
+    """TextCacheService с главами 200 тем"""
+    service = TextCacheService(LoadTestLogger(), cache_dir=os.path.join(workdir, "texts_cache"), legacy_file=None)
+    for number in range(200):
+        service.save_text(f"Тема {number}", "chapter_1", SAMPLE_RESULT["text"])
+    service.flush()
+    return service
+
+
+@benchmark("text_cache.save_text")
+def bench_text_cache_save(_, workdir):
+    service = _text_cache(workdir)
+    topics = itertools.cycle([f"Тема {number}" for number in range(200)])
+    yield lambda: service.save_text(next(topics), "chapter_1", SAMPLE_RESULT["text"])
+    service.flush()
+
+
+@benchmark("text_cache.get_text", ops=100)
+def bench_text_cache_get(_, workdir):
+    service = _text_cache(workdir)
+    topics = itertools.cycle([f"Тема {number}" for number in range(200)])
+
+    def run():
+        for _ in range(100):
+            service.get_text(next(topics), "chapter_1")
+    yield run
+
+
+# --- Очереди ---
+
+TASK_BATCH = 500
+
+
+@benchmark("task_queue.throughput", params=(1, 4), param_name="workers", ops=TASK_BATCH)
+def bench_task_queue(workers, workdir):
+    task_queue = TaskQueue(num_workers=workers)
+    task_queue.start()
+
+    def run():
+        for _ in range(TASK_BATCH):
+            task_queue.add_task(int)
+        task_queue.task_queue.join()
+    yield run
+    task_queue.stop()
+
+
+TELEGRAM_BATCH = 200
+
+
+@benchmark("telegram_queue.dispatch", ops=TELEGRAM_BATCH)
+def bench_telegram_queue(_, workdir):
+    # Ограничение частоты не мешает замеру накладных расходов очереди
+    request_queue = TelegramRequestQueue(max_requests_per_second=1000000)
+    # Разные аргументы, чтобы запросы не отвечались из кэша очереди
+    counter = itertools.count()
+
+    def send_message(number):
+        return number
+
+    def run():
+        for _ in range(TELEGRAM_BATCH):
+            request_queue.enqueue(send_message, next(counter), callback=lambda result, error: None)
+        request_queue.queue.join()
+    yield run
+    request_queue.stop()
+
+
+@benchmark("state_manager.update_user_state", params=(100, 10000), param_name="users", ops=100)
+def bench_state_manager(users, workdir):
+    manager = StateManager(LoadTestLogger(), state_file=os.path.join(workdir, "user_states.json"),
+                           auto_save=False, save_interval=10 ** 9)
+    for user_id in range(users):
+        manager.get_user_state(user_id)
+    user_ids = itertools.cycle(range(users))
+
+    def run():
+        for _ in range(100):
+            manager.update_user_state(next(user_ids), {"current_state": 2, "conversation_history": "Кто такой Рюрик?"})
+    yield run
+
+
+# --- Обработка текста ---
+
+class _ScriptedAPIClient:
+    """Клиент API, мгновенно отвечающий по шаблону запроса"""
+
+    def ask_grok(self, prompt, use_cache=True, temperature=0.3, max_tokens=1024):
+        return scripted_response(prompt)
+
+
+@benchmark("test_service.generate_test")
+def bench_generate_test(_, workdir):
+    service = TestService(_ScriptedAPIClient(), LoadTestLogger())
+    yield lambda: service.generate_test("Смутное время")
+
+
+CONVERSATION_MESSAGES = load_corpus(DEFAULT_CORPUS)
+
+
+@benchmark("conversation._is_history_related", ops=len(CONVERSATION_MESSAGES))
+def bench_is_history_related(_, workdir):
+    service = ConversationService(None, LoadTestLogger())
+    user_data = {'conversation_history': []}
+
+    def run():
+        for message in CONVERSATION_MESSAGES:
+            service._is_history_related(message, user_data)
+    yield run
+
+
+@benchmark("topic_service._format_topic_messages")
+def bench_format_topic_messages(_, workdir):
+    service = TopicService(None, LoadTestLogger())
+    chapters = {chapter: scripted_response(f"Контекст темы: {chapter}") * (number + 1)
+                for number, chapter in enumerate(service.standard_chapters)}
+    yield lambda: service._format_topic_messages("Смутное время", chapters)
+
+
+# --- Запуск и сравнение ---
+
+def measure(func, ops, repeat, min_time):
+    """
+    Замеряет время одной операции.
+
+    Returns:
+        dict: Медиана и минимум времени операции (мкс) и число прогонов в замере
+    """
+    func()  # Прогрев
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    timings = [elapsed / (number * ops)]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / (number * ops))
+    return {
+        "median_us": round(statistics.median(timings) * 1e6, 3),
+        "min_us": round(min(timings) * 1e6, 3),
+        "number": number,
+        "ops": ops,
+    }
+
+
+def select(filters=None):
+    """Бенчмарки и их параметры, имена которых содержат одну из строк filters"""
+    selected = []
+    for bench in BENCHMARKS:
+        for name, param in bench.cases():
+            if not filters or any(pattern in name for pattern in filters):
+                selected.append((bench, name, param))
+    return selected
+
+
+def run(filters=None, repeat=5, min_time=0.05, progress=None):
+    """
+    Выполняет выбранные бенчмарки.
+
+    Returns:
+        dict: Имя замера -> результаты measure
+    """
+    results = {}
+    for bench, name, param in select(filters):
+        workdir = tempfile.mkdtemp(prefix="bench_")
+        try:
+            with bench.setup(param, workdir) as func:
+                results[name] = measure(func, bench.ops, repeat, min_time)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+def environment():
+    """Описание окружения, в котором сделаны замеры"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def save_baseline(results, path):
+    """Сохраняет замеры как базовые (существующие замеры других бенчмарков сохраняются)"""
+    baseline = load_baseline(path) if os.path.exists(path) else {"results": {}}
+    baseline["version"] = 1
+    baseline["environment"] = environment()
+    baseline["results"].update(results)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    """Загружает файл базовых замеров"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results, baseline_results, threshold=0.2):
+    """
+    Сравнивает замеры с базовыми.
+
+    Returns:
+        list: Строки сравнения (имя, базовая и текущая медианы, отношение,
+            вердикт: slower, faster, same или new)
+    """
+    rows = []
+    for name, current in results.items():
+        base = baseline_results.get(name)
+        if not base:
+            rows.append({"name": name, "baseline_us": None, "current_us": current["median_us"],
+                         "ratio": None, "verdict": "new"})
+            continue
+        ratio = current["median_us"] / base["median_us"]
+        min_ratio = current["min_us"] / base["min_us"]
+        if ratio > 1 + threshold and min_ratio > 1 + threshold:
+            verdict = "slower"
+        elif ratio < 1 / (1 + threshold) and min_ratio < 1 / (1 + threshold):
+            verdict = "faster"
+        else:
+            verdict = "same"
+        rows.append({"name": name, "baseline_us": base["median_us"], "current_us": current["median_us"],
+                     "ratio": ratio, "verdict": verdict})
+    return rows
+
+
+VERDICTS = {"slower": "медленнее", "faster": "быстрее", "same": "без изменений", "new": "нет базового"}
+
+
+def print_results(results):
+    """Печатает таблицу замеров"""
+    print(f"{'Бенчмарк':<50}{'медиана, мкс':>14}{'минимум, мкс':>14}")
+    for name, result in results.items():
+        print(f"{name:<50}{result['median_us']:>14.2f}{result['min_us']:>14.2f}")
+
+
+def print_comparison(rows, baseline):
+    """Печатает отчет сравнения с базовыми замерами"""
+    env = baseline.get("environment", {})
+    print(f"Базовые замеры: {env.get('created_at')}, коммит {env.get('commit')}, "
+          f"Python {env.get('python')}, {env.get('platform')}")
+    print()
+    print(f"{'Бенчмарк':<50}{'база, мкс':>12}{'сейчас, мкс':>13}{'x':>8}  Итог")
+    for row in rows:
+        base = f"{row['baseline_us']:.2f}" if row["baseline_us"] is not None else "-"
+        ratio = f"{row['ratio']:.2f}" if row["ratio"] is not None else "-"
+        print(f"{row['name']:<50}{base:>12}{row['current_us']:>13.2f}{ratio:>8}  {VERDICTS[row['verdict']]}")
+    counts = {verdict: sum(row["verdict"] == verdict for row in rows) for verdict in VERDICTS}
+    print()
+    print(f"Медленнее: {counts['slower']}, быстрее: {counts['faster']}, без изменений: {counts['same']}, "
+          f"без базового замера: {counts['new']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filter', action='append', help='Запускать бенчмарки, имя которых содержит строку')
+    parser.add_argument('--list', action='store_true', help='Показать список бенчмарков')
+    parser.add_argument('--repeat', type=int, default=5, help='Количество повторов замера')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Минимальная длительность одного замера, с')
+    parser.add_argument('--save', nargs='?', const=DEFAULT_BASELINE, help='Сохранить замеры как базовые')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, help='Сравнить с базовыми замерами')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Допустимое изменение времени (доля)')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Код возврата 1, если есть замедления')
+    parser.add_argument('--json', help='Записать замеры в файл JSON')
+    args = parser.parse_args()
+
+    if args.list:
+        for _, name, _ in select(args.filter):
+            print(name)
+        return
+
+    results = run(args.filter, args.repeat, args.min_time,
+                  progress=lambda name, result: print(f"  {name}: {result['median_us']:.2f} мкс", file=sys.stderr))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"environment": environment(), "results": results}, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        rows = compare(results, baseline.get("results", {}), args.threshold)
+        print_comparison(rows, baseline)
+    else:
+        print_results(results)
+
+    if args.save:
+        save_baseline(results, args.save)
+        print(f"Базовые замеры сохранены в {args.save}")
+
+    if args.compare and args.fail_on_regression and any(row["verdict"] == "slower" for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Бенчмарк общих функций подготовки текста (src/text_rendering.py).
+
+Сравнивает escape_markdown с прежними реализациями экранирования
+(цикл str.replace из UIManager и TopicService, посимвольная сборка
+строки из CommandHandlers) и split_message с прежним разбиением глав
+по абзацам. Для разбиения дополнительно считается, сколько частей
+превышают лимит Telegram или оставляют выделение незакрытым.
+
+Запуск:
+    python benchmarks/bench_text_rendering.py [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.text_rendering import (
+    TELEGRAM_MAX_MESSAGE_LENGTH, MARKDOWN_SPECIAL_CHARS, escape_markdown, split_message, _open_entities
+)
+
+SAMPLE_PARAGRAPH = (
+    "*Крещение Руси* (988 г.) - принятие христианства [по византийскому обряду](https://ru.wikipedia.org). "
+    "Князь Владимир Святославич (ок. 960-1015) крестил киевлян в водах Днепра! "
+    "_Последствия_: распространение письменности, строительство храмов, укрепление связей с Византией. "
+)
+
+
+def legacy_replace_escape(text):
+    """Прежняя реализация UIManager и TopicService: отдельный проход replace на каждый символ"""
+    if not text:
+        return ""
+    for char in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
+        text = text.replace(char, '\\' + char)
+    return text
+
+
+def legacy_concat_escape(text):
+    """Прежняя реализация CommandHandlers: посимвольная конкатенация строки"""
+    if not text:
+        return ""
+    replacements = {char: '\\' + char for char in MARKDOWN_SPECIAL_CHARS if char != '~'}
+    sanitized_text = ""
+    for char in text:
+        sanitized_text += replacements.get(char, char)
+    return sanitized_text
+
+
+def legacy_split(content, max_length=3500):
+    """Прежнее разбиение глав в CommandHandlers: упаковка абзацев без деления длинных"""
+    chunks = []
+    current_length = 0
+    current_chunk = ""
+    for paragraph in content.split('\n\n'):
+        if current_length + len(paragraph) + 4 <= max_length:
+            current_chunk = current_chunk + "\n\n" + paragraph if current_chunk else paragraph
+            current_length += len(paragraph) + 4
+        else:
+            chunks.append(current_chunk)
+            current_chunk = paragraph
+            current_length = len(paragraph)
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+
+def build_corpus():
+    """Собирает тексты разного размера: короткие, главы из абзацев и главы с огромным абзацем"""
+    short = [SAMPLE_PARAGRAPH[:n] for n in (40, 120, 300)]
+    chapters = ["\n\n".join([SAMPLE_PARAGRAPH * 3] * count) for count in (5, 15, 30)]
+    long_paragraph = [SAMPLE_PARAGRAPH * 60]
+    return short, chapters + long_paragraph
+
+
+def measure(func, texts, repeat):
+    """Возвращает среднее время обработки одного текста в микросекундах"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    elapsed = time.perf_counter() - started
+    return elapsed / (repeat * len(texts)) * 1e6
+
+
+def split_quality(parts, limit):
+    """Считает части длиннее лимита и части с незакрытым выделением"""
+    oversized = sum(len(part) > limit for part in parts)
+    unbalanced = sum(bool(_open_entities(part, [])) for part in parts)
+    return oversized, unbalanced
+
+
+def run(repeat=200):
+    """
+    Выполняет бенчмарк.
+
+    Returns:
+        dict: Время на текст (мкс) для старых и новых реализаций и показатели качества разбиения
+    """
+    short, long_texts = build_corpus()
+    texts = short + long_texts
+
+    results = {
+        "texts": len(texts),
+        "legacy_replace_escape_us": measure(legacy_replace_escape, texts, repeat),
+        "legacy_concat_escape_us": measure(legacy_concat_escape, texts, repeat),
+        "escape_us": measure(escape_markdown, texts, repeat),
+        "escape_mismatches": sum(legacy_replace_escape(text) != escape_markdown(text) for text in texts),
+        "legacy_split_us": measure(legacy_split, long_texts, repeat),
+        "split_us": measure(lambda text: split_message(text, 3500), long_texts, repeat),
+    }
+
+    legacy_parts = [part for text in long_texts for part in legacy_split(text)]
+    parts = [part for text in long_texts for part in split_message(text, 3500)]
+    results["legacy_oversized"], results["legacy_unbalanced"] = split_quality(legacy_parts, TELEGRAM_MAX_MESSAGE_LENGTH)
+    results["oversized"], results["unbalanced"] = split_quality(parts, TELEGRAM_MAX_MESSAGE_LENGTH)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200, help='Количество повторов корпуса')
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    print(f"Текстов в корпусе: {results['texts']}")
+    print(f"Экранирование (replace):  {results['legacy_replace_escape_us']:.2f} -> {results['escape_us']:.2f} мкс/текст")
+    print(f"Экранирование (по символу): {results['legacy_concat_escape_us']:.2f} -> {results['escape_us']:.2f} мкс/текст")
+    print(f"Расхождений экранирования: {results['escape_mismatches']}")
+    print(f"Разбиение на части: {results['legacy_split_us']:.2f} -> {results['split_us']:.2f} мкс/текст")
+    print(f"Частей длиннее лимита: {results['legacy_oversized']} -> {results['oversized']}")
+    print(f"Частей с незакрытым выделением: {results['legacy_unbalanced']} -> {results['unbalanced']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,517 @@
+"""
+Нагрузочный тест обработчиков CommandHandlers с синтетическими пользователями.
+
+Каждый пользователь проходит сценарий бота через поддельные Update,
+CallbackContext и бота Telegram:
+
+    /start -> «Выбрать тему» -> тема из списка -> тест -> ответы
+    -> беседа (несколько вопросов из корпуса сообщений)
+
+Обработчики выполняются в пуле потоков, как в диспетчере Updater
+(workers=8 в src/bot.py); пользователь ждет ответа на каждый шаг, поэтому
+задержка шага включает ожидание в очереди. Gemini заменен кассетой
+GeminiReplay: ответы берутся из записанной кассеты (--cassette), а на
+промах формируются по шаблону запроса с задержкой из распределения
+--latency. Отправка в Telegram имитируется задержкой --telegram-latency.
+
+Отчет: перцентили задержки по шагам, число запросов к Gemini, отправки
+в Telegram в секунду, память процесса, предупреждения и ошибки обработчиков.
+
+Запуск:
+    python benchmarks/load_test_handlers.py [--users N] [--workers N] [--latency SPEC]
+        [--answers N] [--messages N] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.api_client import APIClient
+from src.content_service import ContentService
+from src.gemini_replay import GeminiReplay
+from src.handlers import CommandHandlers
+from src.message_manager import MessageManager
+from src.test_service import TestService
+from src.topic_service import TopicService
+from src.ui_manager import UIManager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), 'data', 'conversation_messages.txt')
+
+# Порядок шагов в отчете
+STEPS = ("start", "topics", "choose_topic", "test", "answer", "end_test", "conversation_menu", "conversation")
+PERCENTILES = (50, 90, 99)
+
+_PERSONS = ["Иван III", "Петр I", "Екатерина II", "Александр II", "Дмитрий Донской", "Ярослав Мудрый"]
+_PLACES = ["Москва", "Новгород", "Киев", "Владимир", "Санкт-Петербург", "Казань"]
+
+
+def scripted_response(prompt):
+    """
+    Формирует правдоподобный ответ Gemini по виду запроса.
+
+    Ответ детерминирован для одного и того же запроса и проходит разбор
+    в TopicService, TestService и ConversationService.
+    """
+    rng = random.Random(zlib.crc32(prompt.encode('utf-8')))
+    if "Составь список из 30" in prompt:
+        return "\n".join(f"{number}. {topic}" for number, topic in enumerate(ContentService.DEFAULT_TOPICS, 1))
+    if "Предложи 3 логически" in prompt:
+        return "\n".join(f"{number}. {rng.choice(_PERSONS)}, {rng.randint(900, 1917)} год" for number in range(1, 4))
+    if "предложи 3 связанные темы" in prompt:
+        return "\n".join(f"{number}. {topic}"
+                         for number, topic in enumerate(rng.sample(ContentService.DEFAULT_TOPICS, 3), 1))
+    if "вопросов для тестирования" in prompt:
+        return "\n\n".join(
+            f"Вопрос: В каком году {rng.choice(_PERSONS)} посетил город {rng.choice(_PLACES)}?\n"
+            f"Правильный ответ: {rng.randint(900, 1917)} год"
+            for _ in range(20)
+        )
+    if "Определи детальные характеристики" in prompt:
+        return " ".join(f"{rng.randint(900, 1917)} год: {rng.choice(_PERSONS)} в городе {rng.choice(_PLACES)}."
+                        for _ in range(12))
+    if "Контекст темы:" in prompt:
+        # Глава длиннее CHAPTER_MIN_LENGTH, чтобы не вызывать повторные запросы
+        paragraphs = []
+        for _ in range(6):
+            paragraphs.append(" ".join(
+                f"В {rng.randint(900, 1917)} году {rng.choice(_PERSONS)} находился в городе {rng.choice(_PLACES)}, "
+                f"что повлияло на дальнейшее развитие страны."
+                for _ in range(4)
+            ))
+        return "\n\n".join(paragraphs)
+    return " ".join(f"{rng.choice(_PERSONS)} правил из города {rng.choice(_PLACES)} с {rng.randint(900, 1917)} года."
+                    for _ in range(15))
+
+
+def percentile(values, p):
+    """Перцентиль с линейной интерполяцией (values отсортированы)"""
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class LoadTestLogger:
+    """Логгер без вывода: считает предупреждения и ошибки обработчиков"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.warnings = 0
+        self.errors = 0
+        self.last_errors = []
+
+    def debug(self, message):
+        pass
+
+    def info(self, message):
+        pass
+
+    def warning(self, message):
+        with self._lock:
+            self.warnings += 1
+
+    def error(self, message):
+        with self._lock:
+            self.errors += 1
+            self.last_errors = (self.last_errors + [str(message)[:200]])[-5:]
+
+    critical = error
+
+    def log_error(self, error, additional_info=None):
+        self.error(f"{additional_info}: {error}")
+
+
+class FakeBot:
+    """Бот Telegram, который только считает отправки и имитирует задержку сети"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._message_id = 0
+        self.sends = []
+        self.methods = {}
+
+    def _send(self, method):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            self._message_id += 1
+            self.sends.append(time.perf_counter())
+            self.methods[method] = self.methods.get(method, 0) + 1
+            return self._message_id
+
+    def send_chat_action(self, chat_id=None, action=None, **kwargs):
+        self._send("sendChatAction")
+        return True
+
+    def send_document(self, chat_id=None, document=None, **kwargs):
+        return FakeMessage(self, self._send("sendDocument"), chat_id)
+
+    def send_message(self, chat_id=None, text=None, **kwargs):
+        return FakeMessage(self, self._send("sendMessage"), chat_id, text)
+
+    def delete_message(self, chat_id=None, message_id=None, **kwargs):
+        self._send("deleteMessage")
+        return True
+
+
+class FakeMessage:
+    """Сообщение Telegram с методом ответа"""
+
+    def __init__(self, bot, message_id, chat_id, text=None, from_user=None):
+        self.bot = bot
+        self.message_id = message_id
+        self.chat_id = chat_id
+        self.chat = SimpleNamespace(id=chat_id)
+        self.text = text
+        self.from_user = from_user
+
+    def reply_text(self, text, **kwargs):
+        return FakeMessage(self.bot, self.bot._send("sendMessage"), self.chat_id, text)
+
+
+class FakeCallbackQuery:
+    """Нажатие кнопки под сообщением бота"""
+
+    def __init__(self, bot, user, data):
+        self.bot = bot
+        self.from_user = user
+        self.data = data
+        self.message = FakeMessage(bot, 0, user.id)
+
+    def answer(self, *args, **kwargs):
+        self.bot._send("answerCallbackQuery")
+        return True
+
+    def edit_message_text(self, text, **kwargs):
+        self.bot._send("editMessageText")
+        return self.message
+
+
+class SyntheticUser:
+    """Пользователь с собственными user_data, отправляющий обновления"""
+
+    def __init__(self, user_id, bot):
+        self.user = SimpleNamespace(id=user_id, first_name=f"Пользователь {user_id}", username=None)
+        self.bot = bot
+        self.context = SimpleNamespace(bot=bot, user_data={}, chat_data={}, bot_data={})
+
+    def message(self, text):
+        """Обновление с текстовым сообщением"""
+        message = FakeMessage(self.bot, 0, self.user.id, text, from_user=self.user)
+        return SimpleNamespace(message=message, callback_query=None, effective_user=self.user,
+                               effective_chat=message.chat, effective_message=message)
+
+    def press(self, data):
+        """Обновление с нажатием кнопки"""
+        query = FakeCallbackQuery(self.bot, self.user, data)
+        return SimpleNamespace(message=None, callback_query=query, effective_user=self.user,
+                               effective_chat=query.message.chat, effective_message=query.message)
+
+
+def create_handlers(replay, logger, semantic_cache=False):
+    """Собирает CommandHandlers с теми же сервисами, что и BotFactory.create_bot"""
+    api_client = APIClient("", None, logger, replay=replay)
+    topic_service = TopicService(api_client, logger)
+    answer_cache = None
+    if semantic_cache:
+        from src.semantic_cache import SemanticAnswerCache
+        answer_cache = SemanticAnswerCache(logger)
+    return CommandHandlers(
+        ui_manager=UIManager(logger, topic_service),
+        api_client=api_client,
+        message_manager=MessageManager(logger),
+        content_service=None,
+        logger=logger,
+        config=None,
+        test_service=TestService(api_client, logger),
+        topic_service=topic_service,
+        answer_cache=answer_cache
+    )
+
+
+class LoadTest:
+    """Прогон сценария для набора пользователей с замером задержек шагов"""
+
+    def __init__(self, handlers, bot, workers, answers, messages, corpus, think_time=0.0, seed=None):
+        self.handlers = handlers
+        self.bot = bot
+        self.answers = answers
+        self.messages = messages
+        self.corpus = corpus
+        self.think_time = think_time
+        self._rng = random.Random(seed)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dispatcher")
+        self._lock = threading.Lock()
+        self.latencies = {step: [] for step in STEPS}
+        self.queue_waits = []
+        self.step_errors = {}
+        self.failed_users = 0
+
+    def _step(self, name, handler, update, context):
+        """Отправляет обновление в пул обработчиков и ждет результата"""
+        submitted = time.perf_counter()
+
+        def execute():
+            started = time.perf_counter()
+            return started, handler(update, context)
+
+        future = self._pool.submit(execute)
+        try:
+            started, state = future.result()
+        except Exception:
+            with self._lock:
+                self.step_errors[name] = self.step_errors.get(name, 0) + 1
+            raise
+        finished = time.perf_counter()
+        with self._lock:
+            self.latencies[name].append(finished - submitted)
+            self.queue_waits.append(started - submitted)
+        if self.think_time > 0:
+            time.sleep(self.think_time)
+        return state
+
+    def _fail(self, name):
+        """Обработчик не упал, но шаг не дал ожидаемого результата"""
+        with self._lock:
+            self.step_errors[name] = self.step_errors.get(name, 0) + 1
+
+    def run_user(self, user):
+        """Сценарий одного пользователя"""
+        with self._lock:
+            rng = random.Random(self._rng.random())
+        handlers = self.handlers
+        context = user.context
+
+        self._step("start", handlers.start, user.message("/start"), context)
+        self._step("topics", handlers.button_handler, user.press("topic"), context)
+        topics = context.user_data.get('topics') or []
+        if not topics:
+            self._fail("topics")
+            return
+        topic_number = rng.randint(1, len(topics))
+        self._step("choose_topic", handlers.choose_topic, user.press(f"topic_{topic_number}"), context)
+
+        self._step("test", handlers.button_handler, user.press("test"), context)
+        questions = context.user_data.get('questions') or []
+        if not questions:
+            self._fail("test")
+        else:
+            for _ in range(min(self.answers, len(questions))):
+                self._step("answer", handlers.handle_answer, user.message(str(rng.randint(1, 4))), context)
+            if self.answers < len(questions):
+                self._step("end_test", handlers.button_handler, user.press("end_test"), context)
+
+        self._step("conversation_menu", handlers.button_handler, user.press("conversation"), context)
+        for _ in range(self.messages):
+            self._step("conversation", handlers.handle_conversation, user.message(rng.choice(self.corpus)), context)
+
+    def run(self, users, ramp_up=0.0):
+        """
+        Запускает пользователей, равномерно распределяя старт по ramp_up секундам.
+
+        Returns:
+            float: Длительность прогона в секундах
+        """
+        synthetic = [SyntheticUser(100000 + number, self.bot) for number in range(users)]
+
+        def scenario(number, user):
+            if ramp_up > 0:
+                time.sleep(ramp_up * number / users)
+            try:
+                self.run_user(user)
+            except Exception:
+                with self._lock:
+                    self.failed_users += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users, thread_name_prefix="user") as user_pool:
+            for number, user in enumerate(synthetic):
+                user_pool.submit(scenario, number, user)
+        duration = time.perf_counter() - started
+        self._pool.shutdown(wait=True)
+        return duration
+
+    def step_report(self):
+        """Перцентили задержки (мс) по шагам"""
+        report = {}
+        for step in STEPS:
+            values = sorted(self.latencies[step])
+            if not values and not self.step_errors.get(step):
+                continue
+            report[step] = {
+                "count": len(values),
+                "errors": self.step_errors.get(step, 0),
+                "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+                "max_ms": values[-1] * 1000 if values else 0.0,
+            }
+            for p in PERCENTILES:
+                report[step][f"p{p}_ms"] = percentile(values, p) * 1000
+        return report
+
+
+def telegram_report(bot, duration):
+    """Отправки в Telegram: всего, в среднем и в пиковую секунду"""
+    sends = sorted(bot.sends)
+    peak = 0
+    window_start = 0
+    for index, sent in enumerate(sends):
+        while sent - sends[window_start] >= 1.0:
+            window_start += 1
+        peak = max(peak, index - window_start + 1)
+    return {
+        "sends": len(sends),
+        "per_second": len(sends) / duration if duration > 0 else 0.0,
+        "peak_per_second": peak,
+        "methods": dict(sorted(bot.methods.items())),
+    }
+
+
+def max_rss_mb():
+    """Пиковый размер резидентной памяти процесса в МБ"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В macOS ru_maxrss в байтах, в Linux - в килобайтах
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def load_corpus(path):
+    """Загружает сообщения корпуса (по одному на строку)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def run(users=10, workers=8, latency="lognormal:1.0:0.5", telegram_latency=0.05, answers=20, messages=3,
+        cassette="", quota_error_rate=0.0, rate_error_rate=0.0, ramp_up=0.0, think_time=0.0,
+        semantic_cache=False, corpus_path=DEFAULT_CORPUS, trace_memory=False, seed=1):
+    """
+    Выполняет нагрузочный тест.
+
+    Returns:
+        dict: Параметры прогона, задержки шагов, статистика Gemini и Telegram,
+            память и число ошибок обработчиков
+    """
+    if trace_memory:
+        tracemalloc.start()
+    logger = LoadTestLogger()
+    # Пустой путь кассеты - все ответы формируются по шаблону запроса
+    replay = GeminiReplay(cassette, mode="replay", latency=latency, quota_error_rate=quota_error_rate,
+                          rate_error_rate=rate_error_rate, on_miss="synthetic", seed=seed,
+                          responder=scripted_response)
+    handlers = create_handlers(replay, logger, semantic_cache)
+    bot = FakeBot(telegram_latency)
+    load_test = LoadTest(handlers, bot, workers, answers, messages, load_corpus(corpus_path), think_time, seed)
+
+    duration = load_test.run(users, ramp_up)
+
+    memory = {"max_rss_mb": max_rss_mb()}
+    if trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory.update(traced_current_mb=current / (1024 * 1024), traced_peak_mb=peak / (1024 * 1024))
+
+    gemini = replay.get_stats()
+    gemini["per_user"] = gemini["calls"] / users if users else 0.0
+    return {
+        "users": users,
+        "workers": workers,
+        "latency": latency,
+        "duration_s": duration,
+        "steps": load_test.step_report(),
+        "queue_wait_p99_ms": percentile(sorted(load_test.queue_waits), 99) * 1000,
+        "gemini": gemini,
+        "telegram": telegram_report(bot, duration),
+        "memory": memory,
+        "failed_users": load_test.failed_users,
+        "handler_warnings": logger.warnings,
+        "handler_errors": logger.errors,
+        "last_errors": logger.last_errors,
+    }
+
+
+def print_report(results):
+    """Печатает отчет в виде таблицы"""
+    print(f"Пользователей: {results['users']}, потоков обработки: {results['workers']}, "
+          f"задержка Gemini: {results['latency']}, длительность: {results['duration_s']:.1f} с")
+    print()
+    print(f"{'Шаг':<18}{'N':>6}{'Ошибок':>8}{'p50, мс':>10}{'p90, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for step, stats in results["steps"].items():
+        print(f"{step:<18}{stats['count']:>6}{stats['errors']:>8}{stats['p50_ms']:>10.0f}"
+              f"{stats['p90_ms']:>10.0f}{stats['p99_ms']:>10.0f}{stats['max_ms']:>10.0f}")
+    print(f"Ожидание в очереди обработчиков, p99: {results['queue_wait_p99_ms']:.0f} мс")
+    print()
+
+    gemini = results["gemini"]
+    print(f"Gemini: {gemini['calls']} запросов ({gemini['per_user']:.1f} на пользователя), "
+          f"из кассеты {gemini['hits']}, по шаблону {gemini['misses']}, ошибок внесено {gemini['injected_errors']}")
+    telegram = results["telegram"]
+    print(f"Telegram: {telegram['sends']} отправок, {telegram['per_second']:.1f}/с в среднем, "
+          f"{telegram['peak_per_second']}/с в пике")
+    print("  " + ", ".join(f"{method}: {count}" for method, count in telegram["methods"].items()))
+
+    memory = results["memory"]
+    if memory["max_rss_mb"] is not None:
+        print(f"Память: пиковый RSS {memory['max_rss_mb']:.1f} МБ")
+    if "traced_peak_mb" in memory:
+        print(f"Память Python (tracemalloc): {memory['traced_current_mb']:.1f} МБ, пик {memory['traced_peak_mb']:.1f} МБ")
+    print(f"Предупреждений: {results['handler_warnings']}, ошибок: {results['handler_errors']}, "
+          f"прерванных сценариев: {results['failed_users']}")
+    for error in results["last_errors"]:
+        print(f"  {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help='Количество одновременных пользователей')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Потоков обработки обновлений (1 - обработчики без run_async в одном потоке диспетчера)')
+    parser.add_argument('--latency', default='lognormal:1.0:0.5',
+                        help='Задержка ответа Gemini: none, fixed:S, uniform:A:B, lognormal:MEDIAN:SIGMA')
+    parser.add_argument('--telegram-latency', type=float, default=0.05, help='Задержка одной отправки в Telegram, с')
+    parser.add_argument('--answers', type=int, default=20, help='Ответов на вопросы теста (меньше 20 - тест прерывается)')
+    parser.add_argument('--messages', type=int, default=3, help='Сообщений в режиме беседы')
+    parser.add_argument('--cassette', default='', help='Записанная кассета Gemini (промахи формируются по шаблону)')
+    parser.add_argument('--quota-error-rate', type=float, default=0.0, help='Доля ошибок квоты Gemini')
+    parser.add_argument('--rate-error-rate', type=float, default=0.0, help='Доля ошибок частоты запросов Gemini')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='Время, за которое стартуют все пользователи, с')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Пауза пользователя между шагами, с')
+    parser.add_argument('--semantic-cache', action='store_true', help='Включить семантический кэш ответов беседы')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='Файл с сообщениями для беседы')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Замерять память Python через tracemalloc (замедляет обработчики)')
+    parser.add_argument('--seed', type=int, default=1, help='Зерно случайных задержек и выбора действий')
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в формате JSON')
+    args = parser.parse_args()
+
+    results = run(users=args.users, workers=args.workers, latency=args.latency,
+                  telegram_latency=args.telegram_latency, answers=args.answers, messages=args.messages,
+                  cassette=args.cassette, quota_error_rate=args.quota_error_rate,
+                  rate_error_rate=args.rate_error_rate, ramp_up=args.ramp_up, think_time=args.think_time,
+                  semantic_cache=args.semantic_cache, corpus_path=args.corpus,
+                  trace_memory=args.trace_memory, seed=args.seed)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -39,7 +39,8 @@ def clear_temp_dirs():
     """Очищает временные директории"""
     temp_dirs = [
         'history_db_generator/temp',
-        'generated_maps'
+        'generated_maps',
+        'texts_cache'
     ]
 
     count = 0
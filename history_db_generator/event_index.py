@@ -0,0 +1,200 @@
+"""
+Индекс событий для устранения дубликатов при генерации базы данных.
+
+Проверка нового события выполняется за O(1) в среднем по трем признакам:
+
+1. Точный дубликат - совпадает идентификатор события (хеш названия и даты).
+2. Совпадают нормализованное название (основы слов без служебных слов,
+   см. src/russian_text.py) и год события.
+3. Почти дубликат - пересказ того же события другими словами: оценка
+   сходства Жаккара по MinHash-подписям множеств основ слов названия и
+   описания не ниже порога, а годы совпадают (или у одного из событий
+   год не указан). Кандидаты ищутся через LSH: подпись делится на полосы,
+   и события с совпадающей полосой попадают в одну корзину.
+
+Индекс пополняется по мере добавления событий, поэтому генерация
+остается линейной по размеру базы.
+"""
+
+import random
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from src.russian_text import tokenize
+
+# Большое простое число для универсального хеширования (2^61 - 1)
+_PRIME = (1 << 61) - 1
+_YEAR_RE = re.compile(r'\b(\d{3,4})\b')
+
+
+def event_year(date: str) -> Optional[str]:
+    """Возвращает первый год (три-четыре цифры) из даты события"""
+    match = _YEAR_RE.search(date or "")
+    return match.group(1) if match else None
+
+
+def normalize_title(title: str) -> str:
+    """Приводит название к основам слов без служебных слов"""
+    return " ".join(tokenize(title or ""))
+
+
+class EventIndex:
+    """Инкрементальный индекс точных и почти совпадающих событий"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.6,
+                 min_tokens: int = 5, seed: int = 1):
+        """
+        Инициализация индекса.
+
+        Args:
+            num_perm (int): Длина MinHash-подписи
+            bands (int): Количество полос LSH (num_perm должно делиться на bands)
+            threshold (float): Минимальное сходство Жаккара для почти дубликата
+            min_tokens (int): Минимум основ слов, при котором событие сравнивается по MinHash
+            seed (int): Зерно коэффициентов хеш-функций
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.min_tokens = min_tokens
+
+        rng = random.Random(seed)
+        self._coefficients = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+        self._ids = set()
+        self._title_years: Dict[Tuple[str, str], str] = {}
+        self._signatures: Dict[str, Tuple[Tuple[int, ...], Optional[str]]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[str]] = {}
+
+        self.stats = {"added": 0, "exact": 0, "title_year": 0, "near": 0}
+
+    @classmethod
+    def from_events(cls, events, **kwargs) -> "EventIndex":
+        """
+        Строит индекс по событиям существующей базы.
+
+        Args:
+            events (list): События с полем id
+            **kwargs: Параметры конструктора
+
+        Returns:
+            EventIndex: Заполненный индекс
+        """
+        index = cls(**kwargs)
+        for event in events:
+            if event.get("id"):
+                index.add(event["id"], event)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _signature(self, event) -> Optional[Tuple[int, ...]]:
+        """Вычисляет MinHash-подпись множества основ слов названия и описания"""
+        tokens = set(tokenize(f"{event.get('title', '')} {event.get('description', '')}"))
+        if len(tokens) < self.min_tokens:
+            return None
+        hashes = [zlib.crc32(token.encode('utf-8')) for token in tokens]
+        return tuple(
+            min((a * value + b) % _PRIME for value in hashes)
+            for a, b in self._coefficients
+        )
+
+    def _band_keys(self, signature: Tuple[int, ...]):
+        """Возвращает ключи корзин LSH для подписи"""
+        for band in range(self.bands):
+            start = band * self.rows
+            yield band, signature[start:start + self.rows]
+
+    def _similarity(self, first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """Оценивает сходство Жаккара по доле совпадающих позиций подписей"""
+        return sum(a == b for a, b in zip(first, second)) / self.num_perm
+
+    def find_duplicate(self, event_id: str, event, signature=None) -> Optional[Tuple[str, str]]:
+        """
+        Ищет событие, которое дублирует переданное.
+
+        Args:
+            event_id (str): Идентификатор события
+            event (dict): Событие с названием, датой и описанием
+            signature (tuple, optional): Заранее вычисленная MinHash-подпись
+
+        Returns:
+            Optional[Tuple[str, str]]: (вид совпадения, id найденного события) или None
+        """
+        if event_id in self._ids:
+            return "exact", event_id
+
+        year = event_year(event.get("date", ""))
+        title = normalize_title(event.get("title", ""))
+        if title and year and (title, year) in self._title_years:
+            return "title_year", self._title_years[(title, year)]
+
+        if signature is None:
+            signature = self._signature(event)
+        if signature is None:
+            return None
+
+        checked = set()
+        for key in self._band_keys(signature):
+            for candidate_id in self._buckets.get(key, ()):
+                if candidate_id in checked:
+                    continue
+                checked.add(candidate_id)
+                candidate_signature, candidate_year = self._signatures[candidate_id]
+                if year and candidate_year and year != candidate_year:
+                    continue
+                if self._similarity(signature, candidate_signature) >= self.threshold:
+                    return "near", candidate_id
+        return None
+
+    def add(self, event_id: str, event, signature=None) -> None:
+        """
+        Добавляет событие в индекс.
+
+        Args:
+            event_id (str): Идентификатор события
+            event (dict): Событие
+            signature (tuple, optional): Заранее вычисленная MinHash-подпись
+        """
+        if event_id in self._ids:
+            return
+        self._ids.add(event_id)
+        self.stats["added"] += 1
+
+        year = event_year(event.get("date", ""))
+        title = normalize_title(event.get("title", ""))
+        if title and year:
+            self._title_years.setdefault((title, year), event_id)
+
+        if signature is None:
+            signature = self._signature(event)
+        if signature is None:
+            return
+        self._signatures[event_id] = (signature, year)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(event_id)
+
+    def check_and_add(self, event_id: str, event) -> Optional[Tuple[str, str]]:
+        """
+        Добавляет событие, если оно не дублирует уже проиндексированные.
+
+        Args:
+            event_id (str): Идентификатор события
+            event (dict): Событие
+
+        Returns:
+            Optional[Tuple[str, str]]: (вид совпадения, id найденного события) для
+                дубликата или None, если событие добавлено
+        """
+        signature = self._signature(event)
+        duplicate = self.find_duplicate(event_id, event, signature)
+        if duplicate:
+            self.stats[duplicate[0]] += 1
+            return duplicate
+        self.add(event_id, event, signature)
+        return None
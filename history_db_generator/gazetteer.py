@@ -0,0 +1,281 @@
+"""
+Офлайн-справочник мест (газеттир) для геокодирования событий.
+
+Названия и координаты загружаются один раз из файла gazetteer.json рядом
+с модулем; справочник можно дополнить своими файлами того же формата
+(список объектов с полями name, lat, lng и необязательным aliases).
+
+Место события ищется по очереди:
+
+1. exact - совпадает нормализованное название или псевдоним (1.0);
+2. stem - совпадают основы слов без служебных и общих слов вроде
+   "город", "окрестности" (см. src/russian_text.py): "под Полтавой",
+   "в Москве" (0.95);
+3. part - место указано перечислением ("Москва, Кремль",
+   "Дерпт (Тарту)"): первая часть, найденная по пунктам 1-2 (0.9);
+4. ngram - в части найдена последовательность основ слов из справочника
+   ("Осада крепости Азов"): 0.6-0.9 в зависимости от доли совпавших слов;
+5. fuzzy - сходство триграмм символов однословного названия (опечатки
+   и варианты написания): коэффициент Дайса не ниже min_similarity,
+   уверенность 0.8 * сходство.
+
+Расплывчатые указания ("Различные губернии", "По всей России") не
+сопоставляются с местом. Если ни один способ не сработал, место
+считается неопределенным: вместо случайных координат вызывающий код
+получает None. Результаты поиска кэшируются по нормализованному названию.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from src.russian_text import normalize, stem, tokenize
+
+# Файл справочника, поставляемый вместе с генератором
+DEFAULT_DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.json")
+
+_WORD_RE = re.compile(r"[0-9a-zа-я]+")
+# Разделители перечисления мест
+_PARTS_RE = re.compile(r"[,;()/]| и ")
+
+# Общие слова, которые не помогают определить место
+_GENERIC_STEMS = frozenset(stem(word) for word in (
+    "город", "г", "село", "деревня", "станица", "окрестности", "район", "близ", "около",
+    "вблизи", "недалеко", "территория", "регион", "между", "рядом",
+))
+
+# Слова, по которым место считается расплывчатым (событие не привязано к одной точке)
+_VAGUE_STEMS = frozenset(stem(word) for word in (
+    "различные", "разные", "все", "вся", "всей", "весь", "многие", "несколько", "неизвестно",
+))
+
+# Уверенность для каждого способа поиска
+EXACT_CONFIDENCE = 1.0
+STEM_CONFIDENCE = 0.95
+PART_CONFIDENCE = 0.9
+NGRAM_MIN_CONFIDENCE = 0.6
+NGRAM_MAX_CONFIDENCE = 0.9
+FUZZY_CONFIDENCE = 0.8
+
+
+def location_key(text: str) -> str:
+    """Нормализует название: нижний регистр, "ё" -> "е", только буквы и цифры"""
+    return " ".join(_WORD_RE.findall(normalize(text or "")))
+
+
+def _stems(text: str) -> List[str]:
+    """Основы слов названия без служебных и общих слов"""
+    return [token for token in tokenize(text or "") if token not in _GENERIC_STEMS]
+
+
+def _trigrams(key: str) -> frozenset:
+    """Триграммы символов каждого слова с границами"""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class Gazetteer:
+    """Справочник мест с поиском по названию, основам слов и триграммам"""
+
+    def __init__(self, min_similarity: float = 0.7):
+        """
+        Инициализация пустого справочника.
+
+        Args:
+            min_similarity (float): Минимальный коэффициент Дайса для нечеткого совпадения
+        """
+        self.min_similarity = min_similarity
+        self._places: List[Dict[str, Any]] = []
+        self._exact: Dict[str, int] = {}
+        self._stems: Dict[str, int] = {}
+        self._max_ngram = 1
+        self._trigram_keys: List[tuple] = []
+        self._trigram_index: Dict[str, List[int]] = {}
+
+        self._cache: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "cache_hits": 0, "exact": 0, "stem": 0, "part": 0,
+                      "ngram": 0, "fuzzy": 0, "unresolved": 0}
+
+    @classmethod
+    def load(cls, *paths: str, **kwargs) -> "Gazetteer":
+        """
+        Загружает справочник из файла по умолчанию и дополнительных файлов.
+
+        Args:
+            *paths: Дополнительные файлы справочника (отсутствующие пропускаются)
+            **kwargs: Параметры конструктора
+
+        Returns:
+            Gazetteer: Заполненный справочник
+        """
+        gazetteer = cls(**kwargs)
+        for path in (DEFAULT_DATA_FILE,) + paths:
+            if os.path.exists(path):
+                gazetteer.load_file(path)
+        return gazetteer
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def load_file(self, path: str) -> int:
+        """
+        Добавляет места из JSON-файла.
+
+        Args:
+            path (str): Путь к файлу со списком мест
+
+        Returns:
+            int: Количество добавленных мест
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            places = json.load(f)
+        for place in places:
+            self.add(place["name"], place["lat"], place["lng"], place.get("aliases", ()))
+        return len(places)
+
+    def add(self, name: str, lat: float, lng: float, aliases=()) -> None:
+        """
+        Добавляет место. Более поздние записи заменяют прежние с тем же названием.
+
+        Args:
+            name (str): Название места
+            lat (float): Широта
+            lng (float): Долгота
+            aliases: Другие названия места (исторические, варианты написания)
+        """
+        place_id = len(self._places)
+        self._places.append({"name": name, "lat": lat, "lng": lng})
+        for variant in (name, *aliases):
+            key = location_key(variant)
+            if not key:
+                continue
+            self._exact[key] = place_id
+            stems = _stems(variant)
+            if stems:
+                self._stems[" ".join(stems)] = place_id
+                self._max_ngram = max(self._max_ngram, len(stems))
+            if " " in key:
+                continue
+            key_id = len(self._trigram_keys)
+            grams = _trigrams(key)
+            self._trigram_keys.append((place_id, len(grams)))
+            for gram in grams:
+                self._trigram_index.setdefault(gram, []).append(key_id)
+        with self._lock:
+            self._cache.clear()
+
+    def resolve(self, location: str) -> Optional[Dict[str, Any]]:
+        """
+        Определяет координаты места.
+
+        Args:
+            location (str): Название места из ответа модели
+
+        Returns:
+            Optional[Dict[str, Any]]: name (название из справочника), lat, lng,
+                confidence (0-1) и match (способ поиска) или None
+        """
+        key = location_key(location)
+        with self._lock:
+            self.stats["lookups"] += 1
+            if key in self._cache:
+                self.stats["cache_hits"] += 1
+                result = self._cache[key]
+                return dict(result) if result else None
+
+        result = self._lookup(location, key) if key else None
+        with self._lock:
+            self._cache[key] = result
+            self.stats[result["match"] if result else "unresolved"] += 1
+        return dict(result) if result else None
+
+    def _result(self, place_id: int, confidence: float, match: str) -> Dict[str, Any]:
+        place = self._places[place_id]
+        return {"name": place["name"], "lat": place["lat"], "lng": place["lng"],
+                "confidence": round(confidence, 2), "match": match}
+
+    def _lookup(self, location: str, key: str) -> Optional[Dict[str, Any]]:
+        """Последовательно применяет способы поиска от точного к нечеткому"""
+        if key in self._exact:
+            return self._result(self._exact[key], EXACT_CONFIDENCE, "exact")
+        tokens = _stems(location)
+        if _VAGUE_STEMS.intersection(tokens):
+            return None
+        stems = " ".join(tokens)
+        if stems in self._stems:
+            return self._result(self._stems[stems], STEM_CONFIDENCE, "stem")
+
+        parts = [part for part in _PARTS_RE.split(location) if location_key(part)]
+        if len(parts) > 1:
+            for part in parts:
+                part_key = location_key(part)
+                place_id = self._exact.get(part_key)
+                if place_id is None:
+                    place_id = self._stems.get(" ".join(_stems(part)))
+                if place_id is not None:
+                    return self._result(place_id, PART_CONFIDENCE, "part")
+
+        for part in parts:
+            match = self._match_ngram(_stems(part))
+            if match:
+                return match
+
+        for part in parts:
+            part_key = location_key(part)
+            # Многословные названия с общими словами ("... губерния") дают ложные совпадения
+            if " " not in part_key:
+                match = self._match_fuzzy(part_key)
+                if match:
+                    return match
+        return None
+
+    def _match_ngram(self, stems: List[str]) -> Optional[Dict[str, Any]]:
+        """Ищет самую длинную последовательность основ слов, известную справочнику"""
+        for size in range(min(len(stems) - 1, self._max_ngram), 0, -1):
+            for start in range(len(stems) - size + 1):
+                # Короткие основы одного слова совпадают случайно ("Белая" и "Белёв")
+                if size == 1 and len(stems[start]) < 4:
+                    continue
+                place_id = self._stems.get(" ".join(stems[start:start + size]))
+                if place_id is not None:
+                    coverage = size / len(stems)
+                    confidence = NGRAM_MIN_CONFIDENCE + (NGRAM_MAX_CONFIDENCE - NGRAM_MIN_CONFIDENCE) * coverage
+                    return self._result(place_id, confidence, "ngram")
+        return None
+
+    def _match_fuzzy(self, key: str) -> Optional[Dict[str, Any]]:
+        """Ищет однословное название с наибольшим сходством триграмм через инвертированный индекс"""
+        grams = _trigrams(key)
+        if not grams:
+            return None
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for key_id in self._trigram_index.get(gram, ()):
+                shared[key_id] = shared.get(key_id, 0) + 1
+
+        best_id, best_score = None, 0.0
+        for key_id, count in shared.items():
+            score = 2 * count / (len(grams) + self._trigram_keys[key_id][1])
+            if score > best_score:
+                best_id, best_score = key_id, score
+        if best_id is None or best_score < self.min_similarity:
+            return None
+        return self._result(self._trigram_keys[best_id][0], FUZZY_CONFIDENCE * best_score, "fuzzy")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику поиска.
+
+        Returns:
+            Dict[str, Any]: Количество запросов, попаданий в кэш и найденных мест по способам
+        """
+        with self._lock:
+            stats = self.stats.copy()
+        stats["places"] = len(self._places)
+        return stats
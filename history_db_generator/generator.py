@@ -5,11 +5,19 @@ import time
 import re
 import hashlib
 import random
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import google.generativeai as genai
+from google.ai import generativelanguage as glm
 from dotenv import load_dotenv
 from datetime import datetime
 from pathlib import Path
 from gemini_api_keys import GEMINI_API_KEYS, get_random_key
+from history_db_generator.event_index import EventIndex
+from history_db_generator.gazetteer import Gazetteer
+from history_db_generator.structured_events import EVENT_SCHEMA, parse_events_json
+from src.gemini_replay import GeminiReplay
 
 # Индекс текущего API ключа
 current_key_index = 0
@@ -36,6 +44,44 @@ ensure_directories()
 DB_FILE = "history_db_generator/russian_history_database.json"
 TEMP_FOLDER = "history_db_generator/temp"
 BACKUPS_FOLDER = "history_db_generator/backups"
+PROGRESS_FILE = f"{TEMP_FOLDER}/generation_progress.json"
+# Журнал новых событий: дописывается при каждом сохранении, при уплотнении переносится в DB_FILE
+DB_LOG_FILE = "history_db_generator/russian_history_database.log.jsonl"
+
+# Минимальный интервал между запросами одного рабочего потока (вместо паузы 3 с между темами)
+MIN_REQUEST_INTERVAL = 1.0
+# Сколько тем обработать между сохранениями новых событий и контрольных точек
+SAVE_INTERVAL = 2
+# Сколько событий может накопиться в журнале до уплотнения в файл базы данных
+COMPACT_EVENTS = 1000
+# Максимум событий в одном запросе мест для событий без указанного места
+GEOCODE_BATCH_SIZE = 30
+# Запрашивать события в формате JSON по схеме вместо свободного текста
+STRUCTURED_OUTPUT = True
+# Лимит токенов одного запроса событий в формате JSON
+STRUCTURED_MAX_OUTPUT_TOKENS = 4096
+# Дополнительный справочник мест того же формата, что history_db_generator/gazetteer.json
+GAZETTEER_EXTRA_FILE = "history_db_generator/gazetteer_extra.json"
+# Минимальная уверенность сопоставления места, при которой событию назначаются координаты
+GEOCODE_MIN_CONFIDENCE = 0.5
+
+# Запись и воспроизведение запросов к Gemini для замеров без сети (см. src/gemini_replay.py):
+# GEMINI_REPLAY_MODE=record записывает ответы в кассету, replay воспроизводит их
+GEMINI_REPLAY = None
+if os.getenv('GEMINI_REPLAY_MODE'):
+    GEMINI_REPLAY = GeminiReplay(
+        os.getenv('GEMINI_CASSETTE_FILE', f"{TEMP_FOLDER}/gemini_cassette.json"),
+        mode=os.getenv('GEMINI_REPLAY_MODE').lower(),
+        latency=os.getenv('GEMINI_REPLAY_LATENCY', 'recorded'),
+        quota_error_rate=float(os.getenv('GEMINI_REPLAY_QUOTA_ERROR_RATE', '0')),
+        rate_error_rate=float(os.getenv('GEMINI_REPLAY_RATE_ERROR_RATE', '0')),
+        on_miss=os.getenv('GEMINI_REPLAY_ON_MISS', 'error').lower()
+    )
+    print(f"Кассета Gemini {GEMINI_REPLAY.cassette_file}: режим {GEMINI_REPLAY.mode}, {len(GEMINI_REPLAY)} записей")
+
+# Справочник мест, общий для рабочих потоков
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
 
 # Словарь с основными категориями событий
 EVENT_CATEGORIES = [
@@ -59,18 +105,32 @@ def hash_string(text):
     """Создает хеш строки для использования в идентификаторах."""
     return hashlib.md5(text.encode()).hexdigest()[:8]
 
-def initialize_gemini_client(api_key):
+def initialize_gemini_client(api_key, dedicated=False):
     """
     Инициализирует клиент Gemini с указанным API ключом.
     
     Args:
         api_key: Ключ API для Gemini
+        dedicated: Создать модель с собственным клиентом. genai.configure меняет
+            ключ для всего процесса, поэтому рабочим потокам конвейера с разными
+            ключами нужны отдельные клиенты
         
     Returns:
-        Model: Инициализированная модель Gemini
+        Model: Инициализированная модель Gemini (обернутая кассетой, если она включена)
     """
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel('gemini-2.0-flash')
+    if GEMINI_REPLAY is not None and GEMINI_REPLAY.mode == "replay":
+        return GEMINI_REPLAY.wrap()
+    
+    if not dedicated:
+        genai.configure(api_key=api_key)
+        gemini_model = genai.GenerativeModel('gemini-2.0-flash')
+    else:
+        gemini_model = genai.GenerativeModel('gemini-2.0-flash')
+        gemini_model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    
+    if GEMINI_REPLAY is not None:
+        return GEMINI_REPLAY.wrap(gemini_model)
+    return gemini_model
 
 def get_next_api_key():
     """
@@ -94,7 +154,57 @@ current_api_key = GEMINI_API_KEYS[current_key_index]
 print(f"Используется API ключ {current_key_index+1}/{len(GEMINI_API_KEYS)}: {current_api_key[:5]}...{current_api_key[-5:]}")
 model = initialize_gemini_client(current_api_key)
 
-def call_gemini_api(prompt, temperature=0.3, max_output_tokens=1024, retry_count=5, retry_delay=10):
+# Клиент рабочего потока конвейера: у каждого потока свой ключ API
+_worker_state = threading.local()
+_worker_numbers = itertools.count()
+
+# Счетчик запросов к API для отчета о пропускной способности
+_stats_lock = threading.Lock()
+api_call_count = 0
+
+def _init_pipeline_worker():
+    """Привязывает рабочий поток конвейера к собственному ключу API"""
+    key_index = next(_worker_numbers) % len(GEMINI_API_KEYS)
+    _worker_state.key_index = key_index
+    _worker_state.model = initialize_gemini_client(GEMINI_API_KEYS[key_index], dedicated=True)
+
+def _get_client():
+    """Возвращает модель текущего рабочего потока или общую модель"""
+    worker_model = getattr(_worker_state, "model", None)
+    return worker_model if worker_model is not None else model
+
+def _rotate_client():
+    """
+    Переключает текущий рабочий поток (или общую модель) на следующий ключ API.
+    
+    Returns:
+        int: Индекс нового ключа
+    """
+    global model, current_api_key, current_key_index
+    
+    if getattr(_worker_state, "model", None) is not None:
+        _worker_state.key_index = (_worker_state.key_index + 1) % len(GEMINI_API_KEYS)
+        _worker_state.model = initialize_gemini_client(GEMINI_API_KEYS[_worker_state.key_index], dedicated=True)
+        return _worker_state.key_index
+    
+    current_api_key, current_key_index = get_next_api_key()
+    model = initialize_gemini_client(current_api_key)
+    return current_key_index
+
+def _wait_request_slot():
+    """Выдерживает интервал между запросами потока и учитывает запрос в статистике"""
+    global api_call_count
+    
+    delay = MIN_REQUEST_INTERVAL - (time.time() - getattr(_worker_state, "last_request", 0.0))
+    if delay > 0:
+        time.sleep(delay)
+    _worker_state.last_request = time.time()
+    
+    with _stats_lock:
+        api_call_count += 1
+
+def call_gemini_api(prompt, temperature=0.3, max_output_tokens=1024, retry_count=5, retry_delay=10,
+                    response_schema=None):
     """
     Отправляет запрос к API Gemini с механизмом повторных попыток и ротацией ключей API.
     
@@ -104,21 +214,24 @@ def call_gemini_api(prompt, temperature=0.3, max_output_tokens=1024, retry_count
         max_output_tokens: Максимальная длина ответа
         retry_count: Количество попыток в случае ошибки
         retry_delay: Задержка между попытками в секундах
+        response_schema: Схема ответа; если указана, модель отвечает JSON по схеме
         
     Returns:
-        str: Ответ от модели
+        str: Ответ от модели или пустая строка, если все попытки не удались
     """
-    global model, current_api_key, current_key_index
-    
     generation_config = {
         "temperature": temperature,
         "max_output_tokens": max_output_tokens,
         "top_p": 0.95,
         "top_k": 40,
     }
+    if response_schema:
+        generation_config["response_mime_type"] = "application/json"
+        generation_config["response_schema"] = response_schema
     
     # Счетчик смены ключей API
     key_rotation_count = 0
+    last_error = None
     max_key_rotations = len(GEMINI_API_KEYS) * 2  # Максимальное количество ротаций ключей
     
     for attempt in range(retry_count * len(GEMINI_API_KEYS)):  # Увеличиваем количество попыток
@@ -127,9 +240,11 @@ def call_gemini_api(prompt, temperature=0.3, max_output_tokens=1024, retry_count
             if attempt > 0:
                 time.sleep(2)
                 
-            response = model.generate_content(prompt, generation_config=generation_config)
+            _wait_request_slot()
+            response = _get_client().generate_content(prompt, generation_config=generation_config)
             return response.text
         except Exception as e:
+            last_error = e
             error_str = str(e).lower()
             print(f"Ошибка при запросе к API (попытка {attempt+1}/{retry_count * len(GEMINI_API_KEYS)}): {e}")
             
@@ -137,13 +252,10 @@ def call_gemini_api(prompt, temperature=0.3, max_output_tokens=1024, retry_count
             if "quota" in error_str or "exhausted" in error_str or "rate" in error_str or "limit" in error_str or "error" in error_str:
                 # Если мы не превысили лимит ротаций
                 if key_rotation_count < max_key_rotations:
-                    # Получаем следующий ключ API
-                    current_api_key, current_key_index = get_next_api_key()
-                    
-                    # Инициализируем клиент с новым ключом
-                    model = initialize_gemini_client(current_api_key)
+                    # Переключаем клиент на следующий ключ API
+                    key_index = _rotate_client()
                     
-                    print(f"Переключение на ключ API {current_key_index+1}/{len(GEMINI_API_KEYS)}")
+                    print(f"Переключение на ключ API {key_index+1}/{len(GEMINI_API_KEYS)}")
                     key_rotation_count += 1
                     
                     # Добавляем небольшую задержку перед повторной попыткой
@@ -170,7 +282,17 @@ def call_gemini_api(prompt, temperature=0.3, max_output_tokens=1024, retry_count
                 if "quota" in error_str or "exhausted" in error_str:
                     print("Рекомендуется сделать паузу на несколько часов из-за исчерпания лимита всех API ключей.")
                     
+                _record_api_failure(e)
                 return ""
+    
+    # Последняя попытка завершилась сменой ключа
+    _record_api_failure(last_error)
+    return ""
+
+def _record_api_failure(error):
+    """Запоминает неудачный запрос к API в текущем потоке (см. get_events_for_topic)"""
+    _worker_state.api_failures = getattr(_worker_state, "api_failures", 0) + 1
+    _worker_state.last_api_error = str(error)
 
 def save_json(data, filename):
     """Сохраняет данные в JSON файл."""
@@ -384,40 +506,26 @@ def extract_events_from_text(text):
                 }
                 events.append(event)
     
-    # Фильтруем дубликаты и короткие описания
+    # Фильтруем дубликаты (в том числе пересказы одного события) и короткие описания
     unique_events = []
-    seen_titles = set()
+    index = EventIndex()
     
     for event in events:
-        title_key = event["title"].lower()
-        if title_key not in seen_titles and len(event["description"]) > 30:
-            seen_titles.add(title_key)
+        if len(event["description"]) > 30 and not index.check_and_add(event["title"].lower(), event):
             unique_events.append(event)
     
     return unique_events
 
-def get_events_for_topic(topic):
+def fetch_topic_response(topic):
     """
-    Получает список исторических событий для указанной темы.
+    Стадия загрузки: запрашивает у Gemini список событий по теме.
     
     Args:
         topic: Историческая тема
         
     Returns:
-        list: Список событий с датами, описаниями и местами
+        str: Объединенный текст ответов
     """
-    print(f"Получение событий для темы: {topic}")
-    
-    # Создаем кэш-файл для темы
-    topic_hash = hash_string(topic)
-    cache_file = f"{TEMP_FOLDER}/events_{topic_hash}.json"
-    
-    # Проверяем, есть ли кэшированные данные
-    cached_events = load_json(cache_file)
-    if cached_events:
-        print(f"Загружено {len(cached_events)} событий из кэша для темы '{topic}'.")
-        return cached_events
-    
     # Формируем запрос для получения событий по теме
     events_prompt = f"""
     Составь максимально полный хронологический список важных исторических событий по теме "{topic}" из истории России.
@@ -478,9 +586,70 @@ def get_events_for_topic(topic):
     additional_response = call_gemini_api(additional_prompt, temperature=0.4, max_output_tokens=2048)
     
     # Объединяем ответы
-    combined_response = response + "\n\n" + additional_response
+    return response + "\n\n" + additional_response
+
+def fetch_structured_events(topic):
+    """
+    Стадии загрузки и разбора в режиме структурированного ответа.
+    
+    Модель возвращает события массивом JSON по схеме EVENT_SCHEMA, поэтому
+    разбор не зависит от формулировок ответа, а оборванный по лимиту токенов
+    ответ восстанавливается, а не запрашивается заново. Второй запрос
+    продолжает список и получает названия уже найденных событий, чтобы
+    не повторять их.
+    
+    Args:
+        topic: Историческая тема
+        
+    Returns:
+        list: События с названием, датой, описанием и местом (если оно указано)
+    """
+    fields = """
+    Каждое событие - объект с полями:
+    - "date": точная дата (день, месяц, год, если известны, или хотя бы год);
+    - "title": название события;
+    - "description": краткое описание (1-2 предложения);
+    - "location": место события (город, регион или конкретное место; если неизвестно точно - наиболее вероятное).
+    
+    Ответь только массивом JSON в хронологическом порядке.
+    """
+    events_prompt = f"""
+    Составь максимально полный хронологический список важных исторических событий по теме "{topic}" из истории России.
+    Приведи не менее 20-30 событий, если это возможно для данной темы. Включай не только крупные, но и менее известные события.
+    {fields}"""
+    response = call_gemini_api(events_prompt, temperature=0.2, max_output_tokens=STRUCTURED_MAX_OUTPUT_TOKENS,
+                               response_schema=EVENT_SCHEMA)
+    events, stats = parse_events_json(response)
+    
+    known_titles = "; ".join(event["title"] for event in events)
+    additional_prompt = f"""
+    Составь еще 15-20 исторических событий по теме "{topic}" из истории России, которых нет в этом списке:
+    {known_titles}
+    
+    Постарайся включить менее известные, но важные события. Будь предельно точен в датах и местах.
+    {fields}"""
+    additional_response = call_gemini_api(additional_prompt, temperature=0.4,
+                                          max_output_tokens=STRUCTURED_MAX_OUTPUT_TOKENS,
+                                          response_schema=EVENT_SCHEMA)
+    additional_events, additional_stats = parse_events_json(additional_response)
+    events.extend(additional_events)
+    
+    for key, value in additional_stats.items():
+        stats[key] += value
+    print(f"Разбор JSON: {len(events)} событий из {stats['parsed']} элементов, "
+          f"восстановлено оборванных: {stats['repaired']}, отброшено: {stats['invalid']}")
+    return events
+
+def parse_topic_events(combined_response):
+    """
+    Стадия разбора: извлекает события из ответа Gemini.
     
-    # Парсим события из ответа
+    Args:
+        combined_response: Текст ответов по теме
+        
+    Returns:
+        list: События с названием, датой, описанием и местом (если оно указано)
+    """
     events = []
     
     # Паттерн для поиска событий в формате "Дата - Название - Место"
@@ -497,68 +666,175 @@ def get_events_for_topic(topic):
         # Нормализуем дату
         date = re.sub(r'\s+', ' ', date)
         
-        # Создаем событие
-        event = {
+        events.append({
             "title": title,
             "date": date,
             "description": description,
-            "location": location,
-            "category": get_category_for_event(title, description)
-        }
+            "location": location
+        })
+    
+    # Если не удалось извлечь события через регулярные выражения,
+    # попробуем альтернативный метод (места определит стадия геокодирования)
+    if not events:
+        print(f"Не удалось извлечь события через регулярные выражения. Используем альтернативный метод...")
+        events = extract_events_from_text(combined_response)
+    
+    return events
+
+def request_event_locations(events):
+    """
+    Запрашивает места для нескольких событий одним запросом к API.
+    
+    Args:
+        events: События без указанного места
+        
+    Returns:
+        dict: Номер события в списке -> название места
+    """
+    lines = [
+        f"{number}. {event['title']} ({event['date']}): {event['description'][:200]}"
+        for number, event in enumerate(events, 1)
+    ]
+    location_prompt = f"""
+    Для каждого исторического события из истории России укажи наиболее вероятное географическое место
+    (город, регион или конкретную локацию), где оно произошло:
+    
+    {chr(10).join(lines)}
+    
+    Ответь нумерованным списком в том же порядке: номер события и только название места, без комментариев.
+    """
+    
+    response = call_gemini_api(location_prompt, temperature=0.1, max_output_tokens=40 * len(events) + 100)
+    
+    locations = {}
+    for line in response.split('\n'):
+        match = re.match(r'^\s*(\d+)[\.\)]\s*(.+)$', line)
+        if not match:
+            continue
+        # Очищаем ответ от возможных мусорных слов
+        location = re.sub(r'^(местоположение|место|локация|ответ|это):\s*', '', match.group(2), flags=re.IGNORECASE)
+        location = location.strip('.,;: ')
+        if location and len(location) < 100:
+            locations[int(match.group(1)) - 1] = location
+    return locations
+
+def geocode_events(events):
+    """
+    Стадия геокодирования: определяет места и координаты событий.
+    
+    Места для событий без указанного места запрашиваются пакетами по
+    GEOCODE_BATCH_SIZE событий вместо отдельного запроса на каждое событие.
+    
+    Args:
+        events: События темы (изменяются на месте)
+        
+    Returns:
+        list: Те же события
+    """
+    missing = [event for event in events if "location" not in event]
+    for start in range(0, len(missing), GEOCODE_BATCH_SIZE):
+        batch = missing[start:start + GEOCODE_BATCH_SIZE]
+        for index, location in request_event_locations(batch).items():
+            if 0 <= index < len(batch):
+                batch[index]["location"] = location
+    
+    return attach_coordinates(events)
+
+def attach_coordinates(events):
+    """
+    Добавляет событиям координаты мест по справочнику.
+    
+    Место, которое не удалось определить, остается строкой без координат,
+    и событие не попадает на карту. Места с координатами без оценки
+    уверенности (получены прежней версией генератора, в том числе
+    случайные) определяются заново.
+    
+    Args:
+        events: События (изменяются на месте)
+        
+    Returns:
+        list: Те же события
+    """
+    for event in events:
+        location = event.get("location")
+        if isinstance(location, dict) and "confidence" not in location:
+            location = location.get("name")
+        if not isinstance(location, str):
+            continue
         
-        # Добавляем географические координаты, если возможно
         coordinates = get_coordinates_for_location(location)
         if coordinates:
             event["location"] = {
                 "name": location,
                 "lat": coordinates["lat"],
-                "lng": coordinates["lng"]
+                "lng": coordinates["lng"],
+                "confidence": coordinates["confidence"]
             }
-        
-        events.append(event)
+        else:
+            event["location"] = location
+    return events
+
+def categorize_events(events):
+    """
+    Стадия категоризации: определяет категории событий, если они еще не определены.
     
-    # Если не удалось извлечь события через регулярные выражения,
-    # попробуем альтернативный метод
-    if not events:
-        print(f"Не удалось извлечь события через регулярные выражения. Используем альтернативный метод...")
-        events = extract_events_from_text(combined_response)
+    Args:
+        events: События темы (изменяются на месте)
         
-        # Добавляем местоположения для событий
-        for event in events:
-            if "location" not in event:
-                location_prompt = f"""
-                Укажи наиболее вероятное географическое место (город, регион или конкретную локацию), 
-                где произошло следующее историческое событие из истории России:
-                
-                Событие: {event["title"]}
-                Дата: {event["date"]}
-                Описание: {event["description"]}
-                
-                Ответь только названием места без дополнительных комментариев.
-                """
-                
-                location = call_gemini_api(location_prompt, temperature=0.1, max_output_tokens=100)
-                
-                # Очищаем ответ от возможных мусорных слов
-                location = re.sub(r'^(местоположение|место|локация|ответ|это):\s*', '', location, flags=re.IGNORECASE)
-                location = location.strip('.,;: \n')
-                
-                if location and len(location) < 100:
-                    # Добавляем географические координаты, если возможно
-                    coordinates = get_coordinates_for_location(location)
-                    if coordinates:
-                        event["location"] = {
-                            "name": location,
-                            "lat": coordinates["lat"],
-                            "lng": coordinates["lng"]
-                        }
-                    else:
-                        event["location"] = location
-    
-    # Определяем категории для событий, если они еще не определены
+    Returns:
+        list: Те же события
+    """
     for event in events:
         if "category" not in event:
             event["category"] = get_category_for_event(event["title"], event["description"])
+    return events
+
+class TopicFetchError(Exception):
+    """Не удалось получить события темы; тема отмечается как необработанная"""
+
+def get_events_for_topic(topic):
+    """
+    Получает список исторических событий для указанной темы.
+    
+    Выполняет стадии конвейера загрузка -> разбор -> геокодирование ->
+    категоризация; результат кэшируется в файле темы.
+    
+    Args:
+        topic: Историческая тема
+        
+    Returns:
+        list: Список событий с датами, описаниями и местами
+        
+    Raises:
+        TopicFetchError: Запрос к API не удался или событий не найдено
+    """
+    print(f"Получение событий для темы: {topic}")
+    
+    # Создаем кэш-файл для темы
+    topic_hash = hash_string(topic)
+    cache_file = f"{TEMP_FOLDER}/events_{topic_hash}.json"
+    
+    # Проверяем, есть ли кэшированные данные
+    cached_events = load_json(cache_file)
+    if cached_events:
+        print(f"Загружено {len(cached_events)} событий из кэша для темы '{topic}'.")
+        return attach_coordinates(cached_events)
+    
+    _worker_state.api_failures = 0
+    events = fetch_structured_events(topic) if STRUCTURED_OUTPUT else []
+    if not events and not _worker_state.api_failures:
+        # Текстовый режим: свободный ответ разбирается регулярными выражениями
+        combined_response = fetch_topic_response(topic)
+        events = parse_topic_events(combined_response)
+    
+    # Тема с неполным ответом не сохраняется в кэш и контрольные точки, чтобы
+    # при перезапуске она была запрошена снова
+    if _worker_state.api_failures:
+        raise TopicFetchError(f"Не получен ответ Gemini по теме '{topic}': {_worker_state.last_api_error}")
+    if not events:
+        raise TopicFetchError(f"Не найдено ни одного события по теме '{topic}'")
+    geocode_events(events)
+    categorize_events(events)
     
     print(f"Найдено {len(events)} событий для темы '{topic}'")
     
@@ -600,138 +876,215 @@ def get_category_for_event(title, description):
     # Если не нашли соответствия, возвращаем общую категорию
     return random.choice(EVENT_CATEGORIES)
 
+def get_gazetteer():
+    """Возвращает справочник мест, загружая его при первом обращении"""
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            _gazetteer = Gazetteer.load(GAZETTEER_EXTRA_FILE)
+            print(f"Справочник мест загружен: {len(_gazetteer)} мест")
+        return _gazetteer
+
 def get_coordinates_for_location(location_name):
     """
-    Возвращает приблизительные координаты для указанного местоположения.
+    Возвращает координаты места по справочнику.
     
     Args:
         location_name: Название местоположения
         
     Returns:
-        dict: Словарь с координатами (lat, lng) или None, если не удалось определить
-    """
-    # Словарь с координатами популярных российских городов и регионов
-    location_coords = {
-        "москва": {"lat": 55.75, "lng": 37.62},
-        "санкт-петербург": {"lat": 59.94, "lng": 30.31},
-        "петербург": {"lat": 59.94, "lng": 30.31},
-        "петроград": {"lat": 59.94, "lng": 30.31},
-        "ленинград": {"lat": 59.94, "lng": 30.31},
-        "киев": {"lat": 50.45, "lng": 30.52},
-        "новгород": {"lat": 58.52, "lng": 31.27},
-        "псков": {"lat": 57.82, "lng": 28.33},
-        "владимир": {"lat": 56.13, "lng": 40.42},
-        "суздаль": {"lat": 56.42, "lng": 40.44},
-        "казань": {"lat": 55.79, "lng": 49.12},
-        "нижний новгород": {"lat": 56.32, "lng": 44.00},
-        "екатеринбург": {"lat": 56.84, "lng": 60.65},
-        "севастополь": {"lat": 44.62, "lng": 33.53},
-        "ялта": {"lat": 44.50, "lng": 34.17},
-        "крым": {"lat": 45.30, "lng": 34.20},
-        "сталинград": {"lat": 48.70, "lng": 44.52},
-        "волгоград": {"lat": 48.70, "lng": 44.52},
-        "куликово поле": {"lat": 53.67, "lng": 38.67},
-        "берлин": {"lat": 52.52, "lng": 13.40},
-        "бородино": {"lat": 55.52, "lng": 35.83},
-        "полтава": {"lat": 49.59, "lng": 34.55},
-        "смоленск": {"lat": 54.78, "lng": 32.05},
-        "архангельск": {"lat": 64.54, "lng": 40.54},
-        "мурманск": {"lat": 68.97, "lng": 33.07},
-        "новосибирск": {"lat": 55.03, "lng": 82.92},
-        "владивосток": {"lat": 43.12, "lng": 131.89},
-        "хабаровск": {"lat": 48.48, "lng": 135.08},
-        "ростов-на-дону": {"lat": 47.23, "lng": 39.72},
-        "краснодар": {"lat": 45.03, "lng": 38.98},
-        "ярославль": {"lat": 57.63, "lng": 39.87},
-        "самара": {"lat": 53.20, "lng": 50.15},
-        "астрахань": {"lat": 46.35, "lng": 48.04},
-        "тула": {"lat": 54.19, "lng": 37.62},
-        "крымский полуостров": {"lat": 45.30, "lng": 34.20},
-        "калининград": {"lat": 54.71, "lng": 20.51},
-        "кенигсберг": {"lat": 54.71, "lng": 20.51},
-        "урал": {"lat": 58.00, "lng": 60.00},
-        "сибирь": {"lat": 60.00, "lng": 90.00},
-        "кавказ": {"lat": 43.00, "lng": 44.00},
-        "дальний восток": {"lat": 50.00, "lng": 135.00},
-        "балтийское море": {"lat": 57.00, "lng": 20.00},
-        "черное море": {"lat": 44.00, "lng": 35.00},
-        "каспийское море": {"lat": 42.00, "lng": 50.00},
-        "финский залив": {"lat": 60.00, "lng": 28.00},
-        "беларусь": {"lat": 53.90, "lng": 27.57},
-        "минск": {"lat": 53.90, "lng": 27.57},
-        "украина": {"lat": 50.45, "lng": 30.52},
-        "грузия": {"lat": 41.69, "lng": 44.80},
-        "тбилиси": {"lat": 41.69, "lng": 44.80},
-        "армения": {"lat": 40.18, "lng": 44.51},
-        "ереван": {"lat": 40.18, "lng": 44.51},
-        "литва": {"lat": 54.69, "lng": 25.27},
-        "вильнюс": {"lat": 54.69, "lng": 25.27},
-        "латвия": {"lat": 56.95, "lng": 24.11},
-        "рига": {"lat": 56.95, "lng": 24.11},
-        "эстония": {"lat": 59.44, "lng": 24.75},
-        "таллин": {"lat": 59.44, "lng": 24.75},
-        "молдавия": {"lat": 47.01, "lng": 28.86},
-        "кишинев": {"lat": 47.01, "lng": 28.86},
-        "азербайджан": {"lat": 40.41, "lng": 49.87},
-        "баку": {"lat": 40.41, "lng": 49.87},
-        "казахстан": {"lat": 51.17, "lng": 71.44},
-        "астана": {"lat": 51.17, "lng": 71.44},
-        "узбекистан": {"lat": 41.31, "lng": 69.24},
-        "ташкент": {"lat": 41.31, "lng": 69.24},
-        "туркменистан": {"lat": 37.95, "lng": 58.38},
-        "ашхабад": {"lat": 37.95, "lng": 58.38},
-        "таджикистан": {"lat": 38.56, "lng": 68.77},
-        "душанбе": {"lat": 38.56, "lng": 68.77},
-        "киргизия": {"lat": 42.87, "lng": 74.60},
-        "бишкек": {"lat": 42.87, "lng": 74.60},
-        "константинополь": {"lat": 41.01, "lng": 28.97},
-        "стамбул": {"lat": 41.01, "lng": 28.97},
-        "париж": {"lat": 48.86, "lng": 2.35},
-        "лондон": {"lat": 51.51, "lng": -0.13},
-        "вена": {"lat": 48.21, "lng": 16.37},
-        "европа": {"lat": 50.00, "lng": 10.00},
-        "россия": {"lat": 55.75, "lng": 37.62},
-        "московская область": {"lat": 55.75, "lng": 37.00},
-        "ленинградская область": {"lat": 59.50, "lng": 30.00},
-        "река нева": {"lat": 59.94, "lng": 30.31},
-        "река волга": {"lat": 55.00, "lng": 46.00},
-        "река днепр": {"lat": 50.45, "lng": 30.52},
-        "река дон": {"lat": 47.23, "lng": 39.72}
-    }
-    
+        dict: Координаты (lat, lng), уверенность (confidence) и способ
+            сопоставления (match) или None, если место не определено
+            надежнее GEOCODE_MIN_CONFIDENCE
+    """
     if not location_name or location_name.lower() == "не указано":
         return None
+    
+    match = get_gazetteer().resolve(location_name)
+    if not match or match["confidence"] < GEOCODE_MIN_CONFIDENCE:
+        return None
+    return match
+
+def merge_topic_events(database, topic, events, index):
+    """
+    Стадия устранения дубликатов: добавляет в базу новые события темы.
+    
+    Args:
+        database: База данных
+        topic: Тема, к которой относятся события
+        events: События темы
+        index: Индекс событий базы (EventIndex), пополняется добавленными событиями
         
-    location_key = location_name.lower()
+    Returns:
+        list: Добавленные события
+    """
+    added = []
+    for event in events:
+        # Пропускаем события без названия или даты
+        if not event.get("title") or not event.get("date"):
+            continue
+        
+        # Создаем идентификатор на основе названия и даты
+        event_id = hash_string(f"{event['title']}_{event['date']}")
+        
+        # Проверяем по индексу, нет ли уже такого или почти такого события в базе данных
+        if not index.check_and_add(event_id, event):
+            event["id"] = event_id
+            event["topic"] = topic  # Добавляем информацию об источнике
+            database["events"].append(event)
+            added.append(event)
+    
+    return added
+
+def load_progress(topics):
+    """
+    Загружает контрольные точки: темы, уже сохраненные в базе.
     
-    # Прямое совпадение
-    if location_key in location_coords:
-        return location_coords[location_key]
+    Args:
+        topics: Список тем текущей генерации
+        
+    Returns:
+        dict: Хеш темы -> сведения об обработке
+    """
+    progress_data = load_json(PROGRESS_FILE) or {}
+    completed = progress_data.get("completed_topics", {})
     
-    # Поиск частичного совпадения
-    for key in location_coords:
-        if key in location_key:
-            return location_coords[key]
+    # Прогресс прежнего формата: все темы до last_topic_index включительно обработаны
+    if not completed and "last_topic_index" in progress_data:
+        for topic in topics[:progress_data["last_topic_index"] + 1]:
+            completed[hash_string(topic)] = {"topic": topic}
     
-    # Поиск обратного частичного совпадения
-    for key in location_coords:
-        if location_key in key:
-            return location_coords[key]
+    return completed
+
+def save_progress(completed, failed, total_topics):
+    """Сохраняет контрольные точки по темам"""
+    save_json({
+        "completed_topics": completed,
+        "failed_topics": failed,
+        "total_topics": total_topics
+    }, PROGRESS_FILE)
+
+def report_throughput(started_at, topics_done, topics_total, events_added):
+    """Выводит пропускную способность генерации и оценку оставшегося времени"""
+    elapsed = max(time.time() - started_at, 1e-6)
+    topics_per_minute = topics_done / elapsed * 60
+    remaining = (topics_total - topics_done) / topics_per_minute if topics_per_minute else 0
+    print(f"Пропускная способность: {topics_done}/{topics_total} тем за {elapsed / 60:.1f} мин, "
+          f"{topics_per_minute:.1f} тем/мин, {events_added / elapsed * 60:.1f} событий/мин, "
+          f"{api_call_count} запросов к API, осталось ~{remaining:.1f} мин")
+
+def append_events_log(events):
+    """
+    Дописывает события в журнал базы данных (одна строка JSON на событие).
     
-    # Возвращаем случайные координаты в пределах европейской части России
-    return {
-        "lat": 55.0 + random.uniform(-10, 10),
-        "lng": 37.0 + random.uniform(-10, 15)
-    }
+    Args:
+        events: Новые события
+    """
+    if not events:
+        return
+    with open(DB_LOG_FILE, 'a', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
 
-def generate_database():
+def read_events_log():
+    """
+    Читает события из журнала базы данных.
+    
+    Returns:
+        list: События в порядке записи
+    """
+    events = []
+    try:
+        with open(DB_LOG_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Последняя строка могла быть записана не полностью при аварийном завершении
+                    print(f"Пропущена поврежденная запись журнала: {line[:80]}")
+    except FileNotFoundError:
+        pass
+    return events
+
+def load_database():
+    """
+    Загружает базу данных: последний уплотненный файл и события из журнала.
+    
+    Returns:
+        dict: База данных или None, если сохраненных данных нет
+    """
+    database = load_json(DB_FILE)
+    logged_events = read_events_log()
+    if database is None and not logged_events:
+        return None
+    
+    database = database or {"events": [], "categories": EVENT_CATEGORIES}
+    # Журнал мог остаться после сбоя между записью базы и его очисткой
+    known_ids = {event.get("id") for event in database["events"]}
+    for event in logged_events:
+        if event.get("id") not in known_ids:
+            database["events"].append(event)
+            known_ids.add(event.get("id"))
+    return database
+
+def compact_database(database, keep_backup=False):
+    """
+    Уплотнение: записывает полную базу данных в DB_FILE и очищает журнал.
+    
+    Файл базы заменяется атомарно, а журнал очищается только после
+    замены, поэтому сбой на любом шаге не теряет события.
+    
+    Args:
+        database: База данных
+        keep_backup: Сохранить предыдущую версию файла базы как резервную копию
+    """
+    temp_file = f"{DB_FILE}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(database, f, ensure_ascii=False, indent=2)
+    
+    if keep_backup and os.path.exists(DB_FILE):
+        # Предыдущая версия переименовывается, а не сериализуется повторно
+        backup_file = f"{os.path.splitext(DB_FILE)[0]}_backup_{int(time.time())}.json"
+        os.replace(DB_FILE, backup_file)
+        print(f"Предыдущая версия базы данных сохранена в {backup_file}")
+    
+    os.replace(temp_file, DB_FILE)
+    open(DB_LOG_FILE, 'w', encoding='utf-8').close()
+    print(f"База данных уплотнена: {len(database['events'])} событий записано в {DB_FILE}")
+
+def persist_checkpoint(new_events, completed, failed, total_topics):
+    """
+    Стадия сохранения: дописывает новые события в журнал, затем контрольные точки.
+    
+    Стоимость сохранения пропорциональна числу новых событий, а не размеру
+    базы. Контрольные точки пишутся после журнала, поэтому тема считается
+    обработанной только когда ее события уже сохранены.
+    """
+    print(f"Сохранение {len(new_events)} новых событий в журнал базы данных")
+    append_events_log(new_events)
+    save_progress(completed, failed, total_topics)
+
+def generate_database(workers=None):
     """
     Генерирует полную базу данных исторических событий России.
+    
+    Темы обрабатываются параллельно: загрузка, разбор, геокодирование и
+    категоризация выполняются в пуле рабочих потоков (по умолчанию по
+    одному на ключ API, у каждого потока свой ключ), а устранение
+    дубликатов и сохранение - в основном потоке по мере готовности тем.
+    
+    Args:
+        workers: Количество рабочих потоков (по умолчанию - число ключей API)
     """
     print("Начало генерации базы данных исторических событий России...")
     
-    # Проверяем наличие существующей базы данных
-    existing_data = load_json(DB_FILE)
+    # Проверяем наличие существующей базы данных (с событиями из журнала)
+    existing_data = load_database()
     if existing_data:
         print(f"Найдена существующая база данных с {len(existing_data.get('events', []))} событиями.")
         user_input = input("Хотите продолжить с существующей базой данных? (y/n): ")
@@ -741,107 +1094,101 @@ def generate_database():
         else:
             print("Создаем новую базу данных.")
             database = {"events": [], "categories": EVENT_CATEGORIES}
+            # Журнал относится к прежней базе
+            open(DB_LOG_FILE, 'w', encoding='utf-8').close()
     else:
         database = {"events": [], "categories": EVENT_CATEGORIES}
     
     # Получаем максимально полный список исторических тем России
     topics = generate_historical_topics()
     
-    # Определяем, с какой темы начать (продолжаем с места остановки)
-    start_index = 0
-    # Проверка наличия информации о последней обработанной теме
-    progress_file = f"{TEMP_FOLDER}/generation_progress.json"
-    progress_data = load_json(progress_file)
-    
-    if progress_data and "last_topic_index" in progress_data:
-        start_index = progress_data["last_topic_index"] + 1
-        print(f"Продолжаем с темы {start_index+1} (предыдущая сессия завершилась на теме {start_index})")
+    # Продолжаем с места остановки: пропускаем темы с контрольной точкой
+    completed = load_progress(topics)
+    failed = {}
+    pending_topics = [topic for topic in topics if hash_string(topic) not in completed]
+    if len(pending_topics) < len(topics):
+        print(f"Пропускаем {len(topics) - len(pending_topics)} уже обработанных тем")
     
-    # Обрабатываем каждую тему
     total_events = len(database.get("events", []))
     print(f"В базе уже имеется {total_events} событий")
     
-    # Устанавливаем частоту сохранения прогресса
-    save_interval = 2  # Сохраняем каждые N тем
+    # Индекс для проверки дубликатов пополняется по мере добавления событий
+    event_index = EventIndex.from_events(database["events"])
     
-    for i, topic in enumerate(topics[start_index:], start=start_index):
-        try:
-            print(f"Обработка темы {i+1}/{len(topics)}: {topic}")
-            
-            # Сохраняем прогресс перед обработкой каждой темы
-            save_json({"last_topic_index": i-1, "total_topics": len(topics)}, progress_file)
-            
-            # Добавляем задержку между обработкой тем, чтобы избежать превышения лимитов API
-            if i > start_index:
-                delay = 3  # 3 секунды между темами
-                print(f"Пауза {delay} секунд перед следующей темой...")
-                time.sleep(delay)
-            
-            # Получаем события для текущей темы
-            events = get_events_for_topic(topic)
-            
-            # Добавляем уникальный идентификатор каждому событию
-            events_added = 0
-            for event in events:
-                # Пропускаем события без названия или даты
-                if not event.get("title") or not event.get("date"):
-                    continue
-                
-                # Создаем идентификатор на основе названия и даты
-                event_id = hash_string(f"{event['title']}_{event['date']}")
-                
-                # Проверяем, нет ли уже такого события в базе данных
-                is_duplicate = False
-                for existing_event in database["events"]:
-                    if "id" in existing_event and existing_event["id"] == event_id:
-                        is_duplicate = True
-                        break
+    workers = max(1, min(workers or len(GEMINI_API_KEYS), len(pending_topics) or 1))
+    print(f"Обработка {len(pending_topics)} тем в {workers} потоках")
+    
+    started_at = time.time()
+    topics_done = 0
+    events_added_total = 0
+    quota_exhausted = False
+    # Новые события, еще не записанные в журнал, и размер журнала с последнего уплотнения
+    unsaved_events = []
+    logged_events = len(read_events_log())
+    
+    with ThreadPoolExecutor(max_workers=workers, initializer=_init_pipeline_worker) as executor:
+        futures = {executor.submit(get_events_for_topic, topic): topic for topic in pending_topics}
+        
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            topic = futures[future]
+            topic_hash = hash_string(topic)
+            try:
+                events = future.result()
+            except Exception as e:
+                print(f"Ошибка при обработке темы '{topic}': {e}")
+                failed[topic_hash] = {"topic": topic, "error": str(e), "failed_at": time.time()}
                 
-                # Если это не дубликат, добавляем событие
-                if not is_duplicate:
-                    event["id"] = event_id
-                    event["topic"] = topic  # Добавляем информацию об источнике
-                    database["events"].append(event)
-                    total_events += 1
-                    events_added += 1
+                # Если это ошибка квоты, прекращаем постановку новых тем
+                if not quota_exhausted and ("quota" in str(e).lower() or "exhausted" in str(e).lower()):
+                    quota_exhausted = True
+                    print("Превышена квота API. Рекомендуется перезапустить скрипт позже.")
+                    for pending in futures:
+                        pending.cancel()
+                continue
             
+            added = merge_topic_events(database, topic, events, event_index)
+            unsaved_events.extend(added)
+            events_added = len(added)
+            events_added_total += events_added
+            total_events += events_added
+            completed[topic_hash] = {"topic": topic, "events": len(events), "added": events_added,
+                                     "finished_at": time.time()}
+            failed.pop(topic_hash, None)
+            topics_done += 1
             print(f"Добавлено {events_added} новых событий для темы '{topic}'")
             
-            # Сохраняем промежуточные результаты чаще
-            if i % save_interval == 0 or i == len(topics) - 1:
-                print(f"Промежуточное сохранение базы данных: {total_events} событий.")
-                save_json(database, DB_FILE)
-                
-                # Обновляем прогресс
-                save_json({"last_topic_index": i, "total_topics": len(topics)}, progress_file)
-            
-        except Exception as e:
-            print(f"Ошибка при обработке темы '{topic}': {e}")
-            # Сохраняем то, что успели собрать
-            save_json(database, DB_FILE)
-            
-            # Сохраняем прогресс для возможности продолжить с этой темы
-            save_json({"last_topic_index": i, "total_topics": len(topics)}, progress_file)
-            
-            # Если это ошибка квоты, делаем большую паузу
-            if "quota" in str(e).lower() or "exhausted" in str(e).lower():
-                print("Превышена квота API. Рекомендуется перезапустить скрипт позже.")
-                print(f"При перезапуске генерация продолжится с темы {i+1}")
-                
-                # Создаем дополнительную резервную копию на случай проблем
-                backup_file = f"{TEMP_FOLDER}/emergency_backup_{int(time.time())}.json"
-                save_json(database, backup_file)
-                print(f"Создана экстренная резервная копия: {backup_file}")
-                break  # Прерываем выполнение
+            # Сохраняем новые события и контрольные точки, журнал периодически уплотняем
+            if topics_done % SAVE_INTERVAL == 0:
+                persist_checkpoint(unsaved_events, completed, failed, len(topics))
+                logged_events += len(unsaved_events)
+                unsaved_events = []
+                if logged_events >= COMPACT_EVENTS:
+                    compact_database(database)
+                    logged_events = 0
+                report_throughput(started_at, topics_done, len(pending_topics), events_added_total)
+    
+    if quota_exhausted:
+        print(f"При перезапуске генерация продолжится с {len(topics) - len(completed)} необработанных тем")
+    elif failed:
+        print(f"Не удалось обработать {len(failed)} тем, они будут запрошены повторно при перезапуске")
     
     # Финальное сохранение
     print(f"Генерация базы данных завершена. Всего в базе {total_events} событий.")
-    save_json(database, DB_FILE)
-    
-    # Создаем резервную копию
-    backup_file = f"history_db_generator/russian_history_database_backup_{int(time.time())}.json"
-    save_json(database, backup_file)
-    print(f"Создана резервная копия базы данных: {backup_file}")
+    stats = event_index.stats
+    print(f"Отброшено дубликатов: {stats['exact']} точных, {stats['title_year']} по названию и году, "
+          f"{stats['near']} пересказов")
+    geocoding = get_gazetteer().get_stats()
+    print(f"Геокодирование: {geocoding['lookups']} запросов ({geocoding['cache_hits']} из кэша), "
+          f"не определено мест: {geocoding['unresolved']}, нечетких совпадений: {geocoding['fuzzy']}")
+    if GEMINI_REPLAY is not None:
+        print(f"Кассета Gemini: {GEMINI_REPLAY.get_stats()}")
+    persist_checkpoint(unsaved_events, completed, failed, len(topics))
+    report_throughput(started_at, topics_done, len(pending_topics), events_added_total)
+    
+    # Переносим журнал в файл базы, предыдущая версия остается резервной копией
+    compact_database(database, keep_backup=True)
     
     return database
 
@@ -0,0 +1,200 @@
+"""
+Разбор событий, полученных от Gemini в структурированном виде (JSON).
+
+Модель отвечает массивом объектов по схеме EVENT_SCHEMA. Ответ проходит
+три шага:
+
+1. Декодирование: снимается обертка ```json ... ```, массив читается
+   по одному объекту, поэтому ошибка в одном элементе не теряет остальные.
+   Допускается и объект-обертка вида {"events": [...]}.
+2. Восстановление: если ответ оборван по лимиту токенов, последний
+   незавершенный объект закрывается (незакрытая строка обрезается до конца
+   последнего предложения) или отбрасывается его незавершенное поле.
+3. Проверка: у события должны быть непустые название и дата с цифрами;
+   поля приводятся к строкам, лишние пробелы и разметка убираются.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Схема ответа для response_schema Gemini
+EVENT_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "date": {"type": "string"},
+            "title": {"type": "string"},
+            "description": {"type": "string"},
+            "location": {"type": "string"},
+        },
+        "required": ["date", "title", "description", "location"],
+    },
+}
+
+# Максимальная длина названия события, более длинные считаются ошибкой разбора
+MAX_TITLE_LENGTH = 200
+
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+_SPACES_RE = re.compile(r'\s+')
+_SENTENCE_END_RE = re.compile(r'[.!?…](?=[^.!?…]*$)')
+
+
+def _text(value: Any) -> str:
+    """Приводит значение поля к строке без лишних пробелов"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        return ""
+    return _SPACES_RE.sub(' ', value).strip()
+
+
+def validate_event(item: Any) -> Optional[Dict[str, str]]:
+    """
+    Проверяет и нормализует событие из ответа модели.
+
+    Args:
+        item: Элемент массива событий
+
+    Returns:
+        Optional[Dict[str, str]]: Событие с полями title, date, description
+            и location (если место указано) или None
+    """
+    if not isinstance(item, dict):
+        return None
+
+    title = _text(item.get("title")).strip('*#_ ')
+    date = _text(item.get("date"))
+    if not title or len(title) > MAX_TITLE_LENGTH or not re.search(r'\d', date):
+        return None
+
+    event = {"title": title, "date": date, "description": _text(item.get("description"))}
+    location = _text(item.get("location"))
+    # Без места событие получит его на стадии геокодирования
+    if location and location.lower() != "не указано":
+        event["location"] = location
+    return event
+
+
+def _repair_object(fragment: str) -> Optional[Any]:
+    """
+    Восстанавливает оборванный JSON-объект.
+
+    Сначала закрывает незакрытую строку и скобки, затем пробует отбросить
+    поля после последней запятой верхнего уровня объекта.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    string_start = 0
+    commas = []
+    for position, char in enumerate(fragment):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+            string_start = position
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if stack:
+                stack.pop()
+        elif char == ',' and len(stack) == 1:
+            commas.append(position)
+
+    candidates = []
+    if in_string:
+        # Оборванный текст обрезается до конца последнего предложения
+        value = fragment[string_start + 1:]
+        if value.endswith('\\'):
+            value = value[:-1]
+        sentence_end = _SENTENCE_END_RE.search(value)
+        if sentence_end:
+            value = value[:sentence_end.end()]
+        candidates.append(fragment[:string_start + 1] + value + '"' + ''.join(reversed(stack)))
+    else:
+        candidates.append(fragment.rstrip().rstrip(',:') + ''.join(reversed(stack)))
+    candidates.extend(fragment[:comma] + '}' for comma in reversed(commas))
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def _decode_items(text: str) -> Tuple[List[Any], Optional[str]]:
+    """
+    Читает элементы массива по одному.
+
+    Returns:
+        Tuple[List[Any], Optional[str]]: Прочитанные элементы и оборванный
+            последний элемент (если ответ обрезан)
+    """
+    decoder = json.JSONDecoder()
+    start = text.find('[')
+    if start == -1:
+        return [], None
+
+    items = []
+    position = start + 1
+    length = len(text)
+    while position < length:
+        while position < length and text[position] in ' \t\r\n,':
+            position += 1
+        if position >= length or text[position] == ']':
+            break
+        try:
+            item, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            return items, text[position:]
+        items.append(item)
+    return items, None
+
+
+def parse_events_json(text: str) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    Извлекает события из JSON-ответа модели.
+
+    Args:
+        text (str): Ответ модели
+
+    Returns:
+        Tuple[List[Dict[str, str]], Dict[str, int]]: Проверенные события и
+            статистика разбора: parsed (прочитано элементов), repaired
+            (восстановлен оборванный элемент), invalid (отброшено проверкой)
+    """
+    stats = {"parsed": 0, "repaired": 0, "invalid": 0}
+    text = _FENCE_RE.sub('', text or "")
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        items, truncated = _decode_items(text)
+        if truncated and truncated.lstrip().startswith('{'):
+            repaired = _repair_object(truncated)
+            if repaired is not None:
+                items.append(repaired)
+                stats["repaired"] = 1
+    else:
+        if isinstance(data, dict):
+            data = next((value for value in data.values() if isinstance(value, list)), [data])
+        items = data if isinstance(data, list) else []
+
+    events = []
+    for item in items:
+        event = validate_event(item)
+        if event:
+            events.append(event)
+        else:
+            stats["invalid"] += 1
+    stats["parsed"] = len(items)
+    return events, stats
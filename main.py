@@ -21,6 +21,7 @@ from src.config import Config
 from src.factory import BotFactory
 from src.data_migration import DataMigration
 from src.task_queue import TaskQueue
+from src.metrics import registry
 
 def check_running_bot():
     """
@@ -91,6 +92,8 @@ def start_bot(config, logger):
 
     # Регистрируем очередь задач в конфигурации для доступа из других модулей
     config.set_task_queue(task_queue)
+    registry.register_stats('bot_task_queue', task_queue.get_stats, "Очередь отложенных задач",
+                            counters=('total', 'completed', 'failed'), gauges=('pending', 'workers'))
 
     # Запускаем бота напрямую в основном потоке
     bot.run()
@@ -113,6 +116,17 @@ def main():
     from src.logger import Logger
     config = Config()
     logger = Logger()
+
+    # Многопроцессный режим: один процесс-приемник и несколько обработчиков
+    if config.bot_workers > 1:
+        if not check_running_bot():
+            logger.error("Процесс-приемник обновлений уже запущен (bot.lock)")
+            return
+
+        from src.worker_pool import BotWorkerPool
+        logger.info(f"Запуск в многопроцессном режиме: {config.bot_workers} обработчиков")
+        BotWorkerPool(config, logger).run()
+        return
     
     # Запускаем бота
     start_bot(config, logger)
@@ -265,6 +279,7 @@ def clear_caches():
 
             if force_clean:
                 cleared_text = text_cache.clear_cache()
+                text_cache.flush()
                 logger.info(f"При запуске проекта очищено {cleared_text} записей из текстового кэша (принудительная очистка)")
         except Exception as e:
             logger.debug(f"Текстовый кэш не используется или произошла ошибка: {e}")
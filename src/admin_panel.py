@@ -4,6 +4,8 @@ import logging
 import time
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import CallbackContext
+from src.text_rendering import split_message
+from src.tracing import tracer
 
 class AdminPanel:
     """Класс для управления админ-панелью бота"""
@@ -117,6 +119,7 @@ class AdminPanel:
             [InlineKeyboardButton("📊 Статистика", callback_data='admin_stats')],
             [InlineKeyboardButton("👥 Управление админами", callback_data='admin_manage')],
             [InlineKeyboardButton("📝 Просмотр логов", callback_data='admin_logs')],
+            [InlineKeyboardButton("⏱️ Задержки по этапам", callback_data='admin_traces')],
             [InlineKeyboardButton("🔄 Перезапустить бота", callback_data='admin_restart')]
         ]
 
@@ -156,6 +159,8 @@ class AdminPanel:
             self._show_admin_management(query, context)
         elif action == 'admin_logs':
             self._show_logs(query, context)
+        elif action == 'admin_traces':
+            self._show_traces(query, context)
         elif action == 'admin_restart':
             self._restart_bot(query, context)
         elif action == 'admin_settings' and self.is_super_admin(user_id):
@@ -260,22 +265,9 @@ class AdminPanel:
         try:
             log_content = self._get_last_logs(100)  # Получаем последние 100 строк логов
 
-            # Разбиваем на части, если слишком длинное сообщение
-            max_length = 4000
-            log_parts = []
-
-            current_part = "📝 *Последние записи логов*\n\n```"
-            for log_line in log_content:
-                if len(current_part) + len(log_line) + 4 > max_length:  # +4 для учета ```
-                    current_part += "```"
-                    log_parts.append(current_part)
-                    current_part = "```\n" + log_line
-                else:
-                    current_part += log_line
-
-            if current_part:
-                current_part += "```"
-                log_parts.append(current_part)
+            # Разбиваем на части, если слишком длинное сообщение:
+            # блок кода закрывается в конце части и открывается в следующей
+            log_parts = split_message("📝 *Последние записи логов*\n\n```" + "".join(log_content) + "```")
 
             # Отправляем первую часть с кнопкой назад
             query.edit_message_text(
@@ -300,6 +292,51 @@ class AdminPanel:
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_back')]])
             )
 
+    def _show_traces(self, query, context):
+        """Показывает задержки этапов обработки запросов по последним трассам"""
+        try:
+            summary = tracer.summarize()
+            back_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_back')]])
+
+            if not summary["stages"]:
+                state = "включена" if tracer.enabled else "выключена (ENABLE_TRACING)"
+                query.edit_message_text(
+                    f"⏱️ *Задержки по этапам*\n\nТрассировка {state}, записанных спанов пока нет.",
+                    reply_markup=back_markup,
+                    parse_mode='Markdown'
+                )
+                return
+
+            # Этап: число вызовов, медиана, 95-й перцентиль и собственное время (без вложенных этапов) в секундах
+            lines = [f"{'этап':<32}{'n':>6}{'p50':>8}{'p95':>8}{'своё':>8}"]
+            for stage in summary["stages"]:
+                lines.append(
+                    f"{stage['name'][:31]:<32}{stage['count']:>6}"
+                    f"{stage['p50_ms'] / 1000:>8.2f}{stage['p95_ms'] / 1000:>8.2f}{stage['self_ms'] / 1000:>8.1f}"
+                )
+
+            traces_parts = split_message(
+                "⏱️ *Задержки по этапам*\n\n"
+                f"Трасс: {summary['traces']}, спанов: {summary['spans']}\n\n"
+                "```\n" + "\n".join(lines) + "\n```"
+            )
+
+            query.edit_message_text(traces_parts[0], reply_markup=back_markup, parse_mode='Markdown')
+            for part in traces_parts[1:]:
+                context.bot.send_message(
+                    chat_id=query.message.chat_id,
+                    text=part,
+                    parse_mode='Markdown'
+                )
+
+            self.logger.info(f"Админ {query.from_user.id} просмотрел задержки по этапам")
+        except Exception as e:
+            self.logger.error(f"Ошибка при отображении задержек по этапам: {e}")
+            query.edit_message_text(
+                f"Ошибка при загрузке трассировки: {e}",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_back')]])
+            )
+
     def _restart_bot(self, query, context):
         """Перезапуск бота"""
         user_id = query.from_user.id
@@ -398,6 +435,7 @@ class AdminPanel:
             [InlineKeyboardButton("📊 Статистика", callback_data='admin_stats')],
             [InlineKeyboardButton("👥 Управление админами", callback_data='admin_manage')],
             [InlineKeyboardButton("📝 Просмотр логов", callback_data='admin_logs')],
+            [InlineKeyboardButton("⏱️ Задержки по этапам", callback_data='admin_traces')],
             [InlineKeyboardButton("🔄 Перезапустить бота", callback_data='admin_restart')]
         ]
 
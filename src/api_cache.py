@@ -7,6 +7,8 @@ from typing import Dict, Any, Optional, List
 import threading
 
 from src.interfaces import ICache, ILogger
+from src.cache_codec import CacheCodec
+from src.tracing import tracer
 
 class APICache(ICache):
     """
@@ -14,7 +16,8 @@ class APICache(ICache):
     Поддерживает персистентное хранение и управление временем жизни кэша.
     """
 
-    def __init__(self, logger: ILogger, max_size: int = 1000, cache_file: str = 'api_cache.json', memory_limit_mb: int = 200):
+    def __init__(self, logger: ILogger, max_size: int = 1000, cache_file: str = 'api_cache.json', memory_limit_mb: int = 200,
+                 codec: Optional[CacheCodec] = None):
         """
         Инициализация системы кэширования.
 
@@ -23,11 +26,13 @@ class APICache(ICache):
             max_size (int): Максимальный размер кэша
             cache_file (str): Путь к файлу для персистентного хранения кэша
             memory_limit_mb (int): Ограничение памяти для кэша в МБ
+            codec (CacheCodec, optional): Кодек сжатия больших значений (по умолчанию zlib)
         """
         self.logger = logger
         self.max_size = max_size
         self.cache_file = cache_file
         self.memory_limit_mb = memory_limit_mb
+        self.codec = codec or CacheCodec()
         self.cache: Dict[str, Dict[str, Any]] = {}
         self.access_counter = {}  # Для отслеживания частоты использования элементов кэша
         self.last_cleanup_time = time.time()
@@ -47,6 +52,7 @@ class APICache(ICache):
         # Запускаем фоновую очистку истекших элементов
         self._start_cleanup_thread()
 
+    @tracer.traced("cache.api.get")
     def get(self, key: str) -> Any:
         """
         Получение значения из кэша.
@@ -75,9 +81,18 @@ class APICache(ICache):
 
             # Обновляем время последнего доступа и счетчик
             cache_item["last_accessed"] = current_time
+            try:
+                value = self._item_value(cache_item)
+            except Exception as e:
+                # Поврежденный элемент считаем промахом и удаляем
+                self.logger.warning(f"Не удалось распаковать элемент кэша {key}: {e}")
+                del self.cache[key]
+                self.stats["misses"] += 1
+                return None
+
             self.access_counter[key] = self.access_counter.get(key, 0) + 1
             self.stats["hits"] += 1
-            return cache_item["value"]
+            return value
 
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """
@@ -95,12 +110,16 @@ class APICache(ICache):
             if len(self.cache) >= self.max_size and key not in self.cache:
                 self._evict_lru()
 
+            # Большие значения храним сжатыми, чтобы больше ответов помещалось в memory_limit_mb
+            stored_value, encoding = self.codec.encode_value(value)
             self.cache[key] = {
-                "value": value,
+                "value": stored_value,
                 "last_accessed": current_time,
                 "created_at": current_time,
                 "ttl": ttl
             }
+            if encoding:
+                self.cache[key]["encoding"] = encoding
 
             self.stats["sets"] += 1
 
@@ -148,6 +167,7 @@ class APICache(ICache):
             stats["size"] = len(self.cache)
             stats["max_size"] = self.max_size
             stats["memory_limit_mb"] = self.memory_limit_mb
+            stats["codec"] = self.codec.get_stats()
 
             # Добавляем информацию о заполненности кэша
             if self.max_size > 0:
@@ -157,6 +177,18 @@ class APICache(ICache):
 
             return stats
 
+    def _item_value(self, cache_item: Dict[str, Any]) -> Any:
+        """
+        Возвращает исходное значение элемента кэша, распаковывая его при необходимости.
+
+        Args:
+            cache_item (Dict[str, Any]): Элемент кэша
+
+        Returns:
+            Any: Значение элемента
+        """
+        return self.codec.decode_value(cache_item.get("value"), cache_item.get("encoding"))
+
     def _evict_lru(self) -> None:
         """
         Удаляет наименее недавно использованный элемент из кэша.
@@ -182,8 +214,9 @@ class APICache(ICache):
             if cache_dir and not os.path.exists(cache_dir):
                 os.makedirs(cache_dir, exist_ok=True)
                 
+            # Компактный JSON без отступов: файл переписывается при каждом изменении
             with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
+                json.dump(self.cache, f, ensure_ascii=False, separators=(',', ':'))
         except Exception as e:
             self.logger.error(f"Ошибка при сохранении кэша в файл: {e}")
 
@@ -255,7 +288,7 @@ class APICache(ICache):
                     
                     for key, item in list(self.cache.items()):
                         # Преобразуем значение в строку и проверяем наличие темы в ней
-                        value_str = str(item.get("value", "")).lower()
+                        value_str = str(self._item_value(item) or "").lower()
                         if topic_filter in value_str:
                             keys_to_delete.append(key)
                     
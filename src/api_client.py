@@ -17,6 +17,12 @@ import google.generativeai as genai
 from src.base_client import BaseClient
 from src.interfaces import ILogger, ICache
 from src.base_service import BaseService
+from src.metrics import registry
+from src.tracing import tracer
+
+# Длительность каждой попытки запроса к Gemini (outcome: success | error)
+GEMINI_REQUEST_SECONDS = registry.histogram(
+    "bot_gemini_request_seconds", "Длительность попыток запроса к Gemini API в секундах", ("outcome",))
 
 class APIClient(BaseService):
     """
@@ -36,7 +42,7 @@ class APIClient(BaseService):
     # Текущая версия API
     API_VERSION = "3.0.0"
 
-    def __init__(self, api_key: str, cache: ICache, logger: ILogger):
+    def __init__(self, api_key: str, cache: ICache, logger: ILogger, replay=None):
         """
         Инициализация API клиента для Google Gemini.
 
@@ -44,10 +50,12 @@ class APIClient(BaseService):
             api_key (str): API ключ для Google Gemini
             cache (ICache): Компонент для кэширования запросов
             logger (ILogger): Компонент для логирования операций
+            replay (GeminiReplay, optional): Кассета для записи или воспроизведения запросов
         """
         super().__init__(logger)
         self.api_key = api_key
         self.cache = cache
+        self.replay = replay
         self.model = None
         self.initialize_model()
         # Добавляем кэширование для API запросов
@@ -55,6 +63,8 @@ class APIClient(BaseService):
         self.cache_ttl = 3600  # Время жизни кэша в секундах (1 час)
         self.cache_hits = 0
         self.cache_misses = 0
+        # Время последнего обращения к Gemini (по нему фоновые задачи определяют простой API)
+        self.last_request_time = 0.0
 
     def _do_initialize(self) -> bool:
         """
@@ -65,11 +75,10 @@ class APIClient(BaseService):
         """
         try:
             # Проверяем доступность API ключа
-            if not self.api_key:
+            if not self.api_key and not self._is_replaying():
                 self._logger.error("API ключ не указан")
                 return False
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash')
+            self._create_model()
             self._logger.info("Gemini API успешно инициализирован (модель: gemini-2.0-flash)")
             return True
         except Exception as e:
@@ -77,10 +86,29 @@ class APIClient(BaseService):
             return False
 
 
+    def _is_replaying(self) -> bool:
+        """Ответы берутся из кассеты без обращения к сети"""
+        return self.replay is not None and self.replay.mode == "replay"
+
+    def _create_model(self) -> None:
+        """Создает модель Gemini, при наличии кассеты - обернутую ею"""
+        if self._is_replaying():
+            self.model = self.replay.wrap()
+            return
+        genai.configure(api_key=self.api_key)
+        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        if self.replay is not None:
+            self.model = self.replay.wrap(self.model)
+
     def initialize_model(self) -> None:
         """
         Инициализация модели Google Gemini с повторными попытками.
         """
+        if self._is_replaying():
+            self._create_model()
+            self._logger.info(f"Gemini API в режиме воспроизведения кассеты {self.replay.cassette_file}")
+            return
+
         max_retries = 3
         retry_delay = 2
 
@@ -89,8 +117,7 @@ class APIClient(BaseService):
                 if not self.api_key:
                     raise ValueError("API ключ не указан")
 
-                genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel('gemini-2.0-flash')
+                self._create_model()
 
                 # Проверяем работоспособность модели
                 test_response = self.model.generate_content(contents="Test connection")
@@ -120,6 +147,7 @@ class APIClient(BaseService):
     def _get_from_cache(self, key):
         """Получает данные из кэша с проверкой времени жизни"""
         if key not in self.request_cache:
+            self.cache_misses += 1
             return None
 
         cache_entry = self.request_cache[key]
@@ -127,6 +155,7 @@ class APIClient(BaseService):
         if time.time() - cache_entry['timestamp'] > self.cache_ttl:
             # Кэш устарел, удаляем запись
             del self.request_cache[key]
+            self.cache_misses += 1
             return None
 
         self.cache_hits += 1
@@ -164,6 +193,7 @@ class APIClient(BaseService):
         return cache_size
 
 
+    @tracer.traced("gemini.call_api")
     def call_api(self, prompt: str, temperature: float = 0.3, max_tokens: int = 1024, 
                 use_cache: bool = True, system_prompt: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -191,7 +221,10 @@ class APIClient(BaseService):
         # Проверяем кэш, если нужно
         if use_cache:
             cache_key = self._get_cache_key(prompt, 'gemini-2.0-flash', max_tokens)
-            cached_result = self._get_from_cache(cache_key)
+            with tracer.span("cache.api_request.get") as span:
+                cached_result = self._get_from_cache(cache_key)
+                if span is not None:
+                    span.set_attribute("hit", bool(cached_result))
             if cached_result:
                 self._logger.debug(f"Получен ответ из кэша для промпта: {prompt[:50]}...")
                 return cached_result
@@ -210,7 +243,9 @@ class APIClient(BaseService):
 
         for attempt in range(max_retries):
             try:
+                tracer.set_attribute("attempts", attempt + 1)
                 start_time = time.time()
+                self.last_request_time = start_time
                 self._logger.debug(f"Отправка запроса к Gemini API: {prompt[:50]}...")
 
                 # Добавляем информацию о версии API в запрос
@@ -263,6 +298,7 @@ class APIClient(BaseService):
                     "model": "gemini-2.0-flash",
                     "elapsed_time": elapsed_time
                 }
+                GEMINI_REQUEST_SECONDS.observe(elapsed_time, outcome="success")
 
                 # Сохраняем в кэш
                 if use_cache:
@@ -272,6 +308,7 @@ class APIClient(BaseService):
                 return result
 
             except Exception as e:
+                GEMINI_REQUEST_SECONDS.observe(time.time() - start_time, outcome="error")
                 error_type = type(e).__name__
                 error_details = str(e)
 
@@ -292,7 +329,8 @@ class APIClient(BaseService):
                 if attempt < max_retries - 1:
                     # Применяем стратегию отступа в зависимости от типа ошибки
                     self._logger.info(f"Повторная попытка через {retry_delay_extended} секунд")
-                    time.sleep(retry_delay_extended)
+                    with tracer.span("gemini.retry_sleep", seconds=retry_delay_extended):
+                        time.sleep(retry_delay_extended)
                 else:
                     self._logger.error(f"Не удалось получить ответ от Gemini API после {max_retries} попыток: {error_type} - {error_details}")
                     # Создаем более информативное исключение
@@ -389,7 +427,8 @@ class APIClient(BaseService):
                 "error": str(e)
             }
 
-    def ask_grok(self, prompt: str, use_cache: bool = True) -> str:
+    def ask_grok(self, prompt: str, use_cache: bool = True, temperature: float = 0.3,
+                 max_tokens: int = 1024) -> str:
         """
         Упрощенный метод для отправки запроса к Gemini API и получения текстового ответа.
         Адаптирован для работы с Gemini 2.0 Flash.
@@ -397,6 +436,8 @@ class APIClient(BaseService):
         Args:
             prompt (str): Текст запроса для модели
             use_cache (bool): Использовать ли кэширование для этого запроса
+            temperature (float): Параметр случайности генерации (0.0-1.0)
+            max_tokens (int): Максимальное количество токенов ответа
 
         Returns:
             str: Текстовый ответ от модели
@@ -404,8 +445,8 @@ class APIClient(BaseService):
         try:
             result = self.call_api(
                 prompt=prompt, 
-                temperature=0.3,
-                max_tokens=1024,
+                temperature=temperature,
+                max_tokens=max_tokens,
                 use_cache=use_cache
             )
             return result.get("text", "")
@@ -1,17 +1,29 @@
 import threading
 import time
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, ConversationHandler, CallbackQueryHandler
+from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, ConversationHandler, CallbackQueryHandler, ExtBot
+from telegram.utils.request import Request
 import logging
 import logging.handlers
 import os
 
 from src.config import TOPIC, CHOOSE_TOPIC, TEST, ANSWER, CONVERSATION
+from src.tracing import tracer
+
+
+class TracedRequest(Request):
+    """Соединение с Telegram API, записывающее каждый запрос как спан текущей трассы"""
+
+    def post(self, url, data, timeout=None):
+        # Запросы вне обработки обновлений (опрос getUpdates) не трассируются
+        with tracer.span(f"telegram.{url.rsplit('/', 1)[-1]}", require_trace=True):
+            return super().post(url, data, timeout=timeout)
+
 
 class Bot:
     """Класс для управления Telegram ботом"""
 
     def __init__(self, config, logger, command_handlers, test_service=None, topic_service=None, 
-              api_client=None, analytics=None, text_cache_service=None):
+              api_client=None, analytics=None, text_cache_service=None, persistence=None):
         self.config = config
         self.logger = logger
         self.handlers = command_handlers
@@ -24,6 +36,9 @@ class Bot:
         self.analytics = analytics
         self.text_cache_service = text_cache_service
 
+        # Хранилище состояний диалогов (BotPersistence или None)
+        self.persistence = persistence
+
         # Контейнер сервисов, будет установлен из фабрики
         self.service_container = None
 
@@ -32,11 +47,17 @@ class Bot:
         try:
             # Инициализируем бота и диспетчер с оптимизированными настройками
             # Используем 8 рабочих потоков для более эффективной параллельной обработки сообщений
+            workers = 8
+            # Пул соединений: по одному на рабочий поток, диспетчер, опрос, JobQueue и главный поток
+            request = TracedRequest(
+                con_pool_size=workers + 4,
+                read_timeout=6, connect_timeout=7  # Уменьшаем таймауты для более быстрого обнаружения проблем
+            )
             self.updater = Updater(
-                self.config.telegram_token, 
+                bot=ExtBot(self.config.telegram_token, request=request),
                 use_context=True, 
-                workers=8,
-                request_kwargs={'read_timeout': 6, 'connect_timeout': 7}  # Уменьшаем таймауты для более быстрого обнаружения проблем
+                workers=workers,
+                persistence=self.persistence
             )
             dp = self.updater.dispatcher
 
@@ -66,7 +87,9 @@ class Bot:
                 },
                 fallbacks=[CommandHandler('start', self.handlers.start)],
                 allow_reentry=True,
-                per_message=False
+                per_message=False,
+                name='main_conversation',
+                persistent=self.persistence is not None
             )
 
             # Добавляем обработчики
@@ -150,6 +173,8 @@ class Bot:
                 self.logger.error(f"Ошибка в idle режиме: {e}")
                 
             # Если idle вернул управление, значит бот завершает работу
+            if self.persistence:
+                self.persistence.close()
             self.logger.info("Бот завершил работу")
         except Exception as e:
             self.logger.log_error(e, {"context": "bot.run()"})
@@ -160,6 +185,48 @@ class Bot:
                 except Exception as stop_error:
                     self.logger.error(f"Ошибка при остановке updater: {stop_error}")
 
+    def run_worker(self, update_source):
+        """
+        Запускает бота как процесс-обработчик многопроцессного режима.
+
+        Обновления не запрашиваются у Telegram, а читаются из очереди,
+        которую заполняет процесс-приемник (см. src/worker_pool.py).
+
+        Args:
+            update_source: Очередь сериализованных обновлений (None - сигнал остановки)
+        """
+        from src.worker_pool import update_from_json
+
+        if not self.updater:
+            self.logger.error("Ошибка запуска обработчика: updater не инициализирован")
+            return
+
+        dispatcher = self.updater.dispatcher
+        dispatcher_thread = threading.Thread(target=dispatcher.start, name="dispatcher", daemon=True)
+        dispatcher_thread.start()
+        self.logger.info("Обработчик обновлений запущен")
+
+        try:
+            while True:
+                data = update_source.get()
+                if data is None:
+                    break
+                try:
+                    dispatcher.update_queue.put(update_from_json(data, dispatcher.bot))
+                except Exception as e:
+                    self.logger.error(f"Ошибка разбора обновления от процесса-приемника: {e}")
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            dispatcher.stop()
+            dispatcher_thread.join(timeout=5)
+            if self.persistence:
+                dispatcher.update_persistence()
+                self.persistence.close()
+            if self.service_container:
+                self.service_container.shutdown_all()
+            self.logger.info("Обработчик обновлений остановлен")
+
     def setup_log_rotation(self):
         log_dir = "logs"
         log_file = os.path.join(log_dir, "bot.log")
@@ -0,0 +1,238 @@
+"""
+Хранение состояния диалогов python-telegram-bot между перезапусками.
+
+BotPersistence сохраняет context.user_data, context.chat_data и состояния
+ConversationHandler в хранилище проекта (SharedStateBackend). Запись
+отложенная: изменения копятся в памяти и сбрасываются пачкой фоновым
+потоком, причем записываются только чаты, данные которых действительно
+изменились с последнего сброса.
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence
+
+from src.interfaces import ILogger
+
+# Метка удаленного состояния диалога в очереди на запись
+_DELETED = object()
+
+
+class BotPersistence(BasePersistence):
+    """
+    Реализация BasePersistence поверх SharedStateBackend с отложенной пакетной записью.
+
+    bot_data не сохраняется: в нем лежат ссылки на сервисы (api_client,
+    analytics и т.д.), которые создаются заново при каждом запуске.
+    """
+
+    USER_DATA_NAMESPACE = "ptb_user_data"
+    CHAT_DATA_NAMESPACE = "ptb_chat_data"
+    CONVERSATIONS_NAMESPACE = "ptb_conversations"
+
+    def __init__(self, backend, logger: ILogger, flush_interval: float = 30.0, start_flush_thread: bool = True):
+        """
+        Инициализация хранилища состояний диалогов.
+
+        Args:
+            backend (SharedStateBackend): Хранилище проекта
+            logger (ILogger): Логгер для записи информации
+            flush_interval (float): Интервал фонового сброса изменений в секундах
+            start_flush_thread (bool): Запускать ли фоновый поток сброса
+        """
+        super().__init__(store_user_data=True, store_chat_data=True, store_bot_data=False)
+        self.backend = backend
+        self._logger = logger
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+
+        # Данные, загруженные из хранилища при старте
+        self._user_data: Optional[defaultdict] = None
+        self._chat_data: Optional[defaultdict] = None
+        self._conversations: Dict[str, Dict[Tuple, Any]] = {}
+
+        # Снимки последних сохраненных данных для определения изменений
+        self._snapshots: Dict[Tuple[str, str], str] = {}
+
+        # Изменения, ожидающие записи: пространство имен -> {ключ: значение}
+        self._pending: Dict[str, Dict[str, Any]] = defaultdict(dict)
+
+        self.stats = {
+            "updates": 0,
+            "unchanged_skipped": 0,
+            "flushes": 0,
+            "records_written": 0,
+            "records_deleted": 0,
+            "serialization_errors": 0,
+            "last_flush_time": 0
+        }
+
+        self._stop_event = threading.Event()
+        self._flush_thread = None
+        if start_flush_thread:
+            self._start_flush_thread()
+
+    # --- Загрузка данных ---
+
+    def _load_namespace(self, namespace: str) -> defaultdict:
+        """Загружает словарь данных по ID из пространства имен хранилища"""
+        data = defaultdict(dict)
+        for key, value in self.backend.get_all(namespace).items():
+            try:
+                data[int(key)] = value
+                self._snapshots[(namespace, key)] = json.dumps(value, ensure_ascii=False, sort_keys=True)
+            except (ValueError, TypeError):
+                self._logger.warning(f"Пропущена некорректная запись {namespace}/{key}")
+        return data
+
+    def get_user_data(self) -> defaultdict:
+        with self.lock:
+            if self._user_data is None:
+                self._user_data = self._load_namespace(self.USER_DATA_NAMESPACE)
+                self._logger.info(f"Загружены данные {len(self._user_data)} пользователей из хранилища")
+            return self._user_data
+
+    def get_chat_data(self) -> defaultdict:
+        with self.lock:
+            if self._chat_data is None:
+                self._chat_data = self._load_namespace(self.CHAT_DATA_NAMESPACE)
+            return self._chat_data
+
+    def get_bot_data(self) -> dict:
+        return {}
+
+    def get_conversations(self, name: str) -> dict:
+        with self.lock:
+            if name not in self._conversations:
+                conversations = {}
+                namespace = f"{self.CONVERSATIONS_NAMESPACE}:{name}"
+                for key, state in self.backend.get_all(namespace).items():
+                    try:
+                        conversations[tuple(json.loads(key))] = state
+                    except (ValueError, TypeError):
+                        self._logger.warning(f"Пропущено некорректное состояние диалога {name}/{key}")
+                self._conversations[name] = conversations
+            return self._conversations[name]
+
+    # --- Регистрация изменений ---
+
+    def _queue_if_changed(self, namespace: str, key: str, data: Any) -> None:
+        """
+        Ставит данные в очередь на запись, если они изменились с последнего сохранения.
+
+        Args:
+            namespace (str): Пространство имен хранилища
+            key (str): Ключ записи
+            data (Any): Данные для сохранения
+        """
+        try:
+            snapshot = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        except (TypeError, ValueError) as e:
+            self.stats["serialization_errors"] += 1
+            self._logger.warning(f"Данные {namespace}/{key} не сериализуются в JSON и не будут сохранены: {e}")
+            return
+
+        with self.lock:
+            self.stats["updates"] += 1
+            if self._snapshots.get((namespace, key)) == snapshot:
+                self.stats["unchanged_skipped"] += 1
+                return
+            self._snapshots[(namespace, key)] = snapshot
+            # Сохраняем копию, чтобы дальнейшие изменения user_data не попали в очередь частично
+            self._pending[namespace][key] = json.loads(snapshot)
+
+    def update_user_data(self, user_id: int, data: Dict) -> None:
+        with self.lock:
+            if self._user_data is not None:
+                self._user_data[user_id] = data
+        self._queue_if_changed(self.USER_DATA_NAMESPACE, str(user_id), data)
+
+    def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        with self.lock:
+            if self._chat_data is not None:
+                self._chat_data[chat_id] = data
+        self._queue_if_changed(self.CHAT_DATA_NAMESPACE, str(chat_id), data)
+
+    def update_bot_data(self, data: Dict) -> None:
+        # bot_data содержит живые объекты сервисов и не сохраняется
+        pass
+
+    def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        with self.lock:
+            conversations = self._conversations.setdefault(name, {})
+            if conversations.get(key) == new_state:
+                return
+            if new_state is None:
+                conversations.pop(key, None)
+            else:
+                conversations[key] = new_state
+            namespace = f"{self.CONVERSATIONS_NAMESPACE}:{name}"
+            self._pending[namespace][json.dumps(list(key))] = _DELETED if new_state is None else new_state
+
+    # --- Запись в хранилище ---
+
+    def flush(self) -> int:
+        """
+        Записывает накопленные изменения в хранилище.
+
+        Returns:
+            int: Количество записанных и удаленных записей
+        """
+        with self.lock:
+            pending = self._pending
+            self._pending = defaultdict(dict)
+
+        written = 0
+        deleted = 0
+        for namespace, items in pending.items():
+            to_write = {key: value for key, value in items.items() if value is not _DELETED}
+            for key, value in items.items():
+                if value is _DELETED:
+                    self.backend.delete(namespace, key)
+                    deleted += 1
+            if to_write:
+                self.backend.set_many(namespace, to_write)
+                written += len(to_write)
+
+        with self.lock:
+            self.stats["flushes"] += 1
+            self.stats["records_written"] += written
+            self.stats["records_deleted"] += deleted
+            self.stats["last_flush_time"] = time.time()
+
+        if written or deleted:
+            self._logger.debug(f"Сохранено состояний диалогов: {written}, удалено: {deleted}")
+        return written + deleted
+
+    def _start_flush_thread(self) -> None:
+        """Запускает фоновый поток периодического сброса изменений"""
+        def flush_job():
+            while not self._stop_event.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    self._logger.error(f"Ошибка в фоновом сохранении состояний диалогов: {e}")
+
+        self._flush_thread = threading.Thread(target=flush_job, name="persistence-flush", daemon=True)
+        self._flush_thread.start()
+
+    def close(self) -> None:
+        """Останавливает фоновый поток и сбрасывает оставшиеся изменения"""
+        self._stop_event.set()
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику хранилища состояний диалогов.
+
+        Returns:
+            Dict[str, Any]: Статистика обновлений и сбросов
+        """
+        with self.lock:
+            stats = self.stats.copy()
+            stats["pending_records"] = sum(len(items) for items in self._pending.values())
+        return stats
@@ -0,0 +1,331 @@
+"""
+Кодеки для компактного хранения кэшированных ответов.
+
+Тексты глав и ответы Gemini - это длинный русский текст, который в UTF-8
+занимает по 2 байта на символ и хорошо сжимается. CacheCodec сериализует
+значение (JSON или msgpack, с запасным вариантом pickle) и сжимает его,
+если размер превышает порог. Поддерживаемые алгоритмы сжатия:
+- zlib (стандартная библиотека, используется по умолчанию)
+- zstd (если установлен пакет zstandard)
+
+Формат двоичных данных: 1 байт сериализатора + 1 байт алгоритма сжатия + данные.
+"""
+
+import base64
+import json
+import pickle
+import threading
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Байты заголовка: сериализатор
+_SERIALIZER_JSON = b"J"
+_SERIALIZER_MSGPACK = b"M"
+_SERIALIZER_PICKLE = b"P"
+
+# Байты заголовка: алгоритм сжатия
+_COMPRESSION_NONE = b"-"
+_COMPRESSION_ZLIB = b"Z"
+_COMPRESSION_ZSTD = b"S"
+
+_COMPRESSION_BY_NAME = {
+    "none": _COMPRESSION_NONE,
+    "zlib": _COMPRESSION_ZLIB,
+    "zstd": _COMPRESSION_ZSTD,
+}
+
+
+class CacheCodec:
+    """
+    Сериализация и сжатие значений кэша со статистикой экономии места.
+
+    Значения меньше порога не сжимаются: на коротких строках заголовок
+    zlib и затраты процессора не окупаются. Если сжатие не уменьшило
+    размер, данные сохраняются как есть.
+    """
+
+    def __init__(self, compression: str = "zlib", threshold: int = 1024, level: int = 6,
+                 serializer: str = "json"):
+        """
+        Инициализация кодека.
+
+        Args:
+            compression (str): Алгоритм сжатия: 'zlib', 'zstd' или 'none'
+            threshold (int): Минимальный размер сериализованных данных для сжатия (байт)
+            level (int): Уровень сжатия
+            serializer (str): Сериализатор: 'json' или 'msgpack'
+        """
+        if compression == "zstd" and zstandard is None:
+            # zstandard - необязательная зависимость
+            compression = "zlib"
+        if compression not in _COMPRESSION_BY_NAME:
+            raise ValueError(f"Неизвестный алгоритм сжатия: {compression}")
+        if serializer == "msgpack" and msgpack is None:
+            serializer = "json"
+
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+        self.serializer = serializer
+        self.lock = threading.Lock()
+        self.stats = {
+            "encoded": 0,
+            "compressed": 0,
+            "raw_bytes": 0,
+            "stored_bytes": 0,
+            "decoded": 0,
+            "decode_errors": 0
+        }
+
+    # --- Двоичный формат (Redis) ---
+
+    def encode(self, value: Any) -> bytes:
+        """
+        Кодирует значение в байты.
+
+        Args:
+            value (Any): Значение для кодирования
+
+        Returns:
+            bytes: Заголовок и (возможно сжатые) сериализованные данные
+        """
+        serializer_byte, payload = self._serialize(value)
+        compression_byte, stored = self._compress(payload)
+        self._record(len(payload), len(stored), compression_byte != _COMPRESSION_NONE)
+        return serializer_byte + compression_byte + stored
+
+    def decode(self, data: bytes) -> Any:
+        """
+        Декодирует значение из байтов, созданных encode().
+
+        Args:
+            data (bytes): Закодированные данные
+
+        Returns:
+            Any: Исходное значение
+        """
+        if len(data) < 2:
+            raise ValueError("Слишком короткие данные для декодирования")
+
+        serializer_byte, compression_byte, payload = data[:1], data[1:2], data[2:]
+        try:
+            payload = self._decompress(compression_byte, payload)
+            value = self._deserialize(serializer_byte, payload)
+        except Exception:
+            with self.lock:
+                self.stats["decode_errors"] += 1
+            raise
+
+        with self.lock:
+            self.stats["decoded"] += 1
+        return value
+
+    @staticmethod
+    def is_encoded(data: bytes) -> bool:
+        """
+        Проверяет, созданы ли данные этим кодеком (а не, например, старым pickle).
+
+        Args:
+            data (bytes): Данные для проверки
+
+        Returns:
+            bool: True если заголовок распознан
+        """
+        return (len(data) >= 2
+                and data[:1] in (_SERIALIZER_JSON, _SERIALIZER_MSGPACK, _SERIALIZER_PICKLE)
+                and data[1:2] in (_COMPRESSION_NONE, _COMPRESSION_ZLIB, _COMPRESSION_ZSTD))
+
+    # --- Текстовый формат (JSON-файлы кэша) ---
+
+    def encode_text(self, text: str) -> Tuple[str, Optional[str]]:
+        """
+        Кодирует строку для хранения внутри JSON-файла.
+
+        Args:
+            text (str): Исходный текст
+
+        Returns:
+            Tuple[str, Optional[str]]: (данные, кодировка). Кодировка None означает,
+                что текст сохранен без изменений
+        """
+        raw = text.encode("utf-8")
+        if len(raw) < self.threshold or self.compression == "none":
+            self._record(len(raw), len(raw), False)
+            return text, None
+
+        compression_byte, stored = self._compress(raw)
+        if compression_byte == _COMPRESSION_NONE:
+            self._record(len(raw), len(raw), False)
+            return text, None
+
+        encoded = base64.b64encode(stored).decode("ascii")
+        self._record(len(raw), len(encoded), True)
+        return encoded, f"{self.compression}+base64"
+
+    def decode_text(self, data: str, encoding: Optional[str]) -> str:
+        """
+        Декодирует строку, закодированную encode_text().
+
+        Args:
+            data (str): Сохраненные данные
+            encoding (str, optional): Кодировка из encode_text()
+
+        Returns:
+            str: Исходный текст
+        """
+        if not encoding:
+            return data
+
+        compression = encoding.split("+", 1)[0]
+        if compression not in _COMPRESSION_BY_NAME:
+            raise ValueError(f"Неизвестная кодировка данных кэша: {encoding}")
+
+        try:
+            raw = self._decompress(_COMPRESSION_BY_NAME[compression], base64.b64decode(data))
+        except Exception:
+            with self.lock:
+                self.stats["decode_errors"] += 1
+            raise
+
+        with self.lock:
+            self.stats["decoded"] += 1
+        return raw.decode("utf-8")
+
+    def encode_value(self, value: Any) -> Tuple[Any, Optional[str]]:
+        """
+        Кодирует произвольное JSON-совместимое значение для хранения внутри JSON-файла.
+
+        Строки кодируются напрямую, остальные значения предварительно
+        сериализуются в JSON.
+
+        Args:
+            value (Any): Значение
+
+        Returns:
+            Tuple[Any, Optional[str]]: (данные, кодировка)
+        """
+        if isinstance(value, str):
+            return self.encode_text(value)
+
+        try:
+            text = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return value, None
+
+        data, encoding = self.encode_text(text)
+        if encoding is None:
+            return value, None
+        return data, f"json+{encoding}"
+
+    def decode_value(self, data: Any, encoding: Optional[str]) -> Any:
+        """
+        Декодирует значение, закодированное encode_value().
+
+        Args:
+            data (Any): Сохраненные данные
+            encoding (str, optional): Кодировка из encode_value()
+
+        Returns:
+            Any: Исходное значение
+        """
+        if not encoding:
+            return data
+        if encoding.startswith("json+"):
+            return json.loads(self.decode_text(data, encoding[len("json+"):]))
+        return self.decode_text(data, encoding)
+
+    # --- Внутренние методы ---
+
+    def _serialize(self, value: Any) -> Tuple[bytes, bytes]:
+        """Сериализует значение, возвращая байт сериализатора и данные"""
+        if self.serializer == "msgpack":
+            try:
+                return _SERIALIZER_MSGPACK, msgpack.packb(value, use_bin_type=True)
+            except (TypeError, ValueError):
+                pass
+        else:
+            try:
+                return _SERIALIZER_JSON, json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            except (TypeError, ValueError):
+                pass
+        # Значения, не представимые в JSON/msgpack
+        return _SERIALIZER_PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _deserialize(serializer_byte: bytes, payload: bytes) -> Any:
+        """Десериализует данные по байту сериализатора"""
+        if serializer_byte == _SERIALIZER_JSON:
+            return json.loads(payload.decode("utf-8"))
+        if serializer_byte == _SERIALIZER_MSGPACK:
+            if msgpack is None:
+                raise ValueError("Для чтения данных требуется пакет msgpack")
+            return msgpack.unpackb(payload, raw=False)
+        if serializer_byte == _SERIALIZER_PICKLE:
+            return pickle.loads(payload)
+        raise ValueError(f"Неизвестный сериализатор: {serializer_byte!r}")
+
+    def _compress(self, payload: bytes) -> Tuple[bytes, bytes]:
+        """Сжимает данные, если это выгодно; возвращает байт алгоритма и данные"""
+        if len(payload) < self.threshold or self.compression == "none":
+            return _COMPRESSION_NONE, payload
+
+        if self.compression == "zstd":
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(payload)
+            compression_byte = _COMPRESSION_ZSTD
+        else:
+            compressed = zlib.compress(payload, self.level)
+            compression_byte = _COMPRESSION_ZLIB
+
+        if len(compressed) >= len(payload):
+            return _COMPRESSION_NONE, payload
+        return compression_byte, compressed
+
+    @staticmethod
+    def _decompress(compression_byte: bytes, payload: bytes) -> bytes:
+        """Распаковывает данные по байту алгоритма"""
+        if compression_byte == _COMPRESSION_NONE:
+            return payload
+        if compression_byte == _COMPRESSION_ZLIB:
+            return zlib.decompress(payload)
+        if compression_byte == _COMPRESSION_ZSTD:
+            if zstandard is None:
+                raise ValueError("Для чтения данных требуется пакет zstandard")
+            return zstandard.ZstdDecompressor().decompress(payload)
+        raise ValueError(f"Неизвестный алгоритм сжатия: {compression_byte!r}")
+
+    def _record(self, raw_size: int, stored_size: int, compressed: bool) -> None:
+        """Обновляет статистику кодирования"""
+        with self.lock:
+            self.stats["encoded"] += 1
+            self.stats["raw_bytes"] += raw_size
+            self.stats["stored_bytes"] += stored_size
+            if compressed:
+                self.stats["compressed"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику кодека.
+
+        Returns:
+            Dict[str, Any]: Количество операций, исходный и сохраненный объем, экономия
+        """
+        with self.lock:
+            stats = self.stats.copy()
+        stats["compression"] = self.compression
+        stats["serializer"] = self.serializer
+        stats["threshold"] = self.threshold
+        stats["bytes_saved"] = stats["raw_bytes"] - stats["stored_bytes"]
+        stats["compression_ratio"] = (
+            stats["raw_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 1.0
+        )
+        return stats
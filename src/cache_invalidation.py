@@ -0,0 +1,178 @@
+"""
+Транспорт сообщений об инвалидации локальных кэшей.
+
+Когда несколько процессов используют DistributedCache, каждый держит
+собственный локальный (ближний) кэш. При удалении, очистке или
+перезаписи значения процесс рассылает сообщение об инвалидации, и
+остальные процессы сразу удаляют устаревшие ключи из своих локальных
+кэшей, не дожидаясь истечения TTL.
+
+Транспорты:
+- RedisInvalidationTransport - Redis pub/sub (рабочий режим)
+- LocalInvalidationTransport - шина внутри процесса (для тестов и одного процесса)
+"""
+
+import json
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+from src.interfaces import ILogger
+
+# Канал по умолчанию для сообщений об инвалидации
+DEFAULT_CHANNEL = "api_cache:invalidate"
+
+
+class InvalidationTransport(ABC):
+    """Интерфейс транспорта сообщений об инвалидации"""
+
+    @abstractmethod
+    def publish(self, message: Dict[str, Any]) -> bool:
+        """
+        Рассылает сообщение всем подписчикам канала.
+
+        Args:
+            message (Dict[str, Any]): Сообщение (сериализуется в JSON)
+
+        Returns:
+            bool: True если сообщение отправлено
+        """
+        pass
+
+    @abstractmethod
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None],
+                  on_reconnect: Callable[[], None] = None) -> None:
+        """
+        Подписывается на сообщения канала.
+
+        Args:
+            callback (Callable): Обработчик полученного сообщения
+            on_reconnect (Callable, optional): Вызывается после восстановления подписки,
+                когда часть сообщений могла быть потеряна
+        """
+        pass
+
+    def close(self) -> None:
+        """Отписывается от канала и освобождает ресурсы"""
+        pass
+
+
+class LocalInvalidationTransport(InvalidationTransport):
+    """
+    Транспорт внутри процесса.
+
+    Все экземпляры с одинаковым каналом получают сообщения друг друга
+    синхронно, что позволяет проверять инвалидацию в тестах без Redis.
+    """
+
+    _subscribers: Dict[str, List[Callable]] = defaultdict(list)
+    _lock = threading.Lock()
+
+    def __init__(self, channel: str = DEFAULT_CHANNEL):
+        """
+        Инициализация транспорта.
+
+        Args:
+            channel (str): Имя канала
+        """
+        self.channel = channel
+        self._callbacks: List[Callable] = []
+
+    def publish(self, message: Dict[str, Any]) -> bool:
+        with self._lock:
+            callbacks = list(self._subscribers[self.channel])
+        data = json.dumps(message, ensure_ascii=False)
+        for callback in callbacks:
+            callback(json.loads(data))
+        return True
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None],
+                  on_reconnect: Callable[[], None] = None) -> None:
+        with self._lock:
+            self._subscribers[self.channel].append(callback)
+        self._callbacks.append(callback)
+
+    def close(self) -> None:
+        with self._lock:
+            for callback in self._callbacks:
+                if callback in self._subscribers[self.channel]:
+                    self._subscribers[self.channel].remove(callback)
+        self._callbacks = []
+
+
+class RedisInvalidationTransport(InvalidationTransport):
+    """
+    Транспорт на основе Redis pub/sub.
+
+    Подписка обслуживается фоновым потоком, который переподключается
+    после сетевых ошибок.
+    """
+
+    def __init__(self, redis_client, logger: ILogger, channel: str = DEFAULT_CHANNEL, retry_interval: float = 5.0):
+        """
+        Инициализация транспорта.
+
+        Args:
+            redis_client: Клиент Redis
+            logger (ILogger): Логгер для записи информации
+            channel (str): Имя канала
+            retry_interval (float): Пауза перед повторной подпиской после ошибки (сек)
+        """
+        self.redis_client = redis_client
+        self.logger = logger
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def publish(self, message: Dict[str, Any]) -> bool:
+        try:
+            self.redis_client.publish(self.channel, json.dumps(message, ensure_ascii=False))
+            return True
+        except Exception as e:
+            self.logger.warning(f"Не удалось отправить сообщение об инвалидации кэша: {e}")
+            return False
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None],
+                  on_reconnect: Callable[[], None] = None) -> None:
+        def listen_job():
+            failed = False
+            while not self._stop_event.is_set():
+                pubsub = None
+                try:
+                    pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.channel)
+                    if failed and on_reconnect:
+                        on_reconnect()
+                    failed = False
+
+                    while not self._stop_event.is_set():
+                        message = pubsub.get_message(timeout=1.0)
+                        if not message or message.get("type") != "message":
+                            continue
+                        try:
+                            data = message["data"]
+                            if isinstance(data, bytes):
+                                data = data.decode("utf-8")
+                            callback(json.loads(data))
+                        except Exception as e:
+                            self.logger.debug(f"Некорректное сообщение об инвалидации кэша: {e}")
+                except Exception as e:
+                    failed = True
+                    self.logger.warning(f"Подписка на инвалидацию кэша прервана: {e}")
+                    self._stop_event.wait(self.retry_interval)
+                finally:
+                    if pubsub is not None:
+                        try:
+                            pubsub.close()
+                        except Exception:
+                            pass
+
+        self._thread = threading.Thread(target=listen_job, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
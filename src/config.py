@@ -54,12 +54,55 @@ class Config:
         self.use_distributed_cache = os.getenv('USE_DISTRIBUTED_CACHE', 'false').lower() == 'true'
         self.redis_url = os.getenv('REDIS_URL', '')
 
+        # Многопроцессный режим: число процессов-обработчиков и общее хранилище состояния
+        self.bot_workers = max(1, int(os.getenv('BOT_WORKERS', '1')))
+        self.shared_state_backend = os.getenv('SHARED_STATE_BACKEND', 'sqlite').lower()  # sqlite | redis
+        self.shared_state_file = os.getenv('SHARED_STATE_FILE', 'shared_state.db')
+
+        # Сохранение состояния диалогов (user_data, прогресс тестов) между перезапусками
+        self.enable_persistence = os.getenv('ENABLE_PERSISTENCE', 'true').lower() == 'true'
+        self.persistence_file = os.getenv('PERSISTENCE_FILE', 'bot_persistence.db')
+        self.persistence_flush_interval = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '30'))
+
         # Конфигурация для мониторинга производительности
         self.enable_performance_monitoring = os.getenv('ENABLE_PERFORMANCE_MONITORING', 'true').lower() == 'true'
         self.metrics_file = os.getenv('METRICS_FILE', 'performance_metrics.json')
+        # Токен для маршрута /metrics веб-сервера (пусто - доступ без токена)
+        self.metrics_token = os.getenv('METRICS_TOKEN', '')
+        # Интервал записи снимка метрик процесса-обработчика в общее хранилище (BOT_WORKERS > 1)
+        self.metrics_push_interval = float(os.getenv('METRICS_PUSH_INTERVAL', '15'))
+        # Трассировка обработки обновлений: спаны этапов в JSONL-файле формата OTLP
+        self.enable_tracing = os.getenv('ENABLE_TRACING', 'true').lower() == 'true'
+        self.trace_file = os.getenv('TRACE_FILE', 'logs/traces.jsonl')  # пусто - только сводка в памяти
+        self.trace_file_max_mb = float(os.getenv('TRACE_FILE_MAX_MB', '50'))
 
         # Настройки кэширования
+        self.cache_compression = os.getenv('CACHE_COMPRESSION', 'zlib').lower()  # zlib | zstd | none
+        self.cache_compression_threshold = int(os.getenv('CACHE_COMPRESSION_THRESHOLD', '1024'))
+        # Семантический кэш ответов в режиме беседы
+        self.enable_semantic_cache = os.getenv('ENABLE_SEMANTIC_CACHE', 'true').lower() == 'true'
+        self.semantic_cache_threshold = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.8'))
+        self.semantic_cache_sample_rate = float(os.getenv('SEMANTIC_CACHE_SAMPLE_RATE', '0.02'))
+        # Локальный классификатор исторических тем
+        self.topic_classifier_file = os.getenv('TOPIC_CLASSIFIER_FILE', 'topic_classifier.json')
+        self.topic_queries_log = os.getenv('TOPIC_QUERIES_LOG', 'topic_queries.jsonl')
+        # Каталог тем для страниц "Больше тем"
+        self.topic_catalogue_file = os.getenv('TOPIC_CATALOGUE_FILE', 'topic_catalogue.json')
+        # Упреждающая подготовка теста и рекомендованных тем (бюджет - запросов к Gemini в час)
+        self.enable_prefetch = os.getenv('ENABLE_PREFETCH', 'true').lower() == 'true'
+        self.prefetch_budget_per_hour = int(os.getenv('PREFETCH_BUDGET_PER_HOUR', '40'))
+        self.prefetch_topics = int(os.getenv('PREFETCH_TOPICS', '2'))
+        # Общий бюджет повторов коротких глав: емкость и пополнение в минуту
+        self.chapter_retry_budget = float(os.getenv('CHAPTER_RETRY_BUDGET', '10'))
+        self.chapter_retry_refill_per_minute = float(os.getenv('CHAPTER_RETRY_REFILL_PER_MINUTE', '2'))
         self.clear_cache_on_startup = os.getenv('CLEAR_CACHE_ON_STARTUP', 'true').lower() == 'true'
+        # Запись и воспроизведение запросов к Gemini для замеров без сети (пусто - выключено)
+        self.gemini_replay_mode = os.getenv('GEMINI_REPLAY_MODE', '').lower()  # record | replay
+        self.gemini_cassette_file = os.getenv('GEMINI_CASSETTE_FILE', 'cassettes/gemini.json')
+        self.gemini_replay_latency = os.getenv('GEMINI_REPLAY_LATENCY', 'recorded')
+        self.gemini_replay_quota_error_rate = float(os.getenv('GEMINI_REPLAY_QUOTA_ERROR_RATE', '0'))
+        self.gemini_replay_rate_error_rate = float(os.getenv('GEMINI_REPLAY_RATE_ERROR_RATE', '0'))
+        self.gemini_replay_on_miss = os.getenv('GEMINI_REPLAY_ON_MISS', 'error').lower()  # error | synthetic
 
         # Настройки для форматирования логов
         self.log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
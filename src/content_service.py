@@ -7,6 +7,8 @@ from typing import Dict, Any, Optional, List, Callable
 
 from src.interfaces import IContentProvider, ILogger
 from src.base_service import BaseService
+from src.topic_classifier import TopicIndex, TopicRelevanceClassifier
+from src.event_search import EventSearchIndex
 
 class ContentService(BaseService):
     """
@@ -14,7 +16,22 @@ class ContentService(BaseService):
     Обеспечивает доступ к историческому контенту через API и локальные данные.
     """
 
-    def __init__(self, api_client, logger: ILogger, events_file: str = 'historical_events.json', text_cache_service=None):
+    # Стандартный набор исторических тем
+    DEFAULT_TOPICS = (
+        "Киевская Русь",
+        "Монгольское нашествие на Русь",
+        "Образование Московского государства",
+        "Смутное время",
+        "Петр I и его реформы",
+        "Отечественная война 1812 года",
+        "Отмена крепостного права",
+        "Октябрьская революция 1917 года",
+        "Великая Отечественная война",
+        "Распад СССР"
+    )
+
+    def __init__(self, api_client, logger: ILogger, events_file: str = 'historical_events.json', text_cache_service=None,
+                 topic_classifier: Optional[TopicRelevanceClassifier] = None):
         """
         Инициализация сервиса контента.
 
@@ -23,6 +40,7 @@ class ContentService(BaseService):
             logger (ILogger): Логгер для записи информации
             events_file (str): Путь к файлу с историческими событиями
             text_cache_service: Сервис кэширования текстов (опционально)
+            topic_classifier (TopicRelevanceClassifier, optional): Локальный классификатор тем
         """
         super().__init__(logger)
         self.api_client = api_client
@@ -30,19 +48,28 @@ class ContentService(BaseService):
         self.text_cache_service = text_cache_service
         self.events_data = self._load_events_data()
 
-        # Стандартный набор исторических тем
-        self.default_topics = [
-            "Киевская Русь",
-            "Монгольское нашествие на Русь",
-            "Образование Московского государства",
-            "Смутное время",
-            "Петр I и его реформы",
-            "Отечественная война 1812 года",
-            "Отмена крепостного права",
-            "Октябрьская революция 1917 года",
-            "Великая Отечественная война",
-            "Распад СССР"
-        ]
+        self.default_topics = list(self.DEFAULT_TOPICS)
+
+        # Поисковый индекс событий для локального поиска тем
+        self.event_index = self._build_event_index()
+
+        # Локальная проверка тем: индекс стандартных тем, индекс событий и классификатор
+        self.topic_index = self._build_topic_index()
+        if topic_classifier is None:
+            # Без файлов модели и журнала: обучаем в памяти на данных проекта
+            topic_classifier = TopicRelevanceClassifier(logger, model_file=None, query_log_file=None)
+            topic_classifier.fit(TopicRelevanceClassifier.build_training_set(self.events_data, self.default_topics))
+        self.topic_classifier = topic_classifier
+
+        # Счетчики путей принятия решения в validate_topic
+        self.validation_stats = {
+            "total": 0,
+            "index": 0,
+            "classifier_accepted": 0,
+            "classifier_rejected": 0,
+            "escalated": 0,
+            "escalated_accepted": 0
+        }
 
     def _do_initialize(self) -> bool:
         """
@@ -53,6 +80,7 @@ class ContentService(BaseService):
         """
         try:
             self.events_data = self._load_events_data()
+            self.event_index = self._build_event_index()
             return True
         except Exception as e:
             self._logger.log_error(e, "Ошибка при инициализации ContentService")
@@ -121,29 +149,71 @@ class ContentService(BaseService):
                 "periods": []
             }
 
+    def _build_topic_index(self) -> TopicIndex:
+        """
+        Строит индекс названий стандартных тем.
+
+        Returns:
+            TopicIndex: Индекс названий
+        """
+        return TopicIndex(self.default_topics)
+
+    def _build_event_index(self) -> EventSearchIndex:
+        """
+        Строит поисковый индекс исторических событий.
+
+        Returns:
+            EventSearchIndex: Индекс событий
+        """
+        return EventSearchIndex((self.events_data or {}).get("events", []))
+
     def validate_topic(self, topic: str) -> bool:
         """
         Проверяет является ли тема исторической.
 
+        Сначала тема ищется в индексе названий, затем оценивается локальным
+        классификатором; к API обращаемся только если классификатор не уверен.
+
         Args:
             topic (str): Тема для проверки
 
         Returns:
             bool: True если тема историческая, False в противном случае
         """
-        # Проверяем, есть ли тема в списке стандартных исторических тем
-        if any(default_topic.lower() in topic.lower() for default_topic in self.default_topics):
+        self.validation_stats["total"] += 1
+
+        # Тема содержит название стандартной темы или события
+        if self.topic_index.match(topic) or self.event_index.find_topic(topic):
+            self.validation_stats["index"] += 1
             return True
 
-        # Проверяем, есть ли тема в загруженных событиях
-        if self.events_data and "events" in self.events_data:
-            for event in self.events_data["events"]:
-                if "name" in event and event["name"].lower() in topic.lower():
-                    return True
+        verdict = self.topic_classifier.classify(topic)
+        if verdict is True:
+            self.validation_stats["classifier_accepted"] += 1
+            return True
+        if verdict is False:
+            self.validation_stats["classifier_rejected"] += 1
+            return False
 
-        # Если не нашли совпадений, используем API для проверки
-        return self.api_client.validate_historical_topic(topic)
+        # Классификатор не уверен, используем API для проверки
+        self.validation_stats["escalated"] += 1
+        result = self.api_client.validate_historical_topic(topic)
+        if result:
+            self.validation_stats["escalated_accepted"] += 1
+        # Ответ API пополняет обучающую выборку классификатора
+        self.topic_classifier.record_verdict(topic, result)
+        return result
 
+    def get_validation_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику проверки тем по путям принятия решения.
+
+        Returns:
+            Dict[str, Any]: Количество решений индекса, классификатора и API
+        """
+        stats = dict(self.validation_stats)
+        stats["local_rate"] = 1 - stats["escalated"] / stats["total"] if stats["total"] else 0.0
+        return stats
 
     def get_default_topics(self) -> List[str]:
         """
@@ -198,22 +268,14 @@ class ContentService(BaseService):
         Returns:
             Dict[str, Any] or None: Информация о теме или None, если не найдена
         """
-        if not self.events_data or "events" not in self.events_data:
-            return None
-
-        # Нормализуем тему для сравнения
-        normalized_topic = topic.lower()
-
-        # Ищем событие с похожим названием
-        for event in self.events_data["events"]:
-            if "name" in event and event["name"].lower() in normalized_topic:
-                if "description" in event:
-                    return {
-                        "status": "success",
-                        "topic": topic,
-                        "content": event["description"],
-                        "source": "local_database"
-                    }
+        event = self.event_index.find_topic(topic)
+        if event and event.get("description"):
+            return {
+                "status": "success",
+                "topic": topic,
+                "content": event["description"],
+                "source": "local_database"
+            }
 
         return None
 
@@ -231,10 +293,11 @@ class ContentService(BaseService):
 
             # Проверяем, есть ли уже информация об этой теме
             for event in self.events_data["events"]:
-                if "name" in event and event["name"].lower() == topic.lower():
+                if EventSearchIndex.event_title(event).lower() == topic.lower():
                     # Обновляем существующую информацию
                     event["description"] = content
                     event["updated_at"] = int(time.time())
+                    self.event_index = self._build_event_index()
 
                     # Сохраняем обновленные данные
                     with open(self.events_file, 'w', encoding='utf-8') as f:
@@ -251,6 +314,7 @@ class ContentService(BaseService):
             }
 
             self.events_data["events"].append(new_event)
+            self.event_index.add_event(new_event)
 
             # Сохраняем обновленные данные
             with open(self.events_file, 'w', encoding='utf-8') as f:
@@ -1,14 +1,170 @@
 import re
 import telegram
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ChatAction
+from src.russian_text import normalize, stem
+from src.text_rendering import split_message
+
+# Русскоязычные исторические ключевые слова, разделенные на категории
+_HISTORY_KEYWORDS = (
+    # Общие исторические термины
+    'история', 'исторический', 'историческое', 'исторические', 'исторически',
+    'прошлое', 'эпоха', 'период', 'эра', 'век', 'столетие', 'летопись', 'хроника',
+
+    # Государственное устройство России
+    'россия', 'российская', 'российской', 'российского', 'российскую', 'русь', 
+    'киевская', 'московская', 'новгородская', 'владимирская', 'империя', 'ссср', 
+    'советский', 'советская', 'советское', 'федерация', 'рсфср', 'российской федерации',
+
+    # Правители и политические деятели
+    'царь', 'царица', 'княгиня', 'князь', 'император', 'императрица', 'правитель',
+    'государь', 'монарх', 'генсек', 'генеральный секретарь', 'президент', 'премьер',
+    'династия', 'престол', 'корона', 'трон', 'правление', 'царствование',
+
+    # Конкретные исторические личности
+    'рюрик', 'олег', 'игорь', 'ольга', 'святослав', 'владимир', 'ярослав', 
+    'иван', 'грозный', 'петр', 'екатерина', 'александр', 'николай', 'павел',
+    'ленин', 'сталин', 'хрущев', 'брежнев', 'горбачев', 'ельцин', 'путин',
+    'романов', 'романовы', 'рюриковичи', 'годунов', 'шуйский',
+
+    # Исторические события и процессы
+    'война', 'революция', 'восстание', 'бунт', 'переворот', 'реформа', 'перестройка',
+    'крепостное', 'крепостничество', 'раскол', 'смута', 'опричнина', 'оттепель', 'застой',
+    'коллективизация', 'индустриализация', 'приватизация', 'распад', 'образование',
+
+    # Конкретные войны и конфликты
+    'отечественная', 'крымская', 'кавказская', 'первая мировая', 'вторая мировая', 
+    'гражданская', 'великая отечественная', 'афганская', 'чеченская', 'холодная',
+
+    # Географические названия
+    'москва', 'петербург', 'ленинград', 'киев', 'новгород', 'псков', 'владимир', 
+    'суздаль', 'казань', 'крым', 'сибирь', 'поволжье', 'кавказ', 'урал', 
+    'кремль', 'красная площадь', 'зимний дворец',
+
+    # Социальные и экономические явления
+    'крестьяне', 'дворяне', 'бояре', 'казаки', 'купцы', 'духовенство', 'интеллигенция',
+    'помещики', 'крепостные', 'пролетариат', 'буржуазия', 'номенклатура', 'партия',
+    'коллективизация', 'индустриализация', 'пятилетка', 'нэп', 'приватизация',
+
+    # Сигнальные слова вопросов и запросов
+    'когда', 'почему', 'как', 'где', 'какой', 'какие', 'какая', 'кто', 'чем',
+    'что случилось', 'что произошло', 'расскажи', 'объясни', 'опиши'
+)
+
+_HISTORY_QUESTION_MARKERS = (
+    'расскажи', 'объясни', 'опиши', 'поведай', 'поясни',
+    'что такое', 'кто такой', 'кто такая', 'когда был', 'когда была',
+    'какие были', 'в каком году', 'при каком', 'какое значение'
+)
+
+def _keyword_entry(keyword):
+    """
+    Возвращает текст ключевого слова для поиска и признак поиска целого слова.
+
+    Ключевые слова сводятся к основе стеммером src/russian_text.py (как в
+    семантическом кэше и классификаторе тем), чтобы находить словоформы
+    ("революции", "петра", "первой мировой"); короткие слова и слова с
+    короткой основой ("век", "как", "царь") ищутся целиком, чтобы не
+    совпадать с началами посторонних слов. Во фразе короткая основа
+    допустима: совпадение ограничено соседними словами ("перв мир").
+    """
+    keyword = normalize(keyword)
+    if ' ' in keyword:
+        return ' '.join(stem(word) for word in keyword.split()), False
+    base = stem(keyword)
+    if len(base) < 4:
+        return keyword, True
+    return base, False
+
+
+def _build_trie_pattern(entries):
+    """
+    Строит регулярное выражение в виде префиксного дерева.
+
+    Альтернативы с общим началом объединяются, поэтому движок регулярных
+    выражений отбрасывает позицию после первого несовпавшего символа, а не
+    перебирает все ключевые слова по очереди (аналог автомата Ахо-Корасик).
+
+    Args:
+        entries: Пары (текст, только целое слово)
+
+    Returns:
+        str: Регулярное выражение
+    """
+    trie = {}
+    for text, whole_word in entries:
+        node = trie
+        for char in text:
+            node = node.setdefault(char, {})
+        # Префикс без ограничения справа поглощает более длинные варианты
+        node[''] = node.get('', True) and whole_word
+
+    def render(node):
+        if '' in node and node[''] is False:
+            return ''
+        branches = []
+        for char in sorted(key for key in node if key):
+            # Пробел во фразе допускает окончание предыдущего слова
+            token = r'\w*\s+' if char == ' ' else re.escape(char)
+            branches.append(token + render(node[char]))
+        optional = '' in node
+        if optional:
+            branches.append(r'(?!\w)')
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    return r'(?<!\w)' + render(trie)
+
+
+# Один автомат на все ключевые слова и маркеры-запросы: сообщение проверяется
+# за один проход, ключевые слова совпадают с началом слова
+_HISTORY_RE = re.compile(_build_trie_pattern(
+    [_keyword_entry(keyword) for keyword in _HISTORY_KEYWORDS]
+    + [(marker, False) for marker in _HISTORY_QUESTION_MARKERS]
+))
+
+# Вопросительные слова (подстрокой) для сообщений с вопросительным знаком
+_QUESTION_WORD_RE = re.compile('кто|что|когда|где|почему|как')
+
+# Признаки исторического контекста в предыдущих сообщениях
+_HISTORY_CONTEXT_RE = re.compile('россия|история|царь|война')
+
+# Распространенные опечатки и альтернативные написания (проверяются по началу слова)
+_TYPO_CORRECTIONS = {
+    'истори': 'история',
+    'росии': 'россии',
+    'руский': 'русский',
+    'путен': 'путин',
+    'ленен': 'ленин',
+    'екатерин': 'екатерина',
+    'революци': 'революция',
+    'красн': 'красный',
+    'совецк': 'советский',
+    'цар': 'царь',
+    'импер': 'император'
+}
+_TYPO_RE = re.compile(r'(?<!\S)(?:' + '|'.join(map(re.escape, _TYPO_CORRECTIONS)) + ')')
+
+# Часто смешиваемые латинские и кириллические символы
+_LATIN_TO_CYRILLIC = str.maketrans('aeopcxbhy', 'аеорсхвну')
+
+# Местоимения, по которым вопрос считается продолжением предыдущего ("а чем он известен?")
+_CONTEXT_DEPENDENT_WORDS = frozenset({
+    'он', 'она', 'оно', 'они', 'его', 'ее', 'её', 'их', 'ему', 'ей', 'им', 'нем', 'ней', 'них',
+    'этот', 'эта', 'это', 'эти', 'этого', 'этой', 'тот', 'та', 'те', 'того', 'тогда', 'там'
+})
 
 class ConversationService:
     """Класс для обработки бесед с пользователем об истории России"""
 
-    def __init__(self, api_client, logger):
+    def __init__(self, api_client, logger, answer_cache=None):
         self.api_client = api_client
         self.logger = logger
         # Используется только для логирования и API вызовов, history_map более не используется
+        # Семантический кэш ответов (SemanticAnswerCache), None - кэш отключен
+        self.answer_cache = answer_cache
+        if answer_cache is not None and answer_cache.normalizer is None:
+            answer_cache.normalizer = self._normalize_russian_input
 
     def handle_conversation(self, update, context, message_manager):
         """
@@ -145,30 +301,8 @@ class ConversationService:
                 except Exception as inner_e:
                     self.logger.error(f"Не удалось отправить сокращенное сообщение: {inner_e}")
         else:
-            # Разбиваем текст на части по абзацам
-            paragraphs = text.split('\n\n')
-            current_part = ""
-            parts = []
-
-            for paragraph in paragraphs:
-                # Если добавление этого абзаца превысит лимит
-                if len(current_part) + len(paragraph) + 2 > max_length:
-                    parts.append(current_part)
-                    current_part = paragraph
-                else:
-                    if current_part:
-                        current_part += '\n\n' + paragraph
-                    else:
-                        current_part = paragraph
-
-            # Добавляем последнюю часть
-            if current_part:
-                parts.append(current_part)
-
-            # Если разбиение по абзацам не помогло (очень длинные абзацы)
-            if not parts or (len(parts) == 1 and len(parts[0]) > max_length):
-                # Разбиваем принудительно по максимальной длине
-                parts = [text[i:i+max_length] for i in range(0, len(text), max_length)]
+            # Разбиваем текст на части по абзацам (длинные абзацы - по предложениям и словам)
+            parts = split_message(text, max_length, markdown=False)
 
             # Отправляем части последовательно
             for i, part in enumerate(parts):
@@ -207,91 +341,23 @@ class ConversationService:
 
     def _is_history_related(self, user_message, user_data):
         """Определяет, связано ли сообщение с историей России"""
-        # Расширенный список русскоязычных исторических ключевых слов
-        # Разделен на категории для более точного определения исторического контекста
-        history_keywords = {
-            # Общие исторические термины
-            'история', 'исторический', 'историческое', 'исторические', 'исторически',
-            'прошлое', 'эпоха', 'период', 'эра', 'век', 'столетие', 'летопись', 'хроника',
-
-            # Государственное устройство России
-            'россия', 'российская', 'российской', 'российского', 'российскую', 'русь', 
-            'киевская', 'московская', 'новгородская', 'владимирская', 'империя', 'ссср', 
-            'советский', 'советская', 'советское', 'федерация', 'рсфср', 'российской федерации',
-
-            # Правители и политические деятели
-            'царь', 'царица', 'княгиня', 'князь', 'император', 'императрица', 'правитель',
-            'государь', 'монарх', 'генсек', 'генеральный секретарь', 'президент', 'премьер',
-            'династия', 'престол', 'корона', 'трон', 'правление', 'царствование',
-
-            # Конкретные исторические личности
-            'рюрик', 'олег', 'игорь', 'ольга', 'святослав', 'владимир', 'ярослав', 
-            'иван', 'грозный', 'петр', 'екатерина', 'александр', 'николай', 'павел',
-            'ленин', 'сталин', 'хрущев', 'брежнев', 'горбачев', 'ельцин', 'путин',
-            'романов', 'романовы', 'рюриковичи', 'годунов', 'шуйский',
-
-            # Исторические события и процессы
-            'война', 'революция', 'восстание', 'бунт', 'переворот', 'реформа', 'перестройка',
-            'крепостное', 'крепостничество', 'раскол', 'смута', 'опричнина', 'оттепель', 'застой',
-            'коллективизация', 'индустриализация', 'приватизация', 'распад', 'образование',
-
-            # Конкретные войны и конфликты
-            'отечественная', 'крымская', 'кавказская', 'первая мировая', 'вторая мировая', 
-            'гражданская', 'великая отечественная', 'афганская', 'чеченская', 'холодная',
-
-            # Географические названия
-            'москва', 'петербург', 'ленинград', 'киев', 'новгород', 'псков', 'владимир', 
-            'суздаль', 'казань', 'крым', 'сибирь', 'поволжье', 'кавказ', 'урал', 
-            'кремль', 'красная площадь', 'зимний дворец',
-
-            # Социальные и экономические явления
-            'крестьяне', 'дворяне', 'бояре', 'казаки', 'купцы', 'духовенство', 'интеллигенция',
-            'помещики', 'крепостные', 'пролетариат', 'буржуазия', 'номенклатура', 'партия',
-            'коллективизация', 'индустриализация', 'пятилетка', 'нэп', 'приватизация',
-
-            # Сигнальные слова вопросов и запросов
-            'когда', 'почему', 'как', 'где', 'какой', 'какие', 'какая', 'кто', 'чем',
-            'что случилось', 'что произошло', 'расскажи', 'объясни', 'опиши'
-        }
-
-        # Проверка на слова-запросы исторической информации
-        history_question_markers = {
-            'расскажи', 'объясни', 'опиши', 'поведай', 'поясни',
-            'что такое', 'кто такой', 'кто такая', 'когда был', 'когда была',
-            'какие были', 'в каком году', 'при каком', 'какое значение'
-        }
-
-        # Нормализуем сообщение для анализа
-        message_lower = user_message.lower()
-        words = set(message_lower.split())
-
-        # Проверяем наличие исторических ключевых слов
-        is_history_related = bool(words.intersection(history_keywords))
-
-        # Если прямых ключевых слов нет, проверяем фразы
-        if not is_history_related:
-            for marker in history_question_markers:
-                if marker in message_lower:
-                    is_history_related = True
-                    break
-
-        # Проверка на наличие вопросительных знаков
-        has_question_mark = '?' in user_message
-
-        # Анализ предыдущих сообщений для создания контекста
-        previous_messages = user_data.get('conversation_history', [])[:-1]  # Все сообщения кроме текущего
-        previous_context = " ".join(previous_messages[-2:]) if previous_messages else ""
+        message_lower = normalize(user_message)
 
-        # Улучшенное определение - сообщение связано с историей, если:
-        # 1. Есть ключевые исторические слова
-        # 2. Есть вопросительный знак и некоторые базовые слова
-        # 3. Предыдущий контекст был историческим и это продолжение разговора
+        # Ключевые слова (с учетом словоформ) и фразы-запросы за один проход
+        if _HISTORY_RE.search(message_lower):
+            return True
 
-        if is_history_related or \
-           (has_question_mark and any(word in message_lower for word in ['кто', 'что', 'когда', 'где', 'почему', 'как'])) or \
-           (previous_context and any(kw in previous_context.lower() for kw in ['россия', 'история', 'царь', 'война'])):
+        # Вопросительный знак и базовые вопросительные слова
+        if '?' in user_message and _QUESTION_WORD_RE.search(message_lower):
             return True
 
+        # Предыдущий контекст был историческим и это продолжение разговора
+        previous_messages = user_data.get('conversation_history', [])[:-1]  # Все сообщения кроме текущего
+        if previous_messages:
+            previous_context = " ".join(previous_messages[-2:]).lower()
+            if _HISTORY_CONTEXT_RE.search(previous_context):
+                return True
+
         return False
 
     def _generate_historical_response(self, user_message, user_data):
@@ -315,19 +381,43 @@ class ConversationService:
         5. Если вопрос не связан с историей России, вежливо перенаправь на историческую тематику.
         """
 
+        # Самостоятельные вопросы ищем в семантическом кэше; вопросы-продолжения
+        # зависят от контекста беседы и всегда отправляются в API
+        use_answer_cache = self.answer_cache is not None and not (
+            previous_messages and self._depends_on_context(user_message)
+        )
+        cached = self.answer_cache.lookup(user_message) if use_answer_cache else None
+        if cached and not self.answer_cache.should_sample():
+            return self._enhance_historical_response(cached["answer"])
+
         # Используем оптимальные параметры для улучшения качества ответа
-        # Обратите внимание: метод ask_grok теперь не использует max_tokens и temp
+        # Параметры генерации ask_grok по умолчанию подходят для ответов в беседе
         try:
             response = self.api_client.ask_grok(prompt, use_cache=True)
         except Exception as e:
             self.logger.error(f"Ошибка при запросе к API: {e}")
             response = "Извините, не удалось получить ответ на ваш вопрос. Попробуйте переформулировать вопрос или задать другой."
+            use_answer_cache = False
+
+        if use_answer_cache and response:
+            if cached and self.answer_cache.record_sample(cached["answer"], response):
+                # Выборочная проверка показала, что кэш ответил не на тот вопрос
+                self.logger.warning(
+                    f"Ложное попадание семантического кэша: '{user_message}' ~ '{cached['question']}'"
+                )
+                self.answer_cache.invalidate(cached["question"])
+            self.answer_cache.store(user_message, response)
 
         # Постобработка ответа для улучшения читаемости
         response = self._enhance_historical_response(response)
 
         return response
 
+    def _depends_on_context(self, user_message):
+        """Проверяет, ссылается ли вопрос на предыдущие сообщения беседы"""
+        words = re.findall(r'\w+', user_message.lower())
+        return any(word in _CONTEXT_DEPENDENT_WORDS for word in words)
+
     def _get_default_response(self):
         """Возвращает стандартный ответ с подсказками по тематике"""
         return (
@@ -413,59 +503,11 @@ class ConversationService:
         if not text:
             return ""
 
-        # Приводим к нижнему регистру
-        text = text.lower()
-
-        # Словарь распространенных опечаток и альтернативных написаний
-        typo_corrections = {
-            'истори': 'история',
-            'росии': 'россии',
-            'руский': 'русский',
-            'путен': 'путин',
-            'сталин': 'сталин',
-            'ленен': 'ленин',
-            'ссср': 'ссср',
-            'петр': 'петр',
-            'екатерин': 'екатерина',
-            'революци': 'революция',
-            'война': 'война',
-            'красн': 'красный',
-            'совецк': 'советский',
-            'цар': 'царь',
-            'импер': 'император'
-        }
-
-        # Применяем коррекции для основы слова
-        words = text.split()
-        corrected_words = []
-
-        for word in words:
-            # Проверяем каждое слово на наличие опечаток
-            corrected = word
-            for typo, correction in typo_corrections.items():
-                if word.startswith(typo):
-                    corrected = correction + word[len(typo):]
-                    break
-
-            corrected_words.append(corrected)
-
-        # Собираем обратно в строку
-        normalized_text = ' '.join(corrected_words)
-
-        # Заменяем часто смешиваемые символы (латинские/кириллические)
-        char_replacements = {
-            'a': 'а',  # латинская -> кириллическая
-            'e': 'е',
-            'o': 'о',
-            'p': 'р',
-            'c': 'с',
-            'x': 'х',
-            'b': 'в',
-            'h': 'н',
-            'y': 'у'
-        }
-
-        for lat, cyr in char_replacements.items():
-            normalized_text = normalized_text.replace(lat, cyr)
-
-        return normalized_text
\ No newline at end of file
+        # Приводим к нижнему регистру и схлопываем пробелы
+        text = ' '.join(text.lower().split())
+
+        # Исправляем опечатки в основах слов
+        text = _TYPO_RE.sub(lambda match: _TYPO_CORRECTIONS[match.group(0)], text)
+
+        # Заменяем латинские символы, похожие на кириллические
+        return text.translate(_LATIN_TO_CYRILLIC)
@@ -13,12 +13,82 @@ import json
 import time
 import hashlib
 import threading
-from typing import Dict, Any, Optional, Union
+from collections import deque
+from typing import Dict, Any, Optional, Union, Iterable, List
 import os
+import uuid
 import redis
 import pickle
 
 from src.interfaces import ICache, ILogger
+from src.cache_invalidation import InvalidationTransport, RedisInvalidationTransport
+from src.cache_codec import CacheCodec
+
+# Признак неудачного обращения к Redis (None - допустимый результат команды)
+_REDIS_FAILED = object()
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для обращений к Redis.
+
+    Состояния:
+    - closed: запросы идут в Redis
+    - open: после серии ошибок запросы в Redis не отправляются,
+      восстановление проверяется фоновым потоком
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        """
+        Инициализация предохранителя.
+
+        Args:
+            failure_threshold (int): Количество ошибок подряд для размыкания
+            reset_timeout (float): Минимальное время в разомкнутом состоянии до повторной проверки (сек)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.open_count = 0
+        self.lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Проверяет, можно ли отправлять запрос в Redis"""
+        return self.state == self.CLOSED
+
+    def record_success(self) -> None:
+        """Регистрирует успешный запрос"""
+        with self.lock:
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self) -> bool:
+        """
+        Регистрирует ошибку запроса.
+
+        Returns:
+            bool: True если предохранитель только что разомкнулся
+        """
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self.open_count += 1
+                return True
+            if self.state == self.OPEN:
+                # Неудачная повторная проверка продлевает разомкнутое состояние
+                self.opened_at = time.time()
+            return False
+
+    def should_probe(self) -> bool:
+        """Проверяет, пора ли выполнить фоновую проверку восстановления Redis"""
+        return self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout
 
 class DistributedCache(ICache):
     """
@@ -28,10 +98,20 @@ class DistributedCache(ICache):
     - Поддержка Redis для распределенного хранения
     - Локальный кэш для быстрого доступа к часто используемым элементам
     - Автоматическое переключение на локальный режим при недоступности Redis
+      и фоновое восстановление через предохранитель (CircuitBreaker)
+    - Пакетные операции get_many/set_many за один сетевой запрос
+    - Чтение из локального кэша без блокировки
+    - Инвалидация локальных кэшей других процессов через pub/sub
     """
+
+    REDIS_PREFIX = "api_cache:"
     
     def __init__(self, logger: ILogger, redis_url: Optional[str] = None, 
-                 max_local_size: int = 1000, local_cache_file: str = 'local_cache.json'):
+                 max_local_size: int = 1000, local_cache_file: str = 'local_cache.json',
+                 redis_client=None, max_connections: int = 20, socket_timeout: float = 2.0,
+                 failure_threshold: int = 3, reset_timeout: float = 30.0, probe_interval: float = 5.0,
+                 local_ttl: Optional[int] = None, invalidation_transport: Optional[InvalidationTransport] = None,
+                 enable_invalidation: bool = True, codec: Optional[CacheCodec] = None):
         """
         Инициализация распределенного кэша.
         
@@ -40,15 +120,36 @@ class DistributedCache(ICache):
             redis_url (str, optional): URL подключения к Redis
             max_local_size (int): Максимальный размер локального кэша
             local_cache_file (str): Файл для локального кэша
+            redis_client (optional): Готовый клиент Redis (например, fakeredis в тестах)
+            max_connections (int): Размер пула соединений с Redis
+            socket_timeout (float): Таймаут сетевых операций Redis в секундах
+            failure_threshold (int): Количество ошибок подряд до отключения Redis
+            reset_timeout (float): Время до повторной проверки отключенного Redis в секундах
+            probe_interval (float): Интервал работы фонового потока проверки в секундах
+            local_ttl (int, optional): Время жизни в локальном кэше значений, полученных из Redis
+                (по умолчанию 5 минут, а при включенной инвалидации - 1 час)
+            invalidation_transport (InvalidationTransport, optional): Транспорт сообщений об инвалидации
+            enable_invalidation (bool): Создавать ли транспорт Redis pub/sub при подключении по URL
+            codec (CacheCodec, optional): Кодек сериализации и сжатия значений в Redis
         """
         self.logger = logger
         self.redis_url = redis_url
-        self.redis_client = None
-        self.using_redis = False
+        self.redis_client = redis_client
+        self.connection_pool = None
+        self.max_connections = max_connections
+        self.socket_timeout = socket_timeout
+        self.probe_interval = probe_interval
+        self.enable_invalidation = enable_invalidation
+        self.codec = codec or CacheCodec()
+        self.invalidation_transport = invalidation_transport
+        self.instance_id = uuid.uuid4().hex
+        self._invalidation_subscribed = False
+        self._local_ttl = local_ttl
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
         self.max_local_size = max_local_size
         self.local_cache_file = local_cache_file
         self.local_cache: Dict[str, Dict[str, Any]] = {}
-        self.lock = threading.RLock()  # Для потокобезопасности
+        self.lock = threading.RLock()  # Для потокобезопасности записи
         
         # Счетчики для статистики
         self.stats = {
@@ -59,40 +160,214 @@ class DistributedCache(ICache):
             "removes": 0,
             "clears": 0,
             "redis_errors": 0,
-            "redis_hits": 0
+            "redis_hits": 0,
+            "redis_ops": 0,
+            "redis_skipped": 0,
+            "batch_gets": 0,
+            "batch_sets": 0,
+            "invalidations_sent": 0,
+            "invalidations_received": 0,
+            "invalidated_keys": 0
         }
+        # Задержки последних обращений к Redis (мс) для расчета перцентилей
+        self.redis_latencies = deque(maxlen=1000)
         
         # Инициализация Redis и локального кэша
         self._init_redis()
         self._load_local_cache()
+
+        self._subscribe_invalidation()
         
-        # Запускаем фоновую очистку истекших элементов
+        # Запускаем фоновую очистку истекших элементов и проверку Redis
         self._start_cleanup_thread()
+
+    @property
+    def local_ttl(self) -> int:
+        """
+        Время жизни в локальном кэше значений, полученных из Redis.
+
+        При работающей инвалидации локальные копии можно хранить дольше:
+        устаревшие ключи удаляются сообщениями от других процессов.
+        """
+        if self._local_ttl is not None:
+            return self._local_ttl
+        return 3600 if self.invalidation_transport is not None else 300
+
+    @property
+    def using_redis(self) -> bool:
+        """Используется ли Redis в данный момент (клиент есть и предохранитель замкнут)"""
+        return self.redis_client is not None and self.breaker.allow_request()
     
     def _init_redis(self) -> None:
-        """Инициализирует подключение к Redis"""
+        """Инициализирует подключение к Redis через пул соединений"""
+        if self.redis_client is not None:
+            # Клиент передан извне, проверяем только доступность
+            self._probe_redis()
+            return
+
         if not self.redis_url:
             self.logger.info("URL Redis не указан, используется только локальный кэш")
-            self.using_redis = False
             return
         
         try:
-            self.redis_client = redis.from_url(self.redis_url)
+            self.connection_pool = redis.ConnectionPool.from_url(
+                self.redis_url,
+                max_connections=self.max_connections,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.socket_timeout
+            )
+            client = redis.Redis(connection_pool=self.connection_pool)
             # Проверка соединения
-            self.redis_client.ping()
-            self.using_redis = True
+            client.ping()
+            self.redis_client = client
+            self.breaker.record_success()
             self.logger.info("Успешное подключение к Redis")
+
+            if self.enable_invalidation and self.invalidation_transport is None:
+                self.invalidation_transport = RedisInvalidationTransport(client, self.logger)
         except Exception as e:
             self.logger.error(f"Ошибка подключения к Redis: {e}. Используется локальный кэш.")
-            self.using_redis = False
             self.redis_client = None
+            self.connection_pool = None
+
+    def _probe_redis(self) -> bool:
+        """
+        Проверяет доступность Redis и обновляет состояние предохранителя.
+
+        Returns:
+            bool: True если Redis отвечает
+        """
+        try:
+            self.redis_client.ping()
+        except Exception as e:
+            self.breaker.record_failure()
+            self.logger.debug(f"Redis по-прежнему недоступен: {e}")
+            return False
+
+        if self.breaker.state != CircuitBreaker.CLOSED:
+            self.logger.info("Соединение с Redis восстановлено")
+        self.breaker.record_success()
+        return True
+
+    def _redis_call(self, operation: str, func, *args, **kwargs) -> Any:
+        """
+        Выполняет обращение к Redis с учетом предохранителя и сбором статистики.
+
+        Args:
+            operation (str): Название операции для журнала
+            func (Callable): Метод клиента Redis
+            *args, **kwargs: Аргументы метода
+
+        Returns:
+            Any: Результат вызова или _REDIS_FAILED при ошибке или отключенном Redis
+        """
+        if not self.using_redis:
+            self.stats["redis_skipped"] += 1
+            return _REDIS_FAILED
+
+        start_time = time.time()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.stats["redis_errors"] += 1
+            self.redis_latencies.append((time.time() - start_time) * 1000)
+            self.stats["redis_ops"] += 1
+            if self.breaker.record_failure():
+                self.logger.warning(f"Redis отключен после серии ошибок ({operation}): {e}. "
+                                    f"Повторная проверка через {self.breaker.reset_timeout} с")
+            else:
+                self.logger.warning(f"Ошибка Redis при операции {operation}: {e}")
+            return _REDIS_FAILED
+
+        self.redis_latencies.append((time.time() - start_time) * 1000)
+        self.stats["redis_ops"] += 1
+        self.breaker.record_success()
+        return result
+
+    def _subscribe_invalidation(self) -> None:
+        """Подписывается на сообщения об инвалидации, если транспорт доступен"""
+        if self.invalidation_transport is not None and not self._invalidation_subscribed:
+            self.invalidation_transport.subscribe(self._handle_invalidation, self._handle_resubscribe)
+            self._invalidation_subscribed = True
+
+    def _publish_invalidation(self, operation: str, keys: Optional[List[str]] = None, topic: Optional[str] = None) -> None:
+        """
+        Рассылает другим процессам сообщение об инвалидации.
+
+        Args:
+            operation (str): Операция (set, remove, clear, clear_topic)
+            keys (List[str], optional): Затронутые ключи
+            topic (str, optional): Тема для операции clear_topic
+        """
+        if self.invalidation_transport is None:
+            return
+        message = {"origin": self.instance_id, "op": operation}
+        if keys is not None:
+            message["keys"] = keys
+        if topic is not None:
+            message["topic"] = topic
+        if self.invalidation_transport.publish(message):
+            self.stats["invalidations_sent"] += 1
+
+    def _handle_invalidation(self, message: Dict[str, Any]) -> None:
+        """
+        Обрабатывает сообщение об инвалидации от другого процесса.
+
+        Args:
+            message (Dict[str, Any]): Сообщение об инвалидации
+        """
+        if message.get("origin") == self.instance_id:
+            return
+
+        self.stats["invalidations_received"] += 1
+        operation = message.get("op")
+        with self.lock:
+            if operation == "clear":
+                removed = len(self.local_cache)
+                self.local_cache.clear()
+            elif operation == "clear_topic" and message.get("topic"):
+                removed = self._remove_local_by_topic(message["topic"])
+            else:
+                removed = 0
+                for key in message.get("keys") or []:
+                    if self.local_cache.pop(key, None) is not None:
+                        removed += 1
+
+            if removed:
+                self.stats["invalidated_keys"] += removed
+                self._save_local_cache()
+
+    def _handle_resubscribe(self) -> None:
+        """Сбрасывает локальный кэш после разрыва подписки: часть сообщений могла быть потеряна"""
+        with self.lock:
+            dropped = len(self.local_cache)
+            self.local_cache.clear()
+            self._save_local_cache()
+        self.logger.info(f"Подписка на инвалидацию восстановлена, сброшено {dropped} локальных записей")
+
+    def _serialize(self, value: Any) -> bytes:
+        """Сериализует (и при необходимости сжимает) значение для хранения в Redis"""
+        return self.codec.encode(value)
+
+    def _deserialize(self, data: bytes) -> Any:
+        """Десериализует значение из Redis (с поддержкой старого формата pickle)"""
+        if CacheCodec.is_encoded(data):
+            return self.codec.decode(data)
+
+        value = pickle.loads(data)
+        # Старый формат хранил словарь-обертку с метаданными; срок жизни теперь задает Redis
+        if isinstance(value, dict) and set(value.keys()) == {"value", "last_accessed", "created_at", "ttl"}:
+            if value["ttl"] and time.time() > value["created_at"] + value["ttl"]:
+                return None
+            return value["value"]
+        return value
     
     def get(self, key: str) -> Any:
         """
         Получение значения из кэша.
         
         Стратегия:
-        1. Сначала проверяем локальный кэш для быстрого доступа
+        1. Сначала проверяем локальный кэш для быстрого доступа (без блокировки)
         2. Если не найдено, и Redis доступен, проверяем в Redis
         
         Args:
@@ -101,50 +376,95 @@ class DistributedCache(ICache):
         Returns:
             Any: Значение из кэша или None, если ключ не найден или элемент истек
         """
-        with self.lock:
-            # Проверяем сначала локальный кэш
-            value = self._get_from_local(key)
+        # Проверяем сначала локальный кэш
+        value = self._get_from_local(key)
+        if value is not None:
+            return value
+        
+        # Если локальный кэш не содержит значение и Redis доступен
+        cached_data = self._redis_call("get", lambda: self.redis_client.get(self.REDIS_PREFIX + key))
+        if cached_data is not _REDIS_FAILED and cached_data:
+            value = self._decode_redis_value(key, cached_data)
             if value is not None:
+                with self.lock:
+                    self._save_local_cache()
                 return value
-            
-            # Если локальный кэш не содержит значение и Redis доступен
-            if self.using_redis and self.redis_client:
-                try:
-                    redis_key = f"api_cache:{key}"
-                    cached_data = self.redis_client.get(redis_key)
-                    
-                    if cached_data:
-                        # Десериализуем данные из Redis
-                        try:
-                            cache_item = pickle.loads(cached_data)
-                            # Проверяем TTL
-                            current_time = time.time()
-                            if "ttl" in cache_item and cache_item["ttl"] and current_time > cache_item["created_at"] + cache_item["ttl"]:
-                                # Элемент истек, удаляем его
-                                self.redis_client.delete(redis_key)
-                                self.stats["misses"] += 1
-                                return None
-                            
-                            # Обновляем статистику
-                            self.stats["hits"] += 1
-                            self.stats["redis_hits"] += 1
-                            
-                            # Добавляем в локальный кэш для ускорения будущих запросов
-                            value = cache_item["value"]
-                            self._add_to_local_cache(key, value, cache_item.get("ttl"))
-                            
-                            return value
-                        except Exception as e:
-                            self.logger.error(f"Ошибка десериализации данных из Redis: {e}")
-                except Exception as e:
-                    self.logger.warning(f"Ошибка при получении данных из Redis: {e}")
-                    self.stats["redis_errors"] += 1
-                    # Если Redis недоступен, переключаемся на локальный режим
-                    self.using_redis = False
-            
-            # Значение не найдено
-            self.stats["misses"] += 1
+        
+        # Значение не найдено
+        self.stats["misses"] += 1
+        return None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Получение нескольких значений из кэша за один запрос к Redis (MGET).
+
+        Args:
+            keys (Iterable[str]): Ключи для поиска
+
+        Returns:
+            Dict[str, Any]: Найденные значения (отсутствующие ключи не включаются)
+        """
+        result = {}
+        missing: List[str] = []
+        for key in keys:
+            value = self._get_from_local(key)
+            if value is not None:
+                result[key] = value
+            else:
+                missing.append(key)
+
+        if missing:
+            self.stats["batch_gets"] += 1
+            values = self._redis_call(
+                "mget", lambda: self.redis_client.mget([self.REDIS_PREFIX + key for key in missing])
+            )
+            if values is _REDIS_FAILED:
+                values = [None] * len(missing)
+
+            redis_hits = 0
+            for key, cached_data in zip(missing, values):
+                value = self._decode_redis_value(key, cached_data) if cached_data else None
+                if value is not None:
+                    result[key] = value
+                    redis_hits += 1
+                else:
+                    self.stats["misses"] += 1
+
+            # Локальный файл перезаписывается один раз на весь пакет
+            if redis_hits:
+                with self.lock:
+                    self._save_local_cache()
+
+        return result
+
+    def _decode_redis_value(self, key: str, cached_data: bytes) -> Any:
+        """
+        Декодирует значение из Redis и кладет его в локальный кэш без записи
+        файла: файл сохраняет вызывающий метод, один раз на запрос.
+
+        Args:
+            key (str): Ключ кэша
+            cached_data (bytes): Данные из Redis
+
+        Returns:
+            Any: Значение или None, если данные повреждены или устарели
+        """
+        try:
+            value = self._deserialize(cached_data)
+        except Exception as e:
+            self.logger.error(f"Ошибка десериализации данных из Redis: {e}")
+            return None
+        if value is None:
             return None
+
+        # Обновляем статистику
+        self.stats["hits"] += 1
+        self.stats["redis_hits"] += 1
+
+        # Добавляем в локальный кэш для ускорения будущих запросов
+        with self.lock:
+            self._add_to_local_cache(key, value, self.local_ttl, save=False)
+        return value
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """
@@ -160,36 +480,49 @@ class DistributedCache(ICache):
             ttl (int, optional): Время жизни элемента в секундах
         """
         with self.lock:
-            current_time = time.time()
-            cache_item = {
-                "value": value,
-                "last_accessed": current_time,
-                "created_at": current_time,
-                "ttl": ttl
-            }
-            
             # Сохраняем в локальный кэш
             self._add_to_local_cache(key, value, ttl)
-            
-            # Если Redis доступен, сохраняем также там
-            if self.using_redis and self.redis_client:
-                try:
-                    redis_key = f"api_cache:{key}"
-                    # Сериализуем данные для Redis
-                    serialized_data = pickle.dumps(cache_item)
-                    
-                    # Если указан TTL, устанавливаем его
-                    if ttl:
-                        self.redis_client.setex(redis_key, ttl, serialized_data)
-                    else:
-                        self.redis_client.set(redis_key, serialized_data)
-                except Exception as e:
-                    self.logger.warning(f"Ошибка при сохранении данных в Redis: {e}")
-                    self.stats["redis_errors"] += 1
-                    # Если Redis недоступен, переключаемся на локальный режим
-                    self.using_redis = False
-            
             self.stats["sets"] += 1
+        
+        # Если Redis доступен, сохраняем также там (срок жизни задает сам Redis)
+        if self.using_redis:
+            serialized_data = self._serialize(value)
+            redis_key = self.REDIS_PREFIX + key
+            self._redis_call(
+                "set", lambda: self.redis_client.set(redis_key, serialized_data, ex=int(ttl) if ttl else None)
+            )
+
+        # Локальные копии этого ключа в других процессах устарели
+        self._publish_invalidation("set", [key])
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        """
+        Установка нескольких значений за один запрос к Redis (pipeline).
+
+        Args:
+            items (Dict[str, Any]): Словарь ключ -> значение
+            ttl (int, optional): Время жизни элементов в секундах
+        """
+        if not items:
+            return
+
+        with self.lock:
+            for key, value in items.items():
+                self._add_to_local_cache(key, value, ttl, save=False)
+            self._save_local_cache()
+            self.stats["sets"] += len(items)
+            self.stats["batch_sets"] += 1
+
+        if self.using_redis:
+            def run_pipeline():
+                pipeline = self.redis_client.pipeline(transaction=False)
+                for key, value in items.items():
+                    pipeline.set(self.REDIS_PREFIX + key, self._serialize(value), ex=int(ttl) if ttl else None)
+                return pipeline.execute()
+
+            self._redis_call("pipeline set", run_pipeline)
+
+        self._publish_invalidation("set", list(items.keys()))
     
     def remove(self, key: str) -> bool:
         """
@@ -203,29 +536,21 @@ class DistributedCache(ICache):
         """
         with self.lock:
             removed_local = False
-            removed_redis = False
             
             # Удаляем из локального кэша
-            if key in self.local_cache:
-                del self.local_cache[key]
+            if self.local_cache.pop(key, None) is not None:
                 removed_local = True
                 self._save_local_cache()
-            
-            # Если Redis доступен, удаляем также оттуда
-            if self.using_redis and self.redis_client:
-                try:
-                    redis_key = f"api_cache:{key}"
-                    removed_redis = bool(self.redis_client.delete(redis_key))
-                except Exception as e:
-                    self.logger.warning(f"Ошибка при удалении данных из Redis: {e}")
-                    self.stats["redis_errors"] += 1
-                    # Если Redis недоступен, переключаемся на локальный режим
-                    self.using_redis = False
-            
-            if removed_local or removed_redis:
-                self.stats["removes"] += 1
-                return True
-            return False
+        
+        # Если Redis доступен, удаляем также оттуда
+        removed_redis = self._redis_call("delete", lambda: self.redis_client.delete(self.REDIS_PREFIX + key))
+        removed_redis = removed_redis is not _REDIS_FAILED and bool(removed_redis)
+        self._publish_invalidation("remove", [key])
+        
+        if removed_local or removed_redis:
+            self.stats["removes"] += 1
+            return True
+        return False
     
     def clear(self) -> None:
         """Очистка всего кэша"""
@@ -233,26 +558,29 @@ class DistributedCache(ICache):
             # Очищаем локальный кэш
             self.local_cache.clear()
             self._save_local_cache()
-            
-            # Если Redis доступен, очищаем также его
-            if self.using_redis and self.redis_client:
-                try:
-                    # Очищаем все ключи с префиксом "api_cache:"
-                    pattern = "api_cache:*"
-                    cursor = 0
-                    while True:
-                        cursor, keys = self.redis_client.scan(cursor, pattern, 100)
-                        if keys:
-                            self.redis_client.delete(*keys)
-                        if cursor == 0:
-                            break
-                except Exception as e:
-                    self.logger.warning(f"Ошибка при очистке данных из Redis: {e}")
-                    self.stats["redis_errors"] += 1
-                    # Если Redis недоступен, переключаемся на локальный режим
-                    self.using_redis = False
-            
-            self.stats["clears"] += 1
+        
+        # Если Redis доступен, очищаем также его (все ключи с префиксом "api_cache:")
+        self._redis_call("clear", self._delete_redis_keys)
+        self._publish_invalidation("clear")
+        self.stats["clears"] += 1
+
+    def _delete_redis_keys(self) -> int:
+        """
+        Удаляет из Redis все ключи кэша пакетами.
+
+        Returns:
+            int: Количество удаленных ключей
+        """
+        deleted = 0
+        batch = []
+        for redis_key in self.redis_client.scan_iter(match=f"{self.REDIS_PREFIX}*", count=500):
+            batch.append(redis_key)
+            if len(batch) >= 500:
+                deleted += self.redis_client.delete(*batch)
+                batch = []
+        if batch:
+            deleted += self.redis_client.delete(*batch)
+        return deleted
     
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -261,42 +589,50 @@ class DistributedCache(ICache):
         Returns:
             Dict[str, Any]: Статистика использования кэша
         """
-        with self.lock:
-            stats = self.stats.copy()
-            stats["size_local"] = len(self.local_cache)
-            stats["max_local_size"] = self.max_local_size
-            stats["using_redis"] = self.using_redis
-            
-            # Добавляем информацию о заполненности локального кэша
-            if self.max_local_size > 0:
-                stats["local_fill_percentage"] = (len(self.local_cache) / self.max_local_size) * 100
-            else:
-                stats["local_fill_percentage"] = 0
-            
-            # Если Redis доступен, добавляем информацию о нем
-            if self.using_redis and self.redis_client:
-                try:
-                    # Получаем количество ключей с префиксом "api_cache:"
-                    pattern = "api_cache:*"
-                    cursor = 0
-                    redis_count = 0
-                    while True:
-                        cursor, keys = self.redis_client.scan(cursor, pattern, 100)
-                        redis_count += len(keys)
-                        if cursor == 0:
-                            break
-                    
-                    stats["redis_size"] = redis_count
-                    stats["redis_info"] = {
-                        "memory_used": self.redis_client.info()["used_memory_human"],
-                        "total_connections": self.redis_client.info()["total_connections_received"],
-                        "uptime": self.redis_client.info()["uptime_in_seconds"]
-                    }
-                except Exception as e:
-                    self.logger.warning(f"Ошибка при получении статистики Redis: {e}")
-                    stats["redis_error"] = str(e)
-            
-            return stats
+        stats = self.stats.copy()
+        stats["size_local"] = len(self.local_cache)
+        stats["max_local_size"] = self.max_local_size
+        stats["using_redis"] = self.using_redis
+        stats["circuit_state"] = self.breaker.state
+        stats["circuit_open_count"] = self.breaker.open_count
+        stats["invalidation_enabled"] = self.invalidation_transport is not None
+        stats["local_ttl"] = self.local_ttl
+        stats["codec"] = self.codec.get_stats()
+        
+        # Добавляем информацию о заполненности локального кэша
+        if self.max_local_size > 0:
+            stats["local_fill_percentage"] = (len(self.local_cache) / self.max_local_size) * 100
+        else:
+            stats["local_fill_percentage"] = 0
+
+        # Задержки и доля ошибок обращений к Redis
+        latencies = sorted(self.redis_latencies)
+        if latencies:
+            stats["redis_latency_avg_ms"] = sum(latencies) / len(latencies)
+            stats["redis_latency_p95_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats["redis_latency_max_ms"] = latencies[-1]
+        stats["redis_error_rate"] = (
+            self.stats["redis_errors"] / self.stats["redis_ops"] if self.stats["redis_ops"] else 0
+        )
+        
+        # Если Redis доступен, добавляем информацию о нем
+        if self.using_redis:
+            try:
+                # Получаем количество ключей с префиксом "api_cache:"
+                stats["redis_size"] = sum(
+                    1 for _ in self.redis_client.scan_iter(match=f"{self.REDIS_PREFIX}*", count=500)
+                )
+                info = self.redis_client.info()
+                stats["redis_info"] = {
+                    "memory_used": info.get("used_memory_human"),
+                    "total_connections": info.get("total_connections_received"),
+                    "uptime": info.get("uptime_in_seconds")
+                }
+            except Exception as e:
+                self.logger.warning(f"Ошибка при получении статистики Redis: {e}")
+                stats["redis_error"] = str(e)
+        
+        return stats
     
     def clear_cache(self, topic_filter=None):
         """
@@ -314,17 +650,7 @@ class DistributedCache(ICache):
             # Очищаем локальный кэш
             if topic_filter:
                 # Фильтруем по теме
-                keys_to_delete = []
-                for key, item in self.local_cache.items():
-                    # Проверяем наличие темы в значении
-                    value_str = str(item.get("value", "")).lower()
-                    if topic_filter.lower() in value_str:
-                        keys_to_delete.append(key)
-                
-                # Удаляем найденные ключи
-                for key in keys_to_delete:
-                    del self.local_cache[key]
-                    count += 1
+                count = self._remove_local_by_topic(topic_filter)
             else:
                 # Очищаем весь кэш
                 count = len(self.local_cache)
@@ -333,56 +659,71 @@ class DistributedCache(ICache):
             # Сохраняем локальный кэш
             self._save_local_cache()
             
-            # Если Redis доступен, очищаем также его
-            if self.using_redis and self.redis_client:
-                try:
-                    if topic_filter:
-                        # Для Redis нам нужно будет проверить каждый ключ
-                        pattern = "api_cache:*"
-                        cursor = 0
-                        redis_count = 0
-                        
-                        while True:
-                            cursor, keys = self.redis_client.scan(cursor, pattern, 100)
-                            
-                            for key in keys:
-                                try:
-                                    # Получаем значение и проверяем его содержимое
-                                    cached_data = self.redis_client.get(key)
-                                    if cached_data:
-                                        cache_item = pickle.loads(cached_data)
-                                        value_str = str(cache_item.get("value", "")).lower()
-                                        
-                                        if topic_filter.lower() in value_str:
-                                            self.redis_client.delete(key)
-                                            redis_count += 1
-                                except Exception as e:
-                                    self.logger.debug(f"Ошибка при проверке ключа Redis {key}: {e}")
-                            
-                            if cursor == 0:
-                                break
-                        
-                        count += redis_count
-                    else:
-                        # Очищаем все ключи с префиксом "api_cache:"
-                        pattern = "api_cache:*"
-                        keys = self.redis_client.keys(pattern)
-                        if keys:
-                            count_redis = len(keys)
-                            self.redis_client.delete(*keys)
-                            count += count_redis
-                except Exception as e:
-                    self.logger.warning(f"Ошибка при очистке данных из Redis: {e}")
-                    self.stats["redis_errors"] += 1
-                    # Если Redis недоступен, переключаемся на локальный режим
-                    self.using_redis = False
-            
-            self.logger.info(f"Очищено {count} записей из кэша API запросов")
-            return count
+        # Если Redis доступен, очищаем также его
+        if topic_filter:
+            redis_count = self._redis_call("clear by topic", self._delete_redis_keys_by_topic, topic_filter)
+        else:
+            redis_count = self._redis_call("clear", self._delete_redis_keys)
+        if redis_count is not _REDIS_FAILED:
+            count += redis_count
+
+        if topic_filter:
+            self._publish_invalidation("clear_topic", topic=topic_filter)
+        else:
+            self._publish_invalidation("clear")
+
+        self.logger.info(f"Очищено {count} записей из кэша API запросов")
+        return count
     
+    def _remove_local_by_topic(self, topic_filter: str) -> int:
+        """
+        Удаляет из локального кэша записи, значения которых относятся к теме.
+
+        Args:
+            topic_filter (str): Тема для фильтрации
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        topic_lower = topic_filter.lower()
+        keys_to_delete = [
+            key for key, item in list(self.local_cache.items())
+            if topic_lower in str(item.get("value", "")).lower()
+        ]
+
+        count = 0
+        for key in keys_to_delete:
+            if self.local_cache.pop(key, None) is not None:
+                count += 1
+        return count
+
+    def _delete_redis_keys_by_topic(self, topic_filter: str) -> int:
+        """
+        Удаляет из Redis ключи, значения которых относятся к теме.
+
+        Args:
+            topic_filter (str): Тема для фильтрации
+
+        Returns:
+            int: Количество удаленных ключей
+        """
+        deleted = 0
+        topic_lower = topic_filter.lower()
+        for redis_key in self.redis_client.scan_iter(match=f"{self.REDIS_PREFIX}*", count=500):
+            try:
+                cached_data = self.redis_client.get(redis_key)
+                if cached_data and topic_lower in str(self._deserialize(cached_data)).lower():
+                    deleted += self.redis_client.delete(redis_key)
+            except Exception as e:
+                self.logger.debug(f"Ошибка при проверке ключа Redis {redis_key}: {e}")
+        return deleted
+
     def _get_from_local(self, key: str) -> Any:
         """
         Получает значение из локального кэша.
+
+        Вызывается без блокировки: операции со словарем атомарны под GIL,
+        а гонка при обновлении last_accessed безвредна для LRU.
         
         Args:
             key (str): Ключ для поиска
@@ -390,16 +731,16 @@ class DistributedCache(ICache):
         Returns:
             Any: Значение или None, если не найдено или истекло
         """
-        if key not in self.local_cache:
+        cache_item = self.local_cache.get(key)
+        if cache_item is None:
             return None
         
-        cache_item = self.local_cache[key]
         current_time = time.time()
         
         # Проверяем TTL
-        if "ttl" in cache_item and cache_item["ttl"] and current_time > cache_item["created_at"] + cache_item["ttl"]:
+        if cache_item.get("ttl") and current_time > cache_item["created_at"] + cache_item["ttl"]:
             # Элемент истек, удаляем его
-            del self.local_cache[key]
+            self.local_cache.pop(key, None)
             return None
         
         # Обновляем время последнего доступа
@@ -410,14 +751,15 @@ class DistributedCache(ICache):
         
         return cache_item["value"]
     
-    def _add_to_local_cache(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+    def _add_to_local_cache(self, key: str, value: Any, ttl: Optional[int] = None, save: bool = True) -> None:
         """
-        Добавляет значение в локальный кэш.
+        Добавляет значение в локальный кэш. Вызывается под блокировкой.
         
         Args:
             key (str): Ключ для сохранения
             value (Any): Значение для сохранения
             ttl (int, optional): Время жизни элемента в секундах
+            save (bool): Сохранить ли локальный кэш в файл сразу
         """
         current_time = time.time()
         
@@ -425,7 +767,7 @@ class DistributedCache(ICache):
         if len(self.local_cache) >= self.max_local_size and key not in self.local_cache:
             self._evict_lru()
         
-        # Добавляем элемент в кэш
+        # Добавляем элемент в кэш (новый словарь, чтобы читатели не видели частично заполненную запись)
         self.local_cache[key] = {
             "value": value,
             "last_accessed": current_time,
@@ -434,25 +776,30 @@ class DistributedCache(ICache):
         }
         
         # Сохраняем локальный кэш
-        self._save_local_cache()
+        if save:
+            self._save_local_cache()
     
     def _evict_lru(self) -> None:
         """Удаляет наименее недавно использованный элемент из локального кэша"""
-        if not self.local_cache:
+        # Снимок записей: читатели без блокировки могут удалять истекшие элементы
+        items = list(self.local_cache.items())
+        if not items:
             return
         
         # Находим ключ с наименьшим временем последнего доступа
-        lru_key = min(self.local_cache.keys(), key=lambda k: self.local_cache[k]["last_accessed"])
+        lru_key = min(items, key=lambda item: item[1]["last_accessed"])[0]
         
         # Удаляем элемент
-        del self.local_cache[lru_key]
-        self.stats["evictions"] += 1
+        if self.local_cache.pop(lru_key, None) is not None:
+            self.stats["evictions"] += 1
     
     def _save_local_cache(self) -> None:
         """Сохраняет локальный кэш в файл"""
         try:
+            # Копия словаря создается атомарно и защищает от изменений во время записи
+            snapshot = dict(self.local_cache)
             with open(self.local_cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.local_cache, f, ensure_ascii=False, indent=2)
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
         except Exception as e:
             self.logger.error(f"Ошибка при сохранении локального кэша в файл: {e}")
     
@@ -475,30 +822,37 @@ class DistributedCache(ICache):
         with self.lock:
             current_time = time.time()
             expired_keys = [
-                key for key, item in self.local_cache.items()
-                if "ttl" in item and item["ttl"] and current_time > item["created_at"] + item["ttl"]
+                key for key, item in list(self.local_cache.items())
+                if item.get("ttl") and current_time > item["created_at"] + item["ttl"]
             ]
             
             # Удаляем истекшие элементы
             for key in expired_keys:
-                del self.local_cache[key]
+                self.local_cache.pop(key, None)
             
             if expired_keys:
                 self.logger.debug(f"Очищено {len(expired_keys)} истекших элементов локального кэша")
                 self._save_local_cache()
     
     def _start_cleanup_thread(self) -> None:
-        """Запускает фоновый поток для очистки истекших элементов"""
+        """Запускает фоновый поток очистки истекших элементов и проверки восстановления Redis"""
         def cleanup_job():
+            last_cleanup = time.time()
             while True:
                 try:
-                    # Очищаем истекшие элементы каждый час
-                    time.sleep(3600)
-                    self._clean_expired_items()
-                    
+                    time.sleep(self.probe_interval)
+
                     # Пробуем восстановить соединение с Redis, если оно было потеряно
-                    if self.redis_url and not self.using_redis:
+                    if self.redis_client is None and self.redis_url:
                         self._init_redis()
+                        self._subscribe_invalidation()
+                    elif self.redis_client is not None and self.breaker.should_probe():
+                        self._probe_redis()
+
+                    # Очищаем истекшие элементы каждый час
+                    if time.time() - last_cleanup >= 3600:
+                        self._clean_expired_items()
+                        last_cleanup = time.time()
                 except Exception as e:
                     self.logger.error(f"Ошибка в фоновой очистке кэша: {e}")
         
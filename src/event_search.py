@@ -0,0 +1,178 @@
+"""
+Поисковый индекс по историческим событиям.
+
+Индекс строится один раз при загрузке historical_events.json и
+сопоставляет основы слов (см. src/russian_text.py) идентификаторам
+событий с учетом поля, в котором встретилось слово. Слова запроса,
+которых нет в словаре индекса (опечатки, редкие словоформы),
+сопоставляются с похожими словами словаря по триграммам.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.russian_text import tokenize
+
+# Вес совпадения в зависимости от поля события
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "topic": 2.0,
+    "description": 1.0,
+}
+
+
+def _trigrams(term: str) -> Set[str]:
+    """Возвращает множество триграмм слова с границами"""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EventSearchIndex:
+    """
+    Инвертированный индекс событий: основа слова -> {id события: вес}.
+
+    Поддерживает ранжированный поиск (search) и поиск события, название
+    которого целиком содержится в запросе (find_topic).
+    """
+
+    def __init__(self, events: Iterable[Dict[str, Any]] = (), fuzzy_threshold: float = 0.4):
+        """
+        Инициализация индекса.
+
+        Args:
+            events: События в формате historical_events.json
+            fuzzy_threshold (float): Минимальное сходство триграмм для нечеткого совпадения
+        """
+        self.fuzzy_threshold = fuzzy_threshold
+        self.lock = threading.RLock()
+        self.events: List[Dict[str, Any]] = []
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._title_stems: List[Set[str]] = []
+        self._trigram_index: Dict[str, Set[str]] = defaultdict(set)
+        self._fuzzy_cache: Dict[str, List[Tuple[str, float]]] = {}
+        for event in events:
+            self.add_event(event)
+
+    @staticmethod
+    def event_title(event: Dict[str, Any]) -> str:
+        """
+        Возвращает название события.
+
+        В historical_events.json название хранится в поле "title", а события,
+        сохраненные ContentService, исторически используют поле "name".
+        """
+        return event.get("title") or event.get("name") or ""
+
+    def add_event(self, event: Dict[str, Any]) -> int:
+        """
+        Добавляет событие в индекс.
+
+        Args:
+            event (Dict[str, Any]): Событие
+
+        Returns:
+            int: Внутренний идентификатор события
+        """
+        fields = {
+            "title": self.event_title(event),
+            "topic": " ".join(str(event.get(key, "")) for key in ("topic", "category")),
+            "description": event.get("description", "") if isinstance(event.get("description"), str) else "",
+        }
+        with self.lock:
+            event_id = len(self.events)
+            self.events.append(event)
+            title_stems = set(tokenize(fields["title"]))
+            self._title_stems.append(title_stems)
+            for field, text in fields.items():
+                weight = FIELD_WEIGHTS[field]
+                for term in set(tokenize(text)):
+                    if term not in self._postings:
+                        # Новое слово словаря: добавляем в триграммный индекс
+                        for trigram in _trigrams(term):
+                            self._trigram_index[trigram].add(term)
+                    postings = self._postings[term]
+                    if postings.get(event_id, 0.0) < weight:
+                        postings[event_id] = weight
+            self._fuzzy_cache.clear()
+        return event_id
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """
+        Возвращает слова словаря, соответствующие слову запроса, с коэффициентом сходства.
+
+        Args:
+            term (str): Основа слова запроса
+
+        Returns:
+            List[Tuple[str, float]]: Пары (слово словаря, сходство)
+        """
+        if term in self._postings:
+            return [(term, 1.0)]
+        cached = self._fuzzy_cache.get(term)
+        if cached is not None:
+            return cached
+
+        query_trigrams = _trigrams(term)
+        shared = defaultdict(int)
+        for trigram in query_trigrams:
+            for candidate in self._trigram_index.get(trigram, ()):
+                shared[candidate] += 1
+
+        matches = []
+        for candidate, count in shared.items():
+            similarity = count / (len(query_trigrams) + len(_trigrams(candidate)) - count)
+            if similarity >= self.fuzzy_threshold:
+                matches.append((candidate, similarity))
+        matches.sort(key=lambda item: item[1], reverse=True)
+        self._fuzzy_cache[term] = matches[:3]
+        return self._fuzzy_cache[term]
+
+    def search(self, query: str, limit: Optional[int] = 5) -> List[Dict[str, Any]]:
+        """
+        Ищет события по запросу.
+
+        Args:
+            query (str): Текст запроса
+            limit (int, optional): Максимальное количество результатов (None - все)
+
+        Returns:
+            List[Dict[str, Any]]: Результаты {'event', 'score', 'title_coverage'} по убыванию score
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        matched_titles: Dict[int, Set[str]] = defaultdict(set)
+        with self.lock:
+            for term in set(tokenize(query)):
+                for vocabulary_term, similarity in self._expand(term):
+                    for event_id, weight in self._postings[vocabulary_term].items():
+                        scores[event_id] += weight * similarity
+                        if vocabulary_term in self._title_stems[event_id]:
+                            matched_titles[event_id].add(vocabulary_term)
+
+            results = []
+            for event_id, score in scores.items():
+                title_stems = self._title_stems[event_id]
+                coverage = len(matched_titles[event_id]) / len(title_stems) if title_stems else 0.0
+                results.append({"event": self.events[event_id], "score": score, "title_coverage": coverage})
+
+        results.sort(key=lambda item: (item["score"], item["title_coverage"]), reverse=True)
+        return results if limit is None else results[:limit]
+
+    def find_topic(self, query: str, min_coverage: float = 1.0) -> Optional[Dict[str, Any]]:
+        """
+        Ищет событие, название которого содержится в запросе.
+
+        Args:
+            query (str): Текст запроса (тема)
+            min_coverage (float): Доля слов названия, которые должны найтись в запросе
+
+        Returns:
+            Optional[Dict[str, Any]]: Событие или None
+        """
+        for result in self.search(query, limit=None):
+            if result["title_coverage"] >= min_coverage:
+                return result["event"]
+        return None
+
+    def __len__(self) -> int:
+        return len(self.events)
@@ -1,5 +1,8 @@
 """Фабрика для создания компонентов бота"""
 
+import atexit
+import json
+import os
 from typing import Dict, Any
 
 from src.api_client import APIClient
@@ -16,6 +19,7 @@ from src.analytics import AnalyticsService
 from src.web_server import WebServer
 from src.test_service import TestService
 from src.topic_service import TopicService
+from src.retry_budget import RetryBudget
 from src.conversation_service import ConversationService #Added import
 from src.text_cache_service import TextCacheService
 from src.data_migration import DataMigration # Added import
@@ -30,15 +34,177 @@ class BotFactory:
     def __init__(self, logger):
         self.logger = logger
 
-    def create_api_cache(self):
-        """Создание кэша для API запросов"""
+    def create_cache_codec(self, config):
+        """Создание кодека сжатия для кэшей"""
+        from src.cache_codec import CacheCodec
+        return CacheCodec(
+            compression=getattr(config, 'cache_compression', 'zlib'),
+            threshold=getattr(config, 'cache_compression_threshold', 1024)
+        )
+
+    def create_answer_cache(self, config):
+        """Создание семантического кэша ответов для режима беседы"""
+        if not getattr(config, 'enable_semantic_cache', False):
+            return None
+        from src.semantic_cache import SemanticAnswerCache
+        return SemanticAnswerCache(
+            self.logger,
+            threshold=getattr(config, 'semantic_cache_threshold', 0.8),
+            sample_rate=getattr(config, 'semantic_cache_sample_rate', 0.02)
+        )
+
+    def create_topic_classifier(self, config):
+        """Создание локального классификатора исторических тем"""
+        from src.topic_classifier import TopicRelevanceClassifier
+        classifier = TopicRelevanceClassifier(
+            self.logger,
+            model_file=getattr(config, 'topic_classifier_file', 'topic_classifier.json'),
+            query_log_file=getattr(config, 'topic_queries_log', 'topic_queries.jsonl')
+        )
+        events_data = {}
+        if os.path.exists('historical_events.json'):
+            with open('historical_events.json', 'r', encoding='utf-8') as f:
+                events_data = json.load(f)
+        classifier.load_or_train(events_data, ContentService.DEFAULT_TOPICS)
+        return classifier
+
+    def create_topic_catalogue(self, config):
+        """Создание каталога тем для страниц «Больше тем»"""
+        from src.topic_catalogue import TopicCatalogue
+        catalogue = TopicCatalogue(self.logger, catalogue_file=getattr(config, 'topic_catalogue_file', 'topic_catalogue.json'))
+        events_data = {}
+        if os.path.exists('historical_events.json'):
+            with open('historical_events.json', 'r', encoding='utf-8') as f:
+                events_data = json.load(f)
+        catalogue.seed(events_data, ContentService.DEFAULT_TOPICS)
+        # Отметки о показанных темах сохраняются с задержкой, дописываем их при выходе
+        atexit.register(catalogue.flush)
+        return catalogue
+
+    def create_prefetcher(self, config, topic_service, test_service, api_client, text_cache_service):
+        """Создание упреждающей подготовки теста и рекомендованных тем"""
+        if not getattr(config, 'enable_prefetch', False):
+            return None
+        from src.prefetcher import TopicPrefetcher
+        return TopicPrefetcher(
+            self.logger, topic_service, test_service, api_client, text_cache_service,
+            # Очередь задач создается после бота и регистрируется в конфигурации
+            task_queue_getter=config.get_task_queue,
+            budget_per_hour=getattr(config, 'prefetch_budget_per_hour', 40),
+            recommended_topics=getattr(config, 'prefetch_topics', 2)
+        )
+
+    def create_gemini_replay(self, config):
+        """Создание кассеты запросов к Gemini (запись или воспроизведение)"""
+        mode = getattr(config, 'gemini_replay_mode', '')
+        if not mode:
+            return None
+        from src.gemini_replay import GeminiReplay
+        replay = GeminiReplay(
+            getattr(config, 'gemini_cassette_file', 'cassettes/gemini.json'),
+            mode=mode,
+            latency=getattr(config, 'gemini_replay_latency', 'recorded'),
+            quota_error_rate=getattr(config, 'gemini_replay_quota_error_rate', 0.0),
+            rate_error_rate=getattr(config, 'gemini_replay_rate_error_rate', 0.0),
+            on_miss=getattr(config, 'gemini_replay_on_miss', 'error')
+        )
+        self.logger.info(f"Кассета Gemini {replay.cassette_file}: режим {mode}, {len(replay)} записей")
+        return replay
+
+    def create_tracer(self, config):
+        """Настройка общего трассировщика обработки обновлений"""
+        from src.tracing import tracer
+        tracer.configure(
+            enabled=getattr(config, 'enable_tracing', False),
+            export_file=getattr(config, 'trace_file', '') or None,
+            logger=self.logger,
+            max_file_mb=getattr(config, 'trace_file_max_mb', 50.0)
+        )
+        # Спаны записываются в файл пакетами, дописываем последние при выходе
+        atexit.register(tracer.flush)
+        return tracer
+
+    def create_performance_monitor(self, config):
+        """Создание монитора производительности (память процесса и замеры времени)"""
+        if not getattr(config, 'enable_performance_monitoring', False):
+            return None
+        from src.performance_monitor import PerformanceMonitor
+        return PerformanceMonitor(self.logger, metrics_file=getattr(config, 'metrics_file', 'performance_metrics.json'))
+
+    def register_metrics(self, api_client, api_cache, text_cache_service, message_manager, topic_service,
+                         answer_cache=None, prefetcher=None, performance_monitor=None):
+        """Регистрация статистики компонентов в общем реестре метрик (маршрут /metrics)"""
+        from src.metrics import registry
+        registry.logger = self.logger
+        registry.register_stats(
+            'bot_api_cache', api_cache.get_stats, "Кэш API",
+            counters=('hits', 'misses', 'sets', 'evictions', 'removes', 'clears'),
+            gauges=('size', 'max_size'))
+        registry.register_stats(
+            'bot_text_cache', text_cache_service.get_stats, "Кэш текстов",
+            counters=('hits', 'misses', 'sets', 'evictions', 'expired', 'flushes'),
+            gauges=('size', 'size_bytes', 'pending_writes'))
+        registry.register_stats(
+            'bot_gemini_request_cache',
+            lambda: {'hits': api_client.cache_hits, 'misses': api_client.cache_misses,
+                     'size': len(api_client.request_cache)},
+            "Кэш ответов Gemini в APIClient",
+            counters=('hits', 'misses'), gauges=('size',))
+        registry.register_stats(
+            'bot_telegram_queue', message_manager.request_queue.get_stats, "Очередь запросов к Telegram",
+            counters=('cache_hits',), gauges=('pending', 'cache_size'))
+        registry.register_collector('bot_topic_chapters', topic_service.collect_metrics)
+        registry.register_stats(
+            'bot_chapter_retry_budget', topic_service.retry_budget.get_stats, "Бюджет повторов глав",
+            counters=('granted', 'denied'), gauges=('capacity', 'available'))
+        if answer_cache is not None:
+            registry.register_stats(
+                'bot_semantic_cache', answer_cache.get_stats, "Семантический кэш ответов",
+                counters=('lookups', 'hits', 'exact_hits', 'misses'), gauges=('entries',))
+        if prefetcher is not None:
+            registry.register_stats(
+                'bot_prefetch', prefetcher.get_stats, "Упреждающая подготовка",
+                counters=('scheduled', 'prefetched', 'already_cached', 'failed', 'dropped', 'expired',
+                          'over_budget', 'api_calls', 'hits', 'misses'),
+                gauges=('pending', 'unused', 'budget_used'))
+        if api_client.replay is not None:
+            registry.register_stats(
+                'bot_gemini_replay', api_client.replay.get_stats, "Кассета Gemini",
+                counters=('calls', 'hits', 'misses', 'recorded', 'injected_errors'), gauges=('interactions',))
+        if performance_monitor is not None:
+            registry.register_collector('bot_performance_monitor', performance_monitor.collect_metrics)
+        return registry
+
+    def start_metrics_publisher(self, config, shared_state):
+        """Запуск записи снимков метрик процесса-обработчика для /metrics процесса-приемника"""
+        from src.metrics import MetricsPublisher, registry
+        source = str(getattr(config, 'worker_index', os.getpid()))
+        publisher = MetricsPublisher(registry, shared_state, source,
+                                     interval=getattr(config, 'metrics_push_interval', 15.0), logger=self.logger)
+        publisher.start()
+        atexit.register(publisher.stop)
+        return publisher
+
+    def create_api_cache(self, codec=None, config=None):
+        """Создание кэша для API запросов (распределенного, если включен USE_DISTRIBUTED_CACHE)"""
+        if config is not None and getattr(config, 'use_distributed_cache', False) and getattr(config, 'redis_url', ''):
+            try:
+                from src.distributed_cache import DistributedCache
+                distributed_cache = DistributedCache(self.logger, redis_url=config.redis_url)
+                self.logger.info("Инициализирован распределенный кэш")
+                return distributed_cache
+            except ImportError:
+                self.logger.warning("Модуль распределенного кэша не установлен, используется локальный кэш")
         from src.api_cache import APICache
-        return APICache(self.logger, max_size=1000, cache_file='api_cache.json')
+        return APICache(self.logger, max_size=1000, cache_file='api_cache.json', codec=codec)
 
-    def create_text_cache_service(self):
+    def create_text_cache_service(self, codec=None):
         """Создание сервиса кэширования текстов"""
         from src.text_cache_service import TextCacheService
-        return TextCacheService(self.logger, cache_file='texts_cache.json', ttl=604800)  # TTL = 7 дней
+        text_cache = TextCacheService(self.logger, cache_dir='texts_cache', ttl=604800, codec=codec)  # TTL = 7 дней
+        # Изменения записываются пакетами в фоне, дописываем последние при выходе
+        atexit.register(text_cache.flush)
+        return text_cache
 
     @staticmethod
     def create_bot(config):
@@ -64,15 +230,27 @@ class BotFactory:
 
         # Создаем и регистрируем все сервисы
 
+        # Трассировка этапов обработки обновлений
+        factory.create_tracer(config)
+
         # Кэш для API
-        api_cache = factory.create_api_cache()
+        cache_codec = factory.create_cache_codec(config)
+        api_cache = factory.create_api_cache(cache_codec, config)
 
         # API-клиент
-        api_client = APIClient(config.gemini_api_key, api_cache, logger)
+        api_client = APIClient(config.gemini_api_key, api_cache, logger, replay=factory.create_gemini_replay(config))
         container.register("api_client", api_client)
 
+        # Общее хранилище состояния нужно только в многопроцессном режиме
+        shared_state = None
+        if getattr(config, 'bot_workers', 1) > 1:
+            from src.shared_state import create_state_backend
+            # Бэкенд Redis использует соединение распределенного кэша, а не открывает второе
+            distributed_cache = api_cache if getattr(api_cache, 'redis_client', None) is not None else None
+            shared_state = create_state_backend(config, logger, distributed_cache=distributed_cache)
+
         # Менеджер состояний
-        state_manager = StateManager(logger)
+        state_manager = StateManager(logger, shared_state=shared_state)
         container.register("state_manager", state_manager)
 
         # Менеджер сообщений
@@ -80,14 +258,17 @@ class BotFactory:
         container.register("message_manager", message_manager)
 
         # Сервис для кэширования текстов
-        text_cache_service = factory.create_text_cache_service()
+        text_cache_service = factory.create_text_cache_service(cache_codec)
         container.register("text_cache_service", text_cache_service)
 
         # Сервисы для тестов и тем
-        test_service = TestService(api_client, logger)
+        test_service = TestService(api_client, logger, shared_state=shared_state)
         container.register("test_service", test_service)
 
-        topic_service = TopicService(api_client, logger)
+        retry_budget = RetryBudget(getattr(config, 'chapter_retry_budget', 10),
+                                   getattr(config, 'chapter_retry_refill_per_minute', 2.0))
+        topic_service = TopicService(api_client, logger, topic_catalogue=factory.create_topic_catalogue(config),
+                                     retry_budget=retry_budget)
         container.register("topic_service", topic_service)
 
         # UI-менеджер
@@ -95,13 +276,20 @@ class BotFactory:
         container.register("ui_manager", ui_manager)
 
         # Сервис контента
-        content_service = ContentService(api_client, logger, 'historical_events.json', text_cache_service)
+        topic_classifier = factory.create_topic_classifier(config)
+        content_service = ContentService(api_client, logger, 'historical_events.json', text_cache_service,
+                                         topic_classifier=topic_classifier)
         container.register("content_service", content_service)
 
         # Аналитический сервис
         analytics_service = AnalyticsService(logger)
         container.register("analytics_service", analytics_service)
 
+        # Монитор производительности
+        performance_monitor = factory.create_performance_monitor(config)
+        if performance_monitor:
+            container.register("performance_monitor", performance_monitor)
+
         # Админ-панель
         admin_panel = AdminPanel(logger, config)
 
@@ -112,10 +300,21 @@ class BotFactory:
             message_manager=message_manager,
             content_service=content_service,
             logger=logger,
-            config=config
+            config=config,
+            test_service=test_service,
+            topic_service=topic_service,
+            answer_cache=factory.create_answer_cache(config),
+            prefetcher=factory.create_prefetcher(config, topic_service, test_service, api_client, text_cache_service)
         )
         command_handlers.admin_panel = admin_panel
 
+        # Метрики компонентов для маршрута /metrics веб-сервера
+        factory.register_metrics(api_client, api_cache, text_cache_service, message_manager, topic_service,
+                                 answer_cache=command_handlers.answer_cache, prefetcher=command_handlers.prefetcher,
+                                 performance_monitor=performance_monitor)
+        if shared_state is not None:
+            factory.start_metrics_publisher(config, shared_state)
+
         # Веб-сервер
         web_server = WebServer(
             logger=logger,
@@ -132,6 +331,14 @@ class BotFactory:
         logger.info("Инициализация всех сервисов...")
         container.initialize_all()
 
+        # Хранилище состояний диалогов для ConversationHandler
+        persistence = None
+        if getattr(config, 'enable_persistence', False):
+            from src.bot_persistence import BotPersistence
+            from src.shared_state import SQLiteStateBackend
+            persistence_backend = shared_state or SQLiteStateBackend(logger, config.persistence_file)
+            persistence = BotPersistence(persistence_backend, logger, flush_interval=config.persistence_flush_interval)
+
         # Создаем бота
         bot = Bot(
             config=config,
@@ -141,7 +348,8 @@ class BotFactory:
             topic_service=topic_service,
             api_client=api_client,
             analytics=analytics_service,
-            text_cache_service=text_cache_service
+            text_cache_service=text_cache_service,
+            persistence=persistence
         )
 
         # Сохраняем ссылку на контейнер сервисов в боте
@@ -0,0 +1,385 @@
+"""
+Запись и воспроизведение запросов к Gemini (record/replay).
+
+Модель Gemini оборачивается объектом ReplayModel с тем же интерфейсом
+(generate_content и start_chat(...).send_message), поэтому APIClient,
+TopicService, TestService и генератор базы событий работают без
+изменений:
+
+- в режиме record запрос выполняется настоящей моделью, а ответ и время
+  ответа дописываются в кассету (JSON-файл);
+- в режиме replay ответ берется из кассеты без обращения к сети.
+
+Ключ кассеты - хеш нормализованного промпта (пробелы схлопнуты, строка
+версии API и случайное зерно из промпта убраны), истории чата и
+параметров генерации. Для одного ключа хранится несколько ответов, при
+воспроизведении они выдаются по кругу.
+
+Для нагрузочных измерений при воспроизведении задается распределение
+задержки (LatencyModel) и доля искусственных ошибок квоты и частоты
+запросов (ResourceExhausted, как у настоящего API).
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from google.api_core.exceptions import ResourceExhausted
+
+REPLAY_MODES = ("record", "replay")
+
+# Сколько разных ответов хранится для одного ключа
+MAX_RESPONSES_PER_KEY = 5
+
+_API_VERSION_RE = re.compile(r'API Version: [\d.]+')
+_SEED_RE = re.compile(r'seed=\d+')
+
+
+class CassetteMissError(KeyError):
+    """В кассете нет ответа на запрос"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Приводит промпт к виду, не зависящему от случайных и служебных частей.
+
+    Args:
+        prompt (str): Текст запроса
+
+    Returns:
+        str: Нормализованный промпт
+    """
+    prompt = _API_VERSION_RE.sub('', prompt or "")
+    prompt = _SEED_RE.sub('seed=*', prompt)
+    return " ".join(prompt.split())
+
+
+def _content_text(content: Any) -> str:
+    """Извлекает текст из содержимого запроса (строка, список частей или сообщение)"""
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        return _content_text(content.get("parts"))
+    if isinstance(content, (list, tuple)):
+        return "\n".join(_content_text(part) for part in content)
+    return str(content)
+
+
+def _generation_params(generation_config: Any) -> Dict[str, Any]:
+    """Параметры генерации, влияющие на ответ, в сериализуемом виде"""
+    if not generation_config:
+        return {}
+    if not isinstance(generation_config, dict):
+        generation_config = {name: getattr(generation_config, name) for name in
+                             ("temperature", "max_output_tokens", "top_p", "top_k",
+                              "response_mime_type", "response_schema")
+                             if getattr(generation_config, name, None) is not None}
+    return json.loads(json.dumps(generation_config, sort_keys=True, default=str))
+
+
+def cassette_key(prompt: str, generation_config: Any = None, history: Any = None) -> str:
+    """
+    Вычисляет ключ кассеты для запроса.
+
+    Args:
+        prompt (str): Текст запроса
+        generation_config: Параметры генерации
+        history: История чата (для start_chat)
+
+    Returns:
+        str: Ключ записи
+    """
+    data = {
+        "prompt": normalize_prompt(prompt),
+        "history": [normalize_prompt(_content_text(message)) for message in history or ()],
+        "params": _generation_params(generation_config),
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:32]
+
+
+class LatencyModel:
+    """
+    Распределение задержки ответа при воспроизведении.
+
+    Описание задается строкой:
+    - "none" - без задержки;
+    - "recorded" - задержка, записанная в кассете;
+    - "fixed:S" - постоянная задержка S секунд;
+    - "uniform:A:B" - равномерно от A до B секунд;
+    - "lognormal:M:SIGMA" - логнормально с медианой M секунд.
+    """
+
+    def __init__(self, spec: str = "recorded", rng: Optional[random.Random] = None):
+        """
+        Инициализация распределения.
+
+        Args:
+            spec (str): Описание распределения
+            rng (random.Random, optional): Генератор случайных чисел
+
+        Raises:
+            ValueError: Если описание не распознано
+        """
+        parts = (spec or "none").strip().lower().split(':')
+        self.kind = parts[0]
+        try:
+            self.params = [float(value) for value in parts[1:]]
+        except ValueError:
+            raise ValueError(f"Неверное описание задержки: {spec}")
+        expected = {"none": 0, "recorded": 0, "fixed": 1, "uniform": 2, "lognormal": 2}
+        if expected.get(self.kind) != len(self.params):
+            raise ValueError(f"Неверное описание задержки: {spec}")
+        self.spec = spec
+        self._rng = rng or random.Random()
+
+    def sample(self, recorded: float = 0.0) -> float:
+        """
+        Возвращает задержку в секундах.
+
+        Args:
+            recorded (float): Задержка, записанная в кассете
+
+        Returns:
+            float: Задержка
+        """
+        if self.kind == "recorded":
+            return max(0.0, recorded)
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self._rng.uniform(self.params[0], self.params[1])
+        if self.kind == "lognormal":
+            return self._rng.lognormvariate(math.log(self.params[0]), self.params[1])
+        return 0.0
+
+
+class ReplayResponse:
+    """Ответ из кассеты с интерфейсом ответа Gemini"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class GeminiReplay:
+    """Кассета запросов к Gemini с записью, воспроизведением и внесением ошибок"""
+
+    def __init__(self, cassette_file: str, mode: str = "replay", latency: str = "recorded",
+                 quota_error_rate: float = 0.0, rate_error_rate: float = 0.0, on_miss: str = "error",
+                 synthetic_length: int = 2000, seed: Optional[int] = None,
+                 sleep: Callable[[float], None] = time.sleep,
+                 responder: Optional[Callable[[str], str]] = None):
+        """
+        Инициализация кассеты.
+
+        Args:
+            cassette_file (str): Путь к файлу кассеты
+            mode (str): record - записывать ответы модели, replay - воспроизводить
+            latency (str): Распределение задержки при воспроизведении (см. LatencyModel)
+            quota_error_rate (float): Доля запросов, завершающихся ошибкой исчерпания квоты
+            rate_error_rate (float): Доля запросов, завершающихся ошибкой частоты запросов
+            on_miss (str): error - ошибка CassetteMissError, synthetic - синтетический ответ
+            synthetic_length (int): Длина синтетического ответа в символах
+            seed (int, optional): Зерно задержек и ошибок для воспроизводимых замеров
+            sleep (Callable): Функция ожидания
+            responder (Callable, optional): Формирует синтетический ответ по тексту
+                запроса вместо ответа заданной длины
+        """
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Неизвестный режим кассеты: {mode}")
+        if on_miss not in ("error", "synthetic"):
+            raise ValueError(f"Неизвестная реакция на промах кассеты: {on_miss}")
+        self.cassette_file = cassette_file
+        self.mode = mode
+        self.quota_error_rate = quota_error_rate
+        self.rate_error_rate = rate_error_rate
+        self.on_miss = on_miss
+        self.synthetic_length = synthetic_length
+        self.responder = responder
+        self._rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self._rng)
+        self._sleep = sleep
+
+        self._lock = threading.Lock()
+        self._interactions: Dict[str, Dict[str, Any]] = {}
+        self._positions: Dict[str, int] = {}
+        self.stats = {"calls": 0, "hits": 0, "misses": 0, "recorded": 0,
+                      "injected_errors": 0, "simulated_latency": 0.0}
+        self._load()
+
+    def _load(self) -> None:
+        """Загружает кассету из файла, если он есть"""
+        if os.path.exists(self.cassette_file):
+            with open(self.cassette_file, 'r', encoding='utf-8') as f:
+                self._interactions = json.load(f).get("interactions", {})
+
+    def save(self) -> None:
+        """Атомарно записывает кассету в файл"""
+        with self._lock:
+            data = {"version": 1, "interactions": self._interactions}
+            directory = os.path.dirname(self.cassette_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_file = f"{self.cassette_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(temp_file, self.cassette_file)
+
+    def __len__(self) -> int:
+        return len(self._interactions)
+
+    def wrap(self, model: Any = None) -> "ReplayModel":
+        """
+        Оборачивает модель Gemini.
+
+        Args:
+            model: Настоящая модель (нужна только в режиме record)
+
+        Returns:
+            ReplayModel: Модель с тем же интерфейсом
+        """
+        if self.mode == "record" and model is None:
+            raise ValueError("Для записи кассеты нужна модель Gemini")
+        return ReplayModel(self, model)
+
+    def execute(self, prompt: str, generation_config: Any, history: Any,
+                live_call: Callable[[], Any]) -> Any:
+        """
+        Выполняет запрос: записывает ответ модели или воспроизводит его из кассеты.
+
+        Args:
+            prompt (str): Текст запроса
+            generation_config: Параметры генерации
+            history: История чата
+            live_call (Callable): Запрос к настоящей модели
+
+        Returns:
+            Ответ с атрибутом text
+
+        Raises:
+            ResourceExhausted: Внесенная ошибка квоты или частоты запросов
+            CassetteMissError: В кассете нет ответа (режим replay, on_miss=error)
+        """
+        key = cassette_key(prompt, generation_config, history)
+        if self.mode == "record":
+            started = time.time()
+            response = live_call()
+            self._record(key, prompt, generation_config, response.text, time.time() - started)
+            return response
+
+        with self._lock:
+            self.stats["calls"] += 1
+            draw = self._rng.random()
+            if draw < self.quota_error_rate + self.rate_error_rate:
+                self.stats["injected_errors"] += 1
+                quota = draw < self.quota_error_rate
+            else:
+                quota = None
+            responses = self._interactions.get(key, {}).get("responses")
+            if responses:
+                self.stats["hits"] += 1
+                position = self._positions.get(key, 0)
+                self._positions[key] = position + 1
+                recorded = responses[position % len(responses)]
+            else:
+                self.stats["misses"] += 1
+                recorded = None
+            delay = self.latency.sample(recorded["latency"] if recorded else 0.0)
+            self.stats["simulated_latency"] += delay
+
+        if quota is not None:
+            if quota:
+                raise ResourceExhausted("Resource has been exhausted (e.g. check quota).")
+            raise ResourceExhausted("Rate limit exceeded: too many requests per minute.")
+        if recorded is None and self.on_miss == "error":
+            raise CassetteMissError(f"Нет записи в кассете для запроса: {normalize_prompt(prompt)[:80]}")
+
+        if delay > 0:
+            self._sleep(delay)
+        if recorded is None:
+            return ReplayResponse(self._synthetic_text(key, prompt))
+        return ReplayResponse(recorded["text"])
+
+    def _record(self, key: str, prompt: str, generation_config: Any, text: str, latency: float) -> None:
+        """Дописывает ответ модели в кассету"""
+        with self._lock:
+            interaction = self._interactions.setdefault(key, {
+                "prompt": normalize_prompt(prompt)[:300],
+                "params": _generation_params(generation_config),
+                "responses": [],
+            })
+            if len(interaction["responses"]) < MAX_RESPONSES_PER_KEY:
+                interaction["responses"].append({"text": text, "latency": round(latency, 3)})
+            self.stats["recorded"] += 1
+        self.save()
+
+    def _synthetic_text(self, key: str, prompt: str) -> str:
+        """Детерминированный ответ заданной длины для промаха кассеты"""
+        if self.responder is not None:
+            return self.responder(prompt)
+        sentence = f"Синтетический ответ на запрос {key[:8]}. "
+        return (sentence * (self.synthetic_length // len(sentence) + 1))[:self.synthetic_length]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику кассеты.
+
+        Returns:
+            Dict[str, Any]: Режим, число записей, запросы, попадания, промахи,
+                внесенные ошибки и суммарная имитированная задержка
+        """
+        with self._lock:
+            stats = self.stats.copy()
+        stats["mode"] = self.mode
+        stats["interactions"] = len(self._interactions)
+        stats["simulated_latency"] = round(stats["simulated_latency"], 3)
+        return stats
+
+
+class ReplayModel:
+    """Обертка модели Gemini, направляющая запросы через кассету"""
+
+    def __init__(self, replay: GeminiReplay, model: Any = None):
+        self._replay = replay
+        self._model = model
+
+    def generate_content(self, contents: Any = None, generation_config: Any = None, **kwargs) -> Any:
+        """Аналог GenerativeModel.generate_content"""
+        if contents is None:
+            contents = kwargs.pop("content", None)
+        return self._replay.execute(
+            _content_text(contents), generation_config, None,
+            lambda: self._model.generate_content(contents, generation_config=generation_config, **kwargs)
+        )
+
+    def start_chat(self, history: Optional[List[Any]] = None, **kwargs) -> "ReplayChat":
+        """Аналог GenerativeModel.start_chat"""
+        return ReplayChat(self._replay, self._model, history or [], kwargs)
+
+
+class ReplayChat:
+    """Чат с историей, запросы которого направляются через кассету"""
+
+    def __init__(self, replay: GeminiReplay, model: Any, history: List[Any], chat_kwargs: Dict[str, Any]):
+        self._replay = replay
+        self._model = model
+        self.history = list(history)
+        self._chat_kwargs = chat_kwargs
+
+    def send_message(self, content: Any, generation_config: Any = None, **kwargs) -> Any:
+        """Аналог ChatSession.send_message"""
+        def live_call():
+            chat = self._model.start_chat(history=self.history, **self._chat_kwargs)
+            return chat.send_message(content, generation_config=generation_config, **kwargs)
+
+        response = self._replay.execute(_content_text(content), generation_config, self.history, live_call)
+        self.history.extend([{"role": "user", "parts": [_content_text(content)]},
+                             {"role": "model", "parts": [response.text]}])
+        return response
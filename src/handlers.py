@@ -5,11 +5,14 @@ import random
 import os
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ChatAction
 from telegram.ext import ConversationHandler
+from src.text_rendering import escape_markdown, split_message, TELEGRAM_MAX_MESSAGE_LENGTH
+from src.tracing import tracer
 
 class CommandHandlers:
     """Класс для обработки команд и взаимодействий с пользователем"""
 
-    def __init__(self, ui_manager, api_client, message_manager, content_service, logger, config):
+    def __init__(self, ui_manager, api_client, message_manager, content_service, logger, config,
+                 test_service=None, topic_service=None, answer_cache=None, prefetcher=None):
         self.ui_manager = ui_manager
         self.api_client = api_client
         self.message_manager = message_manager
@@ -17,11 +20,15 @@ class CommandHandlers:
         self.logger = logger
         self.config = config
 
-        # Инициализируем сервисы
+        # Инициализируем сервисы (если фабрика не передала уже созданные)
         from src.test_service import TestService
         from src.topic_service import TopicService
-        self.test_service = TestService(api_client, logger)
-        self.topic_service = TopicService(api_client, logger)
+        self.test_service = test_service or TestService(api_client, logger)
+        self.topic_service = topic_service or TopicService(api_client, logger)
+        # Семантический кэш ответов для режима беседы (может отсутствовать)
+        self.answer_cache = answer_cache
+        # Упреждающая подготовка теста и рекомендованных тем (может отсутствовать)
+        self.prefetcher = prefetcher
 
         # Импортируем константы состояний из config
         from src.config import TOPIC, CHOOSE_TOPIC, TEST, ANSWER, CONVERSATION
@@ -35,6 +42,7 @@ class CommandHandlers:
         self.callback_cache = {}
         self.callback_cache_ttl = 2  # Время жизни записи в кэше (секунды)
 
+    @tracer.trace_update("handler.start")
     def start(self, update, context):
         """
         Обрабатывает команду /start, показывает приветствие и главное меню.
@@ -77,6 +85,7 @@ class CommandHandlers:
         self.message_manager.save_message_id(update, context, sent_msg.message_id)
         return self.TOPIC
 
+    @tracer.trace_update("handler.button_handler")
     def button_handler(self, update, context):
         """
         Обрабатывает нажатия на кнопки меню с оптимизацией.
@@ -143,32 +152,9 @@ class CommandHandlers:
                 self.logger.error(f"Ошибка при чтении файла presentation.txt: {e}")
                 presentation_text = "Информация о проекте временно недоступна."
 
-            # Разбиваем длинный текст на части (максимум 3000 символов)
-            max_length = 3000
-            parts = []
-
-            # Заголовок добавляем только в первую часть
-            current_part = "📋 *Информация о проекте*\n\n"
-
-            # Разбиваем текст по параграфам для сохранения форматирования
-            paragraphs = presentation_text.split('\n\n')
-
-            for paragraph in paragraphs:
-                # Если добавление параграфа превысит максимальную длину
-                if len(current_part) + len(paragraph) + 2 > max_length:
-                    # Сохраняем текущую часть
-                    parts.append(current_part)
-                    current_part = paragraph
-                else:
-                    # Добавляем параграф с разделителем
-                    if current_part and current_part != "📋 *Информация о проекте*\n\n":
-                        current_part += '\n\n' + paragraph
-                    else:
-                        current_part += paragraph
-
-            # Добавляем последнюю часть
-            if current_part:
-                parts.append(current_part)
+            # Разбиваем длинный текст на части по параграфам (максимум 3000 символов),
+            # заголовок попадает только в первую часть
+            parts = split_message("📋 *Информация о проекте*\n\n" + presentation_text, 3000)
 
             try:
                 # Создаем клавиатуру только с кнопкой возврата в меню
@@ -178,7 +164,7 @@ class CommandHandlers:
 
                 # Отправляем первую часть с редактированием сообщения
                 query.edit_message_text(
-                    parts[0][:4000],  # Ограничиваем длину для безопасности
+                    parts[0],
                     parse_mode='Markdown',
                     reply_markup=InlineKeyboardMarkup(keyboard)
                 )
@@ -186,7 +172,7 @@ class CommandHandlers:
                 # Отправляем остальные части как новые сообщения
                 for i, part in enumerate(parts[1:], 1):
                     sent_msg = query.message.reply_text(
-                        part[:4000],  # Ограничиваем длину для безопасности
+                        part,
                         parse_mode='Markdown',
                         reply_markup=InlineKeyboardMarkup(keyboard) if i == len(parts[1:]) else None
                     )
@@ -425,7 +411,7 @@ class CommandHandlers:
                         [InlineKeyboardButton("🔙 В главное меню", callback_data='back_to_menu')]
                     ]
                     sent_msg = query.message.reply_text(
-                        part[:4000],  # Ограничиваем длину для безопасности
+                        part,
                         parse_mode='Markdown',
                         reply_markup=InlineKeyboardMarkup(keyboard) if i == len(parts) - 1 else None
                     )
@@ -533,7 +519,7 @@ class CommandHandlers:
                 context.bot.send_chat_action(chat_id=update.effective_chat.id, action=telegram.ChatAction.TYPING)
 
                 # Получаем тест через сервис тестирования
-                test_data = self.test_service.generate_test(topic)
+                test_data = self.prefetcher.get_test(topic) if self.prefetcher else self.test_service.generate_test(topic)
 
                 # Получаем вопросы из теста
                 valid_questions = test_data.get('original_questions', [])
@@ -602,8 +588,8 @@ class CommandHandlers:
             try:
                 query.edit_message_text("🔄 Генерирую новый список уникальных тем по истории России...")
 
-                # Получаем новый список тем через сервис
-                filtered_topics = self.topic_service.generate_new_topics_list()
+                # Получаем следующую страницу непоказанных тем (из каталога или через API)
+                filtered_topics = self.topic_service.get_topics_page(user_id)
                 context.user_data['topics'] = filtered_topics
 
                 # Создаем клавиатуру с темами
@@ -826,6 +812,7 @@ class CommandHandlers:
             self.logger.info(f"Пользователь {user_id} открыл карту через меню")
             return self.TOPIC
 
+    @tracer.trace_update("handler.choose_topic")
     def choose_topic(self, update, context):
         """
         Обрабатывает выбор темы пользователем из списка или ввод своей темы.
@@ -885,7 +872,7 @@ class CommandHandlers:
                                 query.message.reply_text(message, parse_mode='Markdown')
 
                         # Получаем информацию о теме через сервис тем (возвращает список сообщений)
-                        messages = self.topic_service.get_topic_info(topic, update_message)
+                        messages = self._get_topic_messages(topic, update_message)
 
                         # Проверяем, что мы получили список сообщений
                         if isinstance(messages, list) and messages:
@@ -902,7 +889,7 @@ class CommandHandlers:
                                 for i, msg in enumerate(messages[1:], 1):
                                     try:
                                         # Проверяем размер сообщения и разбиваем его при необходимости
-                                        if len(msg) > 4000:
+                                        if len(msg) > TELEGRAM_MAX_MESSAGE_LENGTH:
                                             # Сначала извлекаем заголовок с эмодзи и форматом главы
                                             header_match = re.match(r'^(.+?ГЛАВА \d+:.+?\*)\n\n(┈+)\n\n', msg)
                                             if header_match:
@@ -916,27 +903,8 @@ class CommandHandlers:
                                                     footer = "\n\n" + footer_match.group(1) + "\n\n" + footer_match.group(2)
                                                     content = content[:-(len(footer))]
 
-                                                # Разбиваем контент на части по 3500 символов (с запасом)
-                                                chunks = []
-                                                current_length = 0
-                                                current_chunk = ""
-
-                                                # Разбиваем по абзацам
-                                                paragraphs = content.split('\n\n')
-                                                for paragraph in paragraphs:
-                                                    if current_length + len(paragraph) + 4 <= 3500:
-                                                        if current_chunk:
-                                                            current_chunk += "\n\n" + paragraph
-                                                        else:
-                                                            current_chunk = paragraph
-                                                        current_length += len(paragraph) + 4
-                                                    else:
-                                                        chunks.append(current_chunk)
-                                                        current_chunk = paragraph
-                                                        current_length = len(paragraph)
-
-                                                if current_chunk:
-                                                    chunks.append(current_chunk)
+                                                # Разбиваем контент на части по абзацам (3500 символов с запасом под заголовок)
+                                                chunks = split_message(content, 3500)
 
                                                 # Определяем, из какой главы это сообщение
                                                 chapter_match = re.search(r'ГЛАВА (\d+):', header)
@@ -966,8 +934,7 @@ class CommandHandlers:
                                                     self.message_manager.save_message_id(update, context, sent_msg.message_id)
                                             else:
                                                 # Если не удалось извлечь заголовок, отправляем сообщение частями
-                                                chunks = [msg[i:i+4000] for i in range(0, len(msg), 4000)]
-                                                for chunk in chunks:
+                                                for chunk in split_message(msg):
                                                     sent_msg = query.message.reply_text(
                                                         chunk, 
                                                         parse_mode='Markdown',
@@ -1012,7 +979,7 @@ class CommandHandlers:
                                         except Exception as e2:
                                             self.logger.error(f"Вторая ошибка при отправке сообщения: {e2}")
 
-                                self.logger.info(f"Отправлено {len(messages) + sum(1 for m in messages[1:] if len(m) > 4000)} сообщений по теме '{topic}'")
+                                self.logger.info(f"Отправлено {len(messages) + sum(1 for m in messages[1:] if len(m) > TELEGRAM_MAX_MESSAGE_LENGTH)} сообщений по теме '{topic}'")
                             except Exception as e:
                                 self.logger.error(f"Ошибка при отправке сообщения: {e}")
                                 # В случае ошибки пробуем отправить как простой текст
@@ -1024,11 +991,10 @@ class CommandHandlers:
                                 # Отправляем сообщения без форматирования
                                 for msg in messages:
                                     try:
-                                        query.message.reply_text(msg[:4000], parse_mode=None)
-                                        if len(msg) > 4000:
-                                            for i in range(4000, len(msg), 4000):
-                                                query.message.reply_text(msg[i:i+4000], parse_mode=None)
+                                        for j, part in enumerate(split_message(msg, markdown=False)):
+                                            if j:
                                                 time.sleep(0.5)
+                                            query.message.reply_text(part, parse_mode=None)
                                     except Exception as e_msg:
                                         self.logger.error(f"Ошибка при отправке текста без форматирования: {e_msg}")
                         else:
@@ -1057,6 +1023,7 @@ class CommandHandlers:
         # Возвращаем CHOOSE_TOPIC, если не обработано другими условиями
         return self.CHOOSE_TOPIC
 
+    @tracer.trace_update("handler.handle_custom_topic")
     def handle_custom_topic(self, update, context):
         """
         Обрабатывает ввод пользователем своей темы.
@@ -1082,7 +1049,7 @@ class CommandHandlers:
                 update.message.reply_text(message, parse_mode='Markdown')
 
             # Получаем информацию о теме через сервис тем (теперь всегда возвращает список сообщений)
-            messages = self.topic_service.get_topic_info(topic, update_message)
+            messages = self._get_topic_messages(topic, update_message)
 
             # Проверяем, что мы получили список сообщений
             if isinstance(messages, list) and messages:
@@ -1149,6 +1116,7 @@ class CommandHandlers:
             update.message.reply_text(f"Произошла ошибка: {e}. Попробуй еще раз.", reply_markup=self.ui_manager.main_menu())
         return self.TOPIC
 
+    @tracer.trace_update("handler.handle_answer")
     def handle_answer(self, update, context):
         """
         Обрабатывает ответы пользователя на вопросы теста.
@@ -1421,50 +1389,19 @@ class CommandHandlers:
 
     def _sanitize_markdown(self, text):
         """
-        Sanitizes text to prevent Markdown parsing errors.
+        Экранирует специальные символы Markdown в тексте.
 
         Args:
-            text (str): The text to sanitize
+            text (str): Исходный текст
 
         Returns:
-            str: Sanitized text
+            str: Экранированный текст
         """
-        if not text:
-            return ""
-
-        # Replace problematic characters that could break Markdown parsing
-        replacements = {
-            '*': '\\*',
-            '_': '\\_',
-            '`': '\\`',
-            '[': '\\[',
-            ']': '\\]',
-            '(': '\\(',
-            ')': '\\)',
-            '#': '\\#',
-            '>': '\\>',
-            '+': '\\+',
-            '-': '\\-',
-            '=': '\\=',
-            '|': '\\|',
-            '{': '\\{',
-            '}': '\\}',
-            '.': '\\.',
-            '!': '\\!'
-        }
-
-        sanitized_text = ""
-        # Process one character at a time for better control
-        for char in text:
-            if char in replacements:
-                sanitized_text += replacements[char]
-            else:
-                sanitized_text += char
-
-        return sanitized_text
+        return escape_markdown(text)
 
     # Метод _normalize_russian_input перенесен в ConversationService
 
+    @tracer.trace_update("handler.handle_conversation")
     def handle_conversation(self, update, context):
         """
         Обрабатывает сообщения пользователя в режиме беседы с использованием
@@ -1500,7 +1437,8 @@ class CommandHandlers:
                 self.logger.info("Инициализация ConversationService")
                 self.conversation_service = ConversationService(
                     api_client=self.api_client, 
-                    logger=self.logger
+                    logger=self.logger,
+                    answer_cache=self.answer_cache
                 )
 
             # Обрабатываем сообщение и получаем результат
@@ -1524,6 +1462,26 @@ class CommandHandlers:
 
             return self.CONVERSATION
 
+    def _get_topic_messages(self, topic, update_callback):
+        """
+        Получает главы темы и планирует упреждающую подготовку следующих материалов.
+
+        Args:
+            topic (str): Выбранная тема
+            update_callback (function): Функция обновления сообщения о загрузке
+
+        Returns:
+            list: Список сообщений с информацией по теме
+        """
+        if not self.prefetcher:
+            return self.topic_service.get_topic_info(topic, update_callback)
+
+        messages = self.prefetcher.get_topic_info(topic, update_callback)
+        if isinstance(messages, list) and len(messages) > 1:
+            # Пока пользователь читает главы, готовим тест и рекомендованные темы
+            self.prefetcher.schedule(topic)
+        return messages
+
     def recommend_similar_topics(self, current_topic, context):
         """
         Рекомендует пользователю похожие темы на основе текущей темы.
@@ -1538,6 +1496,7 @@ class CommandHandlers:
         # Используем сервис тестирования для получения рекомендаций
         return self.test_service.recommend_similar_topics(current_topic, self.api_client)
 
+    @tracer.trace_update("handler.map_command")
     def map_command(self, update, context):
         """
         Обрабатывает команду /map или /карта для отображения интерактивной карты истории России.
@@ -1583,6 +1542,7 @@ class CommandHandlers:
             )
             return self.TOPIC
 
+    @tracer.trace_update("handler.admin_command")
     def admin_command(self, update, context):
         """
         Обрабатывает команду /admin для доступа к административной панели.
@@ -1597,6 +1557,7 @@ class CommandHandlers:
         else:
             update.message.reply_text("Административная панель недоступна")
             
+    @tracer.trace_update("handler.neadmin_command")
     def neadmin_command(self, update, context):
         """
         Обрабатывает команду /neadmin для быстрого перехода на адрес neadmika
@@ -1632,6 +1593,7 @@ class CommandHandlers:
         )
         self.logger.info(f"Пользователь {user_id} запросил доступ к панели через команду /neadmin")
 
+    @tracer.trace_update("handler.clear_chat_command")
     def clear_chat_command(self, update, context):
         """
         Обрабатывает команду /clear для полной очистки чата.
@@ -1646,6 +1608,7 @@ class CommandHandlers:
         # Отправляем сообщение о том, что функциональность отключена
         update.message.reply_text("⚠️ Функция очистки чата отключена в текущей версии.")
 
+    @tracer.trace_update("handler.admin_callback")
     def admin_callback(self, update, context):
         """
         Обрабатывает нажатия на кнопки в административной панели.
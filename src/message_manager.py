@@ -4,6 +4,7 @@ import os
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from src.telegram_queue import TelegramRequestQueue
 from src.base_service import BaseService
+from src.text_rendering import split_message
 
 class MessageManager(BaseService):
     """Класс для управления сообщениями бота"""
@@ -87,31 +88,14 @@ class MessageManager(BaseService):
         """
         sent_message_ids = []
 
-        for i, message in enumerate(messages):
-            # Контроль размера сообщения
-            if len(message) > 4000:
-                # Разбиваем длинное сообщение на части по 4000 символов
-                chunks = [message[i:i+4000] for i in range(0, len(message), 4000)]
-                for chunk in chunks:
-                    # Очередь запросов обеспечит паузы между отправками
-                    def send_func():
-                        return context.bot.send_message(
-                            chat_id=chat_id,
-                            text=chunk,
-                            parse_mode=parse_mode,
-                            disable_web_page_preview=disable_web_page_preview
-                        )
-
-                    # Используем очередь запросов для отправки сообщения
-                    sent_message = self.request_queue.enqueue(send_func)
-                    if sent_message:
-                        sent_message_ids.append(sent_message.message_id)
-            else:
-                # Отправляем обычное сообщение
-                def send_func():
+        for message in messages:
+            # Длинные сообщения делятся по абзацам с учетом лимита Telegram и разметки
+            for chunk in split_message(message, markdown=bool(parse_mode)):
+                # Очередь запросов обеспечит паузы между отправками
+                def send_func(chunk=chunk):
                     return context.bot.send_message(
                         chat_id=chat_id,
-                        text=message,
+                        text=chunk,
                         parse_mode=parse_mode,
                         disable_web_page_preview=disable_web_page_preview
                     )
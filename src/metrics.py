@@ -0,0 +1,384 @@
+"""
+Единый реестр метрик в формате Prometheus.
+
+Метрики бывают двух видов:
+- собственные счетчики, измерители и гистограммы (Counter, Gauge, Histogram),
+  которые компоненты обновляют сами, например задержка запросов к Gemini;
+- сборщики (collectors) - функции, которые при каждом запросе /metrics
+  читают текущую статистику компонента (кэшей, очередей). Для компонентов
+  со словарем статистики (get_stats) достаточно register_stats.
+
+render() формирует текстовый формат экспозиции Prometheus 0.0.4, его
+отдает маршрут /metrics объединенного веб-сервера.
+
+Реестр принадлежит процессу. В многопроцессном режиме (BOT_WORKERS > 1)
+обработчики периодически записывают снимок своих метрик в общее хранилище
+состояния (MetricsPublisher), а процесс-приемник, в котором работает
+веб-сервер, добавляет снимки в /metrics с меткой worker
+(MetricsRegistry.register_snapshots).
+"""
+
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы гистограммы по умолчанию (секунды): запросы к Gemini длятся от долей секунды до минуты
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+# Значение сборщика: (имя, тип, описание, метки, значение)
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+# Пространство имен общего хранилища для снимков метрик процессов-обработчиков
+SNAPSHOT_NAMESPACE = "metrics"
+
+
+def _format_value(value: float) -> str:
+    """Форматирует значение по правилам текстового формата"""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """Форматирует метки с экранированием значений"""
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{key}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """Базовый класс метрики с набором значений по меткам"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """Ключ значения по меткам (все объявленные метки обязательны)"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Строки экспозиции: (имя, метки, значение)"""
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Увеличивает счетчик"""
+        if amount < 0:
+            raise ValueError("Счетчик не может уменьшаться")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """Текущее значение счетчика"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Измеритель: значение, которое может расти и уменьшаться"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        """Устанавливает значение"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Увеличивает значение"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        """Уменьшает значение"""
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        """Текущее значение"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Гистограмма: распределение значений по корзинам, сумма и количество"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        """Добавляет наблюдение"""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Строки экспозиции: накопительные корзины, _sum и _count"""
+        rows = []
+        with self._lock:
+            for key, state in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, state["buckets"]):
+                    cumulative += count
+                    rows.append((f"{self.name}_bucket", {**labels, "le": _format_value(float(bound))}, cumulative))
+                rows.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, state["count"]))
+                rows.append((f"{self.name}_sum", labels, state["sum"]))
+                rows.append((f"{self.name}_count", labels, state["count"]))
+        return rows
+
+
+class MetricsRegistry:
+    """Реестр метрик и сборщиков статистики компонентов"""
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[Sample]]] = {}
+        # Хранилище состояния со снимками метрик других процессов и имя метки процесса
+        self._snapshot_source: Optional[Tuple[Any, str]] = None
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, labelnames: Sequence[str], **options) -> Any:
+        """Возвращает зарегистрированную метрику или создает новую"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **options)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Метрика {name} уже зарегистрирована с другим типом или метками")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Регистрирует (или возвращает) счетчик"""
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Регистрирует (или возвращает) измеритель"""
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Регистрирует (или возвращает) гистограмму"""
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def register_collector(self, name: str, collect: Callable[[], Iterable[Sample]]) -> None:
+        """
+        Регистрирует сборщик, вызываемый при каждом формировании метрик.
+
+        Повторная регистрация с тем же именем заменяет сборщик (например,
+        после пересоздания компонента).
+
+        Args:
+            name (str): Имя сборщика
+            collect (Callable): Функция, возвращающая значения Sample
+        """
+        with self._lock:
+            self._collectors[name] = collect
+
+    def unregister_collector(self, name: str) -> None:
+        """Удаляет сборщик"""
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def register_stats(self, prefix: str, get_stats: Callable[[], Dict[str, Any]], description: str,
+                       counters: Sequence[str] = (), gauges: Sequence[str] = ()) -> None:
+        """
+        Регистрирует словарь статистики компонента как набор метрик.
+
+        Счетчики получают имена {prefix}_{ключ}_total, измерители - {prefix}_{ключ}.
+        Отсутствующие и нечисловые значения пропускаются.
+
+        Args:
+            prefix (str): Префикс имен метрик, например "bot_api_cache"
+            get_stats (Callable): Метод статистики компонента (get_stats)
+            description (str): Описание компонента для HELP
+            counters: Ключи статистики, которые только растут
+            gauges: Ключи статистики с текущими значениями (размер, глубина очереди)
+        """
+        def collect():
+            stats = get_stats() or {}
+            for kind, keys in (("counter", counters), ("gauge", gauges)):
+                for key in keys:
+                    value = stats.get(key)
+                    if isinstance(value, (int, float)):
+                        name = f"{prefix}_{key}_total" if kind == "counter" else f"{prefix}_{key}"
+                        yield name, kind, f"{description}: {key}", {}, value
+
+        self.register_collector(prefix, collect)
+
+    def register_snapshots(self, backend, label: str = "worker") -> None:
+        """
+        Добавляет в метрики снимки других процессов из общего хранилища состояния.
+
+        Args:
+            backend: Общее хранилище состояния (SharedStateBackend)
+            label (str): Метка, которой отмечаются строки снимка (значение - имя процесса)
+        """
+        with self._lock:
+            self._snapshot_source = (backend, label)
+
+    def snapshot(self) -> List[List[Any]]:
+        """
+        Снимок метрик процесса для передачи другому процессу (без снимков других процессов).
+
+        Returns:
+            List: Семейства [имя, тип, описание, [[имя строки, метки, значение], ...]]
+        """
+        return [[name, kind, help_text, [list(sample) for sample in samples]]
+                for name, kind, help_text, samples in self._collect(include_snapshots=False)]
+
+    def _collect(self, include_snapshots: bool = True) -> List[Tuple[str, str, str, List[Tuple[str, Dict[str, str], float]]]]:
+        """Собирает семейства метрик: (имя, тип, описание, строки)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+            snapshot_source = self._snapshot_source if include_snapshots else None
+
+        families: Dict[str, Tuple[str, str, str, List]] = {}
+        for metric in metrics:
+            families[metric.name] = (metric.name, metric.kind, metric.help, metric.samples())
+        for collector_name, collect in collectors:
+            try:
+                for name, kind, help_text, labels, value in collect():
+                    family = families.setdefault(name, (name, kind, help_text, []))
+                    family[3].append((name, labels, value))
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Ошибка сборщика метрик {collector_name}: {e}")
+
+        if snapshot_source is not None:
+            backend, label = snapshot_source
+            try:
+                snapshots = backend.get_all(SNAPSHOT_NAMESPACE)
+            except Exception as e:
+                snapshots = {}
+                if self.logger:
+                    self.logger.error(f"Ошибка чтения снимков метрик: {e}")
+            for source, snapshot in sorted(snapshots.items()):
+                for name, kind, help_text, samples in snapshot.get("families", []):
+                    family = families.setdefault(name, (name, kind, help_text, []))
+                    if family[1] != kind:
+                        continue
+                    for sample_name, labels, value in samples:
+                        family[3].append((sample_name, {**labels, label: source}, value))
+        return list(families.values())
+
+    def render(self) -> str:
+        """
+        Формирует метрики в текстовом формате Prometheus.
+
+        Returns:
+            str: Текст экспозиции (Content-Type - CONTENT_TYPE)
+        """
+        lines = []
+        for name, kind, help_text, samples in self._collect():
+            if not samples:
+                continue
+            escaped_help = help_text.replace("\\", "\\\\").replace("\n", "\\n")
+            lines.append(f"# HELP {name} {escaped_help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsPublisher:
+    """Периодическая запись снимка метрик процесса в общее хранилище состояния"""
+
+    def __init__(self, metrics_registry: MetricsRegistry, backend, source: str, interval: float = 15.0,
+                 logger=None):
+        """
+        Инициализация публикации.
+
+        Args:
+            metrics_registry (MetricsRegistry): Реестр метрик процесса
+            backend: Общее хранилище состояния (SharedStateBackend)
+            source (str): Имя процесса (значение метки в /metrics процесса-приемника)
+            interval (float): Интервал записи снимка в секундах
+            logger: Логгер (необязательно)
+        """
+        self.registry = metrics_registry
+        self.backend = backend
+        self.source = source
+        self.interval = interval
+        self.logger = logger
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self) -> None:
+        """Записывает снимок; снимок остановившегося процесса истекает через несколько интервалов"""
+        try:
+            self.backend.set(SNAPSHOT_NAMESPACE, self.source,
+                             {"time": time.time(), "families": self.registry.snapshot()},
+                             ttl=max(1, int(self.interval * 4)))
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Ошибка записи снимка метрик: {e}")
+
+    def start(self) -> None:
+        """Запускает фоновую запись снимков"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает запись и удаляет снимок процесса"""
+        self._stop_event.set()
+        try:
+            self.backend.delete(SNAPSHOT_NAMESPACE, self.source)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Ошибка удаления снимка метрик: {e}")
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self.publish()
+            self._stop_event.wait(self.interval)
+
+
+# Общий реестр процесса: компоненты регистрируются при создании в фабрике
+registry = MetricsRegistry()
@@ -196,6 +196,23 @@ class PerformanceMonitor(BaseService):
             "count": len(metrics)
         }
     
+    def collect_metrics(self):
+        """
+        Значения для реестра метрик: последнее значение каждой метрики и память процесса.
+
+        Yields:
+            tuple: (имя, тип, описание, метки, значение) - см. src.metrics.Sample
+        """
+        with self.lock:
+            latest = {}
+            for metric in self.metrics:
+                latest[metric.name] = metric.value
+        for name, value in latest.items():
+            yield ("bot_performance_metric", "gauge", "Последнее значение метрики PerformanceMonitor",
+                   {"name": name}, value)
+        yield ("bot_process_resident_memory_bytes", "gauge", "Резидентная память процесса в байтах",
+               {}, self.process.memory_info().rss)
+
     def measure_memory_usage(self) -> float:
         """
         Измеряет текущее использование памяти процессом.
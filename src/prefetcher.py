@@ -0,0 +1,333 @@
+"""
+Упреждающая подготовка материалов по темам.
+
+Пока пользователь читает главы выбранной темы, его следующие действия
+предсказуемы: пройти тест по теме или перейти к одной из похожих тем
+(recommend_similar_topics). TopicPrefetcher ставит генерацию теста и
+глав рекомендованных тем в TaskQueue с низким приоритетом и сохраняет
+результаты в TextCacheService. Задачи выполняются только когда Gemini
+простаивает и только в пределах почасового бюджета запросов, а
+статистика попаданий показывает, какая доля подготовленного
+действительно пригодилась.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from src.interfaces import ILogger
+from src.task_queue import PRIORITY_LOW, PRIORITY_NORMAL
+from src.topic_service import TOPIC_CHAPTERS_TYPE
+
+# Тип записи TextCacheService для заранее сгенерированного теста.
+# Тест используется один раз: при повторном прохождении вопросы должны быть новыми.
+PREFETCHED_TEST_TYPE = "prefetched_test"
+
+# Примерная стоимость задач в запросах к Gemini
+COST_TEST = 2  # вопросы и факты для вариантов ответов
+COST_RECOMMENDATIONS = 1
+
+
+class TopicPrefetcher:
+    """
+    Фоновая подготовка теста по текущей теме и глав рекомендованных тем.
+
+    Задачи копятся во внутренней очереди и выполняются одной задачей
+    TaskQueue с приоритетом PRIORITY_LOW, поэтому упреждающая генерация
+    занимает не больше одного рабочего потока.
+    """
+
+    def __init__(self, logger: ILogger, topic_service, test_service, api_client, text_cache_service,
+                 task_queue_getter: Optional[Callable[[], Any]] = None, budget_per_hour: int = 40,
+                 recommended_topics: int = 2, idle_seconds: float = 5.0, max_wait: float = 300.0,
+                 poll_interval: float = 1.0, max_pending: int = 20):
+        """
+        Инициализация упреждающей загрузки.
+
+        Args:
+            logger (ILogger): Логгер для записи информации
+            topic_service (TopicService): Сервис тем (генерация глав)
+            test_service (TestService): Сервис тестов (генерация теста и рекомендации)
+            api_client (APIClient): Клиент Gemini
+            text_cache_service (TextCacheService): Кэш, в который сохраняются результаты
+            task_queue_getter (Callable, optional): Функция, возвращающая TaskQueue (создается после бота)
+            budget_per_hour (int): Максимум запросов к Gemini на упреждающую генерацию в час
+            recommended_topics (int): Сколько рекомендованных тем готовить заранее
+            idle_seconds (float): Сколько секунд без запросов к Gemini считается простоем
+            max_wait (float): Сколько секунд задача может ждать простоя, прежде чем будет отброшена
+            poll_interval (float): Интервал проверки простоя в секундах
+            max_pending (int): Максимальный размер внутренней очереди задач
+        """
+        self._logger = logger
+        self.topic_service = topic_service
+        self.test_service = test_service
+        self.api_client = api_client
+        self.text_cache_service = text_cache_service
+        self.task_queue_getter = task_queue_getter
+        self.budget_per_hour = budget_per_hour
+        self.recommended_topics = recommended_topics
+        self.idle_seconds = idle_seconds
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.lock = threading.RLock()
+
+        # Ожидающие задачи: (вид, тема, время постановки)
+        self.pending: Deque[Tuple[str, str, float]] = deque()
+        self._queued: Set[Tuple[str, str]] = set()
+        # Подготовленные, но еще не использованные материалы
+        self._prefetched: Set[Tuple[str, str]] = set()
+        # Потраченный бюджет: (время, стоимость)
+        self._spent: Deque[Tuple[float, int]] = deque()
+        self._drain_scheduled = False
+
+        self.stats = {
+            "scheduled": 0,
+            "prefetched": 0,
+            "already_cached": 0,
+            "failed": 0,
+            "dropped": 0,
+            "expired": 0,
+            "over_budget": 0,
+            "api_calls": 0,
+            "hits": 0,
+            "misses": 0
+        }
+
+    # --- Планирование ---
+
+    def schedule(self, topic: str) -> None:
+        """
+        Планирует подготовку материалов после выбора темы пользователем.
+
+        Args:
+            topic (str): Выбранная тема
+        """
+        if not topic:
+            return
+        self._enqueue("test", topic)
+        self._enqueue("recommendations", topic)
+        self._ensure_drain()
+
+    def _enqueue(self, kind: str, topic: str) -> None:
+        """Добавляет задачу во внутреннюю очередь, пропуская повторы"""
+        job = (kind, topic)
+        with self.lock:
+            if job in self._queued or job in self._prefetched:
+                return
+            if len(self.pending) >= self.max_pending:
+                # Самые старые предположения устаревают первыми
+                old_kind, old_topic, _ = self.pending.popleft()
+                self._queued.discard((old_kind, old_topic))
+                self.stats["dropped"] += 1
+            self.pending.append((kind, topic, time.time()))
+            self._queued.add(job)
+            self.stats["scheduled"] += 1
+
+    def _ensure_drain(self) -> None:
+        """Ставит в TaskQueue задачу обработки внутренней очереди, если она еще не поставлена"""
+        task_queue = self.task_queue_getter() if self.task_queue_getter else None
+        if task_queue is None:
+            return
+        with self.lock:
+            if self._drain_scheduled or not self.pending:
+                return
+            self._drain_scheduled = True
+        task_queue.add_task(self._drain, priority=PRIORITY_LOW)
+
+    def _drain(self) -> None:
+        """Выполняет задачи внутренней очереди по мере простоя Gemini"""
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self._drain_scheduled = False
+                    break
+                kind, topic, queued_at = self.pending.popleft()
+                self._queued.discard((kind, topic))
+
+            if not self._wait_for_idle(queued_at + self.max_wait):
+                with self.lock:
+                    self.stats["expired"] += 1
+                continue
+            self.run_job(kind, topic)
+
+        self._logger.info(f"Упреждающая загрузка: {self.get_stats()}")
+
+    # --- Условия выполнения ---
+
+    def is_idle(self) -> bool:
+        """
+        Проверяет, простаивает ли Gemini: нет недавних запросов и обычных задач в очереди.
+
+        Returns:
+            bool: True если можно выполнять фоновую генерацию
+        """
+        last_request = getattr(self.api_client, 'last_request_time', 0.0)
+        if time.time() - last_request < self.idle_seconds:
+            return False
+        task_queue = self.task_queue_getter() if self.task_queue_getter else None
+        if task_queue is not None and task_queue.pending_count(PRIORITY_NORMAL) > 0:
+            return False
+        return True
+
+    def _wait_for_idle(self, deadline: float) -> bool:
+        """Ждет простоя Gemini до указанного момента"""
+        while not self.is_idle():
+            if time.time() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def _job_cost(self, kind: str) -> int:
+        """Возвращает примерную стоимость задачи в запросах к Gemini"""
+        if kind == "test":
+            return COST_TEST
+        if kind == "recommendations":
+            return COST_RECOMMENDATIONS
+        # Общий контекст темы и по запросу на каждую главу
+        return len(getattr(self.topic_service, 'standard_chapters', ())) + 1
+
+    def _reserve_budget(self, cost: int) -> bool:
+        """Резервирует бюджет запросов, если он не исчерпан за последний час"""
+        now = time.time()
+        with self.lock:
+            while self._spent and now - self._spent[0][0] > 3600:
+                self._spent.popleft()
+            if sum(spent for _, spent in self._spent) + cost > self.budget_per_hour:
+                self.stats["over_budget"] += 1
+                return False
+            self._spent.append((now, cost))
+            self.stats["api_calls"] += cost
+            return True
+
+    # --- Выполнение ---
+
+    def run_job(self, kind: str, topic: str) -> bool:
+        """
+        Выполняет одну задачу подготовки.
+
+        Args:
+            kind (str): Вид задачи: "test", "recommendations" или "topic_info"
+            topic (str): Тема
+
+        Returns:
+            bool: True если материал подготовлен
+        """
+        if kind == "test":
+            cache_type = PREFETCHED_TEST_TYPE
+        elif kind == "topic_info":
+            cache_type = TOPIC_CHAPTERS_TYPE
+        else:
+            cache_type = None
+
+        if cache_type and self.text_cache_service.get_text(topic, cache_type):
+            with self.lock:
+                self.stats["already_cached"] += 1
+            return False
+        if not self._reserve_budget(self._job_cost(kind)):
+            return False
+
+        try:
+            if kind == "recommendations":
+                # Ответ на этот промпт кэшируется APIClient и пригодится на экране результатов теста
+                similar_topics = self.test_service.recommend_similar_topics(topic, self.api_client)
+                for similar_topic in similar_topics[:self.recommended_topics]:
+                    self._enqueue("topic_info", similar_topic)
+                return bool(similar_topics)
+
+            if kind == "test":
+                test_data = self.test_service.generate_test(topic)
+                if not test_data or not test_data.get('original_questions'):
+                    raise ValueError("тест не содержит вопросов")
+                self.text_cache_service.save_text(topic, cache_type, json.dumps(test_data, ensure_ascii=False))
+            else:
+                chapters = self.topic_service.generate_topic_chapters(topic)
+                if not any(chapter.get("text") for chapter in chapters):
+                    raise ValueError("не удалось получить главы")
+                self.topic_service.save_topic_chapters(topic, chapters, self.text_cache_service)
+
+            with self.lock:
+                self._prefetched.add((kind, topic))
+                self.stats["prefetched"] += 1
+            self._logger.info(f"Заранее подготовлено ({kind}) по теме '{topic}'")
+            return True
+        except Exception as e:
+            with self.lock:
+                self.stats["failed"] += 1
+            self._logger.warning(f"Не удалось заранее подготовить ({kind}) по теме '{topic}': {e}")
+            return False
+
+    # --- Использование подготовленного ---
+
+    def _record_use(self, kind: str, topic: str, found: bool) -> None:
+        """Учитывает обращение пользователя к материалу"""
+        with self.lock:
+            if found and (kind, topic) in self._prefetched:
+                self._prefetched.discard((kind, topic))
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+
+    def get_topic_info(self, topic: str, update_callback: Optional[Callable[[str], None]] = None) -> List[str]:
+        """
+        Возвращает главы темы из кэша (в том числе подготовленные заранее) или генерирует их.
+
+        Args:
+            topic (str): Тема
+            update_callback (Callable, optional): Функция обновления статуса загрузки
+
+        Returns:
+            List[str]: Сообщения с информацией по теме
+        """
+        found = self.text_cache_service.get_text(topic, TOPIC_CHAPTERS_TYPE) is not None
+        self._record_use("topic_info", topic, found)
+        return self.topic_service.get_cached_topic_info(topic, update_callback, self.text_cache_service)
+
+    def get_test(self, topic: str) -> Dict[str, Any]:
+        """
+        Возвращает заранее сгенерированный тест по теме или генерирует новый.
+
+        Подготовленный тест удаляется из кэша после выдачи.
+
+        Args:
+            topic (str): Тема
+
+        Returns:
+            Dict[str, Any]: Данные теста
+        """
+        cached = self.text_cache_service.get_text(topic, PREFETCHED_TEST_TYPE)
+        test_data = None
+        if cached:
+            self.text_cache_service.delete_text(topic, PREFETCHED_TEST_TYPE)
+            try:
+                test_data = json.loads(cached)
+            except ValueError as e:
+                self._logger.warning(f"Не удалось прочитать подготовленный тест по теме '{topic}': {e}")
+
+        found = bool(test_data and test_data.get('original_questions'))
+        self._record_use("test", topic, found)
+        if found:
+            self._logger.info(f"Использован заранее подготовленный тест по теме '{topic}'")
+            return test_data
+        return self.test_service.generate_test(topic)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику упреждающей загрузки.
+
+        Returns:
+            Dict[str, Any]: Счетчики, доля попаданий (hit_rate) и доля использованного (precision)
+        """
+        now = time.time()
+        with self.lock:
+            stats = self.stats.copy()
+            stats["pending"] = len(self.pending)
+            stats["unused"] = len(self._prefetched)
+            stats["budget_used"] = sum(cost for spent_at, cost in self._spent if now - spent_at <= 3600)
+        stats["budget_per_hour"] = self.budget_per_hour
+        requests = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / requests if requests else 0.0
+        stats["precision"] = stats["hits"] / stats["prefetched"] if stats["prefetched"] else 0.0
+        return stats
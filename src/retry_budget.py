@@ -0,0 +1,83 @@
+"""
+Общий бюджет повторных запросов к Gemini.
+
+Повтор запроса из-за недостаточного качества ответа (например, слишком
+короткой главы) стоит столько же, сколько исходный запрос. Чтобы
+повторы не умножали нагрузку в периоды, когда модель стабильно отвечает
+коротко, все они расходуют жетоны из одного ведра (token bucket): ведро
+вмещает capacity жетонов и пополняется со скоростью refill_per_minute.
+Когда жетонов нет, ответ принимается как есть.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict
+
+
+class RetryBudget:
+    """Потокобезопасный token bucket для повторных запросов"""
+
+    def __init__(self, capacity: float = 10, refill_per_minute: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Инициализация бюджета.
+
+        Args:
+            capacity (float): Максимальное количество жетонов (повторов подряд)
+            refill_per_minute (float): Сколько жетонов добавляется в минуту
+            clock (Callable): Источник времени в секундах
+        """
+        self.capacity = float(capacity)
+        self.refill_per_second = refill_per_minute / 60.0
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+        self.stats = {"granted": 0, "denied": 0}
+
+    def _refill(self) -> None:
+        """Начисляет жетоны за прошедшее время"""
+        now = self._clock()
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+        self._updated_at = now
+
+    def try_acquire(self, cost: float = 1) -> bool:
+        """
+        Забирает жетоны на повтор, если они есть.
+
+        Args:
+            cost (float): Стоимость повтора в жетонах
+
+        Returns:
+            bool: True если повтор разрешен
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= cost:
+                self._tokens -= cost
+                self.stats["granted"] += 1
+                return True
+            self.stats["denied"] += 1
+            return False
+
+    def available(self) -> float:
+        """Возвращает текущее количество жетонов"""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику бюджета.
+
+        Returns:
+            Dict[str, Any]: Разрешенные и отклоненные повторы, емкость и остаток жетонов
+        """
+        with self._lock:
+            self._refill()
+            stats = self.stats.copy()
+            stats["capacity"] = self.capacity
+            stats["available"] = round(self._tokens, 2)
+        return stats
@@ -0,0 +1,87 @@
+"""
+Простые средства обработки русского текста для локального поиска и классификации.
+
+Стеммер облегченный: отбрасывает самое длинное из распространенных
+окончаний, оставляя основу не короче трех символов. Для сопоставления
+названий тем и событий этого достаточно ("Петра I" и "Петр I",
+"революции" и "революция" дают одинаковые основы). Суффикс -ов/-ев,
+оставшийся после окончания, тоже отбрасывается, чтобы все падежи фамилий
+сводились к одной основе ("Годунов" и "Годунова" дают "годун").
+"""
+
+import re
+from typing import List
+
+_WORD_RE = re.compile(r"[0-9a-zа-я]+")
+
+# Окончания, отсортированные по убыванию длины
+_ENDINGS = tuple(sorted({
+    "иями", "ями", "ами", "ией", "иях", "ях", "ах", "ов", "ев", "ей", "ой", "ый", "ий", "ая", "яя",
+    "ое", "ее", "ые", "ие", "ого", "его", "ому", "ему", "ым", "им", "ом", "ем", "ую", "юю", "ых", "их",
+    "ия", "ие", "ии", "ию", "ием", "ья", "ье", "ьи", "ью", "ть", "ться", "лся", "лась", "лось", "лись",
+    "или", "ить",
+    "ла", "ло", "ли", "ет", "ют", "ит", "ят", "ешь", "ишь", "ется", "ются", "ился", "ась", "ось",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+}, key=len, reverse=True))
+
+# Суффиксы притяжательных прилагательных и фамилий (Годунов-а, Пугачев-ым)
+_SURNAME_SUFFIXES = ("ов", "ев")
+
+# Служебные слова, не несущие смысла для поиска
+STOP_WORDS = frozenset({
+    "и", "в", "во", "на", "о", "об", "обо", "у", "с", "со", "к", "ко", "по", "из", "за", "от", "до",
+    "для", "при", "про", "под", "над", "а", "но", "или", "ли", "же", "бы", "не", "это", "как", "что",
+    "его", "ее", "их", "он", "она", "они", "мне", "год", "года", "году",
+})
+
+
+def normalize(text: str) -> str:
+    """
+    Приводит текст к нижнему регистру и заменяет "ё" на "е".
+
+    Args:
+        text (str): Исходный текст
+
+    Returns:
+        str: Нормализованный текст
+    """
+    return text.lower().replace("ё", "е")
+
+
+def stem(word: str) -> str:
+    """
+    Возвращает основу слова.
+
+    Args:
+        word (str): Слово в нижнем регистре
+
+    Returns:
+        str: Основа слова
+    """
+    if len(word) <= 3 or not ("а" <= word[0] <= "я"):
+        return word
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            base = word[:-len(ending)]
+            # Без окончания фамилия сводится к той же основе, что и в именительном падеже
+            if ending not in _SURNAME_SUFFIXES and base.endswith(_SURNAME_SUFFIXES) and len(base) >= 5:
+                base = base[:-2]
+            return base
+    return word
+
+
+def tokenize(text: str, drop_stop_words: bool = True) -> List[str]:
+    """
+    Разбивает текст на основы слов.
+
+    Args:
+        text (str): Исходный текст
+        drop_stop_words (bool): Отбрасывать ли служебные слова
+
+    Returns:
+        List[str]: Основы слов в порядке следования
+    """
+    words = _WORD_RE.findall(normalize(text))
+    if drop_stop_words:
+        words = [word for word in words if word not in STOP_WORDS]
+    return [stem(word) for word in words]
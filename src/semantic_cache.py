@@ -0,0 +1,346 @@
+"""
+Семантический кэш ответов на вопросы в режиме беседы.
+
+Обычный кэш APIClient работает по точному тексту промпта, поэтому
+переформулированный вопрос ("Когда было Крещение Руси?" и "в каком году
+произошло крещение Руси") всегда вызывает новый запрос к Gemini.
+SemanticAnswerCache приводит слова вопроса к основам общим стеммером
+(src/russian_text.py), сравнивает вопросы по локальным векторам TF-IDF
+символьных n-грамм основ (без внешних сервисов) и возвращает сохраненный
+ответ, если косинусная близость к одному из прошлых вопросов выше порога
+и у каждого слова одного вопроса есть пара в другом.
+
+Качество попаданий контролируется выборочной проверкой: для доли
+попаданий ответ все равно запрашивается у Gemini и сравнивается с
+кэшированным; сильно отличающиеся ответы считаются ложными попаданиями.
+"""
+
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from src.interfaces import ILogger
+from src.russian_text import STOP_WORDS, normalize as normalize_text, stem, tokenize
+
+# Равнозначные формулировки вопросов приводятся к одной
+_QUESTION_SYNONYMS = (
+    (re.compile(r"\bв каком году\b|\bв какой год\b|\bкакого года\b|\bкакой год\b"), "когда"),
+    (re.compile(r"\bкто такой\b|\bкто такая\b|\bкто такие\b"), "кто"),
+    (re.compile(r"\bчто такое\b"), "что"),
+    (re.compile(r"\bпо какой причине\b|\bзачем\b"), "почему"),
+    # Глагол и отглагольное существительное с чередованием ст/щ стеммер не сводит к одной основе
+    (re.compile(r"\bкрести(?:ть|л|ла|ли|ло|лся|лась|лись)\b"), "крещение"),
+)
+
+# Слова беседы, не влияющие на смысл исторического вопроса (дополняют служебные слова russian_text)
+_CONVERSATION_STOP_WORDS = frozenset({
+    "был", "была", "было", "были", "эта", "этот", "пожалуйста", "расскажи", "расскажите", "объясни",
+    "объясните", "опиши", "подскажи", "скажи", "произошло", "произошла", "произошел", "случилось",
+    "такое",
+})
+
+# Вопросительные слова: вопросы с разными вопросительными словами не считаются близкими
+_QUESTION_WORDS = frozenset({"когда", "почему", "кто", "где", "что", "как", "сколько", "какой", "какие", "какая"})
+
+# Основы вопросительных слов и отбрасываемых слов
+_QUESTION_STEMS = frozenset(stem(word) for word in _QUESTION_WORDS)
+_STOP_STEMS = frozenset(stem(word) for word in (STOP_WORDS | _CONVERSATION_STOP_WORDS) - _QUESTION_WORDS)
+
+
+class SemanticAnswerCache:
+    """
+    Кэш ответов, ключом которого служит смысл вопроса, а не точная строка.
+
+    Вопросы хранятся вместе с частотами символьных n-грамм. Поиск
+    кандидатов идет по инвертированному индексу n-грамм, после чего для
+    кандидатов считается косинусная близость векторов TF-IDF.
+    """
+
+    def __init__(self, logger: ILogger, threshold: float = 0.8, max_entries: int = 2000,
+                 ttl: int = 86400, ngram_size: int = 3, sample_rate: float = 0.02,
+                 false_hit_threshold: float = 0.3,
+                 normalizer: Optional[Callable[[str], str]] = None):
+        """
+        Инициализация кэша.
+
+        Args:
+            logger (ILogger): Логгер для записи информации
+            threshold (float): Минимальная косинусная близость вопросов для попадания
+            max_entries (int): Максимальное количество сохраненных вопросов
+            ttl (int): Время жизни ответа в секундах
+            ngram_size (int): Длина символьных n-грамм
+            sample_rate (float): Доля попаданий, проверяемых повторным запросом к API
+            false_hit_threshold (float): Близость ответов, ниже которой попадание считается ложным
+            normalizer (Callable, optional): Предварительная нормализация текста вопроса
+        """
+        self._logger = logger
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.ngram_size = ngram_size
+        self.sample_rate = sample_rate
+        self.false_hit_threshold = false_hit_threshold
+        self.normalizer = normalizer
+        self.lock = threading.RLock()
+
+        # Вопрос (нормализованный) -> запись; порядок соответствует LRU
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # n-грамма -> множество нормализованных вопросов, где она встречается
+        self.index: Dict[str, Set[str]] = defaultdict(set)
+
+        self.stats = {
+            "lookups": 0,
+            "hits": 0,
+            "exact_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "sampled": 0,
+            "false_hits": 0
+        }
+
+    # --- Векторизация ---
+
+    def normalize(self, question: str) -> str:
+        """
+        Приводит вопрос к канонической форме.
+
+        Args:
+            question (str): Исходный вопрос
+
+        Returns:
+            str: Нормализованный вопрос
+        """
+        text = normalize_text(self.normalizer(question) if self.normalizer else question)
+        for pattern, replacement in _QUESTION_SYNONYMS:
+            text = pattern.sub(replacement, text)
+        # Основы слов общего стеммера: "Руси" и "Русь", "крещения" и "крещение" совпадают
+        words = [word for word in tokenize(text, drop_stop_words=False) if word not in _STOP_STEMS]
+        return " ".join(words)
+
+    def _ngrams(self, normalized: str) -> Counter:
+        """
+        Возвращает частоты признаков вопроса: символьных n-грамм основ слов (с
+        границами слов) и целых основ. n-граммы сглаживают опечатки, а целые основы
+        не дают считать близкими вопросы, различающиеся ключевым словом
+        ("началась" и "закончилась").
+        """
+        grams = Counter()
+        size = self.ngram_size
+        for word in normalized.split():
+            grams[f"w:{word}"] += 1
+            padded = f" {word} "
+            if len(padded) <= size:
+                grams[padded] += 1
+                continue
+            for i in range(len(padded) - size + 1):
+                grams[padded[i:i + size]] += 1
+        return grams
+
+    def _words_aligned(self, normalized: str, other: str) -> bool:
+        """
+        Проверяет, что у каждого слова одного вопроса есть пара в другом: та же
+        основа или близкое написание (опечатка). Уточняющее слово без пары
+        ("Великая Отечественная" и "Отечественная") меняет смысл вопроса.
+        """
+        words, other_words = set(normalized.split()), set(other.split())
+        unmatched = words ^ other_words
+        for word in unmatched:
+            grams = set(self._ngrams(word))
+            pool = other_words if word in words else words
+            if not any(self._dice(grams, set(self._ngrams(candidate))) >= 0.5 for candidate in pool):
+                return False
+        return True
+
+    @staticmethod
+    def _dice(grams: Set[str], other: Set[str]) -> float:
+        """Коэффициент Дайса двух множеств признаков слова"""
+        return 2 * len(grams & other) / (len(grams) + len(other)) if grams or other else 0.0
+
+    @staticmethod
+    def _intent(normalized: str) -> Optional[str]:
+        """Возвращает первое вопросительное слово вопроса"""
+        for word in normalized.split():
+            if word in _QUESTION_STEMS:
+                return word
+        return None
+
+    def _idf(self, gram: str) -> float:
+        """Обратная частота n-граммы по сохраненным вопросам"""
+        df = len(self.index.get(gram, ()))
+        return math.log((len(self.entries) + 1) / (df + 1)) + 1.0
+
+    def _weights(self, grams: Counter) -> Tuple[Dict[str, float], float]:
+        """Возвращает веса TF-IDF и норму вектора"""
+        weights = {gram: count * self._idf(gram) for gram, count in grams.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return weights, norm
+
+    def _similarity(self, weights: Dict[str, float], norm: float, grams: Counter) -> float:
+        """Косинусная близость запроса к сохраненному вопросу"""
+        other_weights, other_norm = self._weights(grams)
+        if not norm or not other_norm:
+            return 0.0
+        dot = sum(weight * other_weights.get(gram, 0.0) for gram, weight in weights.items())
+        return dot / (norm * other_norm)
+
+    # --- Публичный интерфейс ---
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Ищет ответ на близкий по смыслу вопрос.
+
+        Args:
+            question (str): Вопрос пользователя
+
+        Returns:
+            Optional[Dict[str, Any]]: {'answer', 'question', 'similarity'} или None при промахе
+        """
+        normalized = self.normalize(question)
+        with self.lock:
+            self.stats["lookups"] += 1
+            if not normalized:
+                self.stats["misses"] += 1
+                return None
+
+            now = time.time()
+            entry = self.entries.get(normalized)
+            if entry and now - entry["created_at"] <= self.ttl:
+                self.entries.move_to_end(normalized)
+                self.stats["hits"] += 1
+                self.stats["exact_hits"] += 1
+                return {"answer": entry["answer"], "question": entry["question"], "similarity": 1.0}
+
+            grams = self._ngrams(normalized)
+            intent = self._intent(normalized)
+            candidates = set()
+            for gram in grams:
+                candidates.update(self.index.get(gram, ()))
+
+            weights, norm = self._weights(grams)
+            best_key, best_similarity = None, 0.0
+            for key in candidates:
+                candidate = self.entries[key]
+                if (now - candidate["created_at"] > self.ttl or self._intent(key) != intent
+                        or not self._words_aligned(normalized, key)):
+                    continue
+                similarity = self._similarity(weights, norm, candidate["grams"])
+                if similarity > best_similarity:
+                    best_key, best_similarity = key, similarity
+
+            if best_key is None or best_similarity < self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            self.entries.move_to_end(best_key)
+            self.stats["hits"] += 1
+            best = self.entries[best_key]
+            self._logger.debug(f"Семантический кэш: '{question}' ~ '{best['question']}' ({best_similarity:.2f})")
+            return {"answer": best["answer"], "question": best["question"], "similarity": best_similarity}
+
+    def store(self, question: str, answer: str) -> None:
+        """
+        Сохраняет ответ на вопрос.
+
+        Args:
+            question (str): Вопрос пользователя
+            answer (str): Ответ API
+        """
+        normalized = self.normalize(question)
+        if not normalized or not answer:
+            return
+
+        with self.lock:
+            if normalized in self.entries:
+                self._remove(normalized)
+            grams = self._ngrams(normalized)
+            self.entries[normalized] = {
+                "question": question,
+                "answer": answer,
+                "grams": grams,
+                "created_at": time.time()
+            }
+            for gram in grams:
+                self.index[gram].add(normalized)
+            self.stats["stores"] += 1
+
+            while len(self.entries) > self.max_entries:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def _remove(self, normalized: str) -> None:
+        """Удаляет вопрос из хранилища и индекса"""
+        entry = self.entries.pop(normalized, None)
+        if not entry:
+            return
+        for gram in entry["grams"]:
+            keys = self.index.get(gram)
+            if keys is not None:
+                keys.discard(normalized)
+                if not keys:
+                    del self.index[gram]
+
+    def invalidate(self, question: str) -> None:
+        """
+        Удаляет ответ на вопрос (например, после обнаружения ложного попадания).
+
+        Args:
+            question (str): Вопрос, под которым был сохранен ответ
+        """
+        with self.lock:
+            self._remove(self.normalize(question))
+
+    def should_sample(self) -> bool:
+        """
+        Решает, нужно ли проверить очередное попадание повторным запросом к API.
+
+        Returns:
+            bool: True если попадание нужно проверить
+        """
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def record_sample(self, cached_answer: str, fresh_answer: str) -> bool:
+        """
+        Сравнивает кэшированный ответ со свежим ответом API.
+
+        Args:
+            cached_answer (str): Ответ из кэша
+            fresh_answer (str): Ответ, полученный от API на текущий вопрос
+
+        Returns:
+            bool: True если попадание признано ложным
+        """
+        cached_grams = self._ngrams(self.normalize(cached_answer))
+        fresh_grams = self._ngrams(self.normalize(fresh_answer))
+        # Для ответов IDF по вопросам не имеет смысла, сравниваем частоты напрямую
+        dot = sum(count * fresh_grams.get(gram, 0) for gram, count in cached_grams.items())
+        norms = (math.sqrt(sum(c * c for c in cached_grams.values()))
+                 * math.sqrt(sum(c * c for c in fresh_grams.values())))
+        similarity = dot / norms if norms else 0.0
+        with self.lock:
+            false_hit = similarity < self.false_hit_threshold
+            self.stats["sampled"] += 1
+            if false_hit:
+                self.stats["false_hits"] += 1
+        return false_hit
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику кэша.
+
+        Returns:
+            Dict[str, Any]: Попадания, промахи, доля попаданий и оценка доли ложных попаданий
+        """
+        with self.lock:
+            stats = self.stats.copy()
+            stats["entries"] = len(self.entries)
+            stats["indexed_ngrams"] = len(self.index)
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["false_hit_rate"] = stats["false_hits"] / stats["sampled"] if stats["sampled"] else 0.0
+        stats["threshold"] = self.threshold
+        return stats
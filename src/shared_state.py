@@ -0,0 +1,383 @@
+"""
+Модуль общего хранилища состояния для многопроцессного режима бота.
+
+Несколько процессов-обработчиков бота обмениваются через это хранилище
+состояниями пользователей, активными сообщениями и кэшем фактов по темам.
+Поддерживаются два бэкенда:
+- SQLite (локальный файл, подходит для нескольких процессов на одном хосте)
+- Redis (используется соединение существующего DistributedCache)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from src.interfaces import ILogger
+
+# Признак неудачного обращения к Redis или разомкнутого предохранителя
+_BACKEND_FAILED = object()
+
+
+class SharedStateBackend(ABC):
+    """Интерфейс общего хранилища состояния, разделенного на пространства имен"""
+
+    @abstractmethod
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """
+        Получает значение из хранилища.
+
+        Args:
+            namespace (str): Пространство имен (например, 'user_states')
+            key (str): Ключ внутри пространства имен
+            default (Any): Значение по умолчанию
+
+        Returns:
+            Any: Сохраненное значение или значение по умолчанию
+        """
+        pass
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """
+        Сохраняет значение в хранилище.
+
+        Args:
+            namespace (str): Пространство имен
+            key (str): Ключ внутри пространства имен
+            value (Any): Значение (должно сериализоваться в JSON)
+            ttl (int, optional): Время жизни записи в секундах
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> bool:
+        """
+        Удаляет значение из хранилища.
+
+        Args:
+            namespace (str): Пространство имен
+            key (str): Ключ внутри пространства имен
+
+        Returns:
+            bool: True если запись была удалена
+        """
+        pass
+
+    @abstractmethod
+    def keys(self, namespace: str) -> List[str]:
+        """
+        Возвращает список ключей пространства имен.
+
+        Args:
+            namespace (str): Пространство имен
+
+        Returns:
+            List[str]: Список ключей
+        """
+        pass
+
+    def set_many(self, namespace: str, items: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        """
+        Сохраняет несколько значений за одну операцию.
+
+        Args:
+            namespace (str): Пространство имен
+            items (Dict[str, Any]): Словарь ключ -> значение
+            ttl (int, optional): Время жизни записей в секундах
+        """
+        for key, value in items.items():
+            self.set(namespace, key, value, ttl)
+
+    def get_all(self, namespace: str) -> Dict[str, Any]:
+        """
+        Возвращает все записи пространства имен.
+
+        Args:
+            namespace (str): Пространство имен
+
+        Returns:
+            Dict[str, Any]: Словарь ключ -> значение
+        """
+        result = {}
+        for key in self.keys(namespace):
+            value = self.get(namespace, key)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def close(self) -> None:
+        """Закрывает соединения с хранилищем"""
+        pass
+
+
+class SQLiteStateBackend(SharedStateBackend):
+    """
+    Общее хранилище состояния на основе SQLite.
+
+    Используется режим WAL, поэтому несколько процессов могут читать
+    одновременно, а записи сериализуются самой базой данных.
+    """
+
+    def __init__(self, logger: ILogger, db_file: str = 'shared_state.db', timeout: float = 10.0):
+        """
+        Инициализация хранилища.
+
+        Args:
+            logger (ILogger): Логгер для записи информации
+            db_file (str): Путь к файлу базы данных
+            timeout (float): Время ожидания блокировки базы в секундах
+        """
+        self._logger = logger
+        self.db_file = db_file
+        self.timeout = timeout
+        # Соединение на каждый поток: sqlite3 не любит общие соединения между потоками
+        self._local = threading.local()
+        self._create_schema()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Возвращает соединение с базой для текущего потока"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_file, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _create_schema(self) -> None:
+        """Создает таблицу хранилища, если она отсутствует"""
+        directory = os.path.dirname(self.db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._get_connection().execute(
+            "CREATE TABLE IF NOT EXISTS shared_state ("
+            "namespace TEXT NOT NULL, "
+            "key TEXT NOT NULL, "
+            "value TEXT NOT NULL, "
+            "expires_at REAL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        try:
+            row = self._get_connection().execute(
+                "SELECT value, expires_at FROM shared_state WHERE namespace = ? AND key = ?",
+                (namespace, str(key))
+            ).fetchone()
+            if not row:
+                return default
+            value, expires_at = row
+            if expires_at is not None and expires_at < time.time():
+                self.delete(namespace, key)
+                return default
+            return json.loads(value)
+        except Exception as e:
+            self._logger.error(f"Ошибка чтения из общего хранилища ({namespace}/{key}): {e}")
+            return default
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        try:
+            self._get_connection().execute(
+                "INSERT OR REPLACE INTO shared_state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, str(key), json.dumps(value, ensure_ascii=False), expires_at)
+            )
+        except Exception as e:
+            self._logger.error(f"Ошибка записи в общее хранилище ({namespace}/{key}): {e}")
+
+    def set_many(self, namespace: str, items: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        if not items:
+            return
+        expires_at = time.time() + ttl if ttl else None
+        rows = [
+            (namespace, str(key), json.dumps(value, ensure_ascii=False), expires_at)
+            for key, value in items.items()
+        ]
+        connection = self._get_connection()
+        try:
+            # Одна транзакция на весь пакет вместо фиксации каждой записи
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT OR REPLACE INTO shared_state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            connection.execute("COMMIT")
+        except Exception as e:
+            try:
+                connection.execute("ROLLBACK")
+            except Exception:
+                pass
+            self._logger.error(f"Ошибка пакетной записи в общее хранилище ({namespace}): {e}")
+
+    def delete(self, namespace: str, key: str) -> bool:
+        try:
+            cursor = self._get_connection().execute(
+                "DELETE FROM shared_state WHERE namespace = ? AND key = ?",
+                (namespace, str(key))
+            )
+            return cursor.rowcount > 0
+        except Exception as e:
+            self._logger.error(f"Ошибка удаления из общего хранилища ({namespace}/{key}): {e}")
+            return False
+
+    def keys(self, namespace: str) -> List[str]:
+        try:
+            rows = self._get_connection().execute(
+                "SELECT key FROM shared_state WHERE namespace = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (namespace, time.time())
+            ).fetchall()
+            return [row[0] for row in rows]
+        except Exception as e:
+            self._logger.error(f"Ошибка получения ключей общего хранилища ({namespace}): {e}")
+            return []
+
+    def close(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class RedisStateBackend(SharedStateBackend):
+    """
+    Общее хранилище состояния на основе Redis.
+
+    Обращается к Redis через DistributedCache: использует его клиент, чтобы
+    не держать отдельный пул соединений на каждый процесс, и его
+    предохранитель. Пока предохранитель разомкнут, запросы в Redis не
+    отправляются и не ждут таймаута сокета: операции выполняются в
+    резервном локальном хранилище (SQLite), общем для процессов этой машины.
+    Записи, сделанные в резервном хранилище, в Redis после восстановления не
+    переносятся.
+    """
+
+    KEY_PREFIX = "shared_state:"
+
+    def __init__(self, logger: ILogger, distributed_cache, fallback: Optional[SharedStateBackend] = None):
+        """
+        Инициализация хранилища.
+
+        Args:
+            logger (ILogger): Логгер для записи информации
+            distributed_cache: Экземпляр DistributedCache с подключением к Redis
+            fallback (SharedStateBackend, optional): Хранилище на время недоступности Redis
+        """
+        self._logger = logger
+        self.distributed_cache = distributed_cache
+        self.fallback = fallback
+
+    @property
+    def redis_client(self):
+        """Клиент Redis распределенного кэша"""
+        return self.distributed_cache.redis_client
+
+    def _make_key(self, namespace: str, key: str) -> str:
+        """Формирует ключ Redis для записи"""
+        return f"{self.KEY_PREFIX}{namespace}:{key}"
+
+    def _redis_call(self, operation: str, func) -> Any:
+        """Выполняет обращение к Redis через предохранитель распределенного кэша"""
+        from src.distributed_cache import _REDIS_FAILED
+        result = self.distributed_cache._redis_call(f"shared_state {operation}", func)
+        return _BACKEND_FAILED if result is _REDIS_FAILED else result
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        data = self._redis_call("get", lambda: self.redis_client.get(self._make_key(namespace, key)))
+        if data is _BACKEND_FAILED:
+            return self.fallback.get(namespace, key, default) if self.fallback else default
+        if data is None:
+            return default
+        try:
+            return json.loads(data)
+        except Exception as e:
+            self._logger.error(f"Ошибка чтения из Redis-хранилища ({namespace}/{key}): {e}")
+            return default
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        data = json.dumps(value, ensure_ascii=False)
+        redis_key = self._make_key(namespace, key)
+        if ttl:
+            result = self._redis_call("set", lambda: self.redis_client.setex(redis_key, ttl, data))
+        else:
+            result = self._redis_call("set", lambda: self.redis_client.set(redis_key, data))
+        if result is _BACKEND_FAILED and self.fallback:
+            self.fallback.set(namespace, key, value, ttl)
+
+    def set_many(self, namespace: str, items: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        if not items:
+            return
+
+        def run_pipeline():
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for key, value in items.items():
+                data = json.dumps(value, ensure_ascii=False)
+                if ttl:
+                    pipeline.setex(self._make_key(namespace, key), ttl, data)
+                else:
+                    pipeline.set(self._make_key(namespace, key), data)
+            return pipeline.execute()
+
+        if self._redis_call("set_many", run_pipeline) is _BACKEND_FAILED and self.fallback:
+            self.fallback.set_many(namespace, items, ttl)
+
+    def delete(self, namespace: str, key: str) -> bool:
+        result = self._redis_call("delete", lambda: self.redis_client.delete(self._make_key(namespace, key)))
+        if result is _BACKEND_FAILED:
+            return self.fallback.delete(namespace, key) if self.fallback else False
+        return bool(result)
+
+    def keys(self, namespace: str) -> List[str]:
+        prefix = self._make_key(namespace, "")
+        redis_keys = self._redis_call(
+            "keys", lambda: list(self.redis_client.scan_iter(match=f"{prefix}*", count=100))
+        )
+        if redis_keys is _BACKEND_FAILED:
+            return self.fallback.keys(namespace) if self.fallback else []
+        result = []
+        for redis_key in redis_keys:
+            if isinstance(redis_key, bytes):
+                redis_key = redis_key.decode('utf-8')
+            result.append(redis_key[len(prefix):])
+        return result
+
+
+def create_state_backend(config, logger: ILogger, distributed_cache=None) -> SharedStateBackend:
+    """
+    Создает общее хранилище состояния согласно конфигурации.
+
+    Args:
+        config: Конфигурация приложения
+        logger (ILogger): Логгер для записи информации
+        distributed_cache: Экземпляр DistributedCache (для бэкенда Redis)
+
+    Returns:
+        SharedStateBackend: Хранилище состояния
+    """
+    backend_name = getattr(config, 'shared_state_backend', 'sqlite')
+    db_file = getattr(config, 'shared_state_file', 'shared_state.db')
+
+    if backend_name == 'redis':
+        if distributed_cache is None and getattr(config, 'redis_url', ''):
+            from src.distributed_cache import DistributedCache
+            distributed_cache = DistributedCache(logger, redis_url=config.redis_url)
+
+        if distributed_cache is not None and distributed_cache.using_redis:
+            from src.metrics import registry
+            registry.register_stats(
+                'bot_distributed_cache', distributed_cache.get_stats, "Распределенный кэш",
+                counters=('hits', 'misses', 'sets', 'evictions', 'removes', 'redis_hits', 'redis_ops',
+                          'redis_errors', 'redis_skipped', 'invalidations_sent', 'invalidations_received',
+                          'circuit_open_count'),
+                gauges=('size_local', 'max_local_size'))
+            logger.info("Общее хранилище состояния: Redis")
+            return RedisStateBackend(logger, distributed_cache,
+                                     fallback=SQLiteStateBackend(logger, db_file))
+
+        logger.warning("Redis недоступен, общее хранилище состояния переключено на SQLite")
+
+    logger.info(f"Общее хранилище состояния: SQLite ({db_file})")
+    return SQLiteStateBackend(logger, db_file)
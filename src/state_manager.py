@@ -15,7 +15,10 @@ class StateManager(BaseService):
     Обеспечивает хранение и управление состояниями пользовательских диалогов.
     """
 
-    def __init__(self, logger: ILogger, state_file: str = 'user_states.json', auto_save: bool = True, save_interval: int = 300):
+    SHARED_NAMESPACE = "user_states"
+
+    def __init__(self, logger: ILogger, state_file: str = 'user_states.json', auto_save: bool = True, save_interval: int = 300,
+                 shared_state=None):
         """
         Инициализация менеджера состояний.
 
@@ -24,11 +27,14 @@ class StateManager(BaseService):
             state_file (str): Путь к файлу для хранения состояний
             auto_save (bool): Автоматически сохранять состояния с интервалом
             save_interval (int): Интервал автосохранения в секундах
+            shared_state (SharedStateBackend, optional): Общее хранилище для многопроцессного режима.
+                Если указано, состояния читаются и пишутся через него, а не через локальный файл
         """
         super().__init__(logger)
         self.state_file = state_file
         self.auto_save = auto_save
         self.save_interval = save_interval
+        self.shared_state = shared_state
         self.states: Dict[int, Dict[str, Any]] = {}
         self.lock = threading.RLock()  # Для потокобезопасности
         self.last_save_time = 0
@@ -37,7 +43,8 @@ class StateManager(BaseService):
         self._load_states()
 
         # Запускаем автосохранение, если оно включено
-        if self.auto_save:
+        # (общее хранилище пишет сразу, фоновое сохранение ему не нужно)
+        if self.auto_save and self.shared_state is None:
             self._start_auto_save()
 
     def _do_initialize(self) -> bool:
@@ -65,6 +72,9 @@ class StateManager(BaseService):
             Dict[str, Any]: Состояние пользователя
         """
         with self.lock:
+            if self.shared_state is not None:
+                self._pull_shared_state(user_id)
+
             # Если состояние для пользователя не существует, создаем его
             if str(user_id) not in self.states:
                 self.states[str(user_id)] = {
@@ -91,6 +101,10 @@ class StateManager(BaseService):
             self.states[str(user_id)] = state_data
             self.states[str(user_id)]["last_interaction"] = int(time.time())
 
+            if self.shared_state is not None:
+                self._push_shared_state(user_id)
+                return
+
             # Сохраняем состояния, если прошло достаточно времени с последнего сохранения
             current_time = time.time()
             if current_time - self.last_save_time > self.save_interval:
@@ -129,6 +143,10 @@ class StateManager(BaseService):
             # Сохраняем обновленное состояние
             self.states[str(user_id)] = user_state
 
+            if self.shared_state is not None:
+                self._push_shared_state(user_id)
+                return
+
             # Сохраняем состояния, если прошло достаточно времени с последнего сохранения
             current_time = time.time()
             if current_time - self.last_save_time > self.save_interval:
@@ -143,6 +161,11 @@ class StateManager(BaseService):
             user_id (int): ID пользователя
         """
         with self.lock:
+            if self.shared_state is not None:
+                self.shared_state.delete(self.SHARED_NAMESPACE, str(user_id))
+                self.states.pop(str(user_id), None)
+                return
+
             # Удаляем состояние пользователя
             if str(user_id) in self.states:
                 del self.states[str(user_id)]
@@ -175,6 +198,9 @@ class StateManager(BaseService):
             List[int]: Список ID активных пользователей
         """
         with self.lock:
+            if self.shared_state is not None:
+                self.states = self.shared_state.get_all(self.SHARED_NAMESPACE)
+
             current_time = int(time.time())
             active_users = []
 
@@ -188,8 +214,26 @@ class StateManager(BaseService):
 
             return active_users
 
+    def _pull_shared_state(self, user_id: int) -> None:
+        """Обновляет локальную копию состояния пользователя из общего хранилища"""
+        state = self.shared_state.get(self.SHARED_NAMESPACE, str(user_id))
+        if state is not None:
+            self.states[str(user_id)] = state
+        else:
+            # Состояние могло быть удалено другим процессом
+            self.states.pop(str(user_id), None)
+
+    def _push_shared_state(self, user_id: int) -> None:
+        """Записывает состояние пользователя в общее хранилище"""
+        self.shared_state.set(self.SHARED_NAMESPACE, str(user_id), self.states[str(user_id)])
+
     def _load_states(self) -> None:
         """Загружает состояния из файла"""
+        if self.shared_state is not None:
+            # Состояния читаются из общего хранилища по требованию
+            self.states = {}
+            return
+
         try:
             if os.path.exists(self.state_file):
                 with open(self.state_file, 'r', encoding='utf-8') as f:
@@ -237,6 +281,9 @@ class StateManager(BaseService):
             int: Количество удаленных состояний
         """
         with self.lock:
+            if self.shared_state is not None:
+                self.states = self.shared_state.get_all(self.SHARED_NAMESPACE)
+
             current_time = int(time.time())
             inactive_users = []
 
@@ -248,6 +295,11 @@ class StateManager(BaseService):
             # Удаляем состояния неактивных пользователей
             for user_id in inactive_users:
                 del self.states[user_id]
+                if self.shared_state is not None:
+                    self.shared_state.delete(self.SHARED_NAMESPACE, user_id)
+
+            if self.shared_state is not None:
+                return len(inactive_users)
 
             # Сохраняем состояния
             if inactive_users:
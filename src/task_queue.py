@@ -12,11 +12,19 @@ import time
 import traceback
 from typing import Dict, Any, Callable, List, Optional
 import uuid
+import itertools
+
+# Приоритеты задач: меньшее значение выполняется раньше
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+# Сигнал остановки обработчиков обгоняет любые задачи
+_PRIORITY_STOP = -1
 
 class Task:
     """Представляет отложенную задачу для выполнения"""
     
-    def __init__(self, func: Callable, args: List = None, kwargs: Dict = None):
+    def __init__(self, func: Callable, args: List = None, kwargs: Dict = None, priority: int = PRIORITY_NORMAL):
         """
         Инициализация задачи
 
@@ -24,8 +32,10 @@ class Task:
             func: Функция для выполнения
             args: Позиционные аргументы для функции
             kwargs: Именованные аргументы для функции
+            priority: Приоритет задачи (меньшее значение выполняется раньше)
         """
         self.id = str(uuid.uuid4())
+        self.priority = priority
         self.func = func
         self.args = args or []
         self.kwargs = kwargs or {}
@@ -56,6 +66,7 @@ class Task:
         return {
             "id": self.id,
             "status": self.status,
+            "priority": self.priority,
             "created_at": self.created_at,
             "started_at": self.started_at,
             "completed_at": self.completed_at,
@@ -67,7 +78,12 @@ class Task:
 
 
 class TaskQueue:
-    """Очередь для обработки отложенных задач в фоновом режиме"""
+    """
+    Очередь для обработки отложенных задач в фоновом режиме.
+
+    Задачи выполняются в порядке приоритета, при равном приоритете - в
+    порядке добавления.
+    """
     
     def __init__(self, num_workers: int = 2, logger = None):
         """
@@ -77,7 +93,9 @@ class TaskQueue:
             num_workers: Количество рабочих потоков для выполнения задач
             logger: Логгер для записи информации о задачах
         """
-        self.task_queue = queue.Queue()
+        self.task_queue = queue.PriorityQueue()
+        # Порядковый номер задачи для сохранения порядка при равном приоритете
+        self._sequence = itertools.count()
         self.tasks = {}  # Хранилище задач по ID
         self.workers = []
         self.num_workers = num_workers
@@ -120,7 +138,7 @@ class TaskQueue:
             
             # Очищаем очередь, добавляя специальные задачи остановки
             for _ in range(self.num_workers):
-                self.task_queue.put(None)
+                self.task_queue.put((_PRIORITY_STOP, next(self._sequence), None))
             
             # Ждем завершения рабочих потоков
             for worker in self.workers:
@@ -135,7 +153,7 @@ class TaskQueue:
         while self.running:
             try:
                 # Получаем задачу из очереди
-                task = self.task_queue.get(block=True, timeout=1.0)
+                _, _, task = self.task_queue.get(block=True, timeout=1.0)
                 
                 # None используется как сигнал для остановки
                 if task is None:
@@ -176,7 +194,8 @@ class TaskQueue:
                     self.logger.error(f"Ошибка в цикле обработчика задач: {str(e)}")
                 time.sleep(1.0)  # Небольшая пауза перед продолжением
 
-    def add_task(self, func: Callable, args: List = None, kwargs: Dict = None) -> str:
+    def add_task(self, func: Callable, args: List = None, kwargs: Dict = None,
+                 priority: int = PRIORITY_NORMAL) -> str:
         """
         Добавляет задачу в очередь
 
@@ -184,12 +203,13 @@ class TaskQueue:
             func: Функция для выполнения
             args: Позиционные аргументы для функции
             kwargs: Именованные аргументы для функции
+            priority: Приоритет задачи (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
 
         Returns:
             str: ID добавленной задачи
         """
         # Создаем задачу
-        task = Task(func, args, kwargs)
+        task = Task(func, args, kwargs, priority)
         
         # Сохраняем задачу в хранилище
         with self.lock:
@@ -197,7 +217,7 @@ class TaskQueue:
             self.stats["total"] += 1
         
         # Добавляем задачу в очередь
-        self.task_queue.put(task)
+        self.task_queue.put((priority, next(self._sequence), task))
         
         # Запускаем обработчики, если они еще не запущены
         if not self.running:
@@ -262,6 +282,23 @@ class TaskQueue:
         
         return result
 
+    def pending_count(self, max_priority: Optional[int] = None) -> int:
+        """
+        Возвращает количество задач, ожидающих выполнения
+
+        Args:
+            max_priority: Учитывать только задачи с приоритетом не ниже указанного
+                (значение приоритета не больше max_priority)
+
+        Returns:
+            int: Количество ожидающих задач
+        """
+        with self.task_queue.mutex:
+            return sum(
+                1 for priority, _, task in self.task_queue.queue
+                if task is not None and (max_priority is None or priority <= max_priority)
+            )
+
     def get_stats(self) -> Dict[str, Any]:
         """
         Возвращает статистику выполнения задач
@@ -4,6 +4,7 @@ import queue
 import threading
 from functools import wraps
 import telegram
+from src.tracing import tracer
 
 class TelegramRequestQueue:
     """Класс для управления очередью запросов к Telegram API"""
@@ -147,8 +148,17 @@ class TelegramRequestQueue:
     
     def enqueue(self, func, *args, callback=None, **kwargs):
         """Добавляет запрос в очередь"""
-        self.queue.put((func, args, kwargs, callback))
+        # Запрос выполняется потоком очереди, но его спаны относятся к трассе вызывающего
+        self.queue.put((tracer.bind(func), args, kwargs, callback))
     
+    def get_stats(self):
+        """Возвращает глубину очереди и статистику кэша запросов"""
+        return {
+            "pending": self.queue.qsize(),
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self.request_cache)
+        }
+
     def stop(self):
         """Останавливает обработчик очереди"""
         self.running = False
@@ -5,14 +5,20 @@ import time
 import json
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from src.base_service import BaseService
+from src.tracing import tracer
 
 class TestService(BaseService):
     """Сервис для работы с тестами по истории"""
 
-    def __init__(self, api_client, logger):
+    # Время жизни фактов по теме в общем хранилище (сутки)
+    TOPIC_FACTS_TTL = 86400
+
+    def __init__(self, api_client, logger, shared_state=None):
         super().__init__(logger)
         self.api_client = api_client
         self.topic_facts_cache = {}  # Кэш фактов по темам для разнообразия ответов
+        # Общее хранилище для многопроцессного режима (SharedStateBackend или None)
+        self.shared_state = shared_state
 
     def _do_initialize(self) -> bool:
         """
@@ -42,6 +48,13 @@ class TestService(BaseService):
         """
         if topic in self.topic_facts_cache:
             return self.topic_facts_cache[topic]
+
+        # Факты могли быть уже получены другим процессом бота
+        if self.shared_state is not None:
+            shared_facts = self.shared_state.get("topic_facts", topic)
+            if shared_facts:
+                self.topic_facts_cache[topic] = shared_facts
+                return shared_facts
             
         prompt = f"""Предоставь 30 исторических фактов по теме "{topic}" в формате JSON. 
 Каждый факт должен быть лаконичным и содержать конкретную историческую информацию.
@@ -81,12 +94,15 @@ class TestService(BaseService):
             
             # Сохраняем в кэш
             self.topic_facts_cache[topic] = facts
+            if self.shared_state is not None and facts:
+                self.shared_state.set("topic_facts", topic, facts, ttl=self.TOPIC_FACTS_TTL)
             return facts
             
         except Exception as e:
             self._logger.error(f"Ошибка при получении фактов по теме '{topic}': {e}")
             return []
 
+    @tracer.traced("test.generate_options")
     def _generate_diverse_options(self, topic, correct_answer, question_type, question_context):
         """
         Генерирует логически релевантные варианты ответов на основе правильного ответа и типа вопроса.
@@ -625,6 +641,7 @@ class TestService(BaseService):
         # Если не удалось определить эпоху, возвращаем общую
         return "общая"
 
+    @tracer.traced("test.generate_test")
     def generate_test(self, topic):
         """
         Генерирует тест по заданной теме с гарантированно разными вариантами ответов.
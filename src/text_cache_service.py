@@ -1,29 +1,104 @@
 """Модуль для кэширования текстовых данных"""
 
+import bisect
 import json
 import os
 import time
 import hashlib
-from typing import Dict, Any, Optional, List
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Set
 
 from src.interfaces import ILogger
 from src.base_service import BaseService
+from src.cache_codec import CacheCodec
+from src.tracing import tracer
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка индекса недоступна
+    fcntl = None
+
+INDEX_FILE = 'index.json'
+LOCK_FILE = 'index.lock'
+
 
 class TextCacheService(BaseService):
     """
     Сервис для кэширования текстовых данных, генерируемых ИИ.
-    Хранит кэш в файле и обеспечивает быстрый доступ к ранее сгенерированным текстам.
+
+    Каждый текст хранится в отдельном файле каталога кэша, а небольшой
+    индекс (index.json) связывает нормализованные тему и тип текста с
+    записями. Изменения накапливаются в памяти и записываются пакетом
+    фоновым потоком не чаще раза в flush_interval секунд. Размер кэша
+    ограничен количеством записей и объемом; при превышении удаляются
+    давно не использовавшиеся записи.
+
+    Каталог могут одновременно использовать несколько процессов (рабочие
+    процессы BOT_WORKERS, очистка кэша из main.py). Перед записью индекс
+    объединяется с версией на диске под файловой блокировкой, поэтому записи
+    и удаления других процессов не теряются.
     """
 
-    def __init__(self, logger, cache_file='texts_cache.json', ttl=604800):
+    def __init__(self, logger, cache_dir='texts_cache', ttl=604800, codec: Optional[CacheCodec] = None,
+                 max_entries: int = 2000, max_bytes: int = 200 * 1024 * 1024, flush_interval: float = 2.0,
+                 legacy_file: Optional[str] = 'texts_cache.json', read_only: bool = False):
+        """
+        Инициализация кэша текстов.
+
+        Args:
+            logger: Логгер
+            cache_dir (str): Каталог файлов кэша
+            ttl (int): Время жизни текста в секундах
+            codec (CacheCodec, optional): Кодек сжатия текстов
+            max_entries (int): Максимальное количество записей
+            max_bytes (int): Максимальный суммарный размер файлов записей в байтах
+            flush_interval (float): Интервал пакетной записи на диск в секундах (0 - запись сразу)
+            legacy_file (str, optional): Файл кэша прежнего формата для переноса записей
+            read_only (bool): Только чтение записей, которые пишет другой экземпляр (например, веб-сервер
+                читает кэш бота); изменения не записываются на диск, индекс перечитывается при его обновлении
+        """
         super().__init__(logger)
-        self.cache_file = cache_file
+        self.cache_dir = cache_dir
         self.ttl = ttl
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.legacy_file = legacy_file
+        self.read_only = read_only
+        self._index_version = None
+        # Ключи индекса на диске при последнем чтении или записи: запись, которой больше
+        # нет на диске, удалил другой процесс
+        self._synced_keys: Set[str] = set()
+        # Тексты глав хранятся сжатыми (порог и алгоритм задает кодек)
+        self.codec = codec or CacheCodec()
+        self.lock = threading.RLock()
+
+        # Индекс записей: ключ -> метаданные; порядок соответствует давности использования
+        self.index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Нормализованная тема -> ключи записей и отсортированный список тем для поиска по префиксу
+        self._topic_keys: Dict[str, Set[str]] = {}
+        self._sorted_topics: List[str] = []
+        self.total_bytes = 0
+
+        # Несохраненные изменения: ключ -> закодированный текст, удаленные ключи
+        self._pending_writes: Dict[str, bytes] = {}
+        self._pending_deletes: Set[str] = set()
+        # Записи, которые сейчас пишутся на диск (читаются из памяти до окончания записи)
+        self._in_flight: Dict[str, bytes] = {}
+        self._index_dirty = False
+        self._flush_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+
         self.stats = {
             "hits": 0,
             "misses": 0,
             "sets": 0,
+            "evictions": 0,
+            "expired": 0,
+            "flushes": 0
         }
 
         self._load_cache()
@@ -41,6 +116,7 @@ class TextCacheService(BaseService):
             self._logger.error(f"Ошибка при инициализации TextCacheService: {e}")
             return False
 
+    @tracer.traced("cache.text.get")
     def get_text(self, topic: str, text_type: str) -> Optional[str]:
         """
         Получение текста из кэша.
@@ -54,28 +130,59 @@ class TextCacheService(BaseService):
         """
         cache_key = self._generate_key(topic, text_type)
 
-        if cache_key not in self.cache:
-            self.stats["misses"] += 1
-            self.logger.debug(f"Кэш-промах для темы '{topic}' (тип: {text_type})")
-            return None
+        with self.lock:
+            if cache_key not in self.index:
+                if self.read_only:
+                    self._reload_if_changed()
+                else:
+                    # Запись мог сохранить другой процесс
+                    self._merge_disk_index()
+            cache_item = self.index.get(cache_key)
+            if cache_item is None:
+                self.stats["misses"] += 1
+                self._logger.debug(f"Кэш-промах для темы '{topic}' (тип: {text_type})")
+                return None
+
+            current_time = time.time()
+
+            # Проверяем, не истек ли элемент
+            if current_time > cache_item["created_at"] + self.ttl:
+                # Элемент истек: удаляем его из индекса, файл удалится при записи на диск
+                self._remove_entry(cache_key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                expired = True
+            else:
+                expired = False
+                data = self._pending_writes.get(cache_key) or self._in_flight.get(cache_key)
 
-        cache_item = self.cache[cache_key]
-        current_time = time.time()
+        if expired:
+            self._schedule_flush()
+            self._logger.debug(f"Истек кэш для темы '{topic}' (тип: {text_type})")
+            return None
 
-        # Проверяем, не истек ли элемент
-        if current_time > cache_item["created_at"] + self.ttl:
-            # Элемент истек, удаляем его
-            del self.cache[cache_key]
-            self._save_cache()
-            self.stats["misses"] += 1
-            self.logger.debug(f"Истек кэш для темы '{topic}' (тип: {text_type})")
+        try:
+            if data is None:
+                with open(self._entry_path(cache_key), 'rb') as f:
+                    data = f.read()
+            text = self.codec.decode(data)
+        except Exception as e:
+            self._logger.warning(f"Не удалось прочитать кэш для темы '{topic}' (тип: {text_type}): {e}")
+            with self.lock:
+                self._remove_entry(cache_key)
+                self.stats["misses"] += 1
+            self._schedule_flush()
             return None
 
-        # Обновляем время последнего доступа
-        cache_item["last_accessed"] = current_time
-        self.stats["hits"] += 1
-        self.logger.debug(f"Кэш-попадание для темы '{topic}' (тип: {text_type})")
-        return cache_item["text"]
+        with self.lock:
+            # Обновляем время последнего доступа (запись могла быть удалена другим потоком)
+            if cache_key in self.index:
+                cache_item["last_accessed"] = current_time
+                self.index.move_to_end(cache_key)
+                self._index_dirty = True
+            self.stats["hits"] += 1
+        self._logger.debug(f"Кэш-попадание для темы '{topic}' (тип: {text_type})")
+        return text
 
     def save_text(self, topic: str, text_type: str, text: str) -> None:
         """
@@ -87,49 +194,74 @@ class TextCacheService(BaseService):
             text (str): Текст для сохранения
         """
         cache_key = self._generate_key(topic, text_type)
+        data = self.codec.encode(text)
         current_time = time.time()
 
-        self.cache[cache_key] = {
-            "text": text,
-            "topic": topic,
-            "type": text_type,
-            "created_at": current_time,
-            "last_accessed": current_time
-        }
+        with self.lock:
+            self._remove_entry(cache_key)
+            self._add_entry(cache_key, {
+                "topic": topic,
+                "type": text_type,
+                "created_at": current_time,
+                "last_accessed": current_time,
+                "size": len(data)
+            })
+            self._pending_deletes.discard(cache_key)
+            self._pending_writes[cache_key] = data
+            self.stats["sets"] += 1
+            self._evict()
+        self._schedule_flush()
+        self._logger.info(f"Текст по теме '{topic}' (тип: {text_type}) сохранен в кэш")
+
+    def delete_text(self, topic: str, text_type: str) -> bool:
+        """
+        Удаление текста из кэша.
 
-        self.stats["sets"] += 1
-        self._save_cache()
-        self.logger.info(f"Текст по теме '{topic}' (тип: {text_type}) сохранен в кэш")
+        Args:
+            topic (str): Тема, для которой был сгенерирован текст
+            text_type (str): Тип текста
+
+        Returns:
+            bool: True если запись была удалена
+        """
+        cache_key = self._generate_key(topic, text_type)
+        with self.lock:
+            if not self._remove_entry(cache_key):
+                return False
+        self._schedule_flush()
+        return True
 
     def clear_cache(self, topic_filter: Optional[str] = None) -> int:
         """
         Очистка кэша текстов.
 
         Args:
-            topic_filter (Optional[str]): Если указан, очищает только кэш по определенной теме
+            topic_filter (Optional[str]): Если указан, очищает только записи тем,
+                начинающихся с этой строки (без учета регистра)
 
         Returns:
             int: Количество удаленных записей из кэша
         """
-        count = 0
-        keys_to_delete = []
-
-        if topic_filter:
-            topic_filter = topic_filter.lower()
-            for key, cache_item in self.cache.items():
-                if "topic" in cache_item and topic_filter in cache_item["topic"].lower():
-                    keys_to_delete.append(key)
-        else:
-            keys_to_delete = list(self.cache.keys())
+        with self.lock:
+            if topic_filter:
+                prefix = self._normalize_topic(topic_filter)
+                # Темы с общим префиксом идут в отсортированном списке подряд
+                position = bisect.bisect_left(self._sorted_topics, prefix)
+                keys_to_delete = []
+                while position < len(self._sorted_topics) and self._sorted_topics[position].startswith(prefix):
+                    keys_to_delete.extend(self._topic_keys[self._sorted_topics[position]])
+                    position += 1
+            else:
+                keys_to_delete = list(self.index.keys())
 
-        # Удаляем найденные ключи
-        for key in keys_to_delete:
-            del self.cache[key]
-            count += 1
+            # Удаляем найденные ключи
+            for key in keys_to_delete:
+                self._remove_entry(key)
 
+        count = len(keys_to_delete)
         if count > 0:
-            self._save_cache()
-            self.logger.info(f"Очищено {count} записей из кэша текстов")
+            self._schedule_flush()
+            self._logger.info(f"Очищено {count} записей из кэша текстов")
 
         return count
 
@@ -140,20 +272,23 @@ class TextCacheService(BaseService):
         Returns:
             Dict[str, Any]: Статистика использования кэша
         """
-        stats = self.stats.copy()
-        stats["size"] = len(self.cache)
-
-        # Вычисляем размер кэша в байтах
-        try:
-            stats["size_bytes"] = os.path.getsize(self.cache_file) if os.path.exists(self.cache_file) else 0
-        except:
-            stats["size_bytes"] = 0
+        with self.lock:
+            stats = self.stats.copy()
+            stats["size"] = len(self.index)
+            stats["size_bytes"] = self.total_bytes
+            stats["pending_writes"] = len(self._pending_writes) + len(self._pending_deletes)
 
         # Добавляем размер кэша в мегабайтах
         stats["size_mb"] = round(stats["size_bytes"] / (1024 * 1024), 2) if stats["size_bytes"] > 0 else 0
+        stats["codec"] = self.codec.get_stats()
 
         return stats
 
+    @staticmethod
+    def _normalize_topic(topic: str) -> str:
+        """Нормализует тему для ключей и индекса тем"""
+        return topic.lower().strip()
+
     def _generate_key(self, topic: str, text_type: str) -> str:
         """
         Генерирует ключ кэша для темы и типа текста.
@@ -166,45 +301,310 @@ class TextCacheService(BaseService):
             str: Хеш-ключ для кэша
         """
         # Нормализуем и объединяем тему и тип
-        key_data = f"{topic.lower().strip()}:{text_type.lower().strip()}"
+        key_data = f"{self._normalize_topic(topic)}:{text_type.lower().strip()}"
         # Создаем хеш для использования в качестве ключа
         return hashlib.md5(key_data.encode()).hexdigest()
 
-    def _save_cache(self) -> None:
-        """Сохраняет кэш в файл"""
+    def _entry_path(self, cache_key: str) -> str:
+        """Путь к файлу записи"""
+        return os.path.join(self.cache_dir, f"{cache_key}.bin")
+
+    # --- Индекс ---
+
+    def _add_entry(self, cache_key: str, item: Dict[str, Any]) -> None:
+        """Добавляет запись в индекс (вызывается под блокировкой)"""
+        self.index[cache_key] = item
+        self.total_bytes += item.get("size", 0)
+        topic = self._normalize_topic(item["topic"])
+        keys = self._topic_keys.get(topic)
+        if keys is None:
+            keys = self._topic_keys[topic] = set()
+            bisect.insort(self._sorted_topics, topic)
+        keys.add(cache_key)
+        self._index_dirty = True
+
+    def _remove_entry(self, cache_key: str) -> bool:
+        """Удаляет запись из индекса и планирует удаление файла (вызывается под блокировкой)"""
+        item = self.index.pop(cache_key, None)
+        if item is None:
+            return False
+        self.total_bytes -= item.get("size", 0)
+        topic = self._normalize_topic(item["topic"])
+        keys = self._topic_keys.get(topic)
+        if keys is not None:
+            keys.discard(cache_key)
+            if not keys:
+                del self._topic_keys[topic]
+                position = bisect.bisect_left(self._sorted_topics, topic)
+                if position < len(self._sorted_topics) and self._sorted_topics[position] == topic:
+                    del self._sorted_topics[position]
+        self._pending_writes.pop(cache_key, None)
+        self._pending_deletes.add(cache_key)
+        self._index_dirty = True
+        return True
+
+    @staticmethod
+    def _index_file_version(index_file: str):
+        """Признак версии индекса: файл заменяется целиком, поэтому меняются inode и время изменения"""
+        stat = os.stat(index_file)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _drop_entry(self, cache_key: str) -> None:
+        """Удаляет из индекса запись, файл которой уже удалил другой процесс (вызывается под блокировкой)"""
+        if self._remove_entry(cache_key):
+            self._pending_deletes.discard(cache_key)
+
+    def _merge_disk_index(self) -> None:
+        """
+        Объединяет индекс в памяти с индексом на диске, если его обновил другой процесс
+        (вызывается под блокировкой).
+
+        Добавляются записи, сохраненные другими процессами, и удаляются записи,
+        которые другие процессы удалили. Несохраненные изменения этого экземпляра
+        имеют приоритет.
+        """
+        index_file = os.path.join(self.cache_dir, INDEX_FILE)
         try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
+            version = self._index_file_version(index_file)
+            if version == self._index_version:
+                return
+            with open(index_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f).get("entries", {})
+        except FileNotFoundError:
+            return
         except Exception as e:
-            self.logger.error(f"Ошибка при сохранении кэша текстов в файл: {e}")
+            self._logger.warning(f"Не удалось прочитать индекс кэша текстов для объединения: {e}")
+            return
+
+        added = False
+        for cache_key, item in entries.items():
+            if cache_key in self._pending_writes or cache_key in self._pending_deletes:
+                continue
+            current = self.index.get(cache_key)
+            if current is not None and current.get("created_at", 0) >= item.get("created_at", 0):
+                current["last_accessed"] = max(current.get("last_accessed", 0), item.get("last_accessed", 0))
+                continue
+            # Новая запись другого процесса или более свежий текст той же темы
+            if os.path.exists(self._entry_path(cache_key)):
+                self._drop_entry(cache_key)
+                self._add_entry(cache_key, dict(item))
+                added = True
+
+        for cache_key in list(self.index):
+            if (cache_key not in entries and cache_key in self._synced_keys
+                    and cache_key not in self._pending_writes):
+                self._drop_entry(cache_key)
+
+        if added:
+            # Восстанавливаем порядок давности использования
+            self.index = OrderedDict(sorted(self.index.items(), key=lambda pair: pair[1].get("last_accessed", 0)))
+        self._index_version = version
+        self._synced_keys = set(entries)
+
+    def _evict(self) -> None:
+        """Удаляет давно не использовавшиеся записи сверх ограничений (вызывается под блокировкой)"""
+        while len(self.index) > 1 and (len(self.index) > self.max_entries or self.total_bytes > self.max_bytes):
+            oldest = next(iter(self.index))
+            self._remove_entry(oldest)
+            self.stats["evictions"] += 1
+
+    # --- Запись на диск ---
+
+    @contextmanager
+    def _index_file_lock(self):
+        """Межпроцессная блокировка каталога на время объединения и записи индекса"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _schedule_flush(self) -> None:
+        """Планирует пакетную запись изменений (вызывается без блокировки кэша)"""
+        if self.read_only:
+            return
+        if self.flush_interval <= 0:
+            self.flush()
+            return
+        with self.lock:
+            if self._flush_thread is None or not self._flush_thread.is_alive():
+                self._flush_thread = threading.Thread(target=self._flush_loop, name="text-cache-flush", daemon=True)
+                self._flush_thread.start()
+        self._flush_event.set()
+
+    def _flush_loop(self) -> None:
+        """Фоновый поток: записывает накопленные изменения не чаще раза в flush_interval секунд"""
+        while True:
+            self._flush_event.wait()
+            time.sleep(self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Записывает на диск несохраненные записи, удаления и индекс"""
+        if self.read_only:
+            return
+        # Запись на диск идет без основной блокировки, чтобы не задерживать чтение
+        with self._flush_lock:
+            with self.lock:
+                if not (self._pending_writes or self._pending_deletes or self._index_dirty):
+                    return
+
+            try:
+                with self._index_file_lock():
+                    self._write_pending()
+                with self.lock:
+                    self.stats["flushes"] += 1
+            except Exception as e:
+                self._logger.error(f"Ошибка при сохранении кэша текстов: {e}")
+            finally:
+                with self.lock:
+                    self._in_flight = {}
+
+    def _write_pending(self) -> None:
+        """Объединяет индекс с версией на диске и записывает изменения (под файловой блокировкой)"""
+        with self.lock:
+            # Индекс мог обновить другой процесс: объединяем, чтобы не потерять его записи
+            self._merge_disk_index()
+            self._evict()
+            writes, self._pending_writes = self._pending_writes, {}
+            deletes, self._pending_deletes = self._pending_deletes, set()
+            self._in_flight = writes
+            index_data = {"version": 1, "entries": {key: dict(item) for key, item in self.index.items()}}
+            self._index_dirty = False
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for cache_key, data in writes.items():
+            temp_file = f"{self._entry_path(cache_key)}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(data)
+            os.replace(temp_file, self._entry_path(cache_key))
+        for cache_key in deletes:
+            try:
+                os.remove(self._entry_path(cache_key))
+            except FileNotFoundError:
+                pass
+        index_file = os.path.join(self.cache_dir, INDEX_FILE)
+        temp_file = f"{index_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(index_data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, index_file)
+        with self.lock:
+            self._index_version = self._index_file_version(index_file)
+            self._synced_keys = set(index_data["entries"])
+
+    # --- Загрузка ---
 
     def _load_cache(self) -> None:
-        """Загружает кэш из файла"""
+        """Загружает индекс кэша и переносит записи из файла прежнего формата"""
+        self._load_index()
+        if self.read_only:
+            return
+
+        self._migrate_legacy_file()
+        self._remove_orphan_files()
+        self._clean_expired_items()
+        self._evict()
+        if self._index_dirty:
+            self.flush()
+
+    def _load_index(self) -> None:
+        """Загружает записи из индекса"""
+        index_file = os.path.join(self.cache_dir, INDEX_FILE)
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    self.cache = json.load(f)
-                self.logger.info(f"Кэш текстов загружен из файла. Элементов: {len(self.cache)}")
-                self._clean_expired_items()
-            else:
-                self.cache = {}
+            if os.path.exists(index_file):
+                self._index_version = self._index_file_version(index_file)
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    entries = json.load(f).get("entries", {})
+                # Записи сохранены в порядке давности использования
+                for cache_key, item in sorted(entries.items(), key=lambda pair: pair[1].get("last_accessed", 0)):
+                    if os.path.exists(self._entry_path(cache_key)):
+                        self._add_entry(cache_key, item)
+                self._synced_keys = set(entries)
+                self._index_dirty = False
+                self._logger.info(f"Кэш текстов загружен. Элементов: {len(self.index)}")
+        except Exception as e:
+            self._logger.error(f"Ошибка при загрузке индекса кэша текстов: {e}")
+
+    def _reload_if_changed(self) -> None:
+        """Перечитывает индекс, если его обновил другой экземпляр (только для чтения)"""
+        index_file = os.path.join(self.cache_dir, INDEX_FILE)
+        try:
+            version = self._index_file_version(index_file)
+        except OSError:
+            return
+        with self.lock:
+            if version == self._index_version:
+                return
+            self.index.clear()
+            self._topic_keys.clear()
+            self._sorted_topics.clear()
+            self.total_bytes = 0
+            self._load_index()
+
+    def _remove_orphan_files(self) -> None:
+        """Удаляет файлы записей, которых нет в индексе (остались от потерянных записей индекса)"""
+        if fcntl is None or not os.path.isdir(self.cache_dir):
+            return
+        removed = 0
+        try:
+            # Под блокировкой другой процесс не может записать файл, еще не внесенный в индекс
+            with self._index_file_lock():
+                with self.lock:
+                    self._merge_disk_index()
+                    known = set(self.index) | set(self._pending_writes)
+                for name in os.listdir(self.cache_dir):
+                    if name.endswith('.bin') and name[:-len('.bin')] not in known:
+                        os.remove(os.path.join(self.cache_dir, name))
+                        removed += 1
         except Exception as e:
-            self.logger.error(f"Ошибка при загрузке кэша текстов из файла: {e}")
-            self.cache = {}
+            self._logger.warning(f"Ошибка при удалении лишних файлов кэша текстов: {e}")
+        if removed:
+            self._logger.info(f"Удалено {removed} файлов кэша текстов без записи в индексе")
+
+    def _migrate_legacy_file(self) -> None:
+        """Переносит записи из единого JSON-файла прежнего формата"""
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+        try:
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                legacy_cache = json.load(f)
+            migrated = 0
+            for cache_key, item in legacy_cache.items():
+                if cache_key in self.index or "topic" not in item:
+                    continue
+                text = self.codec.decode_text(item["text"], item.get("encoding"))
+                data = self.codec.encode(text)
+                self._add_entry(cache_key, {
+                    "topic": item["topic"],
+                    "type": item.get("type", ""),
+                    "created_at": item.get("created_at", time.time()),
+                    "last_accessed": item.get("last_accessed", item.get("created_at", time.time())),
+                    "size": len(data)
+                })
+                self._pending_writes[cache_key] = data
+                migrated += 1
+            self.flush()
+            os.replace(self.legacy_file, f"{self.legacy_file}.migrated")
+            self._logger.info(f"Перенесено {migrated} записей из {self.legacy_file} в {self.cache_dir}")
+        except Exception as e:
+            self._logger.error(f"Ошибка при переносе кэша текстов из {self.legacy_file}: {e}")
 
     def _clean_expired_items(self) -> None:
         """Очищает истекшие элементы из кэша"""
         current_time = time.time()
-        expired_keys = []
-
-        for key, item in self.cache.items():
-            if current_time > item["created_at"] + self.ttl:
-                expired_keys.append(key)
+        with self.lock:
+            expired_keys = [key for key, item in self.index.items()
+                            if current_time > item["created_at"] + self.ttl]
 
-        # Удаляем истекшие элементы
-        for key in expired_keys:
-            del self.cache[key]
+            # Удаляем истекшие элементы
+            for key in expired_keys:
+                self._remove_entry(key)
 
         if expired_keys:
-            self._save_cache()
-            self.logger.debug(f"Очищено {len(expired_keys)} истекших элементов кэша текстов")
\ No newline at end of file
+            self._logger.debug(f"Очищено {len(expired_keys)} истекших элементов кэша текстов")
@@ -0,0 +1,206 @@
+"""
+Подготовка текста к отправке в Telegram: экранирование Markdown и
+разбиение длинных сообщений.
+
+Раньше в боте было три реализации экранирования (цикл str.replace по
+каждому символу в UIManager и TopicService, посимвольная сборка строки в
+CommandHandlers) и несколько разбиений на части: нарезка по 4000
+символов, которая рвала слова и разметку, и упаковка абзацев, которая
+не справлялась с абзацами длиннее лимита. Здесь собраны общие версии:
+
+- escape_markdown экранирует только те специальные символы, которые
+  есть в тексте (str.translate с заменой символа на строку уходит в
+  медленную ветку на кириллице и проигрывает даже прежнему циклу);
+- split_message упаковывает абзацы в сообщения не длиннее лимита
+  Telegram, длинные абзацы делит по строкам, предложениям и словам,
+  не разрывает ссылки [текст](url) и экранированные символы, а
+  незакрытые на границе части выделения (*, _, `, ```) закрывает в конце
+  части и открывает заново в начале следующей.
+"""
+
+import re
+from typing import List
+
+# Максимальная длина текста сообщения в Telegram
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+# Специальные символы Markdown, которые экранируются в пользовательском тексте
+MARKDOWN_SPECIAL_CHARS = '_*[]()~`>#+-=|{}.!'
+
+_ESCAPES = tuple((char, '\\' + char) for char in MARKDOWN_SPECIAL_CHARS)
+
+# Маркеры выделения, которые нужно закрывать и открывать на границе частей
+_CODE_MARKERS = ('```', '`')
+# Экранированный символ или маркер выделения
+_ENTITY_TOKEN_RE = re.compile(r'\\.|```|[`*_]', re.DOTALL)
+
+# Начальный запас длины части под закрывающие и открывающие маркеры
+_ENTITY_RESERVE = 8
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?…])\s+')
+# Слово или ссылка целиком: ссылка с пробелами в тексте не разделяется
+_WORD_RE = re.compile(r'(?:\[[^\]\n]*\]\([^)\s]*\)|\S)+')
+
+
+def escape_markdown(text: str) -> str:
+    """
+    Экранирует специальные символы Markdown обратной косой чертой.
+
+    Args:
+        text (str): Исходный текст
+
+    Returns:
+        str: Текст, безопасный для вставки в сообщение с разметкой
+    """
+    if not text:
+        return ""
+    for char, escaped in _ESCAPES:
+        # Проверка вхождения быстрее холостого прохода replace
+        if char in text:
+            text = text.replace(char, escaped)
+    return text
+
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_MESSAGE_LENGTH, markdown: bool = True) -> List[str]:
+    """
+    Разбивает текст на сообщения длиной не больше limit.
+
+    Args:
+        text (str): Исходный текст
+        limit (int): Максимальная длина одной части
+        markdown (bool): Учитывать разметку Markdown (не разрывать выделения)
+
+    Returns:
+        List[str]: Части текста в исходном порядке
+    """
+    if len(text) <= limit:
+        return [text]
+
+    if not markdown:
+        return _split(text, limit, 0)
+
+    # Маркеры, перенесенные через границу, могут не уместиться в начальный
+    # запас: тогда запас увеличивается на превышение и текст делится заново
+    reserve = _ENTITY_RESERVE
+    while True:
+        parts = _balance_entities(_split(text, max(1, limit - reserve), 0))
+        excess = max(len(part) for part in parts) - limit
+        if excess <= 0 or reserve >= limit - 1:
+            return parts
+        reserve = min(reserve + excess, limit - 1)
+
+
+def _units(text: str, level: int) -> List[str]:
+    """Делит текст на единицы упаковки уровня level"""
+    if level == 0:
+        return text.split('\n\n')
+    if level == 1:
+        return text.split('\n')
+    if level == 2:
+        return _SENTENCE_END_RE.split(text)
+    return _WORD_RE.findall(text)
+
+
+# Разделители, которыми соединяются единицы каждого уровня
+_JOINERS = ('\n\n', '\n', ' ', ' ')
+
+
+def _split(text: str, limit: int, level: int) -> List[str]:
+    """Жадно упаковывает единицы уровня level, слишком длинные делит на следующем уровне"""
+    if len(text) <= limit:
+        return [text]
+    if level == len(_JOINERS):
+        return _hard_split(text, limit)
+
+    joiner = _JOINERS[level]
+    chunks = []
+    current = None
+    for unit in _units(text, level):
+        if current is not None and len(current) + len(joiner) + len(unit) <= limit:
+            current += joiner + unit
+            continue
+        if current is not None:
+            chunks.append(current)
+        if len(unit) > limit:
+            pieces = _split(unit, limit, level + 1)
+            chunks.extend(pieces[:-1])
+            current = pieces[-1]
+        else:
+            current = unit
+    if current is not None:
+        chunks.append(current)
+    return chunks
+
+
+def _hard_split(text: str, limit: int) -> List[str]:
+    """Режет текст по длине, не отделяя обратную косую черту от экранируемого символа"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + limit, len(text))
+        if end < len(text) and end - start > 1:
+            # Нечетное число обратных косых черт в конце - последняя экранирует следующий символ
+            backslashes = len(text[start:end]) - len(text[start:end].rstrip('\\'))
+            if backslashes % 2:
+                end -= 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def _open_entities(text: str, stack: List[str]) -> List[str]:
+    """
+    Возвращает маркеры выделений, открытых к концу текста.
+
+    Args:
+        text (str): Часть сообщения
+        stack (List[str]): Маркеры, открытые к началу части
+
+    Returns:
+        List[str]: Незакрытые маркеры в порядке открытия
+    """
+    # Частый случай: без кода и экранирования четное число маркеров не меняет состояние
+    if '`' not in text and '\\' not in text and text.count('*') % 2 == 0 and text.count('_') % 2 == 0:
+        return list(stack)
+
+    stack = list(stack)
+    position = 0
+    while True:
+        # Внутри кода разметка не действует, ищем только закрывающий маркер
+        if stack and stack[-1] in _CODE_MARKERS:
+            marker = stack[-1]
+            end = text.find(marker, position)
+            if end == -1:
+                break
+            stack.pop()
+            position = end + len(marker)
+            continue
+
+        match = _ENTITY_TOKEN_RE.search(text, position)
+        if not match:
+            break
+        token = match.group()
+        position = match.end()
+        if token[0] == '\\':
+            continue
+        if token in _CODE_MARKERS:
+            stack.append(token)
+        elif token in stack:
+            stack.remove(token)
+        else:
+            stack.append(token)
+    return stack
+
+
+def _balance_entities(parts: List[str]) -> List[str]:
+    """Закрывает выделения в конце каждой части и открывает их в начале следующей"""
+    balanced = []
+    carried: List[str] = []
+    for index, part in enumerate(parts):
+        # Блок кода открывается с новой строки, иначе первое слово станет названием языка
+        prefix = ''.join(marker + '\n' if marker == '```' else marker for marker in carried)
+        carried = _open_entities(part, carried)
+        if carried and index < len(parts) - 1:
+            part = part.rstrip() + ''.join(reversed(carried))
+        balanced.append(prefix + part)
+    return balanced
@@ -0,0 +1,432 @@
+"""
+Каталог тем по истории России.
+
+Раньше каждое нажатие "Больше тем" отправляло в Gemini запрос без кэша
+и заново разбирало ответ. Каталог хранит дедуплицированный список тем в
+JSON-файле и для каждого пользователя запоминает уже показанные темы,
+поэтому очередная страница собирается локально. Каталог изначально
+наполняется темами генератора базы данных и названиями событий из
+historical_events.json, а когда непоказанных тем у пользователя остается
+мало, пополняется в фоне через переданную функцию генерации.
+
+В многопроцессном режиме файл каталога общий: перед записью процесс под
+межпроцессной блокировкой объединяет свое состояние с файлом (темы по
+ключу, показанные темы по пользователю) и перенимает нумерацию файла.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.interfaces import ILogger
+from src.russian_text import tokenize
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка каталога недоступна
+    fcntl = None
+
+# Файл тем, собранных генератором базы исторических событий
+GENERATOR_TOPICS_FILE = 'history_db_generator/temp/historical_topics_cache.json'
+
+_NUMBERING_RE = re.compile(r'^\s*\d+[\.\)\:]\s*')
+
+
+def strip_numbering(topic: str) -> str:
+    """
+    Удаляет нумерацию вида "12. " из начала темы.
+
+    Args:
+        topic (str): Тема
+
+    Returns:
+        str: Тема без номера
+    """
+    return _NUMBERING_RE.sub('', topic).strip()
+
+
+class TopicCatalogue:
+    """
+    Персистентный каталог тем с учетом показанных каждому пользователю тем.
+
+    Темы только добавляются, поэтому номер темы в файле каталога постоянен и
+    используется для хранения множества показанных тем пользователя. Темы,
+    добавленные процессом после последней записи, получают номера файла при
+    объединении в save().
+    """
+
+    def __init__(self, logger: ILogger, catalogue_file: str = 'topic_catalogue.json',
+                 refill_threshold: int = 60, save_interval: float = 5.0):
+        """
+        Инициализация каталога.
+
+        Args:
+            logger (ILogger): Логгер для записи информации
+            catalogue_file (str): Файл каталога
+            refill_threshold (int): Количество непоказанных тем, при котором запускается фоновое пополнение
+            save_interval (float): Минимальный интервал между записями файла в секундах
+        """
+        self._logger = logger
+        self.catalogue_file = catalogue_file
+        self.refill_threshold = refill_threshold
+        self.save_interval = save_interval
+        self.lock = threading.RLock()
+
+        self.topics: List[str] = []
+        # Ключ каждой темы по номеру и номер первой темы с ключом
+        self._topic_keys: List[str] = []
+        self._keys: Dict[str, int] = {}
+        self.seen: Dict[str, Set[int]] = {}
+        # Показанные темы на момент последнего объединения с файлом
+        self._synced_seen: Dict[str, Set[int]] = {}
+        # Пользователи, чья история сброшена после последней записи
+        self._reset_users: Set[str] = set()
+
+        self._refill_callback: Optional[Callable[[], Iterable[str]]] = None
+        self._refill_thread: Optional[threading.Thread] = None
+        self._dirty = False
+        self._last_save = 0.0
+
+        self.stats = {
+            "pages_served": 0,
+            "topics_served": 0,
+            "exhausted": 0,
+            "duplicates_skipped": 0,
+            "refills": 0,
+            "refill_errors": 0
+        }
+
+        self._load()
+
+    # --- Наполнение ---
+
+    @staticmethod
+    def topic_key(topic: str) -> str:
+        """
+        Возвращает ключ темы для дедупликации: основы слов без учета порядка.
+
+        Args:
+            topic (str): Тема
+
+        Returns:
+            str: Ключ темы
+        """
+        return " ".join(sorted(set(tokenize(strip_numbering(topic)))))
+
+    def add_topics(self, topics: Iterable[str]) -> int:
+        """
+        Добавляет темы в каталог, пропуская дубликаты.
+
+        Args:
+            topics: Темы (нумерация удаляется)
+
+        Returns:
+            int: Количество добавленных тем
+        """
+        added = 0
+        with self.lock:
+            for topic in topics:
+                if not isinstance(topic, str):
+                    continue
+                text = strip_numbering(topic).strip(' *"«»')
+                key = self.topic_key(text)
+                if not key:
+                    continue
+                if key in self._keys:
+                    self.stats["duplicates_skipped"] += 1
+                    continue
+                self._keys[key] = len(self.topics)
+                self.topics.append(text)
+                self._topic_keys.append(key)
+                added += 1
+            if added:
+                self._mark_dirty()
+        self._save_if_due()
+        return added
+
+    def seed(self, events_data: Optional[Dict[str, Any]] = None, extra_topics: Iterable[str] = (),
+             generator_topics_file: Optional[str] = GENERATOR_TOPICS_FILE) -> int:
+        """
+        Наполняет каталог темами генератора, событий и дополнительными темами.
+
+        Args:
+            events_data (dict, optional): Данные historical_events.json
+            extra_topics: Дополнительные темы (например, стандартные темы бота)
+            generator_topics_file (str, optional): Файл тем генератора базы событий
+
+        Returns:
+            int: Количество добавленных тем
+        """
+        topics = list(extra_topics)
+        if generator_topics_file and os.path.exists(generator_topics_file):
+            try:
+                with open(generator_topics_file, 'r', encoding='utf-8') as f:
+                    generator_topics = json.load(f)
+                if isinstance(generator_topics, list):
+                    topics.extend(generator_topics)
+            except Exception as e:
+                self._logger.warning(f"Не удалось прочитать темы генератора: {e}")
+
+        for event in (events_data or {}).get("events", []):
+            title = event.get("title") or event.get("name")
+            if title:
+                topics.append(title)
+
+        added = self.add_topics(topics)
+        if added:
+            self._logger.info(f"В каталог тем добавлено {added} тем, всего {len(self.topics)}")
+            self.save()
+        return added
+
+    def set_refill_callback(self, callback: Callable[[], Iterable[str]]) -> None:
+        """
+        Задает функцию генерации новых тем для фонового пополнения каталога.
+
+        Args:
+            callback (Callable): Функция, возвращающая список новых тем
+        """
+        self._refill_callback = callback
+
+    def refill(self) -> int:
+        """
+        Синхронно пополняет каталог через функцию генерации.
+
+        Returns:
+            int: Количество добавленных тем
+        """
+        if not self._refill_callback:
+            return 0
+        try:
+            added = self.add_topics(self._refill_callback())
+            with self.lock:
+                self.stats["refills"] += 1
+            self._logger.info(f"Каталог тем пополнен: добавлено {added}, всего {len(self.topics)}")
+            return added
+        except Exception as e:
+            with self.lock:
+                self.stats["refill_errors"] += 1
+            self._logger.error(f"Ошибка при пополнении каталога тем: {e}")
+            return 0
+
+    def _refill_in_background(self) -> None:
+        """Запускает пополнение каталога в фоне, если оно еще не выполняется"""
+        with self.lock:
+            if not self._refill_callback or (self._refill_thread and self._refill_thread.is_alive()):
+                return
+
+            def refill_job():
+                self.refill()
+                self.save()
+
+            self._refill_thread = threading.Thread(target=refill_job, name="topic-catalogue-refill", daemon=True)
+            self._refill_thread.start()
+
+    # --- Выдача страниц ---
+
+    def _user_order(self, user_id: str, indices: Iterable[int]) -> List[int]:
+        """Возвращает темы в стабильном для пользователя псевдослучайном порядке"""
+        return sorted(indices, key=lambda index: zlib.crc32(f"{user_id}:{index}".encode()))
+
+    def next_page(self, user_id: int, page_size: int = 30) -> List[str]:
+        """
+        Возвращает следующую страницу непоказанных пользователю тем и отмечает их показанными.
+
+        Args:
+            user_id (int): ID пользователя
+            page_size (int): Количество тем на странице
+
+        Returns:
+            List[str]: Темы страницы (пустой список, если каталог для пользователя исчерпан)
+        """
+        user_key = str(user_id)
+        with self.lock:
+            seen = self.seen.setdefault(user_key, set())
+            unseen = [index for index in range(len(self.topics)) if index not in seen]
+            page_indices = self._user_order(user_key, unseen)[:page_size]
+            seen.update(page_indices)
+            remaining = len(unseen) - len(page_indices)
+
+            if page_indices:
+                self.stats["pages_served"] += 1
+                self.stats["topics_served"] += len(page_indices)
+                self._mark_dirty()
+            else:
+                self.stats["exhausted"] += 1
+            page = [self.topics[index] for index in page_indices]
+
+        self._save_if_due()
+        if remaining < self.refill_threshold:
+            self._refill_in_background()
+        return page
+
+    def mark_seen(self, user_id: int, topics: Iterable[str]) -> None:
+        """
+        Отмечает темы показанными пользователю (например, после живой генерации).
+
+        Args:
+            user_id (int): ID пользователя
+            topics: Показанные темы
+        """
+        with self.lock:
+            seen = self.seen.setdefault(str(user_id), set())
+            for topic in topics:
+                index = self._keys.get(self.topic_key(topic))
+                if index is not None:
+                    seen.add(index)
+            self._mark_dirty()
+        self._save_if_due()
+
+    def reset_user(self, user_id: int) -> None:
+        """
+        Сбрасывает историю показанных пользователю тем.
+
+        Args:
+            user_id (int): ID пользователя
+        """
+        user_key = str(user_id)
+        with self.lock:
+            self._reset_users.add(user_key)
+            self._synced_seen.pop(user_key, None)
+            if self.seen.pop(user_key, None) is not None:
+                self._mark_dirty()
+        self._save_if_due()
+
+    # --- Сохранение ---
+
+    def _mark_dirty(self) -> None:
+        """Отмечает несохраненные изменения (вызывается под блокировкой)"""
+        self._dirty = True
+
+    def _save_if_due(self) -> None:
+        """Сохраняет каталог, если с последней записи прошло достаточно времени (вызывается без блокировки)"""
+        if self._dirty and time.time() - self._last_save >= self.save_interval:
+            self.save()
+
+    @contextmanager
+    def _file_lock(self):
+        """Межпроцессная блокировка файла каталога на время объединения и записи"""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.catalogue_file}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self) -> None:
+        """Объединяет каталог с файлом и сохраняет его (атомарно, через временный файл)"""
+        if not self.catalogue_file:
+            with self.lock:
+                self._dirty = False
+            return
+        try:
+            with self._file_lock():
+                disk_topics, disk_seen = self._read_file()
+                with self.lock:
+                    self._merge(disk_topics, disk_seen)
+                    data = {
+                        "topics": list(self.topics),
+                        "seen": {user_key: sorted(indices) for user_key, indices in self.seen.items()}
+                    }
+                    self._dirty = False
+                    self._last_save = time.time()
+                    self._reset_users.clear()
+                temp_file = f"{self.catalogue_file}.tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(temp_file, self.catalogue_file)
+        except Exception as e:
+            self._logger.error(f"Ошибка при сохранении каталога тем: {e}")
+
+    def flush(self) -> None:
+        """Сохраняет несохраненные изменения"""
+        if self._dirty:
+            self.save()
+
+    def _read_file(self) -> Tuple[List[str], Dict[str, Set[int]]]:
+        """Читает темы и показанные темы из файла каталога"""
+        if not os.path.exists(self.catalogue_file):
+            return [], {}
+        with open(self.catalogue_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # Темы загружаются как есть: их номера используются в истории показов
+        topics = [topic for topic in data.get("topics", []) if isinstance(topic, str)]
+        seen = {
+            user_key: {index for index in indices if isinstance(index, int) and 0 <= index < len(topics)}
+            for user_key, indices in data.get("seen", {}).items()
+        }
+        return topics, seen
+
+    def _merge(self, disk_topics: List[str], disk_seen: Dict[str, Set[int]]) -> None:
+        """
+        Объединяет каталог с состоянием файла и переходит на нумерацию файла.
+
+        Темы файла сохраняют свои номера, темы этого процесса с новыми ключами
+        дописываются в конец. К показанным темам пользователя из файла
+        добавляются темы, показанные этим процессом после прошлого
+        объединения: так история, сброшенная в другом процессе, не
+        восстанавливается, а сброшенная в этом процессе не берется из файла.
+        Вызывается под блокировкой.
+
+        Args:
+            disk_topics (List[str]): Темы из файла
+            disk_seen (Dict[str, Set[int]]): Показанные темы из файла
+        """
+        topics = list(disk_topics)
+        topic_keys = [self.topic_key(topic) for topic in disk_topics]
+        keys: Dict[str, int] = {}
+        for index, key in enumerate(topic_keys):
+            keys.setdefault(key, index)
+
+        # Номер темы процесса в объединенной нумерации
+        remap = []
+        for topic, key in zip(self.topics, self._topic_keys):
+            if key not in keys:
+                keys[key] = len(topics)
+                topics.append(topic)
+                topic_keys.append(key)
+            remap.append(keys[key])
+
+        seen = {user_key: set(indices) for user_key, indices in disk_seen.items()
+                if user_key not in self._reset_users}
+        for user_key, indices in self.seen.items():
+            added = indices - self._synced_seen.get(user_key, set())
+            if added:
+                seen.setdefault(user_key, set()).update(remap[index] for index in added)
+
+        self.topics = topics
+        self._topic_keys = topic_keys
+        self._keys = keys
+        self.seen = seen
+        self._synced_seen = {user_key: set(indices) for user_key, indices in seen.items()}
+
+    def _load(self) -> None:
+        """Загружает каталог из файла"""
+        if not self.catalogue_file or not os.path.exists(self.catalogue_file):
+            return
+        try:
+            with self.lock:
+                self._merge(*self._read_file())
+            self._logger.info(f"Каталог тем загружен: {len(self.topics)} тем")
+        except Exception as e:
+            self._logger.error(f"Ошибка при загрузке каталога тем: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику каталога.
+
+        Returns:
+            Dict[str, Any]: Размер каталога и счетчики выдачи
+        """
+        with self.lock:
+            stats = self.stats.copy()
+            stats["topics"] = len(self.topics)
+            stats["users"] = len(self.seen)
+        return stats
@@ -0,0 +1,435 @@
+"""
+Локальная проверка, относится ли тема к истории России.
+
+Раньше ContentService.validate_topic для любой темы, не найденной
+подстрокой среди стандартных тем и событий, обращался к Gemini только
+ради ответа "да/нет". Здесь проверка выполняется в два шага:
+
+1. TopicIndex - инвертированный индекс основ слов названий событий и
+   тем. Если все значимые слова какого-либо названия есть в запросе,
+   тема историческая.
+2. TopicRelevanceClassifier - наивный байесовский классификатор по основам
+   слов. Уверенные отказы возвращаются сразу. Тема принимается локально,
+   только если в ней есть признак именно российской истории (RUSSIAN_MARKERS):
+   слова "война", "революция", "империя" встречаются и в истории других стран,
+   поэтому без такого признака решение остается за Gemini, как и в
+   промежутке неопределенности.
+
+Классификатор обучается на historical_events.json, стандартных темах,
+встроенных примерах и журнале запросов, уже проверенных Gemini.
+Переобучение вручную:
+    python -m src.topic_classifier [--events FILE] [--log FILE] [--model FILE]
+"""
+
+import json
+import math
+import os
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.interfaces import ILogger
+from src.russian_text import stem, tokenize
+
+# Версия обучающей выборки и стеммера: модель с другой версией переобучается при загрузке
+MODEL_VERSION = 5
+
+# Встроенные примеры исторических тем
+SEED_HISTORICAL_TOPICS = (
+    "Киевская Русь", "Монгольское нашествие", "Иван Грозный и опричнина", "Смутное время",
+    "Петр Первый и его реформы", "Екатерина Вторая", "Отечественная война 1812 года",
+    "Восстание декабристов", "Отмена крепостного права", "Крымская война",
+    "Русско-японская война", "Первая мировая война", "Февральская революция",
+    "Октябрьская революция", "Гражданская война в России", "Новая экономическая политика",
+    "Индустриализация и коллективизация", "Великая Отечественная война", "Сталинградская битва",
+    "Хрущевская оттепель", "Эпоха застоя при Брежневе", "Перестройка Горбачева", "Распад СССР",
+    "Реформы Александра II", "Династия Романовых", "Куликовская битва", "Ледовое побоище",
+    "Крещение Руси", "Российская империя", "Советский Союз", "История Москвы", "Царь Николай II",
+    "Правление Ельцина", "Русская православная церковь в истории", "Освоение Сибири",
+)
+
+# Встроенные примеры тем, не относящихся к истории России
+SEED_OTHER_TOPICS = (
+    "Рецепт борща", "Как приготовить пиццу", "Погода на завтра", "Прогноз погоды в Москве",
+    "Программирование на Python", "Как выучить английский язык", "Решение квадратных уравнений",
+    "Таблица умножения", "Лучшие фильмы года", "Сериалы на вечер", "Футбольный матч сегодня",
+    "Чемпионат мира по хоккею", "Курс доллара", "Как похудеть", "Упражнения для спины",
+    "Как настроить роутер", "Купить смартфон", "Новые видеоигры", "Рэп и хип-хоп музыка",
+    "Уход за кошкой", "Дрессировка собак", "Анекдоты", "Гороскоп на неделю", "Как сделать ремонт",
+    "Выбор автомобиля", "Химия органических соединений", "Квантовая физика", "Фотосинтез растений",
+    "Строение клетки", "Домашнее задание по математике", "Привет как дела", "Напиши стихотворение",
+    "Биография Тейлор Свифт", "Маркетинг в социальных сетях", "Как заработать деньги",
+)
+
+# Встроенные примеры истории и литературы других стран: бот отвечает только по истории России
+SEED_FOREIGN_TOPICS = (
+    "История Франции", "Французская революция", "Великая китайская стена", "Война за независимость США",
+    "Гражданская война в США", "Американская революция", "Авраам Линкольн", "Древний Египет",
+    "Пирамиды Гизы", "Римская империя", "Падение Западной Римской империи", "Юлий Цезарь",
+    "Древняя Греция", "Афины и Спарта", "Александр Македонский", "Крестовые походы", "Столетняя война",
+    "Английская революция", "Война Алой и Белой розы", "Викторианская Англия", "Британская империя",
+    "Реформация Мартина Лютера", "Эпоха Возрождения в Италии", "Христофор Колумб и открытие Америки",
+    "Колонизация Северной Америки", "Империя Цинь в Китае", "Династия Мин", "Японские самураи",
+    "Сегунат Токугава", "Независимость Индии и Ганди", "Империя инков", "Османская империя",
+    "Тридцатилетняя война", "Вторая мировая война на Тихом океане", "Объединение Германии Бисмарком",
+    "История Польши", "Гамлет Шекспира", "Дон Кихот Сервантеса", "Отверженные Виктора Гюго",
+    "Божественная комедия Данте", "Фауст Гете", "Три мушкетера Дюма", "Гарри Поттер",
+)
+
+# Признаки российской истории: без них тема не принимается локально
+RUSSIAN_MARKERS = frozenset(stem(word) for word in (
+    "русь", "русский", "россия", "российский", "ссср", "советский", "рсфср", "москва", "московский",
+    "киев", "киевский", "новгород", "петербург", "петроград", "ленинград", "сталинград", "сибирь",
+    "кремль", "царь", "царский", "царство", "князь", "княжество", "боярин", "опричнина", "смута",
+    "смутный", "земский", "стрелецкий", "крепостной", "декабрист", "большевик", "нэп", "колхоз",
+    "коллективизация", "оттепель", "перестройка", "застой", "отечественная", "романов", "рюрик",
+    "рюрикович", "иван", "петр", "екатерина", "елизавета", "александр", "николай", "павел", "алексей",
+    "владимир", "ярослав", "святослав", "ольга", "олег", "игорь", "невский", "донской", "годунов",
+    "пугачев", "разин", "ермак", "суворов", "кутузов", "жуков", "ленин", "сталин", "хрущев", "брежнев",
+    "андропов", "горбачев", "ельцин", "путин", "куликовский", "бородино", "полтава", "полтавский",
+    "чудской", "ледовый", "казак", "казачество", "варяг", "славяне", "славянский", "орда", "ордынский",
+))
+
+
+class TopicIndex:
+    """
+    Инвертированный индекс основ слов названий исторических событий и тем.
+
+    Название считается найденным в запросе, если в запросе есть все
+    основы его значимых слов (порядок и словоформы не важны).
+    """
+
+    def __init__(self, titles: Iterable[str] = ()):
+        self._titles: List[str] = []
+        self._title_sizes: List[int] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._known: Set[str] = set()
+        for title in titles:
+            self.add(title)
+
+    def add(self, title: str) -> None:
+        """
+        Добавляет название в индекс.
+
+        Args:
+            title (str): Название события или темы
+        """
+        stems = set(tokenize(title))
+        key = " ".join(sorted(stems))
+        if not stems or key in self._known:
+            return
+        self._known.add(key)
+        title_id = len(self._titles)
+        self._titles.append(title)
+        self._title_sizes.append(len(stems))
+        for word_stem in stems:
+            self._postings[word_stem].append(title_id)
+
+    def match(self, text: str) -> Optional[str]:
+        """
+        Ищет название, все слова которого есть в тексте.
+
+        Args:
+            text (str): Текст запроса
+
+        Returns:
+            Optional[str]: Самое длинное найденное название или None
+        """
+        counts = Counter()
+        for word_stem in set(tokenize(text)):
+            for title_id in self._postings.get(word_stem, ()):
+                counts[title_id] += 1
+
+        best = None
+        for title_id, count in counts.items():
+            if count == self._title_sizes[title_id]:
+                if best is None or self._title_sizes[title_id] > self._title_sizes[best]:
+                    best = title_id
+        return self._titles[best] if best is not None else None
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+
+class TopicRelevanceClassifier:
+    """
+    Наивный байесовский классификатор "история России / другое" по основам слов.
+
+    predict_proba возвращает вероятность исторической темы; classify
+    возвращает True/False для уверенных ответов и None в промежутке
+    неопределенности [low, high], когда решение остается за Gemini.
+    """
+
+    def __init__(self, logger: ILogger, model_file: Optional[str] = 'topic_classifier.json',
+                 query_log_file: Optional[str] = 'topic_queries.jsonl', low: float = 0.25, high: float = 0.7):
+        """
+        Инициализация классификатора.
+
+        Args:
+            logger (ILogger): Логгер для записи информации
+            model_file (str, optional): Файл обученной модели (None - модель только в памяти)
+            query_log_file (str, optional): Журнал запросов с ответами Gemini (для переобучения)
+            low (float): Вероятность, ниже которой тема уверенно отклоняется
+            high (float): Вероятность, выше которой тема уверенно принимается
+        """
+        self._logger = logger
+        self.model_file = model_file
+        self.query_log_file = query_log_file
+        self.low = low
+        self.high = high
+        self.lock = threading.Lock()
+
+        self.class_log_prior: Dict[str, float] = {}
+        self.token_log_prob: Dict[str, Dict[str, float]] = {}
+        self.unknown_log_prob: Dict[str, float] = {}
+        self.samples_count = 0
+
+    # --- Обучение ---
+
+    def fit(self, samples: Iterable[Tuple[str, bool]]) -> "TopicRelevanceClassifier":
+        """
+        Обучает классификатор.
+
+        Args:
+            samples: Пары (текст, относится ли к истории России)
+
+        Returns:
+            TopicRelevanceClassifier: Этот же классификатор
+        """
+        doc_counts = Counter()
+        token_counts = {"history": Counter(), "other": Counter()}
+        for text, label in samples:
+            label_name = "history" if label else "other"
+            # Учитываем наличие слова, а не частоту: описания событий длинные
+            stems = set(tokenize(text))
+            if not stems:
+                continue
+            doc_counts[label_name] += 1
+            token_counts[label_name].update(stems)
+
+        vocabulary = set(token_counts["history"]) | set(token_counts["other"])
+        total_docs = sum(doc_counts.values())
+        class_log_prior = {}
+        token_log_prob = {}
+        unknown_log_prob = {}
+        for label_name in ("history", "other"):
+            # Сглаживание Лапласа
+            class_log_prior[label_name] = math.log((doc_counts[label_name] + 1) / (total_docs + 2))
+            denominator = sum(token_counts[label_name].values()) + len(vocabulary) + 1
+            token_log_prob[label_name] = {
+                token: math.log((token_counts[label_name][token] + 1) / denominator) for token in vocabulary
+            }
+            unknown_log_prob[label_name] = math.log(1 / denominator)
+
+        with self.lock:
+            self.class_log_prior = class_log_prior
+            self.token_log_prob = token_log_prob
+            self.unknown_log_prob = unknown_log_prob
+            self.samples_count = total_docs
+        return self
+
+    @staticmethod
+    def build_training_set(events_data: Optional[Dict[str, Any]] = None,
+                           default_topics: Iterable[str] = (),
+                           query_log_file: Optional[str] = None) -> List[Tuple[str, bool]]:
+        """
+        Собирает обучающую выборку.
+
+        Args:
+            events_data (dict, optional): Данные historical_events.json
+            default_topics: Стандартные темы бота
+            query_log_file (str, optional): Журнал запросов, проверенных Gemini
+
+        Returns:
+            List[Tuple[str, bool]]: Пары (текст, метка)
+        """
+        samples = [(topic, True) for topic in SEED_HISTORICAL_TOPICS]
+        samples += [(topic, False) for topic in SEED_OTHER_TOPICS]
+        samples += [(topic, False) for topic in SEED_FOREIGN_TOPICS]
+        samples += [(topic, True) for topic in default_topics]
+
+        for event in (events_data or {}).get("events", []):
+            for field in ("title", "name", "category", "description"):
+                if event.get(field):
+                    samples.append((event[field], True))
+
+        if query_log_file and os.path.exists(query_log_file):
+            with open(query_log_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        samples.append((record["topic"], bool(record["historical"])))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        return samples
+
+    def train(self, events_data: Optional[Dict[str, Any]] = None, default_topics: Iterable[str] = ()) -> None:
+        """
+        Обучает классификатор на данных проекта и журнале запросов и сохраняет модель.
+
+        Args:
+            events_data (dict, optional): Данные historical_events.json
+            default_topics: Стандартные темы бота
+        """
+        samples = self.build_training_set(events_data, default_topics, self.query_log_file)
+        self.fit(samples)
+        self.save()
+        self._logger.info(f"Классификатор тем обучен на {self.samples_count} примерах")
+
+    # --- Предсказание ---
+
+    def predict_proba(self, text: str) -> float:
+        """
+        Возвращает вероятность того, что тема относится к истории России.
+
+        Args:
+            text (str): Тема
+
+        Returns:
+            float: Вероятность от 0 до 1 (0.5 если в теме нет известных слов)
+        """
+        stems = set(tokenize(text))
+        with self.lock:
+            if not self.token_log_prob:
+                return 0.5
+            known = [token for token in stems if token in self.token_log_prob["history"]]
+            if not known:
+                return 0.5
+            scores = {}
+            for label_name in ("history", "other"):
+                log_probs = self.token_log_prob[label_name]
+                scores[label_name] = self.class_log_prior[label_name] + sum(log_probs[token] for token in known)
+
+        difference = scores["other"] - scores["history"]
+        if difference > 700:
+            return 0.0
+        return 1.0 / (1.0 + math.exp(difference))
+
+    def classify(self, text: str) -> Optional[bool]:
+        """
+        Классифицирует тему.
+
+        Args:
+            text (str): Тема
+
+        Returns:
+            Optional[bool]: True/False при уверенном ответе, None в промежутке неопределенности
+                или если в уверенно исторической теме нет признаков истории России
+        """
+        probability = self.predict_proba(text)
+        if probability >= self.high:
+            return True if self.has_russian_marker(text) else None
+        if probability <= self.low:
+            return False
+        return None
+
+    @staticmethod
+    def has_russian_marker(text: str) -> bool:
+        """
+        Проверяет, есть ли в теме признак именно российской истории.
+
+        Args:
+            text (str): Тема
+
+        Returns:
+            bool: True если хотя бы одна основа слова входит в RUSSIAN_MARKERS
+        """
+        return any(token in RUSSIAN_MARKERS for token in tokenize(text))
+
+    def record_verdict(self, topic: str, historical: bool) -> None:
+        """
+        Записывает ответ Gemini в журнал запросов для следующего обучения.
+
+        Args:
+            topic (str): Тема
+            historical (bool): Ответ Gemini
+        """
+        if not self.query_log_file:
+            return
+        try:
+            with open(self.query_log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"topic": topic, "historical": historical}, ensure_ascii=False) + "\n")
+        except Exception as e:
+            self._logger.warning(f"Не удалось записать запрос в журнал классификатора: {e}")
+
+    # --- Сохранение модели ---
+
+    def save(self) -> None:
+        """Сохраняет модель в файл"""
+        if not self.model_file:
+            return
+        with self.lock:
+            model = {
+                "version": MODEL_VERSION,
+                "class_log_prior": self.class_log_prior,
+                "token_log_prob": self.token_log_prob,
+                "unknown_log_prob": self.unknown_log_prob,
+                "samples_count": self.samples_count
+            }
+        try:
+            with open(self.model_file, 'w', encoding='utf-8') as f:
+                json.dump(model, f, ensure_ascii=False, separators=(',', ':'))
+        except Exception as e:
+            self._logger.error(f"Ошибка при сохранении модели классификатора тем: {e}")
+
+    def load(self) -> bool:
+        """
+        Загружает модель из файла.
+
+        Returns:
+            bool: True если модель загружена
+        """
+        if not self.model_file or not os.path.exists(self.model_file):
+            return False
+        try:
+            with open(self.model_file, 'r', encoding='utf-8') as f:
+                model = json.load(f)
+            if model.get("version") != MODEL_VERSION:
+                self._logger.info("Модель классификатора тем обучена на прежней выборке, требуется переобучение")
+                return False
+            with self.lock:
+                self.class_log_prior = model["class_log_prior"]
+                self.token_log_prob = model["token_log_prob"]
+                self.unknown_log_prob = model["unknown_log_prob"]
+                self.samples_count = model.get("samples_count", 0)
+            return True
+        except Exception as e:
+            self._logger.warning(f"Не удалось загрузить модель классификатора тем: {e}")
+            return False
+
+    def load_or_train(self, events_data: Optional[Dict[str, Any]] = None, default_topics: Iterable[str] = ()) -> None:
+        """
+        Загружает сохраненную модель, а при ее отсутствии обучает новую.
+
+        Args:
+            events_data (dict, optional): Данные historical_events.json
+            default_topics: Стандартные темы бота
+        """
+        if not self.load():
+            self.train(events_data, default_topics)
+
+
+def main():
+    import argparse
+    from src.logger import Logger
+    from src.content_service import ContentService
+
+    parser = argparse.ArgumentParser(description="Обучение классификатора исторических тем")
+    parser.add_argument('--events', default='historical_events.json', help='Файл исторических событий')
+    parser.add_argument('--log', default='topic_queries.jsonl', help='Журнал запросов, проверенных Gemini')
+    parser.add_argument('--model', default='topic_classifier.json', help='Файл модели')
+    args = parser.parse_args()
+
+    logger = Logger()
+    events_data = {}
+    if os.path.exists(args.events):
+        with open(args.events, 'r', encoding='utf-8') as f:
+            events_data = json.load(f)
+
+    classifier = TopicRelevanceClassifier(logger, model_file=args.model, query_log_file=args.log)
+    classifier.train(events_data, ContentService.DEFAULT_TOPICS)
+    print(f"Модель сохранена в {args.model} ({classifier.samples_count} примеров)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,68 @@
 import re
+import json
 import random
 import textwrap
+import threading
+import time
+from collections import OrderedDict, deque
 from src.base_service import BaseService
+from src.retry_budget import RetryBudget
+from src.text_rendering import escape_markdown, split_message
+from src.tracing import tracer
+
+# Тип записи TextCacheService со структурированными главами темы
+TOPIC_CHAPTERS_TYPE = "topic_chapters"
+# Тип записи прежнего формата: готовые сообщения Telegram
+LEGACY_TOPIC_INFO_TYPE = "topic_info"
+
 
 class TopicService(BaseService):
     """Класс для работы с темами по истории России"""
 
-    def __init__(self, api_client, logger):
+    # Версия оформления сообщений: при изменении _format_topic_messages ее нужно увеличить,
+    # кэшированные главы при этом остаются действительными
+    FORMAT_VERSION = 2
+    # Количество тем с запомненными отформатированными сообщениями
+    RENDER_CACHE_SIZE = 128
+
+    # Проверка качества глав: минимальная длина и число попыток
+    CHAPTER_MIN_LENGTH = 1500
+    CHAPTER_MAX_ATTEMPTS = 3
+    # Лимит токенов ответа для главы: 1024 токенов часто не хватало на 1500 символов,
+    # при повторе лимит удваивается до CHAPTER_RETRY_MAX_TOKENS
+    CHAPTER_MAX_TOKENS = 2048
+    CHAPTER_RETRY_MAX_TOKENS = 4096
+    CHAPTER_TEMPERATURE = 0.3
+    # Повторы главы отключаются, если из последних CHAPTER_RETRY_WINDOW повторов
+    # (но не меньше CHAPTER_RETRY_MIN_SAMPLES) успешных меньше CHAPTER_RETRY_MIN_SUCCESS_RATE.
+    # Каждая CHAPTER_RETRY_PROBE_EVERY-я генерация главы все равно пробует повтор,
+    # чтобы заметить, что ответы модели снова достигают нужной длины
+    CHAPTER_RETRY_WINDOW = 20
+    CHAPTER_RETRY_MIN_SAMPLES = 5
+    CHAPTER_RETRY_MIN_SUCCESS_RATE = 0.2
+    CHAPTER_RETRY_PROBE_EVERY = 10
+
+    def __init__(self, api_client, logger, topic_catalogue=None, retry_budget=None):
         """
         Инициализация сервиса тем
 
         Args:
             api_client: Клиент API для получения данных
             logger: Логгер для записи действий
+            topic_catalogue (TopicCatalogue, optional): Каталог тем для страниц "Больше тем"
+            retry_budget (RetryBudget, optional): Общий бюджет повторных запросов глав
         """
         super().__init__(logger)
         self.api_client = api_client
+        self.topic_catalogue = topic_catalogue
+        self.retry_budget = retry_budget or RetryBudget()
+        # Статистика генерации по главам и последние исходы повторов
+        self._chapter_stats = {}
+        self._retry_outcomes = {}
+        self._stats_lock = threading.Lock()
+        if topic_catalogue is not None:
+            # Каталог пополняется в фоне теми же запросами, что и живая генерация
+            topic_catalogue.set_refill_callback(self.generate_new_topics_list)
         
         # Список стандартных глав для каждой темы
         self.standard_chapters = [
@@ -37,6 +84,10 @@ class TopicService(BaseService):
 
         # Максимальный размер сообщения в Telegram (символов)
         self.max_message_size = 4000
+
+        # Отформатированные сообщения: (тема, версия оформления) -> (подпись глав, сообщения)
+        self._rendered = OrderedDict()
+        self._rendered_lock = threading.Lock()
         
         # Инициализируем логгер для использования в методах
         self.logger = logger
@@ -108,6 +159,32 @@ class TopicService(BaseService):
         # Парсим и возвращаем темы
         return self.parse_topics(topics_text)
 
+    def get_topics_page(self, user_id, page_size=30):
+        """
+        Возвращает страницу тем, которые пользователь еще не видел.
+
+        Темы берутся из каталога; живая генерация через API выполняется
+        только если каталог для пользователя исчерпан.
+
+        Args:
+            user_id (int): ID пользователя
+            page_size (int): Количество тем на странице
+
+        Returns:
+            list: Список тем в формате "N. Тема"
+        """
+        if self.topic_catalogue is not None:
+            page = self.topic_catalogue.next_page(user_id, page_size)
+            if page:
+                return [f"{number}. {topic}" for number, topic in enumerate(page, 1)]
+            self._logger.info(f"Каталог тем исчерпан для пользователя {user_id}, генерируем новые темы")
+
+        topics = self.generate_new_topics_list()
+        if self.topic_catalogue is not None:
+            self.topic_catalogue.add_topics(topics)
+            self.topic_catalogue.mark_seen(user_id, topics)
+        return topics
+
     def parse_topics(self, topics_text):
         """
         Парсит темы из текстового ответа API
@@ -152,10 +229,15 @@ class TopicService(BaseService):
 
         return filtered_topics
 
+    @tracer.traced("topic.get_cached_topic_info")
     def get_cached_topic_info(self, topic, update_callback=None, text_cache_service=None):
         """
         Получает информацию по теме из кэша или генерирует новую
 
+        В кэше хранятся исходные тексты глав, а сообщения Telegram
+        формируются при чтении, поэтому изменение оформления не требует
+        повторной генерации.
+
         Args:
             topic (str): Тема для получения информации
             update_callback (function): Функция обратного вызова для обновления статуса
@@ -169,43 +251,114 @@ class TopicService(BaseService):
 
         # Проверяем кэш, если сервис кэширования предоставлен
         if text_cache_service:
-            cache_key_type = "topic_info"
-            cached_content = text_cache_service.get_text(topic, cache_key_type)
-
-            if cached_content:
-                # Нашли в кэше - десериализуем и возвращаем
+            chapters = self.load_topic_chapters(topic, text_cache_service)
+            if chapters:
                 if update_callback:
                     update_callback(f"📝 Загружаю информацию по теме: *{topic}* из кэша...")
-
                 self._logger.info(f"Информация по теме '{topic}' загружена из кэша")
+                return self.render_topic_messages(topic, chapters)
 
+            # Записи прежнего формата содержат готовые сообщения
+            cached_content = text_cache_service.get_text(topic, LEGACY_TOPIC_INFO_TYPE)
+            if cached_content:
                 try:
-                    # Предполагаем, что в кэше хранится JSON-строка с сообщениями
-                    import json
                     return json.loads(cached_content)
                 except Exception as e:
                     self._logger.error(f"Ошибка при десериализации кэшированной темы '{topic}': {e}")
-                    # В случае ошибки - сгенерируем заново
 
             if update_callback:
                 update_callback(f"🔄 Не найдено в кэше. Генерирую информацию по теме: *{topic}*...")
 
         # Генерируем новую информацию по теме
-        messages = self.get_topic_info(topic, update_callback)
+        try:
+            chapters = self.generate_topic_chapters(topic, update_callback)
+        except Exception as e:
+            self._logger.error(f"Ошибка при получении информации по теме {topic}: {e}")
+            return [f"⚠️ Не удалось получить информацию по теме: {topic}. Ошибка: {str(e)}"]
 
         # Сохраняем в кэш, если сервис кэширования предоставлен и данные успешно получены
-        if text_cache_service and messages and len(messages) > 1 and not messages[0].startswith("⚠️"):
-            try:
-                # Сериализуем сообщения для хранения в кэше
-                import json
-                serialized_messages = json.dumps(messages, ensure_ascii=False)
-                text_cache_service.save_text(topic, "topic_info", serialized_messages)
-                self._logger.info(f"Информация по теме '{topic}' сохранена в кэш")
-            except Exception as e:
-                self._logger.error(f"Ошибка при сохранении темы '{topic}' в кэш: {e}")
-
+        if text_cache_service and any(chapter.get("text") for chapter in chapters):
+            self.save_topic_chapters(topic, chapters, text_cache_service)
+
+        if update_callback:
+            update_callback(f"✏️ Форматирую материал по теме: *{topic}*...")
+        messages = self.render_topic_messages(topic, chapters)
+        if not messages:
+            return [f"⚠️ Не удалось получить информацию по теме: {topic}. Пожалуйста, попробуйте другую тему."]
         return messages
 
+    @staticmethod
+    def load_topic_chapters(topic, text_cache_service):
+        """
+        Загружает структурированные главы темы из кэша (используется ботом и веб-приложением)
+
+        Args:
+            topic (str): Тема
+            text_cache_service (TextCacheService): Сервис кэширования текстов
+
+        Returns:
+            list: Записи глав или None, если тема не найдена в кэше
+        """
+        cached_content = text_cache_service.get_text(topic, TOPIC_CHAPTERS_TYPE)
+        if not cached_content:
+            return None
+        try:
+            chapters = json.loads(cached_content).get("chapters")
+        except (ValueError, AttributeError):
+            return None
+        return chapters or None
+
+    def save_topic_chapters(self, topic, chapters, text_cache_service):
+        """
+        Сохраняет структурированные главы темы в кэш
+
+        Args:
+            topic (str): Тема
+            chapters (list): Записи глав из generate_topic_chapters
+            text_cache_service (TextCacheService): Сервис кэширования текстов
+        """
+        try:
+            document = {"topic": topic, "saved_at": time.time(), "chapters": chapters}
+            text_cache_service.save_text(topic, TOPIC_CHAPTERS_TYPE, json.dumps(document, ensure_ascii=False))
+            self._logger.info(f"Главы по теме '{topic}' сохранены в кэш")
+        except Exception as e:
+            self._logger.error(f"Ошибка при сохранении темы '{topic}' в кэш: {e}")
+
+    @tracer.traced("topic.render_topic_messages")
+    def render_topic_messages(self, topic, chapters):
+        """
+        Формирует сообщения Telegram из глав темы.
+
+        Результат запоминается для пары (тема, FORMAT_VERSION) и
+        используется повторно, пока не изменятся сами главы.
+
+        Args:
+            topic (str): Тема
+            chapters (list): Записи глав
+
+        Returns:
+            list: Список отформатированных сообщений
+        """
+        key = (topic.lower().strip(), self.FORMAT_VERSION)
+        signature = tuple((chapter.get("chapter"), chapter.get("generated_at"), len(chapter.get("text") or ""))
+                          for chapter in chapters)
+        with self._rendered_lock:
+            rendered = self._rendered.get(key)
+            if rendered and rendered[0] == signature:
+                self._rendered.move_to_end(key)
+                return list(rendered[1])
+
+        chapters_content = {chapter.get("chapter"): chapter.get("text", "") for chapter in chapters}
+        messages = self._format_topic_messages(topic, chapters_content)
+
+        with self._rendered_lock:
+            self._rendered[key] = (signature, messages)
+            self._rendered.move_to_end(key)
+            while len(self._rendered) > self.RENDER_CACHE_SIZE:
+                self._rendered.popitem(last=False)
+        return list(messages)
+
+    @tracer.traced("topic.get_topic_info")
     def get_topic_info(self, topic, update_callback=None):
         """
         Получает подробную информацию по теме, разбитую на главы
@@ -218,54 +371,74 @@ class TopicService(BaseService):
             list: Список сообщений с информацией по теме (по одному на каждую главу)
         """
         try:
-            # Функция для очистки текста от специальных символов для безопасной обработки
-            def sanitize_markdown(text):
-                if not text:
-                    return ""
-                # Экранируем специальные символы Markdown
-                chars_to_escape = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-                for char in chars_to_escape:
-                    text = text.replace(char, '\\' + char)
-                return text
-
-            # Очищаем пользовательский ввод
-            safe_topic = sanitize_markdown(topic)
-            chapters = self.standard_chapters
+            chapters = self.generate_topic_chapters(topic, update_callback)
 
             if update_callback:
-                update_callback(f"🔍 Собираю информацию по теме: *{topic}*...")
-
-            # Получаем общий контекст для темы для более точного последующего запроса
-            context_prompt = f"""Определи детальные характеристики и рамки темы "{safe_topic}" из истории России.
-            Укажи:
-            1. Точные хронологические рамки (годы, века, периоды)
-            2. Географический охват (территории, регионы)
-            3. Ключевых исторических деятелей, связанных с темой
-            4. Основные события в хронологическом порядке
-            5. Главные документы/акты/законы, если применимо
-
-            Ответ должен быть конкретным, точным и информативным.
-            """
+                update_callback(f"✏️ Форматирую материал по теме: *{topic}*...")
 
-            # Получаем общий контекст для темы без использования кэша
-            self._logger.info(f"Запрашиваю общий контекст для темы '{topic}'")
-            topic_context = self.api_client.ask_grok(context_prompt, use_cache=False)
+            # Формируем сообщения на основе собранной информации по главам
+            messages = self.render_topic_messages(topic, chapters)
 
-            if update_callback:
-                update_callback(f"📚 Формирую главы для темы: *{topic}*...")
+            # Если не удалось сформировать сообщения, возвращаем ошибку
+            if not messages:
+                return [f"⚠️ Не удалось получить информацию по теме: {topic}. Пожалуйста, попробуйте другую тему."]
 
-            # Получаем информацию для каждой главы отдельно
-            chapters_content = {}
+            return messages
 
-            for i, chapter in enumerate(chapters):
-                if update_callback:
-                    update_callback(f"📝 Работаю над главой {i+1}: *{chapter}*...")
+        except Exception as e:
+            self._logger.error(f"Ошибка при получении информации по теме {topic}: {e}")
+            return [f"⚠️ Не удалось получить информацию по теме: {topic}. Ошибка: {str(e)}"]
+
+    @tracer.traced("topic.generate_topic_chapters")
+    def generate_topic_chapters(self, topic, update_callback=None):
+        """
+        Генерирует содержимое глав темы через API
+
+        Args:
+            topic (str): Тема для получения информации
+            update_callback (function): Функция обратного вызова для обновления статуса
 
-                # Формируем специализированный запрос для каждой главы
-                chapter_prompt = self._get_chapter_prompt(chapter, safe_topic)
+        Returns:
+            list: Записи глав (тема, глава, номер, исходный текст и данные о генерации)
+        """
+        # Очищаем пользовательский ввод
+        safe_topic = escape_markdown(topic)
+        chapters = self.standard_chapters
+
+        if update_callback:
+            update_callback(f"🔍 Собираю информацию по теме: *{topic}*...")
+
+        # Получаем общий контекст для темы для более точного последующего запроса
+        context_prompt = f"""Определи детальные характеристики и рамки темы "{safe_topic}" из истории России.
+        Укажи:
+        1. Точные хронологические рамки (годы, века, периоды)
+        2. Географический охват (территории, регионы)
+        3. Ключевых исторических деятелей, связанных с темой
+        4. Основные события в хронологическом порядке
+        5. Главные документы/акты/законы, если применимо
+
+        Ответ должен быть конкретным, точным и информативным.
+        """
+
+        # Получаем общий контекст для темы без использования кэша
+        self._logger.info(f"Запрашиваю общий контекст для темы '{topic}'")
+        topic_context = self.api_client.ask_grok(context_prompt, use_cache=False)
 
-                # Добавляем контекст темы к запросу
-                full_prompt = f"""Контекст темы: {topic_context}
+        if update_callback:
+            update_callback(f"📚 Формирую главы для темы: *{topic}*...")
+
+        # Получаем информацию для каждой главы отдельно
+        records = []
+
+        for i, chapter in enumerate(chapters):
+            if update_callback:
+                update_callback(f"📝 Работаю над главой {i+1}: *{chapter}*...")
+
+            # Формируем специализированный запрос для каждой главы
+            chapter_prompt = self._get_chapter_prompt(chapter, safe_topic)
+
+            # Добавляем контекст темы к запросу
+            full_prompt = f"""Контекст темы: {topic_context}
 
 ВАЖНО: Ты высококвалифицированный историк, специализирующийся на истории России. Твоя задача - предоставить глубокий, детальный и достоверный анализ темы "{safe_topic}" для образовательного телеграм-бота.
 
@@ -285,41 +458,143 @@ class TopicService(BaseService):
 Текст должен быть готов к непосредственному использованию в качестве учебного материала.
 """
 
-                # Получаем ответ без кэширования 
-                # Попытаемся до 3-х раз получить качественный ответ
-                for attempt in range(3):
-                    self.logger.info(f"Запрос информации для главы '{chapter}', попытка {attempt+1}")
-                    chapter_content = self.api_client.ask_grok(full_prompt, use_cache=False)
-
-                    # Проверяем качество ответа - он должен быть достаточно информативным
-                    if len(chapter_content) >= 1500:
-                        break  # Достаточный объем
-
-                    # Если ответ короткий, повторяем запрос с усилением требований
-                    if update_callback:
-                        update_callback(f"⚠️ Получена неполная информация для главы {i+1}. Пробую снова...")
-
-                    # Усиливаем запрос для следующей попытки
-                    full_prompt += f"\n\nПОЛУЧЕННЫЙ ОТВЕТ НЕДОСТАТОЧЕН! Предыдущий ответ был слишком коротким ({len(chapter_content)} символов). Требуется МИНИМУМ 1500 символов с подробной, конкретной и точной информацией. Пожалуйста, предоставь гораздо более детальный и информативный ответ."
+            # Получаем ответ без кэширования; короткий ответ повторяем, пока это имеет смысл
+            prompt = full_prompt
+            max_tokens = self.CHAPTER_MAX_TOKENS
+            attempt = 0
+            while True:
+                self.logger.info(f"Запрос информации для главы '{chapter}', попытка {attempt+1}")
+                with tracer.span("topic.chapter", chapter=chapter, attempt=attempt + 1) as span:
+                    chapter_content = self.api_client.ask_grok(prompt, use_cache=False,
+                                                               temperature=self.CHAPTER_TEMPERATURE,
+                                                               max_tokens=max_tokens)
+                    if span is not None:
+                        span.set_attribute("length", len(chapter_content))
+                if attempt:
+                    self._record_retry_outcome(chapter, len(chapter_content) >= self.CHAPTER_MIN_LENGTH)
+
+                # Проверяем качество ответа - он должен быть достаточно информативным
+                if len(chapter_content) >= self.CHAPTER_MIN_LENGTH:
+                    break  # Достаточный объем
+                if attempt + 1 >= self.CHAPTER_MAX_ATTEMPTS or not self._can_retry_chapter(chapter):
+                    break
+
+                # Если ответ короткий, повторяем запрос с усилением требований
+                attempt += 1
+                if update_callback:
+                    update_callback(f"⚠️ Получена неполная информация для главы {i+1}. Пробую снова...")
+
+                # Усиливаем запрос: увеличиваем лимит токенов, а примечание о длине
+                # заменяет предыдущее, чтобы промпт не рос с каждой попыткой
+                max_tokens = min(max_tokens * 2, self.CHAPTER_RETRY_MAX_TOKENS)
+                prompt = full_prompt + f"\n\nПОЛУЧЕННЫЙ ОТВЕТ НЕДОСТАТОЧЕН! Предыдущий ответ был слишком коротким ({len(chapter_content)} символов). Требуется МИНИМУМ {self.CHAPTER_MIN_LENGTH} символов с подробной, конкретной и точной информацией. Пожалуйста, предоставь гораздо более детальный и информативный ответ."
+
+            self._record_chapter_result(chapter, len(chapter_content) >= self.CHAPTER_MIN_LENGTH)
+            records.append({
+                "topic": topic,
+                "chapter": chapter,
+                "index": i,
+                "text": chapter_content,
+                "attempts": attempt + 1,
+                "generated_at": time.time(),
+                "api_version": getattr(self.api_client, 'API_VERSION', None)
+            })
+            self.logger.info(f"Получена информация для главы '{chapter}' по теме '{topic}': {len(chapter_content)} символов")
+
+        return records
+
+    def _chapter_counters(self, chapter):
+        """Возвращает счетчики главы (вызывается под _stats_lock)"""
+        if chapter not in self._chapter_stats:
+            self._chapter_stats[chapter] = {
+                "generated": 0,          # сгенерировано глав
+                "retries": 0,            # выполнено повторов
+                "retry_successes": 0,    # повторов, после которых глава достигла нужной длины
+                "short": 0,              # глав, оставшихся короче CHAPTER_MIN_LENGTH
+                "retries_skipped": 0,    # повторов, отключенных из-за низкой успешности
+                "budget_denied": 0       # повторов, не разрешенных бюджетом
+            }
+            self._retry_outcomes[chapter] = deque(maxlen=self.CHAPTER_RETRY_WINDOW)
+        return self._chapter_stats[chapter]
 
-                chapters_content[chapter] = chapter_content
-                self.logger.info(f"Получена информация для главы '{chapter}' по теме '{topic}': {len(chapter_content)} символов")
+    def _can_retry_chapter(self, chapter):
+        """
+        Решает, стоит ли повторять запрос короткой главы.
 
-            if update_callback:
-                update_callback(f"✏️ Форматирую материал по теме: *{topic}*...")
+        Повтор не выполняется, если повторы этой главы в последнее время почти
+        никогда не достигали нужной длины (кроме пробных), или если исчерпан
+        общий бюджет повторов.
 
-            # Формируем сообщения на основе собранной информации по главам
-            messages = self._format_topic_messages(topic, chapters_content)
+        Args:
+            chapter (str): Название главы
 
-            # Если не удалось сформировать сообщения, возвращаем ошибку
-            if not messages:
-                return [f"⚠️ Не удалось получить информацию по теме: {topic}. Пожалуйста, попробуйте другую тему."]
+        Returns:
+            bool: True если повтор разрешен
+        """
+        with self._stats_lock:
+            counters = self._chapter_counters(chapter)
+            outcomes = self._retry_outcomes[chapter]
+            if len(outcomes) >= self.CHAPTER_RETRY_MIN_SAMPLES:
+                success_rate = sum(outcomes) / len(outcomes)
+                is_probe = counters["generated"] % self.CHAPTER_RETRY_PROBE_EVERY == 0
+                if success_rate < self.CHAPTER_RETRY_MIN_SUCCESS_RATE and not is_probe:
+                    counters["retries_skipped"] += 1
+                    return False
+
+        if not self.retry_budget.try_acquire():
+            with self._stats_lock:
+                self._chapter_counters(chapter)["budget_denied"] += 1
+            self.logger.warning(f"Бюджет повторов исчерпан, глава '{chapter}' принимается без повтора")
+            return False
+        return True
+
+    def _record_retry_outcome(self, chapter, success):
+        """Учитывает результат повторного запроса главы"""
+        with self._stats_lock:
+            counters = self._chapter_counters(chapter)
+            counters["retries"] += 1
+            if success:
+                counters["retry_successes"] += 1
+            self._retry_outcomes[chapter].append(success)
+
+    def _record_chapter_result(self, chapter, success):
+        """Учитывает итог генерации главы"""
+        with self._stats_lock:
+            counters = self._chapter_counters(chapter)
+            counters["generated"] += 1
+            if not success:
+                counters["short"] += 1
+
+    def get_retry_stats(self):
+        """
+        Возвращает статистику повторов генерации по главам.
 
-            return messages
+        Returns:
+            dict: Счетчики по главам с долей повторов (retry_rate) и долей успешных
+                повторов (retry_success_rate), а также состояние бюджета повторов
+        """
+        with self._stats_lock:
+            chapters = {chapter: counters.copy() for chapter, counters in self._chapter_stats.items()}
+        for counters in chapters.values():
+            generated = counters["generated"]
+            retries = counters["retries"]
+            counters["retry_rate"] = retries / generated if generated else 0.0
+            counters["retry_success_rate"] = counters["retry_successes"] / retries if retries else 0.0
+        return {"chapters": chapters, "budget": self.retry_budget.get_stats()}
+
+    def collect_metrics(self):
+        """
+        Значения для реестра метрик: счетчики генерации и повторов по главам.
 
-        except Exception as e:
-            self._logger.error(f"Ошибка при получении информации по теме {topic}: {e}")
-            return [f"⚠️ Не удалось получить информацию по теме: {topic}. Ошибка: {str(e)}"]
+        Yields:
+            tuple: (имя, тип, описание, метки, значение) - см. src.metrics.Sample
+        """
+        with self._stats_lock:
+            chapters = {chapter: counters.copy() for chapter, counters in self._chapter_stats.items()}
+        for chapter, counters in chapters.items():
+            for key, value in counters.items():
+                yield (f"bot_topic_chapter_{key}_total", "counter", f"Генерация глав тем по главам: {key}",
+                       {"chapter": chapter}, value)
 
     def _get_chapter_prompt(self, chapter, topic):
         """
@@ -510,28 +785,8 @@ class TopicService(BaseService):
                 # Учитываем размер заголовка и футера
                 available_size = self.max_message_size - len(chapter_header) - 100
 
-                # Разбиваем контент на абзацы
-                paragraphs = formatted_content.split('\n\n')
-
-                # Собираем части сообщения
-                current_part = ""
-                part_messages = []
-
-                for paragraph in paragraphs:
-                    if len(current_part) + len(paragraph) + 4 <= available_size:
-                        if current_part:
-                            current_part += "\n\n" + paragraph
-                        else:
-                            current_part = paragraph
-                    else:
-                        # Добавляем текущую часть в список
-                        if current_part:
-                            part_messages.append(current_part)
-                        current_part = paragraph
-
-                # Добавляем последнюю часть
-                if current_part:
-                    part_messages.append(current_part)
+                # Разбиваем контент на части по абзацам, не разрывая разметку
+                part_messages = split_message(formatted_content, available_size)
 
                 # Формируем сообщения с частями главы
                 for j, part in enumerate(part_messages, 1):
@@ -0,0 +1,388 @@
+"""
+Легковесная трассировка обработки запросов.
+
+Каждое обновление Telegram получает свой идентификатор трассы, который
+передается через contextvars во все вложенные вызовы: обработчик
+CommandHandlers, сервисы тем и тестов, запросы к Gemini, обращения к
+кэшам и отправку сообщений в Telegram. Каждый этап записывается как
+спан с временем начала и окончания.
+
+Завершенные спаны хранятся в памяти (для сводки в админ-панели) и
+пакетами дописываются в JSONL-файл: каждая строка - запрос экспорта
+OTLP (resourceSpans -> scopeSpans -> spans), такой файл читает
+filereceiver OpenTelemetry Collector и совместимые с ним инструменты.
+
+Выключенный трассировщик почти ничего не стоит: декораторы сразу
+вызывают исходную функцию.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Текущий спан потока выполнения (в каждом потоке свой контекст)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+
+# Коды статуса спана OTLP
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """Один этап обработки запроса"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "start_ns", "end_ns",
+                 "attributes", "error", "_started")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        # Длительность считается по монотонным часам, время начала - по системным
+        self._started = time.perf_counter_ns()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Добавляет атрибут спана"""
+        self.attributes[key] = value
+
+    def finish(self) -> None:
+        """Фиксирует окончание спана"""
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._started)
+
+    @property
+    def duration_ms(self) -> float:
+        """Длительность спана в миллисекундах"""
+        end_ns = self.end_ns if self.end_ns is not None else self.start_ns + (time.perf_counter_ns() - self._started)
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Представление спана в формате OTLP/JSON"""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error else {"code": STATUS_OK},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Преобразует атрибуты в список значений OTLP"""
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        result.append({"key": key, "value": typed})
+    return result
+
+
+def _percentile(values: List[float], p: float) -> float:
+    """Перцентиль отсортированного списка с линейной интерполяцией"""
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * p / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class Tracer:
+    """Трассировщик: создает спаны, хранит последние и экспортирует их в файл"""
+
+    def __init__(self, enabled: bool = False, export_file: Optional[str] = None, logger=None,
+                 service_name: str = "history-bot", keep_spans: int = 5000, flush_every: int = 200,
+                 flush_interval: float = 5.0, max_file_mb: float = 50.0):
+        """
+        Инициализация трассировщика.
+
+        Args:
+            enabled (bool): Записывать ли спаны
+            export_file (str, optional): JSONL-файл экспорта (None - только в памяти)
+            logger: Логгер для ошибок экспорта
+            service_name (str): Имя сервиса в ресурсе OTLP
+            keep_spans (int): Сколько последних спанов хранить в памяти для сводки
+            flush_every (int): Запись в файл после накопления стольких спанов
+            flush_interval (float): Запись в файл не реже раза в столько секунд
+            max_file_mb (float): Размер файла, после которого он переименовывается в *.1
+        """
+        self.enabled = enabled
+        self.export_file = export_file
+        self.logger = logger
+        self.service_name = service_name
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.max_file_bytes = int(max_file_mb * 1024 * 1024)
+        self._spans = deque(maxlen=keep_spans)
+        self._pending: List[Span] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+
+    def configure(self, enabled: bool = True, export_file: Optional[str] = None, logger=None, **options) -> None:
+        """Перенастраивает трассировщик (используется фабрикой при запуске бота)"""
+        self.flush()
+        self.enabled = enabled
+        self.export_file = export_file
+        self.logger = logger or self.logger
+        for name in ("service_name", "flush_every", "flush_interval"):
+            if name in options:
+                setattr(self, name, options[name])
+        if "max_file_mb" in options:
+            self.max_file_bytes = int(options["max_file_mb"] * 1024 * 1024)
+        if "keep_spans" in options:
+            with self._lock:
+                self._spans = deque(self._spans, maxlen=options["keep_spans"])
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        """Возвращает текущий спан или None"""
+        return _current_span.get()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Добавляет атрибут текущему спану, если он есть"""
+        span = _current_span.get()
+        if span is not None:
+            span.attributes[key] = value
+
+    @contextmanager
+    def span(self, name: str, new_trace: bool = False, require_trace: bool = False, **attributes):
+        """
+        Контекстный менеджер этапа обработки.
+
+        Спан становится дочерним для текущего; без текущего спана
+        (или с new_trace) начинается новая трасса.
+
+        Args:
+            name (str): Название этапа, например "gemini.call_api"
+            new_trace (bool): Всегда начинать новую трассу
+            require_trace (bool): Не записывать спан вне трассы (например, опрос getUpdates)
+            **attributes: Атрибуты спана
+
+        Yields:
+            Span или None, если спан не записывается
+        """
+        parent = _current_span.get()
+        if not self.enabled or (require_trace and parent is None):
+            yield None
+            return
+        if new_trace or parent is None:
+            span = Span(name, secrets.token_hex(16), None, attributes)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+            self._record(span)
+
+    def traced(self, name: str, **attributes) -> Callable:
+        """
+        Декоратор, записывающий вызов функции как спан.
+
+        Args:
+            name (str): Название этапа
+            **attributes: Постоянные атрибуты спана
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(name, **attributes):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def trace_update(self, name: str) -> Callable:
+        """
+        Декоратор обработчика обновления Telegram (метод с аргументами update, context).
+
+        Обработчик, вызванный не из другого обработчика, начинает новую
+        трассу; в атрибуты записываются идентификаторы обновления и пользователя.
+
+        Args:
+            name (str): Название этапа, например "handler.choose_topic"
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(handler, update, *args, **kwargs):
+                if not self.enabled:
+                    return func(handler, update, *args, **kwargs)
+                with self.span(name, **_update_attributes(update)):
+                    return func(handler, update, *args, **kwargs)
+            return wrapper
+        return decorator
+
+    def bind(self, func: Callable) -> Callable:
+        """
+        Привязывает функцию к текущему контексту трассы.
+
+        Нужен для функций, которые выполняются в другом потоке (очереди
+        запросов Telegram, пулы потоков): их спаны попадут в ту же трассу.
+        """
+        if not self.enabled or _current_span.get() is None:
+            return func
+        context = contextvars.copy_context()
+
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            return context.run(func, *args, **kwargs)
+        return run
+
+    def _record(self, span: Span) -> None:
+        """Сохраняет завершенный спан и при необходимости записывает пакет в файл"""
+        with self._lock:
+            self._spans.append(span)
+            if not self.export_file:
+                return
+            self._pending.append(span)
+            due = (len(self._pending) >= self.flush_every
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Дописывает накопленные спаны в файл экспорта.
+
+        Returns:
+            int: Количество записанных спанов
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if not pending or not self.export_file:
+            return 0
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": "src.tracing"},
+                    "spans": [span.to_otlp() for span in pending]
+                }]
+            }]
+        }
+        line = json.dumps(request, ensure_ascii=False) + "\n"
+        try:
+            with self._export_lock:
+                directory = os.path.dirname(self.export_file)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if os.path.exists(self.export_file) and os.path.getsize(self.export_file) > self.max_file_bytes:
+                    os.replace(self.export_file, self.export_file + ".1")
+                with open(self.export_file, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError as e:
+            if self.logger:
+                self.logger.error(f"Ошибка при записи трассировки в {self.export_file}: {e}")
+            return 0
+        return len(pending)
+
+    def recent_spans(self) -> List[Span]:
+        """Возвращает последние завершенные спаны"""
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        """Забывает сохраненные в памяти спаны (файл экспорта не меняется)"""
+        with self._lock:
+            self._spans.clear()
+
+    def summarize(self, spans: Optional[Iterable[Span]] = None) -> Dict[str, Any]:
+        """
+        Сводка задержек по этапам.
+
+        Собственное время этапа (self_ms) - длительность без вложенных
+        спанов: у обработчиков это паузы и работа, не покрытая другими этапами.
+
+        Args:
+            spans: Спаны для сводки (по умолчанию - последние из памяти)
+
+        Returns:
+            Dict[str, Any]: {"traces": число трасс, "spans": число спанов,
+                "stages": [{"name", "count", "errors", "p50_ms", "p95_ms", "max_ms",
+                "total_ms", "self_ms"}, ...] по убыванию суммарного времени}
+        """
+        spans = self.recent_spans() if spans is None else list(spans)
+        children_ms: Dict[str, float] = {}
+        for span in spans:
+            if span.parent_span_id:
+                children_ms[span.parent_span_id] = children_ms.get(span.parent_span_id, 0.0) + span.duration_ms
+
+        stages: Dict[str, Dict[str, Any]] = {}
+        for span in spans:
+            stage = stages.setdefault(span.name, {"durations": [], "errors": 0, "self_ms": 0.0})
+            duration = span.duration_ms
+            stage["durations"].append(duration)
+            stage["self_ms"] += max(0.0, duration - children_ms.get(span.span_id, 0.0))
+            if span.error:
+                stage["errors"] += 1
+
+        rows = []
+        for name, stage in stages.items():
+            durations = sorted(stage["durations"])
+            rows.append({
+                "name": name,
+                "count": len(durations),
+                "errors": stage["errors"],
+                "p50_ms": round(_percentile(durations, 50), 3),
+                "p95_ms": round(_percentile(durations, 95), 3),
+                "max_ms": round(durations[-1], 3),
+                "total_ms": round(sum(durations), 3),
+                "self_ms": round(stage["self_ms"], 3),
+            })
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return {
+            "traces": len({span.trace_id for span in spans if not span.parent_span_id}),
+            "spans": len(spans),
+            "stages": rows,
+        }
+
+
+def _update_attributes(update) -> Dict[str, Any]:
+    """Атрибуты спана обработчика из обновления Telegram"""
+    attributes = {}
+    update_id = getattr(update, "update_id", None)
+    if update_id is not None:
+        attributes["telegram.update_id"] = update_id
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        attributes["telegram.user_id"] = user.id
+    query = getattr(update, "callback_query", None)
+    if query is not None and getattr(query, "data", None):
+        attributes["telegram.callback_data"] = query.data
+    return attributes
+
+
+# Общий трассировщик процесса; фабрика включает его по настройкам конфигурации
+tracer = Tracer()
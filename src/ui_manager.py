@@ -2,6 +2,7 @@ import re
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from src.topic_service import TopicService # Import the new TopicService
 from src.base_service import BaseService
+from src.text_rendering import escape_markdown
 
 class UIManager(BaseService):
     """Класс для управления пользовательским интерфейсом с функциями очистки текста для Telegram"""
@@ -34,15 +35,7 @@ class UIManager(BaseService):
         Returns:
             str: Очищенный текст
         """
-        if not text:
-            return ""
-
-        # Экранируем специальные символы Markdown
-        chars_to_escape = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-        for char in chars_to_escape:
-            text = text.replace(char, '\\' + char)
-
-        return text
+        return escape_markdown(text)
 
     def main_menu(self):
         """
@@ -0,0 +1,224 @@
+"""
+Многопроцессный режим работы бота.
+
+Telegram разрешает только одного получателя getUpdates на токен, поэтому
+обновления получает один процесс-приемник, а обрабатывают несколько
+процессов-обработчиков. Каждое обновление направляется в процесс по chat_id,
+так что все сообщения одного чата всегда обрабатываются одним и тем же
+процессом (и его context.user_data остается согласованным). Состояния,
+которые нужны нескольким процессам, хранятся в общем хранилище
+(см. src/shared_state.py).
+"""
+
+import json
+import multiprocessing
+import threading
+import time
+from typing import List, Optional
+
+from src.interfaces import ILogger
+
+
+def get_partition(chat_id: Optional[int], num_workers: int) -> int:
+    """
+    Определяет номер процесса-обработчика для чата.
+
+    Args:
+        chat_id (int, optional): ID чата (None для обновлений без чата)
+        num_workers (int): Количество процессов-обработчиков
+
+    Returns:
+        int: Номер процесса от 0 до num_workers - 1
+    """
+    if not chat_id or num_workers <= 1:
+        return 0
+    return abs(int(chat_id)) % num_workers
+
+
+def _worker_main(worker_index: int, update_queue) -> None:
+    """
+    Точка входа процесса-обработчика.
+
+    Создает собственный экземпляр бота через фабрику и обрабатывает
+    обновления, поступающие из очереди процесса-приемника.
+
+    Args:
+        worker_index (int): Номер процесса-обработчика
+        update_queue (multiprocessing.Queue): Очередь сериализованных обновлений
+    """
+    from src.config import Config
+    from src.factory import BotFactory
+    from src.logger import Logger
+    from src.task_queue import TaskQueue
+
+    logger = Logger()
+    config = Config()
+    # Номер процесса - метка снимка его метрик в /metrics процесса-приемника
+    config.worker_index = worker_index
+
+    bot = BotFactory.create_bot(config)
+    if not bot or not bot.setup():
+        logger.error(f"Процесс-обработчик #{worker_index}: не удалось настроить бота")
+        return
+
+    task_queue = TaskQueue(num_workers=2, logger=logger)
+    task_queue.start()
+    config.set_task_queue(task_queue)
+
+    logger.info(f"Процесс-обработчик #{worker_index} запущен")
+    bot.run_worker(update_queue)
+    task_queue.stop()
+
+
+class BotWorkerPool:
+    """
+    Пул процессов-обработчиков с процессом-приемником обновлений.
+
+    Процесс-приемник опрашивает Telegram и раскладывает обновления
+    по очередям обработчиков согласно get_partition.
+    """
+
+    def __init__(self, config, logger: ILogger, num_workers: Optional[int] = None):
+        """
+        Инициализация пула.
+
+        Args:
+            config: Конфигурация приложения
+            logger (ILogger): Логгер для записи информации
+            num_workers (int, optional): Количество обработчиков (по умолчанию config.bot_workers)
+        """
+        self.config = config
+        self.logger = logger
+        self.num_workers = max(1, num_workers or getattr(config, 'bot_workers', 1))
+        # Процессы запускаются через spawn: к моменту запуска в процессе уже работают
+        # потоки (веб-сервер, фоновая очистка кэшей), а fork копирует их блокировки
+        # в захваченном состоянии
+        self._mp_context = multiprocessing.get_context('spawn')
+        self.queues: List[multiprocessing.Queue] = []
+        self.processes: List[multiprocessing.Process] = []
+        self.updater = None
+        self.shared_state = None
+        self.routed_updates = [0] * self.num_workers
+        self.lock = threading.Lock()
+
+    def start_workers(self) -> None:
+        """Запускает процессы-обработчики"""
+        for index in range(self.num_workers):
+            update_queue = self._mp_context.Queue()
+            process = self._mp_context.Process(
+                target=_worker_main,
+                args=(index, update_queue),
+                name=f"bot-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self.queues.append(update_queue)
+            self.processes.append(process)
+        self.logger.info(f"Запущено {self.num_workers} процессов-обработчиков бота")
+
+    def route_update(self, update, context=None) -> None:
+        """
+        Передает обновление в очередь процесса-обработчика.
+
+        Используется как обработчик диспетчера процесса-приемника.
+
+        Args:
+            update (telegram.Update): Объект обновления Telegram
+            context (telegram.ext.CallbackContext, optional): Контекст (не используется)
+        """
+        chat_id = update.effective_chat.id if update.effective_chat else None
+        index = get_partition(chat_id, self.num_workers)
+        self.queues[index].put(update.to_json())
+        with self.lock:
+            self.routed_updates[index] += 1
+
+    def get_stats(self) -> dict:
+        """
+        Возвращает статистику пула.
+
+        Returns:
+            dict: Количество обработчиков, живых процессов и распределение обновлений
+        """
+        with self.lock:
+            routed = list(self.routed_updates)
+        return {
+            "num_workers": self.num_workers,
+            "alive_workers": sum(1 for process in self.processes if process.is_alive()),
+            "routed_updates": routed
+        }
+
+    def register_metrics(self) -> None:
+        """
+        Подключает к /metrics процесса-приемника снимки метрик обработчиков.
+
+        Веб-сервер работает в процессе-приемнике, а сервисы бота - в обработчиках,
+        поэтому их метрики приходят через общее хранилище состояния.
+        """
+        from src.metrics import registry
+        from src.shared_state import create_state_backend
+
+        self.shared_state = create_state_backend(self.config, self.logger)
+        registry.register_snapshots(self.shared_state)
+        registry.register_stats('bot_worker_pool', self.get_stats, "Пул процессов-обработчиков",
+                                gauges=('num_workers', 'alive_workers'))
+
+    def run(self) -> None:
+        """Запускает обработчики и процесс-приемник (блокирующий вызов)"""
+        from telegram.ext import Updater, TypeHandler
+        from telegram import Update
+
+        self.start_workers()
+        self.register_metrics()
+
+        self.updater = Updater(
+            self.config.telegram_token,
+            use_context=True,
+            workers=1,
+            request_kwargs={'read_timeout': 6, 'connect_timeout': 7}
+        )
+        self.updater.dispatcher.add_handler(TypeHandler(Update, self.route_update))
+
+        self.logger.info("Процесс-приемник обновлений запускает polling")
+        self.updater.start_polling(
+            timeout=10,
+            drop_pending_updates=True,
+            allowed_updates=['message', 'callback_query', 'chat_member', 'chosen_inline_result'],
+            poll_interval=0.5
+        )
+        try:
+            self.updater.idle()
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Останавливает процессы-обработчики.
+
+        Args:
+            timeout (float): Время ожидания завершения каждого процесса в секундах
+        """
+        for update_queue in self.queues:
+            update_queue.put(None)
+
+        deadline = time.time() + timeout
+        for process in self.processes:
+            process.join(max(0.0, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+
+        self.logger.info("Процессы-обработчики бота остановлены")
+
+
+def update_from_json(data: str, bot):
+    """
+    Восстанавливает объект обновления из JSON, полученного от процесса-приемника.
+
+    Args:
+        data (str): Сериализованное обновление
+        bot (telegram.Bot): Экземпляр бота процесса-обработчика
+
+    Returns:
+        telegram.Update: Объект обновления
+    """
+    from telegram import Update
+    return Update.de_json(json.loads(data), bot)
@@ -0,0 +1,49 @@
+
+import sys
+import os
+import tempfile
+import unittest
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.bench_suite import compare, load_baseline, run, save_baseline, select
+
+
+class TestBenchSuite(unittest.TestCase):
+
+    def test_compare_verdicts(self):
+        """Тест: замедление засчитывается, только если выросли и медиана, и минимум"""
+        baseline = {
+            "a": {"median_us": 10.0, "min_us": 9.0},
+            "b": {"median_us": 10.0, "min_us": 9.0},
+            "c": {"median_us": 10.0, "min_us": 9.0},
+        }
+        results = {
+            "a": {"median_us": 13.0, "min_us": 12.0},
+            "b": {"median_us": 13.0, "min_us": 9.5},
+            "c": {"median_us": 7.0, "min_us": 6.0},
+            "d": {"median_us": 1.0, "min_us": 1.0},
+        }
+        verdicts = {row["name"]: row["verdict"] for row in compare(results, baseline, threshold=0.2)}
+        self.assertEqual(verdicts, {"a": "slower", "b": "same", "c": "faster", "d": "new"})
+
+    def test_run_and_save_baseline(self):
+        """Тест прогона выбранного бенчмарка и сохранения базовых замеров"""
+        self.assertIn("api_cache.get[size=1000]", [name for _, name, _ in select(["api_cache.get"])])
+
+        results = run(["conversation."], repeat=2, min_time=0.001)
+        self.assertEqual(list(results), ["conversation._is_history_related"])
+        self.assertGreater(results["conversation._is_history_related"]["median_us"], 0)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "baseline.json")
+            save_baseline(results, path)
+            save_baseline({"other": {"median_us": 1.0, "min_us": 1.0}}, path)
+            baseline = load_baseline(path)
+        self.assertEqual(set(baseline["results"]), {"conversation._is_history_related", "other"})
+        self.assertIn("python", baseline["environment"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+import shutil
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bot_persistence import BotPersistence
+from src.shared_state import SQLiteStateBackend
+from src.interfaces import ILogger
+
+class TestBotPersistence(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка окружения для тестов"""
+        self.logger = MagicMock(spec=ILogger)
+        self.temp_dir = tempfile.mkdtemp()
+        self.backend = SQLiteStateBackend(self.logger, os.path.join(self.temp_dir, 'persistence.db'))
+        self.persistence = BotPersistence(self.backend, self.logger, start_flush_thread=False)
+
+    def tearDown(self):
+        """Очистка после тестов"""
+        self.backend.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_write_behind(self):
+        """Тест отложенной записи: данные попадают в хранилище только после flush"""
+        self.persistence.update_user_data(1, {"topics": ["Смутное время"], "score": 3})
+        self.assertIsNone(self.backend.get(BotPersistence.USER_DATA_NAMESPACE, "1"))
+
+        self.assertEqual(self.persistence.flush(), 1)
+        self.assertEqual(self.backend.get(BotPersistence.USER_DATA_NAMESPACE, "1")["score"], 3)
+
+    def test_unchanged_data_not_written(self):
+        """Тест пропуска неизмененных данных"""
+        user_data = {"current_question": 0}
+        self.persistence.update_user_data(1, user_data)
+        self.persistence.flush()
+
+        self.persistence.update_user_data(1, user_data)
+        self.assertEqual(self.persistence.flush(), 0)
+        self.assertEqual(self.persistence.stats["unchanged_skipped"], 1)
+
+        user_data["current_question"] = 1
+        self.persistence.update_user_data(1, user_data)
+        self.assertEqual(self.persistence.flush(), 1)
+
+    def test_restore_after_restart(self):
+        """Тест восстановления данных и состояний диалогов после перезапуска"""
+        self.persistence.update_user_data(7, {"questions": ["Вопрос 1"], "current_question": 1})
+        self.persistence.update_conversation("main_conversation", (100, 7), 3)
+        self.persistence.update_conversation("main_conversation", (100, 8), 1)
+        self.persistence.update_conversation("main_conversation", (100, 8), None)
+        self.persistence.flush()
+
+        restored = BotPersistence(self.backend, self.logger, start_flush_thread=False)
+        self.assertEqual(restored.get_user_data()[7]["current_question"], 1)
+        self.assertEqual(restored.get_conversations("main_conversation"), {(100, 7): 3})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock
+import json
+import tempfile
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.cache_codec import CacheCodec
+from src.api_cache import APICache
+from src.interfaces import ILogger
+
+LONG_TEXT = "Крещение Руси при князе Владимире Святославиче в 988 году. " * 60
+
+
+class TestCacheCodec(unittest.TestCase):
+
+    def test_binary_roundtrip(self):
+        """Тест кодирования и декодирования значений разных типов"""
+        codec = CacheCodec(threshold=100)
+        for value in ("короткая строка", LONG_TEXT, {"text": LONG_TEXT, "n": 1}, [1, 2, 3], {1, 2}):
+            data = codec.encode(value)
+            self.assertTrue(CacheCodec.is_encoded(data))
+            self.assertEqual(codec.decode(data), value)
+
+    def test_threshold_and_savings(self):
+        """Тест порога сжатия и подсчета сэкономленных байт"""
+        codec = CacheCodec(threshold=1024)
+        data, encoding = codec.encode_text("Смутное время")
+        self.assertEqual(data, "Смутное время")
+        self.assertIsNone(encoding)
+
+        data, encoding = codec.encode_text(LONG_TEXT)
+        self.assertEqual(encoding, "zlib+base64")
+        self.assertEqual(codec.decode_text(data, encoding), LONG_TEXT)
+
+        stats = codec.get_stats()
+        self.assertEqual(stats["compressed"], 1)
+        self.assertGreater(stats["bytes_saved"], len(LONG_TEXT.encode("utf-8")) // 2)
+        self.assertGreater(stats["compression_ratio"], 1.0)
+
+    def test_missing_zstd_falls_back_to_zlib(self):
+        """Тест замены недоступного алгоритма на zlib"""
+        from src import cache_codec
+        if cache_codec.zstandard is None:
+            self.assertEqual(CacheCodec(compression="zstd").compression, "zlib")
+        with self.assertRaises(ValueError):
+            CacheCodec(compression="lzma")
+
+    def test_api_cache_stores_compressed_values(self):
+        """Тест хранения сжатых значений в файле APICache"""
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.json')
+        temp_file.close()
+        try:
+            logger = MagicMock(spec=ILogger)
+            cache = APICache(logger, max_size=5, cache_file=temp_file.name)
+            cache.set("chapter", LONG_TEXT)
+            cache.set("structured", {"facts": [LONG_TEXT]})
+            cache._save_cache()
+
+            with open(temp_file.name, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+            self.assertEqual(raw["chapter"]["encoding"], "zlib+base64")
+            self.assertLess(os.path.getsize(temp_file.name), len(LONG_TEXT.encode("utf-8")))
+
+            reloaded = APICache(logger, max_size=5, cache_file=temp_file.name)
+            self.assertEqual(reloaded.get("chapter"), LONG_TEXT)
+            self.assertEqual(reloaded.get("structured"), {"facts": [LONG_TEXT]})
+        finally:
+            os.unlink(temp_file.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -69,6 +69,28 @@ class TestConversationService(unittest.TestCase):
             "Сообщение должно быть определено как историческое с учетом контекста"
         )
 
+    def test_is_history_related_inflected_forms(self):
+        """Тест распознавания словоформ исторических ключевых слов"""
+        for msg in ["Последствия революции 1917 года", "Реформы Петра Первого", "Итоги Первой мировой"]:
+            self.assertTrue(
+                self.conversation_service._is_history_related(msg, {}),
+                f"Сообщение должно быть определено как историческое: {msg}"
+            )
+        self.assertFalse(self.conversation_service._is_history_related("Посоветуй фильм на вечер", {}))
+
+    def test_keywords_use_shared_stemmer(self):
+        """Тест: ключевые слова сводятся к тем же основам, что и в russian_text"""
+        from src.conversation_service import _keyword_entry
+        from src.russian_text import stem
+
+        self.assertEqual(_keyword_entry("революция"), (stem("революция"), False))
+        self.assertEqual(_keyword_entry("Крымская война"), (f"{stem('крымская')} {stem('война')}", False))
+        # Короткая основа ищется целым словом
+        self.assertEqual(_keyword_entry("царь"), ("царь", True))
+        for msg in ["Причины Крымской войны", "Когда распался Советский Союз", "Правление Ивана Грозного"]:
+            self.assertTrue(self.conversation_service._is_history_related(msg, {}), msg)
+        self.assertFalse(self.conversation_service._is_history_related("Царапина на двери", {}))
+
     def test_enhance_historical_response(self):
         """Тест улучшения форматирования исторического ответа"""
         # Простой ответ
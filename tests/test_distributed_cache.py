@@ -0,0 +1,161 @@
+
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+import time
+import tempfile
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.distributed_cache import DistributedCache, CircuitBreaker
+from src.cache_invalidation import LocalInvalidationTransport
+from src.interfaces import ILogger
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+class TestDistributedCache(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка окружения для тестов"""
+        self.logger = MagicMock(spec=ILogger)
+        self.temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.json')
+        self.temp_file.close()
+        os.unlink(self.temp_file.name)
+
+    def tearDown(self):
+        """Очистка после тестов"""
+        if os.path.exists(self.temp_file.name):
+            os.unlink(self.temp_file.name)
+
+    def _create_cache(self, redis_client=None, **kwargs):
+        return DistributedCache(self.logger, local_cache_file=self.temp_file.name,
+                                redis_client=redis_client, **kwargs)
+
+    def test_local_only_mode(self):
+        """Тест работы без Redis"""
+        cache = self._create_cache()
+        self.assertFalse(cache.using_redis)
+
+        cache.set_many({"a": 1, "b": {"text": "Киевская Русь"}})
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": 1, "b": {"text": "Киевская Русь"}})
+        self.assertEqual(cache.stats["misses"], 1)
+
+    @unittest.skipUnless(fakeredis, "fakeredis не установлен")
+    def test_get_many_uses_redis(self):
+        """Тест пакетного чтения из Redis с наполнением локального кэша"""
+        client = fakeredis.FakeRedis()
+        writer = self._create_cache(redis_client=client)
+        writer.set_many({"k1": "v1", "k2": "v2"}, ttl=60)
+
+        reader = self._create_cache(redis_client=client)
+        reader.local_cache.clear()
+        self.assertEqual(reader.get_many(["k1", "k2", "k3"]), {"k1": "v1", "k2": "v2"})
+        self.assertEqual(reader.stats["redis_hits"], 2)
+        self.assertEqual(reader.stats["batch_gets"], 1)
+
+        # Повторное чтение обслуживается локальным кэшем
+        self.assertEqual(reader.get("k1"), "v1")
+        self.assertEqual(reader.stats["redis_hits"], 2)
+        self.assertGreater(client.ttl(DistributedCache.REDIS_PREFIX + "k1"), 0)
+
+    @unittest.skipUnless(fakeredis, "fakeredis не установлен")
+    def test_get_many_saves_local_file_once(self):
+        """Тест: пакетное чтение из Redis перезаписывает локальный файл не более одного раза"""
+        client = fakeredis.FakeRedis()
+        writer = self._create_cache(redis_client=client)
+        writer.set_many({f"k{i}": f"v{i}" for i in range(5)}, ttl=60)
+
+        reader = self._create_cache(redis_client=client)
+        reader.local_cache.clear()
+        with patch.object(reader, '_save_local_cache', wraps=reader._save_local_cache) as save:
+            self.assertEqual(len(reader.get_many([f"k{i}" for i in range(5)])), 5)
+        self.assertLessEqual(save.call_count, 1)
+        self.assertEqual(reader.stats["redis_hits"], 5)
+
+    def test_circuit_breaker_opens_and_recovers(self):
+        """Тест размыкания предохранителя и восстановления после проверки"""
+        client = MagicMock()
+        cache = self._create_cache(redis_client=client, failure_threshold=2, reset_timeout=0.05)
+        self.assertTrue(cache.using_redis)
+
+        client.get.side_effect = ConnectionError("redis down")
+        self.assertIsNone(cache.get("x"))
+        self.assertIsNone(cache.get("y"))
+        self.assertFalse(cache.using_redis)
+        self.assertEqual(cache.breaker.state, CircuitBreaker.OPEN)
+
+        # Пока предохранитель разомкнут, Redis не вызывается
+        calls = client.get.call_count
+        cache.get("z")
+        self.assertEqual(client.get.call_count, calls)
+
+        time.sleep(0.06)
+        self.assertTrue(cache.breaker.should_probe())
+        self.assertTrue(cache._probe_redis())
+        self.assertTrue(cache.using_redis)
+
+        stats = cache.get_stats()
+        self.assertEqual(stats["circuit_open_count"], 1)
+        self.assertAlmostEqual(stats["redis_error_rate"], 1.0)
+        self.assertIn("redis_latency_p95_ms", stats)
+
+    def test_invalidation_between_processes(self):
+        """Тест удаления устаревших ключей из локальных кэшей других процессов"""
+        channel = f"test:{self.id()}"
+        first = self._create_cache(invalidation_transport=LocalInvalidationTransport(channel))
+        second = DistributedCache(self.logger, local_cache_file=self.temp_file.name + '.2',
+                                  invalidation_transport=LocalInvalidationTransport(channel))
+        try:
+            self.assertEqual(first.local_ttl, 3600)
+            second.set("topic", "старое значение")
+
+            first.set("topic", "новое значение")
+            self.assertIsNone(second.get("topic"))
+            self.assertEqual(second.stats["invalidations_received"], 1)
+            self.assertEqual(first.get("topic"), "новое значение")
+
+            second.set("other", "Смутное время")
+            first.set("another", "Смутное время")
+            first.clear_cache("смутное")
+            self.assertIsNone(second.get("other"))
+
+            second.set("x", 1)
+            first.clear()
+            self.assertEqual(second.get_stats()["size_local"], 0)
+        finally:
+            first.invalidation_transport.close()
+            second.invalidation_transport.close()
+            if os.path.exists(self.temp_file.name + '.2'):
+                os.unlink(self.temp_file.name + '.2')
+
+    @unittest.skipUnless(fakeredis, "fakeredis не установлен")
+    def test_redis_pubsub_invalidation(self):
+        """Тест инвалидации через Redis pub/sub"""
+        from src.cache_invalidation import RedisInvalidationTransport
+        client = fakeredis.FakeRedis()
+        first = self._create_cache(redis_client=client,
+                                   invalidation_transport=RedisInvalidationTransport(client, self.logger))
+        second = DistributedCache(self.logger, local_cache_file=self.temp_file.name + '.2', redis_client=client,
+                                  invalidation_transport=RedisInvalidationTransport(client, self.logger))
+        try:
+            second.set("key", "v1")
+            time.sleep(0.2)  # Даем подпискам установиться
+            first.remove("key")
+
+            deadline = time.time() + 3
+            while "key" in second.local_cache and time.time() < deadline:
+                time.sleep(0.05)
+            self.assertNotIn("key", second.local_cache)
+        finally:
+            first.invalidation_transport.close()
+            second.invalidation_transport.close()
+            if os.path.exists(self.temp_file.name + '.2'):
+                os.unlink(self.temp_file.name + '.2')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+
+import sys
+import os
+import unittest
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from history_db_generator.event_index import EventIndex, event_year, normalize_title
+
+
+class TestEventIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка индекса с одним событием"""
+        self.index = EventIndex()
+        self.battle = {
+            "title": "Полтавская битва",
+            "date": "27 июня 1709 г.",
+            "description": "Генеральное сражение Северной войны между русскими войсками Петра I и шведской армией Карла XII под Полтавой."
+        }
+        self.assertIsNone(self.index.check_and_add("battle", self.battle))
+
+    def test_exact_and_title_year_duplicates(self):
+        """Тест точных дубликатов и совпадения названия и года"""
+        self.assertEqual(self.index.check_and_add("battle", self.battle), ("exact", "battle"))
+
+        same_title = {"title": "Полтавской битвы", "date": "1709", "description": "Кратко."}
+        self.assertEqual(self.index.check_and_add("other", same_title), ("title_year", "battle"))
+
+        # То же название, но другой год - другое событие
+        self.assertIsNone(self.index.check_and_add("later", {"title": "Полтавская битва", "date": "1909", "description": ""}))
+
+    def test_near_duplicate_paraphrase(self):
+        """Тест обнаружения пересказа события с другим названием"""
+        paraphrase = {
+            "title": "Сражение под Полтавой",
+            "date": "1709 г.",
+            "description": "Генеральное сражение Северной войны: русские войска Петра I разбили шведскую армию Карла XII под Полтавой."
+        }
+        self.assertEqual(self.index.check_and_add("paraphrase", paraphrase), ("near", "battle"))
+        self.assertEqual(self.index.stats["near"], 1)
+
+        # Похожий текст о событии другого года не считается дубликатом
+        paraphrase["date"] = "1710 г."
+        self.assertIsNone(self.index.find_duplicate("paraphrase-1710", paraphrase))
+
+    def test_distinct_event_and_rebuild(self):
+        """Тест: разные события не совпадают, индекс восстанавливается по базе"""
+        founding = {
+            "title": "Основание Санкт-Петербурга",
+            "date": "27 мая 1703 г.",
+            "description": "Петр I заложил Петропавловскую крепость на Заячьем острове в устье Невы."
+        }
+        self.assertIsNone(self.index.check_and_add("founding", founding))
+
+        rebuilt = EventIndex.from_events([dict(self.battle, id="battle"), dict(founding, id="founding")])
+        self.assertEqual(len(rebuilt), 2)
+        self.assertEqual(rebuilt.find_duplicate("x", self.battle), ("title_year", "battle"))
+
+    def test_helpers(self):
+        """Тест извлечения года и нормализации названия"""
+        self.assertEqual(event_year("8 сентября 1380 г."), "1380")
+        self.assertIsNone(event_year("неизвестно"))
+        self.assertEqual(normalize_title("Битва на Калке"), normalize_title("битвы на Калке"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.event_search import EventSearchIndex
+from src.content_service import ContentService
+from src.interfaces import ILogger
+
+EVENTS = [
+    {"id": 1, "title": "Крещение Руси", "date": "988", "category": "Культура и религия",
+     "description": "Массовое крещение жителей Киева в водах Днепра князем Владимиром."},
+    {"id": 2, "title": "Куликовская битва", "date": "1380", "category": "Войны и сражения",
+     "description": "Победа русского войска под командованием Дмитрия Донского над армией Мамая."},
+    {"name": "Смутное время", "description": "Период кризиса в начале XVII века."},
+]
+
+
+class TestEventSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка окружения для тестов"""
+        self.index = EventSearchIndex(EVENTS)
+
+    def test_search_ranks_title_matches_first(self):
+        """Тест ранжирования: совпадение в названии весит больше, чем в описании"""
+        results = self.index.search("битва Дмитрия Донского")
+        self.assertEqual(results[0]["event"]["id"], 2)
+        self.assertEqual(self.index.search("князь Владимир")[0]["event"]["id"], 1)
+        self.assertEqual(self.index.search("космос"), [])
+
+    def test_find_topic_with_word_forms_typos_and_name_field(self):
+        """Тест поиска темы по словоформам, с опечатками и в событиях с полем name"""
+        self.assertEqual(self.index.find_topic("о Куликовской битве")["id"], 2)
+        self.assertEqual(self.index.find_topic("крешение руси")["id"], 1)
+        self.assertEqual(self.index.find_topic("Смутное время")["name"], "Смутное время")
+        self.assertIsNone(self.index.find_topic("битва"))
+
+
+class TestContentServiceLocalLookup(unittest.TestCase):
+
+    def test_local_content_served_without_api(self):
+        """Тест получения информации о теме из локальных данных без обращения к API"""
+        api_client = MagicMock()
+        service = ContentService(api_client, MagicMock(spec=ILogger), events_file='missing.json')
+        service.events_data = {"events": list(EVENTS)}
+        service.event_index = service._build_event_index()
+
+        info = service.get_topic_info("Крещение Руси")
+        self.assertEqual(info["source"], "local_database")
+        self.assertIn("Днепра", info["content"])
+        api_client.get_historical_info.assert_not_called()
+
+        self.assertTrue(service.validate_topic("Итоги Куликовской битвы"))
+        api_client.validate_historical_topic.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
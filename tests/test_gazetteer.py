@@ -0,0 +1,78 @@
+
+import sys
+import os
+import json
+import tempfile
+import unittest
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from history_db_generator.gazetteer import Gazetteer
+
+
+class TestGazetteer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Справочник из поставляемого файла"""
+        cls.gazetteer = Gazetteer.load()
+
+    def assertPlace(self, location, name, match):
+        result = self.gazetteer.resolve(location)
+        self.assertIsNotNone(result, location)
+        self.assertEqual((result["name"], result["match"]), (name, match))
+        return result
+
+    def test_exact_and_alias(self):
+        """Тест точного совпадения названия, псевдонима и написания через ё"""
+        result = self.assertPlace("Москва", "Москва", "exact")
+        self.assertEqual(result["confidence"], 1.0)
+        self.assertPlace("Петроград", "Санкт-Петербург", "exact")
+        self.assertPlace("Кёнигсберг", "Калининград", "exact")
+
+    def test_morphological_forms(self):
+        """Тест падежных форм и общих слов: "под Полтавой", "в окрестностях Смоленска" """
+        self.assertPlace("под Полтавой", "Полтава", "stem")
+        self.assertPlace("В окрестностях Смоленска", "Смоленск", "stem")
+
+    def test_parts_and_ngrams(self):
+        """Тест перечисления мест и названия внутри описания места"""
+        result = self.assertPlace("Москва, Грановитая палата", "Москва", "part")
+        self.assertLess(result["confidence"], 1.0)
+        self.assertPlace("Дерпт (Тарту)", "Тарту", "part")
+        result = self.assertPlace("Устье реки Невы у Заячьего острова", "Нева", "ngram")
+        self.assertLess(result["confidence"], 0.9)
+
+    def test_fuzzy_spelling(self):
+        """Тест опечатки: уверенность нечеткого совпадения ниже точного"""
+        result = self.assertPlace("Таллинн", "Таллин", "fuzzy")
+        self.assertLess(result["confidence"], 0.8)
+
+    def test_unresolved_and_vague(self):
+        """Тест неизвестных и расплывчатых мест: координаты не подбираются"""
+        self.assertIsNone(self.gazetteer.resolve("Эрестфер"))
+        self.assertIsNone(self.gazetteer.resolve("Различные губернии Российской империи"))
+        self.assertIsNone(self.gazetteer.resolve(""))
+        # Общее слово не дает ложного нечеткого совпадения
+        self.assertIsNone(self.gazetteer.resolve("Оренбургская губерния"))
+
+    def test_cache_and_extension(self):
+        """Тест кэша результатов и дополнения справочника файлом"""
+        gazetteer = Gazetteer.load()
+        gazetteer.resolve("Столбово")
+        gazetteer.resolve("столбово")
+        self.assertEqual(gazetteer.get_stats()["cache_hits"], 1)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            extra_file = os.path.join(temp_dir, "extra.json")
+            with open(extra_file, 'w', encoding='utf-8') as f:
+                json.dump([{"name": "Эрестфер", "lat": 58.27, "lng": 27.03, "aliases": ["Эрастфер"]}], f)
+            gazetteer = Gazetteer.load(extra_file)
+
+        self.assertEqual(gazetteer.resolve("Эрастфер")["name"], "Эрестфер")
+        self.assertEqual(len(gazetteer), len(self.gazetteer) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
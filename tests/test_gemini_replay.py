@@ -0,0 +1,106 @@
+
+import sys
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from google.api_core.exceptions import ResourceExhausted
+
+from src.api_client import APIClient
+from src.gemini_replay import CassetteMissError, GeminiReplay, LatencyModel, cassette_key
+
+
+class TestGeminiReplay(unittest.TestCase):
+
+    def setUp(self):
+        """Кассета во временном каталоге и модель с фиксированными ответами"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cassette_file = os.path.join(self.temp_dir.name, "gemini.json")
+        self.model = MagicMock()
+        self.model.generate_content.side_effect = lambda prompt, **kwargs: MagicMock(text=f"Ответ: {prompt.strip()}")
+        chat = MagicMock()
+        chat.send_message.return_value = MagicMock(text="Ответ в чате")
+        self.model.start_chat.return_value = chat
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def record(self, *prompts):
+        """Записывает ответы модели на промпты в кассету"""
+        recorder = GeminiReplay(self.cassette_file, mode="record").wrap(self.model)
+        for prompt in prompts:
+            recorder.generate_content(prompt, generation_config={"temperature": 0.3})
+        return recorder
+
+    def test_record_and_replay(self):
+        """Тест: записанный ответ воспроизводится без обращения к модели"""
+        self.record("Крещение Руси")
+        self.assertEqual(self.model.generate_content.call_count, 1)
+
+        replay = GeminiReplay(self.cassette_file, mode="replay", latency="none")
+        model = replay.wrap()
+        response = model.generate_content("  Крещение   Руси\n", generation_config={"temperature": 0.3})
+
+        self.assertEqual(response.text, "Ответ: Крещение Руси")
+        self.assertEqual(replay.get_stats()["hits"], 1)
+        # Другие параметры генерации - другой ключ
+        with self.assertRaises(CassetteMissError):
+            model.generate_content("Крещение Руси", generation_config={"temperature": 0.9})
+
+    def test_key_normalization(self):
+        """Тест: строка версии API и случайное зерно не влияют на ключ"""
+        self.assertEqual(cassette_key("Темы\n\nAPI Version: 3.0.0", {"temperature": 0.3}),
+                         cassette_key("Темы\n\nAPI Version: 4.1.0", {"temperature": 0.3}))
+        self.assertEqual(cassette_key("Темы seed=1234"), cassette_key("Темы seed=9876"))
+        self.assertNotEqual(cassette_key("Темы"), cassette_key("Темы", history=["Системный промпт"]))
+
+    def test_chat_history(self):
+        """Тест записи и воспроизведения чата с историей"""
+        history = [{"role": "user", "parts": ["Ты историк"]}, {"role": "model", "parts": ["Понял"]}]
+        GeminiReplay(self.cassette_file, mode="record").wrap(self.model).start_chat(history=history).send_message("Кто такой Рюрик?")
+
+        chat = GeminiReplay(self.cassette_file, mode="replay", latency="none").wrap().start_chat(history=history)
+        self.assertEqual(chat.send_message("Кто такой Рюрик?").text, "Ответ в чате")
+
+    def test_latency_and_errors(self):
+        """Тест имитации задержки и внесения ошибок квоты"""
+        self.record("Смутное время")
+        sleeps = []
+        replay = GeminiReplay(self.cassette_file, mode="replay", latency="fixed:0.25", sleep=sleeps.append)
+        replay.wrap().generate_content("Смутное время", generation_config={"temperature": 0.3})
+        self.assertEqual(sleeps, [0.25])
+
+        failing = GeminiReplay(self.cassette_file, mode="replay", quota_error_rate=1.0)
+        with self.assertRaises(ResourceExhausted) as context:
+            failing.wrap().generate_content("Смутное время", generation_config={"temperature": 0.3})
+        self.assertIn("quota", str(context.exception))
+        self.assertEqual(failing.get_stats()["injected_errors"], 1)
+
+    def test_synthetic_miss_and_latency_specs(self):
+        """Тест синтетического ответа на промах и разбора описаний задержки"""
+        replay = GeminiReplay(self.cassette_file, mode="replay", latency="none", on_miss="synthetic",
+                              synthetic_length=1600)
+        self.assertEqual(len(replay.wrap().generate_content("Неизвестный запрос").text), 1600)
+
+        self.assertEqual(LatencyModel("recorded").sample(1.5), 1.5)
+        self.assertTrue(0.5 <= LatencyModel("uniform:0.5:2").sample() <= 2)
+        self.assertGreater(LatencyModel("lognormal:1.2:0.5").sample(), 0)
+        with self.assertRaises(ValueError):
+            LatencyModel("lognormal:1.2")
+
+    def test_api_client_replay_without_network(self):
+        """Тест: APIClient в режиме воспроизведения не обращается к сети при создании"""
+        replay = GeminiReplay(self.cassette_file, mode="replay", latency="none", on_miss="synthetic")
+        api_client = APIClient("", MagicMock(), MagicMock(), replay=replay)
+
+        result = api_client.call_api("Реформы Петра I", use_cache=False)
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(replay.get_stats()["calls"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
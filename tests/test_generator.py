@@ -0,0 +1,109 @@
+
+import sys
+import os
+import json
+import re
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from history_db_generator import generator
+
+TOPICS = [f"Тема {number}" for number in range(1, 8)]
+
+
+class FakeModel:
+    """Модель Gemini с заранее заданными ответами по темам"""
+
+    def __init__(self, failing_topics=()):
+        self.failing_topics = set(failing_topics)
+        self.topics = []
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None):
+        topic = re.search(r'по теме "([^"]+)"', prompt).group(1)
+        with self.lock:
+            self.topics.append(topic)
+            self.threads.add(threading.get_ident())
+        if topic in self.failing_topics:
+            raise RuntimeError("503 Service Unavailable")
+        number = TOPICS.index(topic)
+        # Продолжение списка содержит новые события
+        part = 1 if "Составь еще" in prompt else 0
+        events = [{"date": str(1500 + number * 10 + part * 5 + offset),
+                   "title": f"Событие {chr(0x410 + number)}{part}{offset} {topic}",
+                   "description": f"Описание события по теме {topic}",
+                   "location": "Москва"} for offset in range(2)]
+        return SimpleNamespace(text=json.dumps(events, ensure_ascii=False))
+
+
+class TestGenerateDatabase(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка окружения: файлы генератора во временном каталоге, без пауз и запросов к API"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        temp = self.temp_dir.name
+        patches = [
+            patch.object(generator, 'DB_FILE', os.path.join(temp, 'database.json')),
+            patch.object(generator, 'DB_LOG_FILE', os.path.join(temp, 'database.log.jsonl')),
+            patch.object(generator, 'TEMP_FOLDER', temp),
+            patch.object(generator, 'PROGRESS_FILE', os.path.join(temp, 'progress.json')),
+            patch.object(generator, 'MIN_REQUEST_INTERVAL', 0),
+            patch.object(generator, 'STRUCTURED_OUTPUT', True),
+            patch.object(generator, 'GEMINI_REPLAY', None),
+            patch.object(generator, 'generate_historical_topics', return_value=list(TOPICS)),
+            patch.object(generator, '_init_pipeline_worker', lambda: None),
+            patch.object(generator, '_rotate_client', return_value=0),
+            patch('time.sleep'),
+            patch('builtins.input', return_value='y'),
+            patch('builtins.print'),
+        ]
+        for item in patches:
+            item.start()
+            self.addCleanup(item.stop)
+
+    def tearDown(self):
+        """Очистка после тестов"""
+        self.temp_dir.cleanup()
+
+    def _run(self, model):
+        with patch.object(generator, '_get_client', return_value=model):
+            return generator.generate_database(workers=3)
+
+    def test_failed_topic_is_retried_after_restart(self):
+        """Тест: тема без ответа API отмечается как необработанная и запрашивается при перезапуске"""
+        first = FakeModel(failing_topics={"Тема 3"})
+        database = self._run(first)
+
+        self.assertGreater(len(first.threads), 1)
+        self.assertEqual({event["topic"] for event in database["events"]}, set(TOPICS) - {"Тема 3"})
+        with open(generator.PROGRESS_FILE, encoding='utf-8') as f:
+            progress = json.load(f)
+        completed_topics = {item["topic"] for item in progress["completed_topics"].values()}
+        self.assertEqual(completed_topics, set(TOPICS) - {"Тема 3"})
+        self.assertEqual([item["topic"] for item in progress["failed_topics"].values()], ["Тема 3"])
+        # Пустой результат не кэшируется
+        self.assertFalse(os.path.exists(os.path.join(generator.TEMP_FOLDER,
+                                                     f"events_{generator.hash_string('Тема 3')}.json")))
+
+        # Перезапуск запрашивает только необработанную тему
+        second = FakeModel()
+        database = self._run(second)
+
+        self.assertEqual(set(second.topics), {"Тема 3"})
+        self.assertEqual({event["topic"] for event in database["events"]}, set(TOPICS))
+        self.assertEqual(len(database["events"]), len(TOPICS) * 4)
+        with open(generator.PROGRESS_FILE, encoding='utf-8') as f:
+            progress = json.load(f)
+        self.assertEqual(len(progress["completed_topics"]), len(TOPICS))
+        self.assertEqual(progress["failed_topics"], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
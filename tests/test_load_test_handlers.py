@@ -0,0 +1,40 @@
+
+import sys
+import os
+import unittest
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.load_test_handlers import percentile, run
+
+
+class TestLoadTestHandlers(unittest.TestCase):
+
+    def test_scenario_runs_without_errors(self):
+        """Тест: сценарий проходит все шаги обработчиков без ошибок"""
+        results = run(users=2, workers=2, latency="none", telegram_latency=0.0, answers=2, messages=1)
+
+        steps = results["steps"]
+        self.assertEqual(set(steps), {"start", "topics", "choose_topic", "test", "answer", "end_test",
+                                      "conversation_menu", "conversation"})
+        self.assertEqual(steps["answer"]["count"], 4)
+        self.assertTrue(all(stats["errors"] == 0 for stats in steps.values()))
+        self.assertEqual(results["failed_users"], 0)
+        self.assertEqual(results["handler_errors"], 0)
+
+        self.assertGreater(results["gemini"]["calls"], 0)
+        self.assertEqual(results["gemini"]["injected_errors"], 0)
+        self.assertGreater(results["telegram"]["sends"], 0)
+        self.assertGreaterEqual(results["telegram"]["peak_per_second"], 1)
+
+    def test_percentile(self):
+        """Тест перцентилей с интерполяцией"""
+        values = [1.0, 2.0, 3.0, 4.0]
+        self.assertEqual(percentile(values, 50), 2.5)
+        self.assertEqual(percentile(values, 100), 4.0)
+        self.assertEqual(percentile([], 99), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+
+import sys
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.metrics import SNAPSHOT_NAMESPACE, MetricsPublisher, MetricsRegistry
+from src.shared_state import SQLiteStateBackend
+from src.telegram_queue import TelegramRequestQueue
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_counter_gauge_histogram_exposition(self):
+        """Тест текстового формата счетчиков, измерителей и гистограмм"""
+        registry = MetricsRegistry()
+        requests = registry.counter("bot_requests_total", "Запросы", ("outcome",))
+        requests.inc(outcome="success")
+        requests.inc(2, outcome="error")
+        registry.gauge("bot_queue_depth", "Глубина очереди").set(3)
+        latency = registry.histogram("bot_latency_seconds", "Задержка", buckets=(0.5, 1.0))
+        for value in (0.2, 0.7, 3.0):
+            latency.observe(value)
+
+        self.assertIs(registry.counter("bot_requests_total", "Запросы", ("outcome",)), requests)
+        with self.assertRaises(ValueError):
+            registry.gauge("bot_requests_total", "Запросы", ("outcome",))
+        with self.assertRaises(ValueError):
+            requests.inc(-1, outcome="error")
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE bot_requests_total counter", lines)
+        self.assertIn('bot_requests_total{outcome="error"} 2', lines)
+        self.assertIn("bot_queue_depth 3", lines)
+        self.assertIn('bot_latency_seconds_bucket{le="0.5"} 1', lines)
+        self.assertIn('bot_latency_seconds_bucket{le="1.0"} 2', lines)
+        self.assertIn('bot_latency_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn("bot_latency_seconds_count 3", lines)
+        self.assertIn("bot_latency_seconds_sum 3.9", lines)
+
+    def test_registered_stats_and_collectors(self):
+        """Тест: статистика компонентов читается при каждом формировании метрик"""
+        registry = MetricsRegistry()
+        stats = {"hits": 1, "misses": 4, "size": 10, "codec": {"raw_bytes": 1}}
+        registry.register_stats("bot_cache", lambda: stats, "Кэш", counters=("hits", "misses"),
+                                gauges=("size", "codec", "absent"))
+        registry.register_collector("chapters", lambda: [
+            ("bot_chapter_total", "counter", "Главы", {"chapter": 'Итоги "эпохи"'}, 2),
+        ])
+        registry.register_collector("broken", lambda: 1 / 0)
+
+        stats["hits"] = 5
+        text = registry.render()
+        self.assertIn("bot_cache_hits_total 5\n", text)
+        self.assertIn("bot_cache_size 10\n", text)
+        self.assertNotIn("codec", text)
+        self.assertNotIn("absent", text)
+        self.assertIn('bot_chapter_total{chapter="Итоги \\"эпохи\\""} 2\n', text)
+
+        registry.unregister_collector("bot_cache")
+        self.assertNotIn("bot_cache_hits_total", registry.render())
+
+    def test_worker_snapshots_in_ingress_metrics(self):
+        """Тест: метрики процессов-обработчиков попадают в /metrics процесса-приемника"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backend = SQLiteStateBackend(MagicMock(), os.path.join(temp_dir, 'shared_state.db'))
+            try:
+                workers = []
+                for index in range(2):
+                    worker = MetricsRegistry()
+                    worker.counter("bot_requests_total", "Запросы").inc(index + 1)
+                    worker.histogram("bot_latency_seconds", "Задержка", buckets=(1.0,)).observe(0.5)
+                    worker.register_stats("bot_api_cache", lambda: {"hits": 5}, "Кэш API", counters=("hits",))
+                    workers.append(MetricsPublisher(worker, backend, str(index)))
+                    workers[-1].publish()
+
+                ingress = MetricsRegistry()
+                ingress.register_snapshots(backend)
+                text = ingress.render()
+
+                self.assertIn('bot_requests_total{worker="0"} 1', text)
+                self.assertIn('bot_requests_total{worker="1"} 2', text)
+                self.assertIn('bot_latency_seconds_bucket{le="1.0",worker="1"} 1', text)
+                self.assertIn('bot_api_cache_hits_total{worker="0"} 5', text)
+                self.assertEqual(text.count("# TYPE bot_requests_total counter"), 1)
+
+                # Снимок остановленного процесса удаляется, а снимки не передаются дальше
+                workers[1].stop()
+                self.assertEqual(backend.keys(SNAPSHOT_NAMESPACE), ["0"])
+                self.assertNotIn('worker="1"', ingress.render())
+                self.assertEqual(MetricsRegistry().snapshot(), [])
+            finally:
+                backend.close()
+
+    def test_telegram_queue_stats(self):
+        """Тест статистики очереди запросов к Telegram для реестра метрик"""
+        queue = TelegramRequestQueue(max_requests_per_second=1000)
+        try:
+            self.assertEqual(queue.get_stats(), {"pending": 0, "cache_hits": 0, "cache_size": 0})
+        finally:
+            queue.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+
+import sys
+import os
+import json
+import time
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.prefetcher import TopicPrefetcher, PREFETCHED_TEST_TYPE
+from src.task_queue import TaskQueue, PRIORITY_HIGH, PRIORITY_LOW
+from src.text_cache_service import TextCacheService
+from src.topic_service import TOPIC_CHAPTERS_TYPE
+from src.interfaces import ILogger
+
+TEST_DATA = {"status": "success", "original_questions": ["Вопрос 1"], "display_questions": ["Вопрос 1"]}
+
+
+class TestTopicPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка окружения для тестов"""
+        self.logger = MagicMock(spec=ILogger)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.text_cache = TextCacheService(self.logger, cache_dir=os.path.join(self.temp_dir.name, 'texts'),
+                                           flush_interval=0, legacy_file=None)
+
+        self.topic_service = MagicMock()
+        self.topic_service.standard_chapters = ["Глава 1", "Глава 2"]
+        self.topic_service.generate_topic_chapters.side_effect = lambda topic, callback=None: [
+            {"topic": topic, "chapter": "Глава 1", "text": f"Глава: {topic}"}]
+        self.topic_service.save_topic_chapters.side_effect = lambda topic, chapters, cache: cache.save_text(
+            topic, TOPIC_CHAPTERS_TYPE, json.dumps({"chapters": chapters}, ensure_ascii=False))
+        self.topic_service.get_cached_topic_info.side_effect = self._get_cached_topic_info
+
+        self.test_service = MagicMock()
+        self.test_service.generate_test.return_value = dict(TEST_DATA)
+        self.test_service.recommend_similar_topics.return_value = ["Смутное время", "Реформы Петра I", "Полтава"]
+
+        self.api_client = MagicMock()
+        self.api_client.last_request_time = 0.0
+
+    def tearDown(self):
+        """Очистка после тестов"""
+        self.temp_dir.cleanup()
+
+    def _get_cached_topic_info(self, topic, update_callback=None, text_cache_service=None):
+        cached = text_cache_service.get_text(topic, TOPIC_CHAPTERS_TYPE)
+        return ["из кэша", cached] if cached else ["Оглавление", "сгенерировано"]
+
+    def _create_prefetcher(self, **kwargs):
+        return TopicPrefetcher(self.logger, self.topic_service, self.test_service, self.api_client,
+                               self.text_cache, **kwargs)
+
+    def test_prefetch_and_hits(self):
+        """Тест подготовки теста и рекомендованных тем и учета попаданий"""
+        prefetcher = self._create_prefetcher(recommended_topics=2)
+        prefetcher.schedule("Крещение Руси")
+        prefetcher._drain()
+
+        self.topic_service.generate_topic_chapters.assert_any_call("Смутное время")
+        self.assertEqual(self.topic_service.generate_topic_chapters.call_count, 2)
+
+        test_data = prefetcher.get_test("Крещение Руси")
+        self.assertEqual(test_data["original_questions"], ["Вопрос 1"])
+        self.assertEqual(self.test_service.generate_test.call_count, 1)
+        # Подготовленный тест используется один раз
+        self.assertIsNone(self.text_cache.get_text("Крещение Руси", PREFETCHED_TEST_TYPE))
+
+        self.assertEqual(prefetcher.get_topic_info("Смутное время")[0], "из кэша")
+        prefetcher.get_topic_info("Ледовое побоище")
+
+        stats = prefetcher.get_stats()
+        self.assertEqual(stats["prefetched"], 3)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+        self.assertAlmostEqual(stats["precision"], 2 / 3)
+        self.assertEqual(stats["api_calls"], 2 + 1 + 2 * 3)
+
+    def test_budget_cap(self):
+        """Тест ограничения расхода запросов бюджетом"""
+        prefetcher = self._create_prefetcher(budget_per_hour=3)
+        prefetcher.schedule("Крещение Руси")
+        prefetcher._drain()
+
+        # Тест (2) и рекомендации (1) исчерпывают бюджет, главы не генерируются
+        self.topic_service.generate_topic_chapters.assert_not_called()
+        self.assertEqual(prefetcher.get_stats()["over_budget"], 2)
+
+    def test_waits_for_idle_api(self):
+        """Тест отказа от задач, если Gemini занят дольше допустимого ожидания"""
+        self.api_client.last_request_time = time.time() + 60
+        prefetcher = self._create_prefetcher(max_wait=0.0, poll_interval=0.01)
+        prefetcher.schedule("Крещение Руси")
+        prefetcher._drain()
+
+        self.test_service.generate_test.assert_not_called()
+        self.assertEqual(prefetcher.get_stats()["expired"], 2)
+
+    def test_runs_through_task_queue(self):
+        """Тест выполнения подготовки в очереди задач с низким приоритетом"""
+        task_queue = TaskQueue(num_workers=1, logger=self.logger)
+        prefetcher = self._create_prefetcher(task_queue_getter=lambda: task_queue)
+        try:
+            prefetcher.schedule("Крещение Руси")
+            task_queue.task_queue.join()
+            self.assertEqual([task.priority for task in task_queue.tasks.values()], [PRIORITY_LOW])
+        finally:
+            task_queue.stop()
+        self.assertIsNotNone(self.text_cache.get_text("Крещение Руси", PREFETCHED_TEST_TYPE))
+
+
+class TestTaskQueuePriority(unittest.TestCase):
+
+    def test_priority_order(self):
+        """Тест выполнения задач в порядке приоритета"""
+        task_queue = TaskQueue(num_workers=1)
+        order = []
+        task_queue.running = True  # Задачи копятся, пока обработчики не запущены
+        task_queue.add_task(order.append, ["low"], priority=PRIORITY_LOW)
+        task_queue.add_task(order.append, ["normal"])
+        task_queue.add_task(order.append, ["high"], priority=PRIORITY_HIGH)
+        self.assertEqual(task_queue.pending_count(PRIORITY_HIGH), 1)
+        task_queue.running = False
+        task_queue.start()
+        try:
+            task_queue.task_queue.join()
+        finally:
+            task_queue.stop()
+        self.assertEqual(order, ["high", "normal", "low"])
+
+
+if __name__ == '__main__':
+    unittest.main()
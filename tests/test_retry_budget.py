@@ -0,0 +1,38 @@
+
+import sys
+import os
+import unittest
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.retry_budget import RetryBudget
+
+
+class TestRetryBudget(unittest.TestCase):
+
+    def test_bucket_refill(self):
+        """Тест расхода и пополнения жетонов"""
+        now = [0.0]
+        budget = RetryBudget(capacity=2, refill_per_minute=6, clock=lambda: now[0])
+
+        self.assertTrue(budget.try_acquire())
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+
+        # За 10 секунд начисляется один жетон
+        now[0] = 10.0
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+
+        # Емкость не превышается
+        now[0] = 1000.0
+        self.assertEqual(budget.available(), 2)
+
+        stats = budget.get_stats()
+        self.assertEqual(stats["granted"], 3)
+        self.assertEqual(stats["denied"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.semantic_cache import SemanticAnswerCache
+from src.conversation_service import ConversationService
+
+
+class TestSemanticAnswerCache(unittest.TestCase):
+    """Тесты для SemanticAnswerCache"""
+
+    def setUp(self):
+        """Установка перед каждым тестом"""
+        self.logger = MagicMock()
+        self.cache = SemanticAnswerCache(self.logger, threshold=0.8, sample_rate=0)
+        self.cache.store("Когда было Крещение Руси?", "В 988 году при князе Владимире.")
+        self.cache.store("Почему началась Крымская война?", "Из-за спора о святых местах.")
+        self.cache.store("Когда началась Великая Отечественная война?", "22 июня 1941 года.")
+
+    def test_rephrased_question_hits(self):
+        """Тест попадания для переформулированного вопроса"""
+        for question in ("в каком году произошло крещение Руси", "в каком году крестили Русь"):
+            result = self.cache.lookup(question)
+            self.assertIsNotNone(result, question)
+            self.assertEqual(result["answer"], "В 988 году при князе Владимире.")
+
+        result = self.cache.lookup("Когда началась великая отечественная война")
+        self.assertIsNotNone(result)
+        self.assertEqual(result["answer"], "22 июня 1941 года.")
+
+    def test_baptism_alias_only(self):
+        """Тест: к "крещению" приводятся только формы глагола "крестить", другие глаголы на -стить не меняются"""
+        self.assertEqual(self.cache.normalize("крестили Русь"), self.cache.normalize("крещение Руси"))
+        self.assertNotIn("крещен", self.cache.normalize("крестьяне Руси"))
+        self.assertNotIn("щен", self.cache.normalize("кого пустили в Кремль и зачем чистить летописи"))
+
+    def test_different_questions_miss(self):
+        """Тест промаха для вопросов с другим смыслом"""
+        self.assertIsNone(self.cache.lookup("Когда началась Крымская война?"))
+        self.assertIsNone(self.cache.lookup("Когда закончилась Великая Отечественная война?"))
+        self.assertIsNone(self.cache.lookup("Что такое нэп?"))
+        # "Отечественная война" без уточнения может означать и войну 1812 года
+        self.assertIsNone(self.cache.lookup("Когда началась отечественная война?"))
+
+        stats = self.cache.get_stats()
+        self.assertEqual(stats["lookups"], 4)
+        self.assertEqual(stats["misses"], 4)
+        self.assertEqual(stats["hit_rate"], 0.0)
+
+    def test_eviction_keeps_index_consistent(self):
+        """Тест вытеснения старых вопросов вместе с записями индекса"""
+        cache = SemanticAnswerCache(self.logger, max_entries=2)
+        cache.store("Кто такой Рюрик?", "Основатель династии.")
+        cache.store("Что такое опричнина?", "Политика Ивана Грозного.")
+        cache.store("Когда была Куликовская битва?", "В 1380 году.")
+
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+        self.assertIsNone(cache.lookup("Кто такой Рюрик?"))
+        for keys in cache.index.values():
+            self.assertNotIn(cache.normalize("Кто такой Рюрик?"), keys)
+
+    def test_false_hit_sampling(self):
+        """Тест учета ложных попаданий при выборочной проверке"""
+        self.assertFalse(self.cache.record_sample("В 988 году при князе Владимире.",
+                                                  "Русь крестил князь Владимир в 988 году."))
+        self.assertTrue(self.cache.record_sample("В 988 году при князе Владимире.",
+                                                 "Крымская война шла с 1853 по 1856 год."))
+        stats = self.cache.get_stats()
+        self.assertEqual(stats["sampled"], 2)
+        self.assertAlmostEqual(stats["false_hit_rate"], 0.5)
+
+
+class TestConversationAnswerCache(unittest.TestCase):
+    """Тесты использования семантического кэша в ConversationService"""
+
+    def setUp(self):
+        """Установка перед каждым тестом"""
+        self.api_client = MagicMock()
+        self.api_client.ask_grok.return_value = "Крещение Руси произошло в 988 году."
+        self.cache = SemanticAnswerCache(MagicMock(), sample_rate=0)
+        self.service = ConversationService(self.api_client, MagicMock(), answer_cache=self.cache)
+
+    def test_rephrased_question_served_from_cache(self):
+        """Тест ответа из кэша без обращения к API"""
+        first = self.service._generate_historical_response(
+            "Когда было Крещение Руси?", {'conversation_history': ["Когда было Крещение Руси?"]})
+        second = self.service._generate_historical_response(
+            "в каком году произошло крещение Руси", {'conversation_history': ["в каком году произошло крещение Руси"]})
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.api_client.ask_grok.call_count, 1)
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+
+    def test_context_dependent_question_bypasses_cache(self):
+        """Тест обхода кэша для вопросов, зависящих от контекста беседы"""
+        self.cache.store("А чем он известен?", "Ответ про другого правителя")
+        user_data = {'conversation_history': ["Расскажи о Петре I", "А чем он известен?"]}
+        self.service._generate_historical_response("А чем он известен?", user_data)
+
+        self.api_client.ask_grok.assert_called_once()
+        self.assertEqual(self.cache.get_stats()["lookups"], 0)
+
+    def test_sampled_false_hit_is_replaced(self):
+        """Тест замены ответа после обнаружения ложного попадания"""
+        self.cache.store("Когда было Крещение Руси?", "Совершенно неподходящий текст про погоду.")
+        with patch.object(self.cache, 'should_sample', return_value=True):
+            response = self.service._generate_historical_response(
+                "Когда было Крещение Руси?", {'conversation_history': ["Когда было Крещение Руси?"]})
+
+        self.assertEqual(response, "Крещение Руси произошло в 988 году.")
+        self.assertEqual(self.cache.get_stats()["false_hits"], 1)
+        self.assertEqual(self.cache.lookup("Когда было Крещение Руси?")["answer"],
+                         "Крещение Руси произошло в 988 году.")
+
+
+if __name__ == '__main__':
+    unittest.main()
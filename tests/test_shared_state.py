@@ -0,0 +1,115 @@
+
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+import time
+import tempfile
+import shutil
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.shared_state import RedisStateBackend, SQLiteStateBackend, create_state_backend
+from src.state_manager import StateManager
+from src.worker_pool import get_partition
+from src.interfaces import ILogger
+
+class TestSharedState(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка окружения для тестов"""
+        self.logger = MagicMock(spec=ILogger)
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.temp_dir, 'shared_state.db')
+        self.backend = SQLiteStateBackend(self.logger, self.db_file)
+
+    def tearDown(self):
+        """Очистка после тестов"""
+        self.backend.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_set_get_delete(self):
+        """Тест базовых операций хранилища"""
+        self.backend.set("ns", "key", {"value": [1, 2, 3]})
+        self.assertEqual(self.backend.get("ns", "key"), {"value": [1, 2, 3]})
+        self.assertIsNone(self.backend.get("other", "key"))
+
+        self.assertTrue(self.backend.delete("ns", "key"))
+        self.assertIsNone(self.backend.get("ns", "key"))
+        self.assertFalse(self.backend.delete("ns", "key"))
+
+    def test_ttl_and_keys(self):
+        """Тест истечения срока жизни записей и списка ключей"""
+        self.backend.set("ns", "permanent", 1)
+        self.backend.set("ns", "expiring", 2, ttl=1)
+        self.assertEqual(sorted(self.backend.keys("ns")), ["expiring", "permanent"])
+
+        time.sleep(1.1)
+        self.assertIsNone(self.backend.get("ns", "expiring"))
+        self.assertEqual(self.backend.keys("ns"), ["permanent"])
+
+    def test_state_shared_between_managers(self):
+        """Тест обмена состояниями между менеджерами разных процессов"""
+        other_backend = SQLiteStateBackend(self.logger, self.db_file)
+        first = StateManager(self.logger, state_file=os.path.join(self.temp_dir, 'unused.json'),
+                             shared_state=self.backend)
+        second = StateManager(self.logger, state_file=os.path.join(self.temp_dir, 'unused.json'),
+                              shared_state=other_backend)
+
+        first.update_user_state(42, {"current_state": "TEST"})
+        self.assertEqual(second.get_user_state(42)["current_state"], "TEST")
+        self.assertIn(42, second.get_active_users())
+
+        second.clear_user_state(42)
+        self.assertIsNone(first.get_user_state(42)["current_state"])
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'unused.json')))
+        other_backend.close()
+
+    def test_redis_backend_reuses_distributed_cache(self):
+        """Тест: бэкенд Redis использует соединение переданного распределенного кэша"""
+        distributed_cache = MagicMock(using_redis=True)
+        config = MagicMock(shared_state_backend='redis', redis_url='redis://localhost:6379/0')
+        from src.metrics import registry
+        self.addCleanup(registry.unregister_collector, 'bot_distributed_cache')
+        with patch('src.distributed_cache.DistributedCache') as cache_class:
+            backend = create_state_backend(config, self.logger, distributed_cache=distributed_cache)
+
+        self.assertIsInstance(backend, RedisStateBackend)
+        self.assertIs(backend.redis_client, distributed_cache.redis_client)
+        cache_class.assert_not_called()
+
+    def test_redis_backend_uses_circuit_breaker(self):
+        """Тест: при недоступном Redis бэкенд не ждет таймаута и работает через резервное хранилище"""
+        from src.distributed_cache import DistributedCache
+        client = MagicMock()
+        client.get.return_value = b'{"current_state": "REDIS"}'
+        distributed_cache = DistributedCache(self.logger, redis_client=client, failure_threshold=2,
+                                             reset_timeout=60,
+                                             local_cache_file=os.path.join(self.temp_dir, 'local_cache.json'))
+        backend = RedisStateBackend(self.logger, distributed_cache, fallback=self.backend)
+        self.assertEqual(backend.get("states", "42"), {"current_state": "REDIS"})
+
+        client.get.side_effect = ConnectionError("redis down")
+        client.set.side_effect = ConnectionError("redis down")
+        backend.set("states", "42", {"current_state": "LOCAL"})
+        backend.get("states", "42")
+        self.assertFalse(distributed_cache.using_redis)
+
+        # Пока предохранитель разомкнут, Redis не вызывается, данные берутся из резервного хранилища
+        calls = client.get.call_count + client.set.call_count
+        backend.set("states", "7", {"current_state": "TEST"})
+        self.assertEqual(backend.get("states", "7"), {"current_state": "TEST"})
+        self.assertEqual(backend.get("states", "42"), {"current_state": "LOCAL"})
+        self.assertEqual(client.get.call_count + client.set.call_count, calls)
+
+    def test_partition_is_stable(self):
+        """Тест распределения чатов по процессам-обработчикам"""
+        self.assertEqual(get_partition(None, 4), 0)
+        self.assertEqual(get_partition(12345, 1), 0)
+        self.assertEqual(get_partition(12345, 4), get_partition(12345, 4))
+        # Отрицательные ID групповых чатов тоже должны попадать в допустимый диапазон
+        self.assertIn(get_partition(-100123456789, 3), range(3))
+
+if __name__ == '__main__':
+    unittest.main()
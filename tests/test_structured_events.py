@@ -0,0 +1,75 @@
+
+import sys
+import os
+import json
+import unittest
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from history_db_generator.structured_events import parse_events_json, validate_event
+
+
+EVENTS = [
+    {"date": "8 сентября 1380 г.", "title": "Куликовская битва", "location": "Куликово поле",
+     "description": "Войско Дмитрия Донского разбило армию Мамая. Победа ослабила власть Орды."},
+    {"date": "1480", "title": "Стояние на реке Угре", "location": "Река Угра",
+     "description": "Противостояние Ивана III и хана Ахмата. Конец ордынского ига."},
+]
+
+
+class TestStructuredEvents(unittest.TestCase):
+
+    def test_parse_complete_response(self):
+        """Тест разбора полного ответа, в том числе в обертке ```json и объекте"""
+        events, stats = parse_events_json(json.dumps(EVENTS, ensure_ascii=False))
+        self.assertEqual([event["title"] for event in events], ["Куликовская битва", "Стояние на реке Угре"])
+        self.assertEqual(stats, {"parsed": 2, "repaired": 0, "invalid": 0})
+
+        fenced = "```json\n" + json.dumps({"events": EVENTS}, ensure_ascii=False) + "\n```"
+        events, _ = parse_events_json(fenced)
+        self.assertEqual(len(events), 2)
+
+    def test_repair_truncated_description(self):
+        """Тест восстановления ответа, оборванного внутри описания"""
+        text = json.dumps(EVENTS, ensure_ascii=False)
+        truncated = text[:text.index("Конец ордынского") + 5]
+        events, stats = parse_events_json(truncated)
+
+        self.assertEqual(stats["repaired"], 1)
+        self.assertEqual(len(events), 2)
+        # Оборванное предложение отбрасывается
+        self.assertEqual(events[1]["description"], "Противостояние Ивана III и хана Ахмата.")
+
+    def test_repair_truncated_field(self):
+        """Тест восстановления ответа, оборванного на названии поля"""
+        text = json.dumps(EVENTS, ensure_ascii=False)
+        truncated = text[:text.index('"description": "Противостояние') + 8]
+        events, stats = parse_events_json(truncated)
+
+        self.assertEqual(stats["repaired"], 1)
+        self.assertEqual(events[1], {"title": "Стояние на реке Угре", "date": "1480",
+                                     "description": "", "location": "Река Угра"})
+
+    def test_invalid_items_skipped(self):
+        """Тест: ошибочный элемент не мешает разбору остальных"""
+        text = '[{"date": "1480", "title": "Стояние на Угре", "description": "Текст"}, "мусор",' \
+               ' {"date": "неизвестно", "title": "Без года"}, {"date": 1703, "title": "Основание Санкт-Петербурга",' \
+               ' "location": "Не указано"}]'
+        events, stats = parse_events_json(text)
+
+        self.assertEqual([event["title"] for event in events], ["Стояние на Угре", "Основание Санкт-Петербурга"])
+        self.assertEqual(stats["invalid"], 2)
+        self.assertEqual(events[1]["date"], "1703")
+        self.assertNotIn("location", events[1])
+
+    def test_validate_event(self):
+        """Тест нормализации полей события"""
+        event = validate_event({"date": " 1812 ", "title": "**Бородинское  сражение**", "description": None})
+        self.assertEqual(event, {"title": "Бородинское сражение", "date": "1812", "description": ""})
+        self.assertIsNone(validate_event({"date": "1812", "title": ""}))
+        self.assertEqual(parse_events_json("не JSON")[0], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
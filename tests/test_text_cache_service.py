@@ -0,0 +1,152 @@
+
+import sys
+import os
+import json
+import time
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.text_cache_service import TextCacheService, INDEX_FILE
+from src.interfaces import ILogger
+
+
+class TestTextCacheService(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка окружения для тестов"""
+        self.logger = MagicMock(spec=ILogger)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'texts')
+        self.legacy_file = os.path.join(self.temp_dir.name, 'texts_cache.json')
+
+    def tearDown(self):
+        """Очистка после тестов"""
+        self.temp_dir.cleanup()
+
+    def _create_cache(self, **kwargs):
+        kwargs.setdefault('flush_interval', 0)
+        return TextCacheService(self.logger, cache_dir=self.cache_dir, legacy_file=self.legacy_file, **kwargs)
+
+    def test_entry_files_and_reload(self):
+        """Тест хранения записей в отдельных файлах и загрузки по индексу"""
+        cache = self._create_cache()
+        cache.save_text("Крещение Руси", "topic_info", "Глава " * 500)
+        cache.save_text("Смутное время", "test", "{}")
+
+        entry_files = [name for name in os.listdir(self.cache_dir) if name.endswith('.bin')]
+        self.assertEqual(len(entry_files), 2)
+
+        reloaded = self._create_cache()
+        self.assertEqual(reloaded.get_text(" крещение руси ", "topic_info"), "Глава " * 500)
+        self.assertEqual(reloaded.get_stats()["size"], 2)
+
+    def test_batched_flush(self):
+        """Тест накопления изменений до пакетной записи"""
+        cache = self._create_cache(flush_interval=60)
+        cache.save_text("Крещение Руси", "topic_info", "текст")
+        cache.save_text("Смутное время", "topic_info", "текст")
+
+        # Запись еще не выполнена, но текст доступен из памяти
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, INDEX_FILE)))
+        self.assertEqual(cache.get_text("Крещение Руси", "topic_info"), "текст")
+        self.assertEqual(cache.get_stats()["pending_writes"], 2)
+
+        cache.flush()
+        self.assertEqual(cache.get_stats()["flushes"], 1)
+        with open(os.path.join(self.cache_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)["entries"]), 2)
+
+    def test_clear_by_topic_prefix(self):
+        """Тест очистки записей по префиксу темы"""
+        cache = self._create_cache()
+        cache.save_text("Петр I", "topic_info", "a")
+        cache.save_text("Петр I", "test", "b")
+        cache.save_text("Петровские реформы", "topic_info", "c")
+        cache.save_text("Смутное время", "topic_info", "d")
+
+        self.assertEqual(cache.clear_cache("петр"), 3)
+        self.assertIsNone(cache.get_text("Петр I", "test"))
+        self.assertEqual(cache.get_text("Смутное время", "topic_info"), "d")
+        self.assertEqual(len([name for name in os.listdir(self.cache_dir) if name.endswith('.bin')]), 1)
+
+    def test_size_bounded_eviction(self):
+        """Тест вытеснения давно не использовавшихся записей"""
+        cache = self._create_cache(max_entries=2)
+        cache.save_text("Тема 1", "topic_info", "1")
+        cache.save_text("Тема 2", "topic_info", "2")
+        cache.get_text("Тема 1", "topic_info")
+        cache.save_text("Тема 3", "topic_info", "3")
+
+        self.assertIsNone(cache.get_text("Тема 2", "topic_info"))
+        self.assertEqual(cache.get_text("Тема 1", "topic_info"), "1")
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+    def test_expired_entry(self):
+        """Тест удаления истекшей записи"""
+        cache = self._create_cache(ttl=0.05)
+        cache.save_text("Тема", "topic_info", "текст")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get_text("Тема", "topic_info"))
+        self.assertEqual(cache.get_stats()["expired"], 1)
+
+    def test_read_only_reader_sees_new_entries(self):
+        """Тест чтения записей, добавленных другим экземпляром после запуска"""
+        writer = self._create_cache()
+        reader = self._create_cache(read_only=True)
+        self.assertIsNone(reader.get_text("Крещение Руси", "topic_chapters"))
+
+        writer.save_text("Крещение Руси", "topic_chapters", "главы")
+        os.utime(os.path.join(self.cache_dir, INDEX_FILE), (time.time() + 1, time.time() + 1))
+        self.assertEqual(reader.get_text("Крещение Руси", "topic_chapters"), "главы")
+
+    def test_writers_merge_index(self):
+        """Тест: несколько записывающих экземпляров не теряют записи и удаления друг друга"""
+        first = self._create_cache()
+        second = self._create_cache()
+        first.save_text("Петр I", "topic_chapters", "главы о Петре")
+        second.save_text("Смутное время", "topic_chapters", "главы о Смуте")
+
+        self.assertEqual(second.get_text("Петр I", "topic_chapters"), "главы о Петре")
+        reloaded = self._create_cache()
+        self.assertEqual(reloaded.get_text("Петр I", "topic_chapters"), "главы о Петре")
+        self.assertEqual(reloaded.get_text("Смутное время", "topic_chapters"), "главы о Смуте")
+
+        # Удаление в одном экземпляре не восстанавливается записью другого
+        self.assertEqual(reloaded.clear_cache(), 2)
+        first.save_text("Крещение Руси", "topic_chapters", "главы о Крещении")
+        restarted = self._create_cache()
+        self.assertIsNone(restarted.get_text("Петр I", "topic_chapters"))
+        self.assertIsNone(restarted.get_text("Смутное время", "topic_chapters"))
+        self.assertEqual(restarted.get_text("Крещение Руси", "topic_chapters"), "главы о Крещении")
+        self.assertEqual(len([name for name in os.listdir(self.cache_dir) if name.endswith('.bin')]), 1)
+
+    def test_orphan_files_removed_on_load(self):
+        """Тест удаления файлов записей, которых нет в индексе"""
+        cache = self._create_cache()
+        cache.save_text("Петр I", "topic_info", "текст")
+        with open(os.path.join(self.cache_dir, "0" * 32 + ".bin"), 'wb') as f:
+            f.write(b"lost")
+
+        reloaded = self._create_cache()
+        self.assertEqual(reloaded.get_text("Петр I", "topic_info"), "текст")
+        self.assertEqual(len([name for name in os.listdir(self.cache_dir) if name.endswith('.bin')]), 1)
+
+    def test_legacy_migration(self):
+        """Тест переноса записей из файла прежнего формата"""
+        legacy_cache = TextCacheService.__new__(TextCacheService)
+        key = legacy_cache._generate_key("Крещение Руси", "topic_info")
+        with open(self.legacy_file, 'w', encoding='utf-8') as f:
+            json.dump({key: {"text": "старый текст", "topic": "Крещение Руси", "type": "topic_info",
+                             "created_at": time.time(), "last_accessed": time.time()}}, f)
+
+        cache = self._create_cache()
+        self.assertEqual(cache.get_text("Крещение Руси", "topic_info"), "старый текст")
+        self.assertFalse(os.path.exists(self.legacy_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+
+import sys
+import os
+import unittest
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.text_rendering import (
+    TELEGRAM_MAX_MESSAGE_LENGTH, escape_markdown, split_message, _open_entities
+)
+
+
+class TestEscapeMarkdown(unittest.TestCase):
+
+    def test_escapes_special_characters(self):
+        """Тест экранирования всех специальных символов"""
+        self.assertEqual(escape_markdown("*Петр I* (1672-1725)."), "\\*Петр I\\* \\(1672\\-1725\\)\\.")
+        self.assertEqual(escape_markdown("a_b[c]~`>#+=|{}!"), "a\\_b\\[c\\]\\~\\`\\>\\#\\+\\=\\|\\{\\}\\!")
+
+    def test_empty_text(self):
+        """Тест обработки пустого текста"""
+        self.assertEqual(escape_markdown(""), "")
+        self.assertEqual(escape_markdown(None), "")
+
+
+class TestSplitMessage(unittest.TestCase):
+
+    def test_short_text_unchanged(self):
+        """Тест короткого текста: возвращается одной частью"""
+        self.assertEqual(split_message("Крещение Руси"), ["Крещение Руси"])
+
+    def test_packs_paragraphs(self):
+        """Тест упаковки абзацев в части без превышения лимита"""
+        paragraphs = [f"Абзац {i} " + "текст " * 20 for i in range(10)]
+        parts = split_message("\n\n".join(paragraphs), 400)
+
+        self.assertGreater(len(parts), 1)
+        self.assertTrue(all(len(part) <= 400 for part in parts))
+        # Абзацы не разрываются и сохраняют порядок
+        self.assertEqual("\n\n".join(parts), "\n\n".join(paragraphs))
+
+    def test_long_paragraph_split_by_words(self):
+        """Тест деления абзаца длиннее лимита по предложениям и словам"""
+        text = "Слово " * 2000
+        parts = split_message(text, TELEGRAM_MAX_MESSAGE_LENGTH, markdown=False)
+
+        self.assertTrue(all(len(part) <= TELEGRAM_MAX_MESSAGE_LENGTH for part in parts))
+        self.assertTrue(all(not part.startswith("ово") for part in parts))
+        self.assertEqual(" ".join(parts).split(), text.split())
+
+    def test_entities_closed_and_reopened(self):
+        """Тест закрытия выделения в конце части и открытия в следующей"""
+        text = "*" + "важное слово " * 30 + "конец*"
+        parts = split_message(text, 100)
+
+        self.assertGreater(len(parts), 1)
+        for part in parts:
+            self.assertLessEqual(len(part), 100)
+            self.assertEqual(_open_entities(part, []), [])
+            self.assertTrue(part.startswith("*") and part.endswith("*"))
+
+    def test_nested_entities_fit_limit(self):
+        """Тест: части с несколькими перенесенными выделениями не длиннее лимита"""
+        # Внутри части одновременно открыты *, _ и блок кода, строка кода режется по длине
+        text = "*_начало ```\n" + "x" * 200 + "\n```_*"
+        for limit in (30, 50, 100):
+            parts = split_message(text, limit)
+            self.assertGreater(len(parts), 1)
+            for part in parts:
+                self.assertLessEqual(len(part), limit)
+                self.assertEqual(_open_entities(part, []), [])
+
+    def test_code_block_reopened(self):
+        """Тест переноса блока кода: разметка внутри кода не учитывается"""
+        text = "```\n" + "".join(f"строка_{i} *лога*\n" for i in range(40)) + "```"
+        parts = split_message(text, 200)
+
+        for part in parts:
+            self.assertTrue(part.startswith("```\n"))
+            self.assertTrue(part.endswith("```"))
+            self.assertEqual(_open_entities(part, []), [])
+
+    def test_links_and_escapes_not_broken(self):
+        """Тест: ссылка и экранированный символ не разрываются"""
+        link = "[указ о престолонаследии](https://example.org/ukaz)"
+        parts = split_message(("слово " * 10 + link + " ") * 5, 90)
+        self.assertEqual(sum(part.count(link) for part in parts), 5)
+
+        escaped = "\\." * 30
+        parts = split_message(escaped, 15)
+        self.assertTrue(all(not part.startswith(".") for part in parts))
+        self.assertEqual("".join(parts), escaped)
+
+
+if __name__ == '__main__':
+    unittest.main()
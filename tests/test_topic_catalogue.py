@@ -0,0 +1,112 @@
+
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.topic_catalogue import TopicCatalogue
+from src.topic_service import TopicService
+from src.interfaces import ILogger
+
+TOPICS = [f"{number}. Тема номер {word}" for number, word in enumerate(
+    ["один", "два", "три", "четыре", "пять", "шесть", "семь"], 1)]
+
+
+class TestTopicCatalogue(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка окружения для тестов"""
+        self.logger = MagicMock(spec=ILogger)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.catalogue_file = os.path.join(self.temp_dir.name, 'catalogue.json')
+
+    def tearDown(self):
+        """Очистка после тестов"""
+        self.temp_dir.cleanup()
+
+    def _create_catalogue(self):
+        return TopicCatalogue(self.logger, catalogue_file=self.catalogue_file, refill_threshold=0, save_interval=0)
+
+    def test_deduplication(self):
+        """Тест пропуска повторяющихся тем с другим порядком слов и словоформами"""
+        catalogue = self._create_catalogue()
+        self.assertEqual(catalogue.add_topics(["1. Реформы Петра I", "Петр I: реформы", "Смутное время"]), 2)
+        self.assertEqual(catalogue.get_stats()["duplicates_skipped"], 1)
+
+    def test_pages_do_not_repeat_and_persist(self):
+        """Тест выдачи непоказанных тем и сохранения истории показов"""
+        catalogue = self._create_catalogue()
+        catalogue.add_topics(TOPICS)
+
+        first = catalogue.next_page(1, page_size=4)
+        second = catalogue.next_page(1, page_size=4)
+        self.assertEqual(len(first), 4)
+        self.assertEqual(len(second), 3)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(catalogue.next_page(1, page_size=4), [])
+
+        # Другой пользователь видит каталог заново
+        self.assertEqual(len(catalogue.next_page(2, page_size=10)), 7)
+
+        catalogue.flush()
+        reloaded = self._create_catalogue()
+        self.assertEqual(len(reloaded.topics), 7)
+        self.assertEqual(reloaded.next_page(1), [])
+
+    def test_workers_merge_shared_file(self):
+        """Тест: процессы с общим файлом не теряют темы и историю показов друг друга"""
+        first = self._create_catalogue()
+        second = self._create_catalogue()
+        first.add_topics(TOPICS[:3])
+        second.add_topics(TOPICS[3:] + TOPICS[:1])
+
+        first_page = first.next_page(1, page_size=2)
+        second_page = second.next_page(2, page_size=2)
+        first.flush()
+        second.flush()
+
+        reloaded = self._create_catalogue()
+        self.assertEqual(len(reloaded.topics), 7)
+        # Номера показанных тем указывают на те же темы после перезапуска
+        self.assertEqual({reloaded.topics[index] for index in reloaded.seen["1"]}, set(first_page))
+        self.assertEqual({reloaded.topics[index] for index in reloaded.seen["2"]}, set(second_page))
+        self.assertEqual(second.topics, reloaded.topics)
+
+        # Сброс истории в одном процессе не восстанавливается записью другого
+        reloaded.reset_user(1)
+        unseen = next(topic for topic in reloaded.topics if topic not in second_page)
+        first.mark_seen(2, [unseen])
+        first.flush()
+        restarted = self._create_catalogue()
+        self.assertNotIn("1", restarted.seen)
+        self.assertEqual({restarted.topics[index] for index in restarted.seen["2"]}, set(second_page) | {unseen})
+
+
+class TestTopicServicePages(unittest.TestCase):
+
+    def test_live_generation_only_when_exhausted(self):
+        """Тест обращения к API только после исчерпания каталога"""
+        api_client = MagicMock()
+        api_client.ask_grok.return_value = "1. Новая тема про декабристов\n2. Новая тема про Полтаву"
+        catalogue = TopicCatalogue(MagicMock(spec=ILogger), catalogue_file=None, refill_threshold=0)
+        catalogue.add_topics(TOPICS[:3])
+        service = TopicService(api_client, MagicMock(spec=ILogger), topic_catalogue=catalogue)
+
+        page = service.get_topics_page(42, page_size=30)
+        self.assertEqual(len(page), 3)
+        self.assertTrue(page[0].startswith("1. "))
+        api_client.ask_grok.assert_not_called()
+
+        page = service.get_topics_page(42, page_size=30)
+        self.assertEqual(len(page), 2)
+        api_client.ask_grok.assert_called_once()
+        self.assertEqual(len(catalogue.topics), 5)
+        self.assertEqual(catalogue.next_page(42), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
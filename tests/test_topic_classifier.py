@@ -0,0 +1,133 @@
+
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock
+import json
+import tempfile
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.topic_classifier import TopicIndex, TopicRelevanceClassifier
+from src.content_service import ContentService
+from src.interfaces import ILogger
+
+
+class TestTopicIndex(unittest.TestCase):
+
+    def test_match_ignores_word_forms_and_order(self):
+        """Тест поиска названия по основам слов"""
+        index = TopicIndex(["Крещение Руси", "Петр I и его реформы", "Смутное время"])
+        self.assertEqual(index.match("Реформы Петра I"), "Петр I и его реформы")
+        self.assertEqual(index.match("расскажи про крещение руси князем Владимиром"), "Крещение Руси")
+        self.assertIsNone(index.match("Смутные мысли"))
+
+
+class TestTopicRelevanceClassifier(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка окружения для тестов"""
+        self.logger = MagicMock(spec=ILogger)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.model_file = os.path.join(self.temp_dir.name, 'model.json')
+        self.log_file = os.path.join(self.temp_dir.name, 'queries.jsonl')
+
+    def tearDown(self):
+        """Очистка после тестов"""
+        self.temp_dir.cleanup()
+
+    def _create_classifier(self):
+        return TopicRelevanceClassifier(self.logger, model_file=self.model_file, query_log_file=self.log_file)
+
+    def test_confident_answers(self):
+        """Тест уверенных ответов на явные темы"""
+        classifier = self._create_classifier()
+        classifier.train({}, ContentService.DEFAULT_TOPICS)
+        self.assertTrue(classifier.classify("Реформы Александра I"))
+        self.assertFalse(classifier.classify("Прогноз погоды на выходные"))
+        self.assertIsNone(classifier.classify("Квазар"))  # Незнакомые слова - решает Gemini
+
+    def test_foreign_topics_are_not_accepted_locally(self):
+        """Тест: темы истории и литературы других стран отклоняются или передаются Gemini"""
+        events_file = os.path.join(os.path.dirname(__file__), '..', 'historical_events.json')
+        with open(events_file, 'r', encoding='utf-8') as f:
+            events_data = json.load(f)
+        classifier = self._create_classifier()
+        classifier.fit(TopicRelevanceClassifier.build_training_set(events_data, ContentService.DEFAULT_TOPICS))
+
+        for topic in ("История Франции", "Французская революция", "Великая китайская стена",
+                      "Война за независимость США", "История Японии", "Наполеоновские войны в Европе",
+                      "Сонеты Шекспира"):
+            self.assertIsNot(classifier.classify(topic), True, topic)
+        self.assertTrue(classifier.classify("Первая русская революция"))
+
+    def test_inflected_surnames_are_russian_markers(self):
+        """Тест: фамилии в косвенных падежах распознаются как признаки истории России"""
+        for topic in ("Правление Бориса Годунова", "Восстание Пугачева", "Реформы Хрущева",
+                      "Правление Андропова", "Династия Романовых", "Борис Годунов"):
+            self.assertTrue(TopicRelevanceClassifier.has_russian_marker(topic), topic)
+
+        events_file = os.path.join(os.path.dirname(__file__), '..', 'historical_events.json')
+        with open(events_file, 'r', encoding='utf-8') as f:
+            events_data = json.load(f)
+        classifier = self._create_classifier()
+        classifier.fit(TopicRelevanceClassifier.build_training_set(events_data, ContentService.DEFAULT_TOPICS))
+        self.assertTrue(classifier.classify("Правление Бориса Годунова"))
+        self.assertTrue(classifier.classify("Реформы Хрущева"))
+
+    def test_model_of_previous_version_is_retrained(self):
+        """Тест: модель, сохраненная без версии выборки, не загружается"""
+        with open(self.model_file, 'w', encoding='utf-8') as f:
+            json.dump({"class_log_prior": {}, "token_log_prob": {}, "unknown_log_prob": {}}, f)
+        self.assertFalse(self._create_classifier().load())
+
+    def test_logged_verdicts_are_used_for_training(self):
+        """Тест переобучения на журнале ответов Gemini и загрузки модели"""
+        classifier = self._create_classifier()
+        classifier.train({}, ())
+        self.assertIsNone(classifier.classify("Блокада Ленинграда"))
+
+        for _ in range(3):
+            classifier.record_verdict("Блокада Ленинграда", True)
+        classifier.train({}, ())
+
+        reloaded = self._create_classifier()
+        self.assertTrue(reloaded.load())
+        self.assertTrue(reloaded.classify("Блокада Ленинграда"))
+
+
+class TestContentServiceValidateTopic(unittest.TestCase):
+
+    def setUp(self):
+        """Подготовка окружения для тестов"""
+        self.api_client = MagicMock()
+        self.api_client.validate_historical_topic.return_value = True
+        self.service = ContentService(self.api_client, MagicMock(spec=ILogger), events_file='missing.json')
+        self.service.events_data = {"events": [{"title": "Ледовое побоище"}]}
+        self.service.event_index = self.service._build_event_index()
+
+    def test_decision_paths(self):
+        """Тест счетчиков путей принятия решения"""
+        self.assertTrue(self.service.validate_topic("Ледовое побоище 1242 года"))
+        self.assertTrue(self.service.validate_topic("Реформы Александра II"))
+        self.assertFalse(self.service.validate_topic("Рецепт пиццы"))
+        self.assertTrue(self.service.validate_topic("Квазар"))
+
+        stats = self.service.get_validation_stats()
+        self.assertEqual(stats["total"], 4)
+        self.assertEqual(stats["index"], 1)
+        self.assertEqual(stats["classifier_accepted"], 1)
+        self.assertEqual(stats["classifier_rejected"], 1)
+        self.assertEqual(stats["escalated"], 1)
+        self.api_client.validate_historical_topic.assert_called_once_with("Квазар")
+
+    def test_foreign_topic_is_escalated(self):
+        """Тест: тема без признаков истории России проверяется через API"""
+        self.api_client.validate_historical_topic.return_value = False
+        self.assertFalse(self.service.validate_topic("История Франции"))
+        self.api_client.validate_historical_topic.assert_called_once_with("История Франции")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -107,5 +107,83 @@ class TestTopicServiceExtended(unittest.TestCase):
         mock_callback.assert_called()  # Callback должен быть вызван
         self.assertIn(cached_content, result[0])  # Кэшированный контент должен быть в результате
 
+    def test_cached_chapters_rendered_on_read(self):
+        """Test that chapters are cached as structured records and rendered on read"""
+        import tempfile
+        from src.text_cache_service import TextCacheService
+        from src.topic_service import TOPIC_CHAPTERS_TYPE
+
+        topic = "Крещение Руси"
+        self.mock_api_client.ask_grok.return_value = "Князь Владимир принял крещение. " * 60
+        self.mock_api_client.API_VERSION = "3.0.0"
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            text_cache = TextCacheService(self.mock_logger, cache_dir=temp_dir, flush_interval=0, legacy_file=None)
+            first = self.topic_service.get_cached_topic_info(topic, None, text_cache)
+            calls = self.mock_api_client.ask_grok.call_count
+
+            # В кэше хранятся исходные тексты глав, а не сообщения Telegram
+            chapters = TopicService.load_topic_chapters(topic, text_cache)
+            self.assertEqual([chapter["chapter"] for chapter in chapters], self.topic_service.standard_chapters)
+            self.assertNotIn("ГЛАВА", json.loads(text_cache.get_text(topic, TOPIC_CHAPTERS_TYPE))["chapters"][0]["text"])
+
+            # Повторное чтение не обращается к API и использует запомненное оформление
+            self.topic_service._format_topic_messages = MagicMock()
+            second = self.topic_service.get_cached_topic_info(topic, None, text_cache)
+            self.assertEqual(second, first)
+            self.assertEqual(self.mock_api_client.ask_grok.call_count, calls)
+            self.topic_service._format_topic_messages.assert_not_called()
+
+            # Новая версия оформления перерисовывает сообщения из тех же глав
+            self.topic_service.FORMAT_VERSION += 1
+            self.topic_service._format_topic_messages.return_value = ["новое оформление"]
+            self.assertEqual(self.topic_service.get_cached_topic_info(topic, None, text_cache), ["новое оформление"])
+            self.assertEqual(self.mock_api_client.ask_grok.call_count, calls)
+
+    def test_short_chapter_retries(self):
+        """Test quality retries: larger token limit, fixed-size prompt and per-chapter stats"""
+        self.mock_api_client.ask_grok.side_effect = lambda prompt, **kwargs: (
+            "Текст главы. " * (200 if kwargs.get("max_tokens", 0) > TopicService.CHAPTER_MAX_TOKENS else 10))
+
+        records = self.topic_service.generate_topic_chapters("Крещение Руси")
+
+        self.assertTrue(all(record["attempts"] == 2 for record in records))
+        retry_calls = [call for call in self.mock_api_client.ask_grok.call_args_list
+                       if call.kwargs.get("max_tokens") == TopicService.CHAPTER_RETRY_MAX_TOKENS]
+        self.assertEqual(len(retry_calls), len(self.topic_service.standard_chapters))
+        self.assertEqual(retry_calls[0].args[0].count("ПОЛУЧЕННЫЙ ОТВЕТ НЕДОСТАТОЧЕН"), 1)
+
+        stats = self.topic_service.get_retry_stats()
+        chapter_stats = stats["chapters"]["Ключевые события"]
+        self.assertEqual(chapter_stats["retry_rate"], 1.0)
+        self.assertEqual(chapter_stats["retry_success_rate"], 1.0)
+        self.assertEqual(stats["budget"]["granted"], len(self.topic_service.standard_chapters))
+
+    def test_retries_limited_by_budget_and_success_rate(self):
+        """Test that unreachable length targets stop consuming retries"""
+        from src.retry_budget import RetryBudget
+
+        self.mock_api_client.ask_grok.return_value = "Короткий ответ."
+        self.topic_service.retry_budget = RetryBudget(capacity=3, refill_per_minute=0)
+        self.topic_service.generate_topic_chapters("Крещение Руси")
+
+        # Бюджет позволяет только три повтора на всю тему
+        chapters_count = len(self.topic_service.standard_chapters)
+        self.assertEqual(self.mock_api_client.ask_grok.call_count, 1 + chapters_count + 3)
+        stats = self.topic_service.get_retry_stats()
+        self.assertEqual(sum(c["budget_denied"] for c in stats["chapters"].values()), chapters_count - 1)
+
+        # После серии безуспешных повторов глава больше не повторяется
+        self.topic_service.retry_budget = RetryBudget(capacity=100, refill_per_minute=0)
+        self.topic_service.standard_chapters = ["Итоги"]
+        for _ in range(TopicService.CHAPTER_RETRY_MIN_SAMPLES):
+            self.topic_service.generate_topic_chapters("Крещение Руси")
+        skipped = self.topic_service.get_retry_stats()["chapters"]["Итоги"]["retries_skipped"]
+        self.mock_api_client.ask_grok.reset_mock()
+        self.topic_service.generate_topic_chapters("Крещение Руси")
+        # Запрос контекста и одна попытка главы без повторов
+        self.assertEqual(self.mock_api_client.ask_grok.call_count, 2)
+        self.assertEqual(self.topic_service.get_retry_stats()["chapters"]["Итоги"]["retries_skipped"], skipped + 1)
+
 if __name__ == '__main__':
     unittest.main()
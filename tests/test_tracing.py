@@ -0,0 +1,129 @@
+
+import sys
+import os
+import json
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+# Добавляем путь к корневой директории проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.tracing import STATUS_ERROR, Tracer, tracer
+
+
+class TestTracing(unittest.TestCase):
+
+    def test_nested_spans_share_trace(self):
+        """Тест: вложенные спаны относятся к одной трассе, ошибка отмечается в статусе"""
+        local = Tracer(enabled=True)
+        with local.span("handler") as root:
+            with local.span("gemini", attempt=1) as child:
+                local.set_attribute("hit", False)
+            with self.assertRaises(ValueError):
+                with local.span("telegram"):
+                    raise ValueError("boom")
+        with local.span("other") as other:
+            pass
+
+        self.assertIsNone(root.parent_span_id)
+        self.assertEqual(child.trace_id, root.trace_id)
+        self.assertEqual(child.parent_span_id, root.span_id)
+        self.assertEqual(child.attributes, {"attempt": 1, "hit": False})
+        self.assertNotEqual(other.trace_id, root.trace_id)
+        self.assertIsNone(local.current_span())
+
+        failed = [span for span in local.recent_spans() if span.name == "telegram"][0]
+        self.assertEqual(failed.to_otlp()["status"]["code"], STATUS_ERROR)
+
+    def test_disabled_and_required_trace(self):
+        """Тест: выключенный трассировщик и спаны вне трассы ничего не записывают"""
+        disabled = Tracer(enabled=False)
+        with disabled.span("handler") as span:
+            self.assertIsNone(span)
+        self.assertEqual(disabled.traced("f")(lambda: 42)(), 42)
+
+        local = Tracer(enabled=True)
+        with local.span("telegram.getUpdates", require_trace=True) as span:
+            self.assertIsNone(span)
+        self.assertEqual(local.recent_spans(), [])
+
+    def test_trace_update_and_bind(self):
+        """Тест: обработчик начинает трассу, а привязанная функция продолжает ее в другом потоке"""
+        local = Tracer(enabled=True)
+        results = {}
+
+        class Handlers:
+            @local.trace_update("handler.button_handler")
+            def button_handler(self, update, context):
+                bound = local.bind(lambda: local.current_span())
+                thread = threading.Thread(target=lambda: results.update(span=bound()))
+                thread.start()
+                thread.join()
+                return local.current_span()
+
+        update = SimpleNamespace(update_id=7, effective_user=SimpleNamespace(id=42),
+                                 callback_query=SimpleNamespace(data="topic_1"))
+        span = Handlers().button_handler(update, None)
+
+        self.assertEqual(span.attributes, {"telegram.update_id": 7, "telegram.user_id": 42,
+                                           "telegram.callback_data": "topic_1"})
+        self.assertIs(results["span"], span)
+
+    def test_export_and_summary(self):
+        """Тест экспорта в OTLP/JSONL и сводки собственного времени этапов"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "traces", "spans.jsonl")
+            local = Tracer(enabled=True, export_file=path, flush_every=1000, flush_interval=3600)
+            with local.span("handler"):
+                time.sleep(0.02)
+                with local.span("gemini"):
+                    time.sleep(0.03)
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(local.flush(), 2)
+
+            with open(path, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+        spans = lines[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        self.assertEqual([span["name"] for span in spans], ["gemini", "handler"])
+        self.assertEqual(spans[0]["parentSpanId"], spans[1]["spanId"])
+        self.assertEqual(len(spans[1]["traceId"]), 32)
+        self.assertGreater(int(spans[1]["endTimeUnixNano"]), int(spans[1]["startTimeUnixNano"]))
+
+        summary = local.summarize()
+        self.assertEqual(summary["traces"], 1)
+        stages = {stage["name"]: stage for stage in summary["stages"]}
+        self.assertEqual(summary["stages"][0]["name"], "handler")
+        self.assertGreaterEqual(stages["gemini"]["self_ms"], 30)
+        self.assertLess(stages["handler"]["self_ms"], stages["handler"]["total_ms"] - 25)
+
+    def test_handler_scenario_is_traced(self):
+        """Тест: сценарий обработчиков дает трассы от обработчика до запросов к Gemini"""
+        from benchmarks.load_test_handlers import run
+
+        tracer.configure(enabled=True, export_file=None)
+        tracer.clear()
+        try:
+            run(users=1, workers=1, latency="none", telegram_latency=0.0, answers=1, messages=1)
+            spans = tracer.recent_spans()
+        finally:
+            tracer.configure(enabled=False)
+            tracer.clear()
+
+        by_id = {span.span_id: span for span in spans}
+        names = {span.name for span in spans}
+        self.assertTrue({"handler.choose_topic", "topic.generate_topic_chapters", "topic.chapter",
+                         "test.generate_test", "gemini.call_api", "handler.handle_conversation"} <= names)
+        for span in spans:
+            if span.name == "gemini.call_api":
+                root = span
+                while root.parent_span_id:
+                    root = by_id[root.parent_span_id]
+                self.assertTrue(root.name.startswith("handler."))
+                self.assertEqual(root.trace_id, span.trace_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,7 @@ import shutil
 import threading
 import datetime
 import re
-from flask import Flask, render_template, jsonify, request, send_file, make_response, redirect, url_for
+from flask import Flask, Response, render_template, jsonify, request, send_file, make_response, redirect, url_for
 
 # Настройка логирования
 import os
@@ -39,6 +39,9 @@ from src.admin_panel import AdminPanel
 from src.config import Config
 from src.api_cache import APICache
 from src.api_client import APIClient
+from src.text_cache_service import TextCacheService
+from src.topic_service import TopicService
+from src.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry as metrics_registry
 
 class UnifiedServer:
     """
@@ -76,6 +79,9 @@ class UnifiedServer:
                          static_folder=static_path)
 
 
+        # Кэш текстов бота (только чтение): главы тем, уже сгенерированные для бота
+        self.text_cache = TextCacheService(self.logger, read_only=True)
+
         # Предзагрузка данных
         self.events_data = None
         self.admins_data = None
@@ -490,6 +496,21 @@ class UnifiedServer:
             logger.error(f"Ошибка при чтении файла логов: {e}")
             return [f"Ошибка при чтении логов: {e}"]
 
+    def _load_cached_topic_content(self, title):
+        """
+        Собирает подробное описание события из глав темы, уже сгенерированных ботом.
+
+        Args:
+            title (str): Название события (тема)
+
+        Returns:
+            Optional[str]: Текст глав с заголовками или None, если глав в кэше нет
+        """
+        chapters = TopicService.load_topic_chapters(title, self.text_cache)
+        if not chapters:
+            return None
+        return "\n\n".join(f"{chapter['chapter']}\n\n{chapter['text']}" for chapter in chapters)
+
     def _setup_routes(self):
         """Настраивает маршруты для объединенного сервера"""
 
@@ -583,6 +604,12 @@ class UnifiedServer:
                 if not data or not data.get('title'):
                     return jsonify({'error': 'Недостаточно данных о событии'}), 400
 
+                # Подробное описание можно собрать из глав, уже сгенерированных ботом
+                if not data.get('isBrief', True):
+                    content = self._load_cached_topic_content(data['title'])
+                    if content:
+                        return jsonify({'content': content, 'source': 'topic_cache'})
+
                 # Получаем API ключ
                 api_key = None
                 try:
@@ -707,6 +734,9 @@ class UnifiedServer:
                 if not api_key:
                     return jsonify({'error': 'API ключ не найден'}), 500
 
+                # Реферат можно собрать из глав, уже сгенерированных ботом
+                cached_content = self._load_cached_topic_content(data['title'])
+
                 # Создаем объекты для работы с API
                 api_cache = APICache(self.logger)
                 api_client = APIClient(api_key, api_cache, self.logger)
@@ -739,12 +769,15 @@ class UnifiedServer:
                 """
 
                 try:
-                    # Инициализация API клиента если нужно
-                    if not api_client.is_initialized():
-                        api_client.initialize()
+                    if cached_content:
+                        detailed_content = cached_content
+                    else:
+                        # Инициализация API клиента если нужно
+                        if not api_client.is_initialized():
+                            api_client.initialize()
 
-                    # Запрос к Gemini API
-                    detailed_content = api_client.ask_grok(prompt, use_cache=True)
+                        # Запрос к Gemini API
+                        detailed_content = api_client.ask_grok(prompt, use_cache=True)
 
                     # Создаем документ Word
                     doc = Document()
@@ -1163,6 +1196,15 @@ class UnifiedServer:
                 logger.error(f"Ошибка при получении логов: {e}")
                 return jsonify({"error": str(e)}), 500
 
+        # Метрики бота и кэшей в текстовом формате Prometheus
+        @self.app.route('/metrics', methods=['GET'])
+        def metrics():
+            """Метрики для Prometheus (при заданном METRICS_TOKEN - только с токеном Bearer)"""
+            token = getattr(self.config, 'metrics_token', '')
+            if token and request.headers.get('Authorization', '') != f"Bearer {token}":
+                return Response("Требуется авторизация\n", status=401, mimetype='text/plain')
+            return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
         # Здесь добавьте остальные маршруты из оригинального admin_server.py
         # ...
 